@@ -0,0 +1,580 @@
+#!/usr/bin/env python3
+"""
+ALB Access Log Parser
+Streams Application Load Balancer access log records from plain, mmapped or gzip files
+"""
+
+import argparse
+import gzip
+import json
+import mmap
+import os
+import re
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+# Positional fields of an ALB access log entry, in file order.
+# https://docs.aws.amazon.com/elasticloadbalancing/latest/application/load-balancer-access-logs.html
+FIELD_NAMES = [
+    "type",
+    "time",
+    "elb",
+    "client:port",
+    "target:port",
+    "request_processing_time",
+    "target_processing_time",
+    "response_processing_time",
+    "elb_status_code",
+    "target_status_code",
+    "received_bytes",
+    "sent_bytes",
+    "request",
+    "user_agent",
+    "ssl_cipher",
+    "ssl_protocol",
+    "target_group_arn",
+    "trace_id",
+    "domain_name",
+    "chosen_cert_arn",
+    "matched_rule_priority",
+    "request_creation_time",
+    "actions_executed",
+    "redirect_url",
+    "error_reason",
+    "target:port_list",
+    "target_status_code_list",
+    "classification",
+    "classification_reason",
+    "conn_trace_id",
+]
+
+# Number of fields every ALB entry carries; newer entries append conn_trace_id
+MIN_FIELDS = 29
+
+# Fields before "request" never contain quotes, so they can be split on spaces
+UNQUOTED_PREFIX = 12
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+_TOKEN_RE = re.compile(rb'"(?:[^"\\]|\\.)*"|[^ ]+')
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+def _text(value: bytes) -> Optional[str]:
+    if value == b"-" or value == b"":
+        return None
+    return value.decode("utf-8", "replace")
+
+
+def _int(value: bytes) -> Optional[int]:
+    if value == b"-" or value == b"":
+        return None
+    return int(value)
+
+
+def _float(value: bytes) -> Optional[float]:
+    if value == b"-" or value == b"":
+        return None
+    return float(value)
+
+
+def _host(value: bytes) -> Optional[str]:
+    if value == b"-":
+        return None
+    return value.rpartition(b":")[0].decode("ascii", "replace")
+
+
+def _port(value: bytes) -> Optional[int]:
+    if value == b"-":
+        return None
+    return int(value.rpartition(b":")[2])
+
+
+def _request_part(index: int) -> Callable[[bytes], Optional[str]]:
+    def extract(value: bytes) -> Optional[str]:
+        parts = value.split(b" ", 2)
+        if len(parts) != 3:
+            return None
+        return _text(parts[index])
+    extract.part = index
+    return extract
+
+
+# Athena column name -> (field index, converter, Athena type).
+# Names and types follow the alb_access_logs table queried in athena.tf.
+_COLUMN_SPECS: Dict[str, Tuple[int, Callable[[bytes], object], str]] = {
+    "type": (0, _text, "string"),
+    "time": (1, _text, "string"),
+    "elb": (2, _text, "string"),
+    "client_ip": (3, _host, "string"),
+    "client_port": (3, _port, "int"),
+    "target_ip": (4, _host, "string"),
+    "target_port": (4, _port, "int"),
+    "request_processing_time": (5, _float, "double"),
+    "target_processing_time": (6, _float, "double"),
+    "response_processing_time": (7, _float, "double"),
+    "elb_status_code": (8, _int, "int"),
+    "target_status_code": (9, _int, "int"),
+    "received_bytes": (10, _int, "bigint"),
+    "sent_bytes": (11, _int, "bigint"),
+    "request_verb": (12, _request_part(0), "string"),
+    "request_url": (12, _request_part(1), "string"),
+    "request_proto": (12, _request_part(2), "string"),
+    "user_agent": (13, _text, "string"),
+    "ssl_cipher": (14, _text, "string"),
+    "ssl_protocol": (15, _text, "string"),
+    "target_group_arn": (16, _text, "string"),
+    "trace_id": (17, _text, "string"),
+    "domain_name": (18, _text, "string"),
+    "chosen_cert_arn": (19, _text, "string"),
+    "matched_rule_priority": (20, _text, "string"),
+    "request_creation_time": (21, _text, "string"),
+    "actions_executed": (22, _text, "string"),
+    "redirect_url": (23, _text, "string"),
+    "lambda_error_reason": (24, _text, "string"),
+    "target_port_list": (25, _text, "string"),
+    "target_status_code_list": (26, _text, "string"),
+    "classification": (27, _text, "string"),
+    "classification_reason": (28, _text, "string"),
+    "conn_trace_id": (29, _text, "string"),
+}
+
+# (name, Athena type) pairs in table order
+COLUMNS: List[Tuple[str, str]] = [(name, spec[2]) for name, spec in _COLUMN_SPECS.items()]
+
+# Partition columns derived from the AWSLogs/.../YYYY/MM/DD/ S3 path layout
+PARTITION_COLUMNS = ["year", "month", "day"]
+
+
+class ALBLogParseError(ValueError):
+    """Raised when a line is not a valid ALB access log entry"""
+
+
+def tokenize(line: bytes) -> List[bytes]:
+    """Split a raw log line into its positional fields, stripping quotes"""
+    head = line.split(b" ", UNQUOTED_PREFIX)
+    if len(head) <= UNQUOTED_PREFIX:
+        raise ALBLogParseError(f"Expected at least {MIN_FIELDS} fields: {line[:120]!r}")
+
+    fields = head[:UNQUOTED_PREFIX]
+    for token in _TOKEN_RE.findall(head[UNQUOTED_PREFIX]):
+        if token[:1] == b'"':
+            token = token[1:-1]
+        fields.append(token)
+
+    if len(fields) < MIN_FIELDS:
+        raise ALBLogParseError(f"Expected at least {MIN_FIELDS} fields, got {len(fields)}")
+    return fields
+
+
+# Splitting the quoted tail of a line on '"' yields unquoted runs at even
+# indices and quoted fields at odd indices. Because the ALB layout is fixed,
+# each field maps to (segment index, position within the run or None).
+_TAIL_LAYOUT: Dict[int, Tuple[int, Optional[int]]] = {
+    12: (1, None),   # request
+    13: (3, None),   # user_agent
+    14: (4, 0),      # ssl_cipher
+    15: (4, 1),      # ssl_protocol
+    16: (4, 2),      # target_group_arn
+    17: (5, None),   # trace_id
+    18: (7, None),   # domain_name
+    19: (9, None),   # chosen_cert_arn
+    20: (10, 0),     # matched_rule_priority
+    21: (10, 1),     # request_creation_time
+    22: (11, None),  # actions_executed
+    23: (13, None),  # redirect_url
+    24: (15, None),  # error_reason
+    25: (17, None),  # target:port_list
+    26: (19, None),  # target_status_code_list
+    27: (21, None),  # classification
+    28: (23, None),  # classification_reason
+    29: (24, None),  # conn_trace_id, see _conn_trace_id
+}
+
+# Segments produced by a 29-field line: 12 quoted fields -> 25 segments
+_MIN_SEGMENTS = 25
+
+_CONN_TRACE_INDEX = 29
+
+
+def _conn_trace_id(segments: List[bytes]) -> bytes:
+    """Raw conn_trace_id from a tail split on '"'
+
+    ALB writes it unquoted after classification_reason, so it is the trailing
+    run of segment 24; a quoted value would land in segment 25 instead.
+    """
+    value = segments[24].strip() if len(segments) > 24 else b""
+    if not value and len(segments) > 25:
+        value = segments[25]
+    return value or b"-"
+
+
+class ALBLogRecord:
+    """A single log entry that tokenizes and converts fields only when accessed
+
+    The record keeps a reference to the raw line; nothing is split until the
+    first field access, and only the columns actually read are converted.
+    The unquoted prefix is split on spaces and the quoted tail on '"', so no
+    regex runs on the hot path unless a field contains an escaped quote.
+    """
+
+    __slots__ = ("raw", "_head", "_segments", "_fields")
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+        self._head: Optional[List[bytes]] = None
+        self._segments: Optional[List[bytes]] = None
+        self._fields: Optional[List[bytes]] = None
+
+    @property
+    def fields(self) -> List[bytes]:
+        """All positional fields as raw bytes"""
+        if self._fields is None:
+            self._fields = tokenize(self.raw)
+        return self._fields
+
+    def field(self, index: int) -> bytes:
+        """Raw bytes of a positional field (missing trailing fields read as '-')"""
+        if self._fields is not None:
+            fields = self._fields
+            return fields[index] if index < len(fields) else b"-"
+
+        head = self._head
+        if head is None:
+            head = self._head = self.raw.split(b" ", UNQUOTED_PREFIX)
+            if len(head) <= UNQUOTED_PREFIX:
+                raise ALBLogParseError(f"Expected at least {MIN_FIELDS} fields: {self.raw[:120]!r}")
+        if index < UNQUOTED_PREFIX:
+            return head[index]
+
+        segments = self._segments
+        if segments is None:
+            tail = head[UNQUOTED_PREFIX]
+            segments = tail.split(b'"')
+            if len(segments) < _MIN_SEGMENTS or b'\\"' in tail:
+                # Escaped quotes or an unexpected shape: fall back to the tokenizer
+                return self._fallback(index)
+            self._segments = segments
+
+        if index == _CONN_TRACE_INDEX:
+            return _conn_trace_id(segments)
+        segment, position = _TAIL_LAYOUT[index]
+        if segment >= len(segments):
+            return b"-"
+        if position is None:
+            return segments[segment]
+        run = segments[segment].split()
+        if len(run) != 3 - (segment == 10):
+            return self._fallback(index)
+        return run[position]
+
+    def _fallback(self, index: int) -> bytes:
+        fields = self.fields
+        return fields[index] if index < len(fields) else b"-"
+
+    def get(self, column: str):
+        """Typed value of an Athena column, or None for '-'"""
+        try:
+            index, convert, _ = _COLUMN_SPECS[column]
+        except KeyError:
+            raise KeyError(f"Unknown column: {column}") from None
+        return convert(self.field(index))
+
+    __getitem__ = get
+
+    def to_dict(self, columns: Optional[List[str]] = None) -> Dict[str, object]:
+        """Materialize the requested columns (all columns by default)"""
+        names = columns or list(_COLUMN_SPECS)
+        return {name: self.get(name) for name in names}
+
+    def __repr__(self) -> str:
+        return f"ALBLogRecord({self.raw[:80]!r}...)"
+
+
+def column_getter(column: str) -> Callable[[ALBLogRecord], object]:
+    """Return a fast accessor for one column, for use in tight loops"""
+    index, convert, _ = _COLUMN_SPECS[column]
+    field = ALBLogRecord.field
+    return lambda record: convert(field(record, index))
+
+
+def parse_line(line: Union[bytes, str], columns: Optional[List[str]] = None) -> Dict[str, object]:
+    """Parse one log line eagerly into a dict of typed columns"""
+    if isinstance(line, str):
+        line = line.encode("utf-8")
+    return ALBLogRecord(line.rstrip(b"\r\n")).to_dict(columns)
+
+
+def is_gzip(path: str) -> bool:
+    """Detect gzip content by magic bytes rather than file extension"""
+    with open(path, "rb") as f:
+        return f.read(2) == _GZIP_MAGIC
+
+
+@contextmanager
+def open_log(path: str, use_mmap: bool = True) -> Iterator[BinaryIO]:
+    """Open a log file as a binary stream: gzip-decoded, mmapped or buffered"""
+    if is_gzip(path):
+        with gzip.open(path, "rb") as stream:
+            yield stream
+        return
+
+    with open(path, "rb", buffering=DEFAULT_CHUNK_SIZE) as f:
+        if use_mmap and os.fstat(f.fileno()).st_size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, "madvise"):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                yield mm
+        else:
+            yield f
+
+
+def iter_blocks(stream: BinaryIO, chunk_size: int) -> Iterator[Tuple[bool, List[bytes]]]:
+    """Yield (block may contain escapes, complete non-empty lines) per block read"""
+    read = stream.read
+    tail = b""
+    while True:
+        chunk = read(chunk_size)
+        if not chunk:
+            break
+        block = tail + chunk if tail else chunk
+        lines = block.split(b"\n")
+        tail = lines.pop()
+        if b"\r" in block:
+            lines = [line.rstrip(b"\r") for line in lines]
+        if not all(lines):
+            lines = [line for line in lines if line]
+        # A single-byte membership test is a memchr; escaped quotes are rare
+        yield b"\\" in block, lines
+    tail = tail.rstrip(b"\r")
+    if tail.strip():
+        yield b"\\" in tail, [tail]
+
+
+def iter_lines(stream: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield non-empty lines from a binary stream using fixed-size block reads
+
+    Memory use is bounded by chunk_size plus the longest line, regardless of
+    file size.
+    """
+    for _, lines in iter_blocks(stream, chunk_size):
+        yield from lines
+
+
+def iter_records(source: Union[str, BinaryIO], use_mmap: bool = True,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[ALBLogRecord]:
+    """Yield lazily-parsed records from a file path or an open binary stream"""
+    if isinstance(source, (str, os.PathLike)):
+        with open_log(os.fspath(source), use_mmap=use_mmap) as stream:
+            for line in iter_lines(stream, chunk_size):
+                yield ALBLogRecord(line)
+    else:
+        for line in iter_lines(source, chunk_size):
+            yield ALBLogRecord(line)
+
+
+def iter_line_chunks(stream: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[bytes]]:
+    """Yield lists of complete non-empty lines, one list per block read from the stream"""
+    for _, lines in iter_blocks(stream, chunk_size):
+        yield lines
+
+
+def _raw_columns(lines: List[bytes], indices: List[int]) -> Dict[int, List[bytes]]:
+    """Extract raw fields from every line of a batch, splitting each line at most twice"""
+    columns: Dict[int, List[bytes]] = {}
+
+    head_indices = [i for i in indices if i < UNQUOTED_PREFIX]
+    if head_indices:
+        limit = max(head_indices) + 1
+        heads = [line.split(b" ", limit) for line in lines]
+        for index in head_indices:
+            columns[index] = [head[index] for head in heads]
+
+    tail_indices = [i for i in indices if i >= UNQUOTED_PREFIX]
+    if tail_indices:
+        # The unquoted prefix has no quotes, so splitting a whole line on '"'
+        # yields the same segment indices as splitting its quoted tail.
+        # A quoted conn_trace_id needs segment 25 split off as well
+        limit = max(_TAIL_LAYOUT[i][0] + 1 + (i == _CONN_TRACE_INDEX) for i in tail_indices)
+        segments = [line.split(b'"', limit) for line in lines]
+        for index in tail_indices:
+            segment, position = _TAIL_LAYOUT[index]
+            if index == _CONN_TRACE_INDEX:
+                columns[index] = [_conn_trace_id(parts) for parts in segments]
+            elif position is not None:
+                columns[index] = [parts[segment].split()[position] for parts in segments]
+            elif index < MIN_FIELDS:
+                columns[index] = [parts[segment] for parts in segments]
+            else:
+                columns[index] = [parts[segment] if len(parts) > segment else b"-" for parts in segments]
+    return columns
+
+
+def _convert_batch(convert: Callable[[bytes], object]) -> Callable[[List[bytes]], List[object]]:
+    """Return a list-at-a-time version of a field converter"""
+    if convert is _int:
+        return lambda values: [None if v == b"-" else int(v) for v in values]
+    if convert is _float:
+        return lambda values: [None if v == b"-" else float(v) for v in values]
+    if convert is _text:
+        return lambda values: [None if v == b"-" or not v else v.decode("utf-8", "replace") for v in values]
+    part = getattr(convert, "part", None)
+    if part is not None:
+        def request_part(values: List[bytes]) -> List[Optional[str]]:
+            split = [v.split(b" ", 2) for v in values]
+            return [p[part].decode("utf-8", "replace") if len(p) == 3 else None for p in split]
+        return request_part
+    return lambda values: list(map(convert, values))
+
+
+def iter_column_batches(source: Union[str, BinaryIO], columns: List[str], use_mmap: bool = True,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict[str, List[object]]]:
+    """Yield {column: values} batches, one per block, for the requested columns
+
+    This is the high-throughput path: per-record objects are never created and
+    each line is split at most twice no matter how many columns are requested.
+    Blocks containing escaped quotes or malformed lines fall back to
+    per-record tokenizing, which raises ALBLogParseError for bad lines.
+    """
+    extractors = []
+    for column in columns:
+        index, convert, _ = _COLUMN_SPECS[column]
+        extractors.append((column, index, convert, _convert_batch(convert)))
+    indices = sorted({index for _, index, _, _ in extractors})
+
+    def batches(stream: BinaryIO) -> Iterator[Dict[str, List[object]]]:
+        for escaped, lines in iter_blocks(stream, chunk_size):
+            raw = None
+            if not (escaped and any(b'\\"' in line for line in lines)):
+                try:
+                    raw = _raw_columns(lines, indices)
+                except IndexError:
+                    pass  # malformed line somewhere in the block
+            if raw is None:
+                records = [ALBLogRecord(line) for line in lines]
+                yield {column: [convert(record.field(index)) for record in records]
+                       for column, index, convert, _ in extractors}
+                continue
+            yield {column: convert_batch(raw[index])
+                   for column, index, _, convert_batch in extractors}
+
+    if isinstance(source, (str, os.PathLike)):
+        with open_log(os.fspath(source), use_mmap=use_mmap) as stream:
+            yield from batches(stream)
+    else:
+        yield from batches(source)
+
+
+def sample_log_path() -> str:
+    """Path of the sample log shipped in examples/"""
+    repo_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return os.path.join(repo_root, "examples", "sample-logs", "sample-alb-log.log")
+
+
+def write_synthetic_log(path: str, size_bytes: int, template_path: Optional[str] = None,
+                        compress: bool = False) -> int:
+    """Write a log of roughly size_bytes by repeating template lines; returns bytes written"""
+    with open(template_path or sample_log_path(), "rb") as f:
+        block = b"".join(line.rstrip(b"\r\n") + b"\n" for line in f if line.strip())
+
+    repeats = max(1, (1 << 22) // len(block))
+    block *= repeats
+
+    written = 0
+    opener = gzip.open(path, "wb", compresslevel=1) if compress else open(path, "wb")
+    with opener as out:
+        while written < size_bytes:
+            out.write(block)
+            written += len(block)
+    return written
+
+
+def benchmark(path: str, columns: Optional[List[str]] = None, use_mmap: bool = True,
+              mode: str = "batch") -> Dict[str, float]:
+    """Time a full streaming pass over path, reading the given columns from every record
+
+    mode is "batch" (iter_column_batches) or "record" (lazy ALBLogRecord objects).
+    """
+    columns = columns if columns is not None else ["elb_status_code", "request_url"]
+
+    records = 0
+    decoded = 0
+    start = time.perf_counter()
+    if mode == "batch":
+        with open_log(path, use_mmap=use_mmap) as stream:
+            for batch in iter_column_batches(stream, columns or ["type"]):
+                records += len(next(iter(batch.values())))
+            decoded = stream.tell()
+    elif mode == "record":
+        getters = [column_getter(c) for c in columns]
+        for record in iter_records(path, use_mmap=use_mmap):
+            for getter in getters:
+                getter(record)
+            records += 1
+            decoded += len(record.raw) + 1
+    else:
+        raise ValueError(f"Unknown benchmark mode: {mode}")
+    elapsed = time.perf_counter() - start
+
+    return {
+        "file_bytes": os.path.getsize(path),
+        "decoded_bytes": decoded,
+        "records": records,
+        "seconds": round(elapsed, 3),
+        "mb_per_second": round(decoded / elapsed / 1e6, 1) if elapsed else 0.0,
+        "records_per_second": round(records / elapsed) if elapsed else 0,
+    }
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Stream and benchmark ALB access log parsing")
+    subparsers = parser.add_subparsers(dest="command", help="Command to execute")
+
+    parse_parser = subparsers.add_parser("parse", help="Print records as JSON lines")
+    parse_parser.add_argument("path", help="Log file (plain or gzip)")
+    parse_parser.add_argument("--columns", help="Comma-separated columns to output")
+    parse_parser.add_argument("--limit", type=int, help="Stop after this many records")
+
+    bench_parser = subparsers.add_parser("benchmark", help="Benchmark against a synthetic log file")
+    bench_parser.add_argument("--size-mb", type=int, default=2048, help="Synthetic file size in MB")
+    bench_parser.add_argument("--columns", default="elb_status_code,request_url",
+                              help="Comma-separated columns to read per record ('' for none)")
+    bench_parser.add_argument("--gzip", action="store_true", help="Benchmark a gzip-compressed file")
+    bench_parser.add_argument("--no-mmap", action="store_true", help="Use buffered reads instead of mmap")
+    bench_parser.add_argument("--mode", choices=["batch", "record"], default="batch",
+                              help="Columnar batches or lazy per-record objects")
+    bench_parser.add_argument("--file", help="Benchmark an existing file instead of generating one")
+
+    args = parser.parse_args()
+
+    if args.command == "parse":
+        columns = args.columns.split(",") if args.columns else None
+        for count, record in enumerate(iter_records(args.path)):
+            if args.limit is not None and count >= args.limit:
+                break
+            print(json.dumps(record.to_dict(columns)))
+        return 0
+
+    if args.command == "benchmark":
+        columns = [c for c in args.columns.split(",") if c]
+        if args.file:
+            print(json.dumps(benchmark(args.file, columns, not args.no_mmap, args.mode), indent=2))
+            return 0
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "synthetic-alb.log" + (".gz" if args.gzip else ""))
+            print(f"Writing {args.size_mb} MB synthetic log to {path}...")
+            write_synthetic_log(path, args.size_mb * 1_000_000, compress=args.gzip)
+            print(json.dumps(benchmark(path, columns, not args.no_mmap, args.mode), indent=2))
+        return 0
+
+    parser.print_help()
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
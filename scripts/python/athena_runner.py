@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Athena Query Runner
+Runs the named queries in the Athena workgroup concurrently under an
+active-query cap, polling with adaptive backoff, streaming result pages and
+recording queue/execution time and bytes scanned per query
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import inspect
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import instrumentation
+from instrumentation import span
+from local_aws import FINAL_STATES, MAX_RESULTS_PER_PAGE, LocalAthena, LocalS3, error_code
+from query_linter import extract_queries
+from result_cache import normalize_sql
+
+DEFAULT_CONCURRENCY = 5
+
+# Errors meaning "slow down" rather than "this request is wrong"
+THROTTLE_CODES = ("TooManyRequestsException", "ThrottlingException", "RequestLimitExceeded")
+
+# Weight of the newest run in the per-query duration estimate
+HISTORY_WEIGHT = 0.5
+
+
+@dataclass
+class RunnerOptions:
+    """Concurrency, polling and paging settings"""
+    max_concurrency: int = DEFAULT_CONCURRENCY
+    poll_initial: float = 0.2
+    poll_max: float = 5.0
+    poll_backoff: float = 1.5
+    start_retries: int = 6
+    page_size: int = MAX_RESULTS_PER_PAGE
+    timeout_seconds: Optional[float] = None
+
+
+@dataclass
+class QueryStats:
+    """What one query cost and how the runner waited for it"""
+    name: str
+    sql: str = field(repr=False)
+    execution_id: str = ""
+    state: str = "PENDING"
+    reason: str = ""
+    output_location: str = ""
+    queue_seconds: float = 0.0
+    engine_seconds: float = 0.0
+    total_seconds: float = 0.0
+    bytes_scanned: int = 0
+    polls: int = 0
+    throttled: int = 0
+    pages: int = 0
+    rows: int = 0
+    fetch_seconds: float = 0.0
+    wall_seconds: float = 0.0
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data.pop("sql")
+        return data
+
+
+@dataclass
+class ResultPage:
+    """One GetQueryResults page; values are strings, None for NULL"""
+    query: str
+    index: int
+    columns: List[str]
+    types: List[str]
+    rows: List[Tuple[Optional[str], ...]]
+
+
+class PollSchedule:
+    """Delays between status checks of one query
+
+    The first check is scheduled at a fraction of how long the same SQL took
+    last time (or poll_initial for unseen SQL); later checks back off
+    geometrically up to poll_max, starting over once the query leaves the
+    queue, since its run time only starts then.
+    """
+
+    def __init__(self, options: RunnerOptions, expected: Optional[float] = None):
+        self.options = options
+        self.delay = options.poll_initial
+        if expected:
+            self.delay = min(options.poll_max, max(options.poll_initial, expected * 0.8))
+        self._first = True
+
+    def next(self, state: str = "", previous: str = "") -> float:
+        if self._first:
+            self._first = False
+            return self.delay
+        if previous == "QUEUED" and state == "RUNNING":
+            self.delay = self.options.poll_initial
+        else:
+            self.delay = min(self.options.poll_max, self.delay * self.options.poll_backoff)
+        return self.delay
+
+
+class AthenaRunner:
+    """Submits queries to one workgroup, at most max_concurrency active at a time
+
+    boto3 is synchronous, so client calls run on a small thread pool while an
+    asyncio loop schedules them; a slot is held from StartQueryExecution until
+    the query reaches a final state, and results are fetched after releasing it
+    because fetching does not count against the active-query quota.
+    """
+
+    def __init__(self, workgroup: str, database: Optional[str] = None, options: Optional[RunnerOptions] = None,
+                 athena=None, region: str = "us-east-1", output_location: Optional[str] = None):
+        if athena is None:
+            import boto3
+            athena = boto3.client("athena", region_name=region)
+        self.athena = athena
+        self.workgroup = workgroup
+        self.database = database
+        self.options = options or RunnerOptions()
+        self.output_location = output_location
+        # Exponentially weighted seconds per normalized statement, steering the first poll
+        self.history: Dict[str, float] = {}
+        self._executor = ThreadPoolExecutor(max_workers=self.options.max_concurrency + 4,
+                                            thread_name_prefix="athena")
+        # A semaphore binds to the loop that first waits on it, so each loop gets its own
+        self._slots: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = None
+
+    def _loop_slots(self) -> asyncio.Semaphore:
+        """The max_concurrency semaphore of the running loop"""
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots[0] is not loop:
+            self._slots = (loop, asyncio.Semaphore(self.options.max_concurrency))
+        return self._slots[1]
+
+    async def _call(self, method: Callable, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, lambda: method(**kwargs))
+
+    @staticmethod
+    def _history_key(sql: str) -> str:
+        return hashlib.sha256(normalize_sql(sql).encode()).hexdigest()
+
+    async def _start(self, stats: QueryStats) -> str:
+        request = {"QueryString": stats.sql, "WorkGroup": self.workgroup}
+        if self.database:
+            request["QueryExecutionContext"] = {"Database": self.database}
+        if self.output_location:
+            request["ResultConfiguration"] = {"OutputLocation": self.output_location}
+        delay = self.options.poll_initial
+        for attempt in range(self.options.start_retries + 1):
+            try:
+                response = await self._call(self.athena.start_query_execution, **request)
+                return response["QueryExecutionId"]
+            except Exception as e:
+                if error_code(e) not in THROTTLE_CODES or attempt == self.options.start_retries:
+                    raise
+                stats.throttled += 1
+                await asyncio.sleep(delay)
+                delay = min(self.options.poll_max, delay * 2)
+
+    async def _wait(self, stats: QueryStats):
+        """Poll until the query finishes, stopping it after timeout_seconds from submission"""
+        schedule = PollSchedule(self.options, self.history.get(self._history_key(stats.sql)))
+        started = time.perf_counter()
+        state = previous = ""
+        while True:
+            await asyncio.sleep(schedule.next(state, previous))
+            previous = state
+            try:
+                response = await self._call(self.athena.get_query_execution, QueryExecutionId=stats.execution_id)
+            except Exception as e:
+                if error_code(e) not in THROTTLE_CODES:
+                    raise
+                stats.throttled += 1
+            else:
+                stats.polls += 1
+                execution = response["QueryExecution"]
+                state = execution["Status"]["State"]
+                if state in FINAL_STATES:
+                    self._record(stats, execution)
+                    return
+            # Checked after throttled polls too, so a throttled query still times out
+            if self.options.timeout_seconds and time.perf_counter() - started > self.options.timeout_seconds:
+                await self._call(self.athena.stop_query_execution, QueryExecutionId=stats.execution_id)
+                stats.state = "CANCELLED"
+                stats.reason = f"timed out after {self.options.timeout_seconds:g}s"
+                return
+
+    async def _stop(self, stats: QueryStats):
+        """Best-effort StopQueryExecution so an abandoned query does not keep holding the quota"""
+        try:
+            await self._call(self.athena.stop_query_execution, QueryExecutionId=stats.execution_id)
+        except Exception:
+            pass
+
+    def _record(self, stats: QueryStats, execution: Dict):
+        status = execution["Status"]
+        statistics = execution.get("Statistics", {})
+        stats.state = status["State"]
+        stats.reason = status.get("StateChangeReason", "")
+        stats.output_location = execution.get("ResultConfiguration", {}).get("OutputLocation", "")
+        stats.queue_seconds = statistics.get("QueryQueueTimeInMillis", 0) / 1000
+        stats.engine_seconds = statistics.get("EngineExecutionTimeInMillis", 0) / 1000
+        stats.total_seconds = statistics.get("TotalExecutionTimeInMillis", 0) / 1000
+        stats.bytes_scanned = statistics.get("DataScannedInBytes", 0)
+        if stats.state == "SUCCEEDED" and stats.total_seconds:
+            key = self._history_key(stats.sql)
+            previous = self.history.get(key, stats.total_seconds)
+            self.history[key] = HISTORY_WEIGHT * stats.total_seconds + (1 - HISTORY_WEIGHT) * previous
+
+    async def pages(self, stats: QueryStats) -> AsyncIterator[ResultPage]:
+        """Result pages of a finished query, fetching the next page while the caller handles this one"""
+        request = {"QueryExecutionId": stats.execution_id, "MaxResults": self.options.page_size}
+        loop = asyncio.get_running_loop()
+        pending = loop.create_task(self._call(self.athena.get_query_results, **request))
+        columns: List[str] = []
+        index = 0
+        while pending is not None:
+            response = await pending
+            token = response.get("NextToken")
+            pending = (loop.create_task(self._call(self.athena.get_query_results, **request, NextToken=token))
+                       if token else None)
+            info = response["ResultSet"]["ResultSetMetadata"]["ColumnInfo"]
+            columns = columns or [c["Name"] for c in info]
+            rows = [tuple(d.get("VarCharValue") for d in row["Data"]) for row in response["ResultSet"]["Rows"]]
+            # The first row of the first page repeats the column names
+            if index == 0 and rows and list(rows[0]) == columns:
+                rows = rows[1:]
+            yield ResultPage(stats.name, index, columns, [c["Type"] for c in info], rows)
+            index += 1
+
+    async def run_query(self, name: str, sql: str, consumer: Optional[Callable] = None) -> QueryStats:
+        """Run one statement; consumer(page) (sync or async) receives result pages as they arrive"""
+        slots = self._loop_slots()
+        stats = QueryStats(name, sql)
+        started = time.perf_counter()
+        try:
+            async with slots:
+                stats.execution_id = await self._start(stats)
+                stats.state = "QUEUED"
+                try:
+                    await self._wait(stats)
+                except (Exception, asyncio.CancelledError):
+                    await self._stop(stats)
+                    raise
+
+            if stats.state == "SUCCEEDED":
+                fetch_started = time.perf_counter()
+                async for page in self.pages(stats):
+                    stats.pages += 1
+                    stats.rows += len(page.rows)
+                    if consumer is not None:
+                        result = consumer(page)
+                        if inspect.isawaitable(result):
+                            await result
+                stats.fetch_seconds = time.perf_counter() - fetch_started
+        except Exception as e:
+            stats.state = "ERROR"
+            stats.reason = str(e)
+        stats.wall_seconds = time.perf_counter() - started
+        return stats
+
+    async def run_all(self, queries: List[Tuple[str, str]], consumer: Optional[Callable] = None) -> List[QueryStats]:
+        """Run (name, sql) pairs concurrently; stats come back in the given order"""
+        self._loop_slots()
+        return list(await asyncio.gather(*(self.run_query(name, sql, consumer) for name, sql in queries)))
+
+    def run(self, queries: List[Tuple[str, str]], consumer: Optional[Callable] = None) -> List[QueryStats]:
+        """Blocking wrapper around run_all"""
+        return asyncio.run(self.run_all(queries, consumer))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class CsvWriter:
+    """Consumer writing each query's pages to <directory>/<name>.csv as they stream in"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._files: Dict[str, Tuple] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, page: ResultPage):
+        if page.query not in self._files:
+            handle = open(os.path.join(self.directory, f"{page.query}.csv"), "w", newline="")
+            writer = csv.writer(handle)
+            writer.writerow(page.columns)
+            self._files[page.query] = (handle, writer)
+        self._files[page.query][1].writerows(page.rows)
+
+    def close(self):
+        for handle, _ in self._files.values():
+            handle.close()
+        self._files.clear()
+
+
+def print_stats(results: List[QueryStats]):
+    """Print per-query queue/run time, bytes scanned and paging"""
+    print(f"\n{'='*100}")
+    print("Athena Query Runs")
+    print(f"{'='*100}")
+    print(f"{'Query':<28} {'State':<10} {'Queue':>8} {'Engine':>8} {'Wall':>8} {'Scanned MB':>11} "
+          f"{'Polls':>6} {'Pages':>6} {'Rows':>8}")
+    print("-" * 100)
+    for s in results:
+        print(f"{s.name[:28]:<28} {s.state:<10} {s.queue_seconds:>7.2f}s {s.engine_seconds:>7.2f}s "
+              f"{s.wall_seconds:>7.2f}s {s.bytes_scanned / 1024 ** 2:>11.2f} {s.polls:>6} {s.pages:>6} "
+              f"{s.rows:>8}")
+        if s.reason:
+            print(f"  {s.reason}")
+    print("-" * 100)
+    print(f"{len(results)} queries; {sum(s.bytes_scanned for s in results) / 1024 ** 2:.2f} MB scanned, "
+          f"{sum(s.throttled for s in results)} throttled calls")
+    print(f"{'='*100}\n")
+
+
+def main():
+    """Main function"""
+    default_tf = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              "..", "..", "terraform", "modules", "aws", "athena.tf")
+    parser = argparse.ArgumentParser(description="Run named Athena queries concurrently")
+    parser.add_argument("--workgroup", default="primary", help="Athena workgroup")
+    parser.add_argument("--database", help="Glue database")
+    parser.add_argument("--region", default="us-east-1", help="AWS region")
+    parser.add_argument("--output-location", help="s3:// results prefix (default: the workgroup's)")
+    parser.add_argument("--tf", default=default_tf, help="Terraform file(s) holding the named queries")
+    parser.add_argument("--query", action="append", help="Named query to run (repeatable; default: all)")
+    parser.add_argument("--sql", help="Run this SQL instead of the named queries")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Queries active at once (keep below the account's active-query quota)")
+    parser.add_argument("--timeout", type=float, help="Cancel queries running longer than this (seconds)")
+    parser.add_argument("--results-dir", help="Stream each query's rows to <dir>/<name>.csv")
+    parser.add_argument("--local", metavar="TREE", help="Run against a local log tree instead of Athena")
+    parser.add_argument("--json", help="Write per-query stats to this file")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.sql:
+        queries = [("sql", args.sql)]
+    else:
+        queries = [(q.name, q.sql) for q in extract_queries([args.tf]) if not args.query or q.name in args.query]
+    if not queries:
+        print("Error: no queries selected")
+        return 1
+
+    options = RunnerOptions(max_concurrency=args.concurrency, timeout_seconds=args.timeout)
+    with instrumentation.session("athena_runner", args.trace, args.profile), \
+            tempfile.TemporaryDirectory() as scratch:
+        athena = LocalAthena(args.local, LocalS3(scratch)) if args.local else None
+        runner = AthenaRunner(args.workgroup, args.database, options, athena, args.region, args.output_location)
+        consumer = CsvWriter(args.results_dir) if args.results_dir else None
+        try:
+            with span("run queries", "query", queries=len(queries)):
+                results = runner.run(queries, consumer)
+        finally:
+            runner.close()
+            if consumer:
+                consumer.close()
+
+    print_stats(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([s.to_dict() for s in results], f, indent=2)
+    return 0 if all(s.state == "SUCCEEDED" for s in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Shared Helpers
+Optional-dependency loaders and the small codecs shared by the log tools
+"""
+
+import hashlib
+from typing import Iterable, Tuple
+
+
+def require_numpy(purpose: str):
+    """numpy, or a RuntimeError saying what needs it"""
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError(f"numpy is required for {purpose}: pip install numpy") from None
+    return numpy
+
+
+def optional_numpy():
+    """numpy when installed, else None for callers with a pure-Python fallback"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def require_pyarrow(purpose: str = "Parquet files"):
+    """(pyarrow, pyarrow.parquet), or a RuntimeError saying what needs them"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError(f"pyarrow is required for {purpose}: pip install pyarrow") from None
+    return pyarrow, pyarrow.parquet
+
+
+def require_diagrams():
+    """The diagrams package, or a RuntimeError explaining how to install it"""
+    try:
+        import diagrams
+    except ImportError:
+        raise RuntimeError("diagrams is required for rendering: pip install diagrams (and Graphviz)") from None
+    return diagrams
+
+
+def write_varint(out: bytearray, value: int):
+    """Append an unsigned LEB128 varint"""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """(value, position after it) of the unsigned LEB128 varint at pos"""
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def content_version(entries: Iterable[Tuple[str, object, object]]) -> str:
+    """Digest of (name, size, modified/etag) for every object in a partition"""
+    digest = hashlib.sha1()
+    for name, size, stamp in sorted(entries):
+        digest.update(f"{name}\0{size}\0{stamp}\n".encode())
+    return digest.hexdigest()
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+ALB Log Compaction
+Merges the many small objects ALB delivers per partition into a few large,
+time-sorted gzip files, committed atomically through a per-directory manifest.
+Superseded objects are then moved out of the table location, because Athena,
+the Glue crawler and S3 sync do not read the manifest.
+"""
+
+import argparse
+import gzip
+import heapq
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from log_layout import (COMPACTED_SUFFIX, MANIFEST_FILE, LogObject, is_compacted,
+                        iter_log_objects, read_manifest)
+
+MB = 1024 * 1024
+DEFAULT_TARGET_MB = 256
+# Objects at least this large are already right-sized and left alone
+DEFAULT_MIN_MB = 128
+# Lines held in memory before a sorted run is spilled to disk
+DEFAULT_MEMORY_MB = 256
+
+# Compacted objects keep the ALB naming so every tool can still parse them
+COMPACTED_IP = "0.0.0.0"
+
+# Sibling of AWSLogs/ receiving superseded objects; outside the projected table
+# location, excluded from the crawler, and skipped by iter_log_objects
+SUPERSEDED_DIR = "_superseded"
+
+
+@dataclass
+class CompactionOptions:
+    """Options shared by every partition compaction"""
+    target_bytes: int = DEFAULT_TARGET_MB * MB
+    min_bytes: int = DEFAULT_MIN_MB * MB
+    memory_bytes: int = DEFAULT_MEMORY_MB * MB
+    compression_level: int = 6
+    delete_superseded: bool = False
+    dry_run: bool = False
+
+
+@dataclass
+class CompactionResult:
+    """Outcome of compacting one day directory"""
+    partition: str
+    generation: int
+    input_files: int
+    input_bytes: int
+    rows: int
+    output_files: List[str] = field(default_factory=list)
+    output_bytes: int = 0
+    seconds: float = 0.0
+
+
+def _time_key(line: bytes) -> bytes:
+    # type time elb ...: ISO-8601 UTC timestamps sort lexicographically
+    parts = line.split(b" ", 2)
+    return parts[1] if len(parts) > 1 else b""
+
+
+def _read_lines(path: str) -> Iterator[bytes]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield line if line.endswith(b"\n") else line + b"\n"
+
+
+def _spill(lines: List[bytes], path: str) -> str:
+    with gzip.open(path, "wb", compresslevel=1) as out:
+        out.writelines(lines)
+    return path
+
+
+def _sorted_runs(paths: List[str], memory_bytes: int, spill_prefix: str) -> Tuple[List[Iterable[bytes]], List[str]]:
+    """Sorted runs over all lines of paths: one in memory, plus spilled runs when they do not fit"""
+    runs: List[Iterable[bytes]] = []
+    spilled: List[str] = []
+    buffer: List[bytes] = []
+    held = 0
+    for path in paths:
+        for line in _read_lines(path):
+            buffer.append(line)
+            held += len(line)
+            if held >= memory_bytes:
+                buffer.sort(key=_time_key)
+                spilled.append(_spill(buffer, f"{spill_prefix}.run{len(spilled)}.tmp"))
+                buffer, held = [], 0
+    buffer.sort(key=_time_key)
+    runs.extend(_read_lines(path) for path in spilled)
+    runs.append(buffer)
+    return runs, spilled
+
+
+class _RotatingWriter:
+    """Writes gzip objects of about target_bytes compressed, each published under its final name"""
+
+    def __init__(self, directory: str, stem: str, generation: int, options: CompactionOptions):
+        self.directory = directory
+        self.stem = stem
+        self.generation = generation
+        self.options = options
+        self.outputs: List[str] = []
+        self.rows = 0
+        self._raw = None
+        self._gzip = None
+        self._path = None
+
+    def _open(self, line: bytes):
+        # ALB names carry a minute timestamp; use the first record's so names sort by time
+        stamp = _time_key(line).decode()
+        timestamp = f"{stamp[0:4]}{stamp[5:7]}{stamp[8:10]}T{stamp[11:13]}{stamp[14:16]}Z"
+        suffix = f"{COMPACTED_SUFFIX}{self.generation}n{len(self.outputs):04d}"
+        name = f"{self.stem}_{timestamp}_{COMPACTED_IP}_{suffix}.log.gz"
+        self._path = os.path.join(self.directory, name)
+        self._raw = open(self._path + ".tmp", "wb")
+        self._gzip = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=self.options.compression_level)
+
+    def write(self, line: bytes):
+        if self._gzip is None:
+            self._open(line)
+        self._gzip.write(line)
+        self.rows += 1
+        if self._raw.tell() >= self.options.target_bytes:
+            self.close()
+
+    def close(self) -> List[str]:
+        if self._gzip is not None:
+            self._gzip.close()
+            self._raw.flush()
+            os.fsync(self._raw.fileno())
+            self._raw.close()
+            # Not yet live: compacted names are ignored until the manifest lists them
+            os.replace(self._path + ".tmp", self._path)
+            self.outputs.append(os.path.basename(self._path))
+            self._gzip = self._raw = None
+        return self.outputs
+
+
+def _write_manifest(directory: str, manifest: dict):
+    """Atomically replace the manifest: this single rename is the commit point"""
+    path = os.path.join(directory, MANIFEST_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _remove_uncommitted(directory: str, manifest: dict):
+    """Delete leftovers of an interrupted run: temp files and compacted objects no manifest lists"""
+    known = set(manifest["files"]) | set(manifest["superseded"])
+    for name in os.listdir(directory):
+        if is_compacted(name) and (name.endswith(".tmp") or name not in known):
+            os.remove(os.path.join(directory, name))
+
+
+def superseded_directory(directory: str) -> str:
+    """The day directory's path under the _superseded/ sibling of its AWSLogs/ ancestor"""
+    parts = os.path.normpath(directory).split(os.sep)
+    if "AWSLogs" not in parts:
+        return os.path.join(directory, SUPERSEDED_DIR)
+    at = len(parts) - 1 - parts[::-1].index("AWSLogs")
+    return os.sep.join(parts[:at] + [SUPERSEDED_DIR] + parts[at:])
+
+
+def _stem(obj: LogObject) -> str:
+    return f"{obj.account}_elasticloadbalancing_{obj.region}_{obj.load_balancer}"
+
+
+def compact_partition(directory: str, objects: List[LogObject], options: CompactionOptions,
+                      ) -> Optional[CompactionResult]:
+    """Merge the small live objects of one day directory; None when nothing needs compacting"""
+    start = time.perf_counter()
+    previous = read_manifest(directory) or {"generation": 0, "files": [], "superseded": []}
+    generation = previous["generation"] + 1
+    if not options.dry_run:
+        _remove_uncommitted(directory, previous)
+
+    groups: Dict[str, List[LogObject]] = defaultdict(list)
+    for obj in objects:
+        if obj.load_balancer and os.path.getsize(obj.key) < options.min_bytes:
+            groups[_stem(obj)].append(obj)
+    groups = {stem: group for stem, group in groups.items() if len(group) > 1}
+    if not groups:
+        return None
+
+    inputs = [obj.key for group in groups.values() for obj in group]
+    result = CompactionResult(
+        partition="/".join(objects[0].partition),
+        generation=generation,
+        input_files=len(inputs),
+        input_bytes=sum(os.path.getsize(p) for p in inputs),
+        rows=0,
+    )
+    if options.dry_run:
+        return result
+
+    outputs: List[str] = []
+    for stem, group in sorted(groups.items()):
+        spill_prefix = os.path.join(directory, f"{stem}_{COMPACTED_SUFFIX}{generation}")
+        runs, spilled = _sorted_runs([obj.key for obj in group], options.memory_bytes, spill_prefix)
+        writer = _RotatingWriter(directory, stem, generation, options)
+        try:
+            for line in heapq.merge(*runs, key=_time_key):
+                writer.write(line)
+        finally:
+            outputs.extend(writer.close())
+            for path in spilled:
+                os.remove(path)
+        result.rows += writer.rows
+
+    consumed = {obj.filename for group in groups.values() for obj in group}
+    superseded = [name for name in previous["superseded"] if os.path.exists(os.path.join(directory, name))]
+    _write_manifest(directory, {
+        "generation": generation,
+        "files": [name for name in previous["files"] if name not in consumed] + outputs,
+        "superseded": superseded + sorted(consumed),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    })
+
+    # Left in place, every reader but this repo's would count these rows twice.
+    # A reader that listed the directory before the commit may fail to open them.
+    target = None if options.delete_superseded else superseded_directory(directory)
+    if target:
+        os.makedirs(target, exist_ok=True)
+    for name in sorted(consumed):
+        path = os.path.join(directory, name)
+        if target:
+            os.replace(path, os.path.join(target, name))
+        else:
+            os.remove(path)
+
+    result.output_files = [os.path.join(directory, name) for name in outputs]
+    result.output_bytes = sum(os.path.getsize(p) for p in result.output_files)
+    result.seconds = round(time.perf_counter() - start, 3)
+    return result
+
+
+def group_by_directory(root: str) -> Dict[str, List[LogObject]]:
+    """Live log objects under root, grouped by the day directory holding them"""
+    directories: Dict[str, List[LogObject]] = defaultdict(list)
+    for obj in iter_log_objects(root):
+        directories[os.path.dirname(obj.key)].append(obj)
+    return dict(sorted(directories.items()))
+
+
+def compact_tree(root: str, options: CompactionOptions, workers: Optional[int] = None) -> List[CompactionResult]:
+    """Compact every day directory under root, one directory per worker process"""
+    directories = group_by_directory(root)
+    if not directories:
+        return []
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(directories) == 1:
+        results = [compact_partition(d, objects, options) for d, objects in directories.items()]
+    else:
+        results = []
+        with ProcessPoolExecutor(max_workers=min(workers, len(directories))) as pool:
+            futures = [pool.submit(compact_partition, d, objects, options)
+                       for d, objects in directories.items()]
+            for future in as_completed(futures):
+                results.append(future.result())
+    return sorted((r for r in results if r is not None), key=lambda r: r.partition)
+
+
+def print_summary(results: List[CompactionResult], dry_run: bool = False):
+    """Print formatted compaction summary"""
+    print("\n" + "=" * 80)
+    print("LOG COMPACTION SUMMARY" + (" (DRY RUN)" if dry_run else ""))
+    print("=" * 80)
+    for r in results:
+        if dry_run:
+            print(f"  {r.partition}: would merge {r.input_files} files ({r.input_bytes:,} bytes)")
+        else:
+            print(f"  {r.partition} (generation {r.generation}): {r.input_files} files, {r.rows:,} rows "
+                  f"-> {len(r.output_files)} files, {r.input_bytes:,} -> {r.output_bytes:,} bytes "
+                  f"in {r.seconds}s")
+
+    print("-" * 80)
+    total = f"  TOTAL: {len(results)} partitions, {sum(r.input_files for r in results):,} files"
+    print(total if dry_run else f"{total} -> {sum(len(r.output_files) for r in results):,} files")
+    print("=" * 80 + "\n")
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Compact small ALB log objects into large time-sorted files")
+    parser.add_argument("root", help="Local directory containing an AWSLogs/ tree")
+    parser.add_argument("--target-mb", type=int, default=DEFAULT_TARGET_MB,
+                        help="Compressed size of each compacted file")
+    parser.add_argument("--min-mb", type=int, default=DEFAULT_MIN_MB,
+                        help="Objects at least this large are left as they are")
+    parser.add_argument("--memory-mb", type=int, default=DEFAULT_MEMORY_MB,
+                        help="Log lines sorted in memory per worker before spilling to disk")
+    parser.add_argument("--compression-level", type=int, default=6, help="gzip level (1-9)")
+    parser.add_argument("--delete-superseded", action="store_true",
+                        help="Delete the merged objects once the manifest is committed instead of "
+                             f"moving them under {SUPERSEDED_DIR}/ next to AWSLogs/")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be compacted")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    args = parser.parse_args()
+
+    options = CompactionOptions(
+        target_bytes=args.target_mb * MB,
+        min_bytes=args.min_mb * MB,
+        memory_bytes=args.memory_mb * MB,
+        compression_level=args.compression_level,
+        delete_superseded=args.delete_superseded,
+        dry_run=args.dry_run,
+    )
+    results = compact_tree(args.root, options, args.workers)
+    if args.json:
+        print(json.dumps([vars(r) for r in results], indent=2))
+    else:
+        print_summary(results, args.dry_run)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
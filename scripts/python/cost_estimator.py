@@ -4,10 +4,14 @@ Cost Estimation Utility
 Estimates infrastructure costs across cloud providers
 """
 
+import argparse
 import json
-from typing import Dict, List
+from typing import Dict, List, Optional
 from dataclasses import dataclass
 
+import instrumentation
+from instrumentation import span
+
 @dataclass
 class CostEstimate:
     """Cost estimate for a resource"""
@@ -134,20 +138,25 @@ class AzureCostEstimator:
             notes=f"{spark_pool_hours} hours/month"
         )
 
-def generate_cost_report(scenario: str = "standard") -> Dict:
-    """Generate comprehensive cost report"""
+def generate_cost_report(scenario: str = "standard", scanned_tb: Optional[float] = None) -> Dict:
+    """Generate comprehensive cost report
+
+    scanned_tb overrides the scenario's monthly query scan volume, e.g. with the
+    pruning-aware figure from partition_stats.monthly_scanned_tb().
+    """
     
     if scenario == "standard":
-        # Standard scenario: 100GB logs, 10 queries/day
+        # Standard scenario: 100GB logs, 10 queries/day, 300GB scanned
+        scanned_tb = 0.3 if scanned_tb is None else round(scanned_tb, 4)
         aws_costs = [
             AWSCostEstimator.estimate_s3_costs(100, 10000),
             AWSCostEstimator.estimate_glue_costs(30),
-            AWSCostEstimator.estimate_athena_costs(0.3)  # 300GB scanned
+            AWSCostEstimator.estimate_athena_costs(scanned_tb)
         ]
         
         gcp_costs = [
             GCPCostEstimator.estimate_gcs_costs(100),
-            GCPCostEstimator.estimate_bigquery_costs(0.3, 100)
+            GCPCostEstimator.estimate_bigquery_costs(scanned_tb, 100)
         ]
         
         azure_costs = [
@@ -156,7 +165,9 @@ def generate_cost_report(scenario: str = "standard") -> Dict:
         ]
     
     else:
-        raise ValueError(f"Unknown scenario: {scenario}")
+        # Other scenarios are defined in the pricing catalog and simulated by cost_model
+        from cost_model import scenario_report
+        return scenario_report(scenario, scanned_tb=scanned_tb)
     
     # Calculate totals
     aws_total = sum(c.monthly_cost for c in aws_costs)
@@ -205,14 +216,39 @@ def print_cost_report(report: Dict):
 
 def main():
     """Main function"""
-    report = generate_cost_report("standard")
-    print_cost_report(report)
-    
-    # Save to JSON
-    with open("cost-estimate.json", "w") as f:
-        json.dump(report, f, indent=2)
-    
-    print("Cost estimate saved to cost-estimate.json")
+    parser = argparse.ArgumentParser(description="Estimate infrastructure costs")
+    parser.add_argument("--scenario", default="standard", help="standard, or a scenario in config/pricing.yaml")
+    parser.add_argument("--partition-stats",
+                        help="Price the named queries' scans from partition statistics (see partition_stats.py)")
+    parser.add_argument("--queries", nargs="*", default=["terraform/modules/aws"],
+                        help="Terraform files or dirs holding the named queries")
+    parser.add_argument("--columnar", action="store_true", help="Price scans as if the logs were Parquet")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.session("cost_estimator", args.trace, args.profile):
+        scanned_tb = None
+        if args.partition_stats:
+            from partition_stats import PartitionStats, monthly_scanned_tb
+            from query_linter import extract_queries
+            with span("load partition stats", "parse", path=args.partition_stats):
+                stats = PartitionStats.load(args.partition_stats)
+            with span("extract queries", "parse"):
+                queries = [q.sql for q in extract_queries(args.queries)]
+            with span("estimate scans", "compute", queries=len(queries)):
+                scanned_tb = monthly_scanned_tb(stats, queries, columnar=args.columnar)
+
+        with span("generate report", "compute", scenario=args.scenario):
+            report = generate_cost_report(args.scenario, scanned_tb)
+        with span("print report", "render"):
+            print_cost_report(report)
+
+        # Save to JSON
+        with span("write json", "render"):
+            with open("cost-estimate.json", "w") as f:
+                json.dump(report, f, indent=2)
+
+        print("Cost estimate saved to cost-estimate.json")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Cost Model
+Projects monthly costs for all three clouds from a pricing catalog and usage
+time series, evaluating whole parameter grids at once with numpy
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from common import require_numpy
+from cost_estimator import CostEstimate
+
+CLOUDS = ["aws", "gcp", "azure"]
+
+DAYS_PER_MONTH = 30
+GB_PER_TB = 1024
+
+DEFAULT_CATALOG = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "config", "pricing.yaml")
+
+# Scenario parameters and their defaults; each becomes an array with one value per scenario
+PARAMETERS = {
+    "monthly_growth": 0.0,       # compound growth of log volume and scanned bytes per month
+    "columnar_fraction": 0.0,    # share of data converted to Parquet (0-1)
+    "retention_days": 90.0,      # lifecycle expiration
+    "tiering": 1.0,              # 1 moves data through colder tiers, 0 keeps it in the hottest tier
+    "query_multiplier": 1.0,     # scales the query counts of the usage series
+}
+
+
+def load_catalog(path: Optional[str] = None) -> Dict:
+    """Load a pricing catalog from YAML or JSON"""
+    path = path or DEFAULT_CATALOG
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError("PyYAML is required for YAML catalogs: pip install pyyaml") from None
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+@dataclass
+class UsageSeries:
+    """Per-month usage; shorter series repeat their last value"""
+    daily_log_gb: List[float]
+    queries_per_day: List[float]
+    scanned_gb_per_query: List[float]
+
+    @classmethod
+    def constant(cls, daily_log_gb: float, queries_per_day: float, scanned_gb_per_query: float) -> "UsageSeries":
+        return cls([daily_log_gb], [queries_per_day], [scanned_gb_per_query])
+
+    @classmethod
+    def load(cls, path: str) -> "UsageSeries":
+        """Load a CSV with one row per month, or a JSON list of month objects"""
+        with open(path) as f:
+            rows = list(csv.DictReader(f)) if path.endswith(".csv") else json.load(f)
+        return cls(
+            [float(r["daily_log_gb"]) for r in rows],
+            [float(r["queries_per_day"]) for r in rows],
+            [float(r["scanned_gb_per_query"]) for r in rows],
+        )
+
+    def arrays(self, months: int):
+        """(daily_log_gb, queries_per_day, scanned_gb_per_query) as arrays of length months"""
+        np = require_numpy("the cost model")
+
+        def pad(values: List[float]):
+            values = list(values)[:months]
+            return np.array(values + [values[-1]] * (months - len(values)), dtype=np.float64)
+
+        return pad(self.daily_log_gb), pad(self.queries_per_day), pad(self.scanned_gb_per_query)
+
+
+def parameter_grid(**values: Sequence[float]) -> Dict[str, "object"]:
+    """Cartesian product of parameter values as equal-length arrays (unset parameters use defaults)"""
+    np = require_numpy("the cost model")
+    names = list(PARAMETERS)
+    axes = [list(values.get(name, [PARAMETERS[name]])) for name in names]
+    unknown = set(values) - set(names)
+    if unknown:
+        raise ValueError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+    mesh = np.meshgrid(*[np.asarray(a, dtype=np.float64) for a in axes], indexing="ij")
+    return {name: grid.ravel() for name, grid in zip(names, mesh)}
+
+
+@dataclass
+class SimulationResult:
+    """Costs per (cloud, component) as arrays of shape (scenarios, months)"""
+    parameters: Dict[str, "object"]
+    components: Dict[Tuple[str, str], "object"]
+    months: int
+    seconds: float = 0.0
+
+    @property
+    def scenarios(self) -> int:
+        return len(next(iter(self.parameters.values())))
+
+    def cloud_total(self, cloud: str):
+        """Monthly totals for one cloud, shape (scenarios, months)"""
+        return sum(cost for (c, _), cost in self.components.items() if c == cloud)
+
+    def horizon_total(self, cloud: str):
+        """Total over all simulated months for each scenario"""
+        return self.cloud_total(cloud).sum(axis=1)
+
+    def scenario_parameters(self, index: int) -> Dict[str, float]:
+        return {name: float(values[index]) for name, values in self.parameters.items()}
+
+    def projection(self, index: int, cloud: str) -> List[Dict[str, float]]:
+        """Month-by-month component costs for one scenario"""
+        rows = []
+        for month in range(self.months):
+            row = {"month": month + 1}
+            for (c, component), cost in self.components.items():
+                if c == cloud:
+                    row[component] = round(float(cost[index, month]), 2)
+            row["total"] = round(float(self.cloud_total(cloud)[index, month]), 2)
+            rows.append(row)
+        return rows
+
+
+def _tiered_storage(ingest, tiers: List[Tuple[float, float]], retention, tiering):
+    """GB held in each tier per month, from GB ingested per month
+
+    tiers is [(after_days, rate)] hottest first. A month's cohort spans ages
+    [30j, 30j + 30) days after j months; the overlap of that window with each
+    tier's age range (capped at retention) decides how much of it sits there.
+    """
+    np = require_numpy("the cost model")
+    scenarios, months = ingest.shape
+    stored = [np.zeros_like(ingest) for _ in tiers]
+    lowers = [np.where(tiering > 0, after, np.inf) if i else np.zeros(scenarios)
+              for i, (after, _) in enumerate(tiers)]
+    uppers = lowers[1:] + [np.full(scenarios, np.inf)]
+
+    shifted = np.zeros_like(ingest)
+    for age_months in range(months):
+        start = age_months * DAYS_PER_MONTH
+        shifted[:, age_months:] = ingest[:, :months - age_months]
+        shifted[:, :age_months] = 0
+        for i in range(len(tiers)):
+            low = np.maximum(lowers[i], start)
+            high = np.minimum(np.minimum(uppers[i], retention), start + DAYS_PER_MONTH)
+            share = np.clip(high - low, 0, DAYS_PER_MONTH) / DAYS_PER_MONTH
+            if share.any():
+                stored[i] += share[:, None] * shifted
+    return stored
+
+
+def simulate(catalog: Dict, usage: UsageSeries, parameters: Optional[Dict[str, "object"]] = None,
+             months: int = 12) -> SimulationResult:
+    """Project monthly costs for every scenario in parameters (see parameter_grid)"""
+    np = require_numpy("the cost model")
+    start_time = time.perf_counter()
+    parameters = parameters or parameter_grid()
+    count = len(next(iter(parameters.values())))
+    params = {name: np.broadcast_to(np.asarray(parameters.get(name, default), dtype=np.float64), (count,))
+              for name, default in PARAMETERS.items()}
+
+    daily_gb, queries_per_day, scanned_per_query = usage.arrays(months)
+    growth = (1 + params["monthly_growth"])[:, None] ** np.arange(months)[None, :]
+    columnar = params["columnar_fraction"][:, None]
+    storage_factor = (1 - columnar) + columnar * catalog["columnar"]["storage_ratio"]
+    scan_factor = (1 - columnar) + columnar * catalog["columnar"]["scan_ratio"]
+
+    ingest_gb = daily_gb[None, :] * growth * DAYS_PER_MONTH
+    stored_ingest = ingest_gb * storage_factor
+    queries = queries_per_day[None, :] * DAYS_PER_MONTH * params["query_multiplier"][:, None]
+    per_query_gb = scanned_per_query[None, :] * growth * scan_factor
+
+    components: Dict[Tuple[str, str], object] = {}
+    for cloud in CLOUDS:
+        prices = catalog[cloud]
+        tiers = [(t["after_days"], t["gb_month"]) for t in prices["storage"]]
+        stored = _tiered_storage(stored_ingest, tiers, params["retention_days"], params["tiering"])
+        for tier, gb in zip(prices["storage"], stored):
+            components[(cloud, tier["tier"])] = gb * tier["gb_month"]
+        components[(cloud, "requests")] = ingest_gb * prices["objects_per_gb"] / 1000 * prices["requests_per_1000"]
+
+        if "query" in prices:
+            min_gb = prices["query"]["min_bytes_per_query"] / 1024 ** 3
+            scanned_tb = queries * np.maximum(per_query_gb, min_gb) / GB_PER_TB
+            components[(cloud, "queries")] = scanned_tb * prices["query"]["per_tb_scanned"]
+
+    crawler = catalog["aws"]["crawler"]
+    components[("aws", "crawler")] = np.full((count, months), crawler["runs_per_month"]
+                                             * crawler["dpu_hours_per_run"] * crawler["dpu_hour"])
+
+    bq = catalog["gcp"]["bigquery_storage"]
+    active, long_term = _tiered_storage(
+        stored_ingest, [(0, bq["active_gb_month"]), (bq["long_term_after_days"], bq["long_term_gb_month"])],
+        params["retention_days"], np.ones(count))
+    components[("gcp", "bigquery_storage")] = active * bq["active_gb_month"] + long_term * bq["long_term_gb_month"]
+
+    spark = catalog["azure"]["spark"]
+    minutes = np.maximum(spark["min_minutes_per_query"], per_query_gb / (spark["gb_per_node_minute"] * spark["nodes"]))
+    components[("azure", "spark")] = queries * minutes / 60 * spark["nodes"] * spark["node_hour"]
+
+    return SimulationResult(params, components, months, round(time.perf_counter() - start_time, 6))
+
+
+def scenario_report(scenario: str, catalog: Optional[Dict] = None, months: int = 12,
+                    scanned_tb: Optional[float] = None) -> Dict:
+    """A generate_cost_report()-shaped report for a named catalog scenario, averaged over months
+
+    scanned_tb replaces the scenario's month-one scan volume (spread over its
+    queries); growth and columnar savings still apply on top of it.
+    """
+    catalog = catalog or load_catalog()
+    definition = catalog.get("scenarios", {}).get(scenario)
+    if definition is None:
+        raise ValueError(f"Unknown scenario: {scenario}")
+
+    usage = UsageSeries.constant(**definition["usage"])
+    if scanned_tb is not None:
+        queries_per_month = usage.queries_per_day[0] * DAYS_PER_MONTH
+        usage.scanned_gb_per_query = [scanned_tb * GB_PER_TB / queries_per_month]
+    parameters = parameter_grid(**{k: [v] for k, v in definition.get("parameters", {}).items()})
+    result = simulate(catalog, usage, parameters, months)
+
+    report: Dict = {"scenario": scenario}
+    for cloud in CLOUDS:
+        costs = [CostEstimate(service=cloud.upper(), resource=component,
+                              monthly_cost=round(float(cost[0].mean()), 2), unit="USD",
+                              notes=f"{months}-month average, month {months}: ${float(cost[0, -1]):.2f}")
+                 for (c, component), cost in result.components.items() if c == cloud]
+        report[cloud] = {"costs": [vars(c) for c in costs], "total": round(sum(c.monthly_cost for c in costs), 2)}
+    report["grand_total"] = round(sum(report[c]["total"] for c in CLOUDS), 2)
+    return report
+
+
+def _floats(text: str) -> List[float]:
+    return [float(v) for v in text.split(",")]
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Simulate multi-cloud costs over a parameter grid")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG, help="Pricing catalog (YAML or JSON)")
+    parser.add_argument("--usage", help="Usage series (CSV or JSON); default: the standard scenario")
+    parser.add_argument("--months", type=int, default=12, help="Months to project")
+    for name, default in PARAMETERS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=_floats, default=[default],
+                            help=f"Comma-separated values (default: {default})")
+    parser.add_argument("--cloud", choices=CLOUDS, default="aws", help="Cloud to rank scenarios for")
+    parser.add_argument("--top", type=int, default=5, help="Cheapest scenarios to show")
+    parser.add_argument("--output", help="Write the cheapest scenario's monthly projection to this CSV")
+
+    args = parser.parse_args()
+
+    np = require_numpy("the cost model")
+    catalog = load_catalog(args.catalog)
+    if args.usage:
+        usage = UsageSeries.load(args.usage)
+    else:
+        usage = UsageSeries.constant(**catalog["scenarios"]["standard"]["usage"])
+    grid = parameter_grid(**{name: getattr(args, name) for name in PARAMETERS})
+
+    result = simulate(catalog, usage, grid, args.months)
+    totals = result.horizon_total(args.cloud)
+    order = np.argsort(totals)
+
+    print(f"\nSimulated {result.scenarios:,} scenarios x {result.months} months in {result.seconds * 1000:.1f} ms")
+    print(f"\nCheapest {args.cloud.upper()} scenarios ({args.months}-month total):")
+    print("-" * 80)
+    for index in order[:args.top]:
+        settings = ", ".join(f"{k}={v:g}" for k, v in result.scenario_parameters(index).items())
+        print(f"  ${totals[index]:>12,.2f}  {settings}")
+    print("-" * 80)
+
+    if args.output:
+        rows = result.projection(int(order[0]), args.cloud)
+        with open(args.output, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Monthly projection saved to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
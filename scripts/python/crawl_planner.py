@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Incremental Crawl Planner
+Turns S3 object-created events into Glue BatchCreatePartition requests so new
+ALB log partitions are registered without a full crawl
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+from urllib.parse import unquote_plus
+
+from log_layout import LOG_PREFIX, Partition, parse_key
+from partition_projection import ProjectionConfig
+
+# Glue accepts at most 100 partitions per BatchCreatePartition call
+BATCH_SIZE = 100
+
+_INDEX_MAGIC = b"ALBPIDX1"
+
+# Matches "key": "..." in S3 notifications, EventBridge events and plain {"key": ...} lines
+_KEY_RE = re.compile(r'"key"\s*:\s*"((?:[^"\\]|\\.)*)"')
+# eventName of S3 notification records and detail-type of EventBridge events
+_EVENT_TYPE_RE = re.compile(r'"(?:eventName|detail-type)"\s*:\s*"([^"]*)"')
+_CREATED_TYPES = ("ObjectCreated", "Object Created")
+
+
+def _pack(partition: Partition) -> int:
+    year, month, day = partition
+    return int(year) * 10000 + int(month) * 100 + int(day)
+
+
+def _unpack(value: int) -> Partition:
+    return (f"{value // 10000:04d}", f"{value // 100 % 100:02d}", f"{value % 100:02d}")
+
+
+class PartitionIndex:
+    """Known partitions stored on disk as a sorted array of packed YYYYMMDD integers
+
+    Ten years of daily partitions is about 14 KB, and loading is a single read.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._known: Set[int] = set()
+        if path and os.path.exists(path):
+            self._load(path)
+
+    def _load(self, path: str):
+        with open(path, "rb") as f:
+            if f.read(len(_INDEX_MAGIC)) != _INDEX_MAGIC:
+                raise ValueError(f"Not a partition index: {path}")
+            values = array("I")
+            values.frombytes(f.read())
+        self._known = set(values)
+
+    def save(self, path: Optional[str] = None):
+        """Write the index atomically"""
+        path = path or self.path
+        if not path:
+            raise ValueError("No index path configured")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_INDEX_MAGIC)
+            f.write(array("I", sorted(self._known)).tobytes())
+        os.replace(tmp_path, path)
+
+    def __contains__(self, partition: Partition) -> bool:
+        return _pack(partition) in self._known
+
+    def __len__(self) -> int:
+        return len(self._known)
+
+    def add(self, partitions: Iterable[Partition]):
+        self._known.update(_pack(p) for p in partitions)
+
+    def partitions(self) -> List[Partition]:
+        return [_unpack(v) for v in sorted(self._known)]
+
+
+@dataclass
+class CrawlPlan:
+    """Partitions that need registering, plus counters for the events consumed"""
+    new_partitions: List[Partition] = field(default_factory=list)
+    events: int = 0
+    objects: int = 0
+    skipped_objects: int = 0
+    seconds: float = 0.0
+
+
+def iter_event_keys(lines: Iterable[str], bucket: Optional[str] = None) -> Iterator[str]:
+    """Yield object keys of created objects from JSON-lines S3 events
+
+    Keys are pulled out with a regex rather than a full JSON parse; lines with
+    any event other than a creation (removal, tagging, restore, lifecycle)
+    fall back to json.loads so only created objects are counted.
+    """
+    for line in lines:
+        if bucket and bucket not in line:
+            continue
+        if not all(name.startswith(_CREATED_TYPES) for name in _EVENT_TYPE_RE.findall(line)):
+            yield from _created_keys(json.loads(line), bucket)
+            continue
+        for raw in _KEY_RE.findall(line):
+            yield _unquote(json.loads(f'"{raw}"') if "\\" in raw else raw)
+
+
+def _unquote(key: str) -> str:
+    """Event keys are URL-encoded; ALB log keys never contain '%' or '+' themselves"""
+    return unquote_plus(key) if "%" in key or "+" in key else key
+
+
+def _created_keys(event: Dict, bucket: Optional[str]) -> Iterator[str]:
+    records = event.get("Records")
+    if records is not None:
+        for record in records:
+            if not record.get("eventName", "").startswith("ObjectCreated"):
+                continue
+            s3 = record.get("s3", {})
+            if bucket and s3.get("bucket", {}).get("name") != bucket:
+                continue
+            yield _unquote(s3.get("object", {}).get("key", ""))
+        return
+    if "detail" in event:
+        if event.get("detail-type") != "Object Created":
+            return
+        detail = event["detail"]
+        if bucket and detail.get("bucket", {}).get("name") != bucket:
+            return
+        yield _unquote(detail.get("object", {}).get("key", ""))
+        return
+    if event.get("key") and (not bucket or event.get("bucket", bucket) == bucket):
+        yield _unquote(event["key"])
+
+
+class CrawlPlanner:
+    """Computes the minimal set of partitions to add for a stream of new objects"""
+
+    def __init__(self, table: ProjectionConfig, database: str, index: PartitionIndex):
+        self.table = table
+        self.database = database
+        self.index = index
+        self._location_prefix = table.location.split("/", 3)[3]
+
+    def plan(self, lines: Iterable[str]) -> CrawlPlan:
+        """Consume JSON-lines events and return the partitions missing from the index"""
+        start = time.perf_counter()
+        result = CrawlPlan()
+        directories: Dict[str, int] = {}
+
+        counted = _CountingIterator(lines)
+        for key in iter_event_keys(counted, self.table.bucket):
+            directory = key.rpartition("/")[0]
+            directories[directory] = directories.get(directory, 0) + 1
+        result.events = counted.count
+        result.objects = sum(directories.values())
+
+        new: Set[Partition] = set()
+        for directory, objects in directories.items():
+            # Only objects under this table's AWSLogs/<account>/.../<region>/ root belong to it
+            obj = parse_key(directory + "/_")
+            if obj is None or not (directory + "/").startswith(self._location_prefix):
+                result.skipped_objects += objects
+                continue
+            if obj.partition not in self.index:
+                new.add(obj.partition)
+
+        result.new_partitions = sorted(new)
+        result.seconds = round(time.perf_counter() - start, 6)
+        return result
+
+    def partition_input(self, partition: Partition) -> Dict:
+        """Glue PartitionInput for one partition"""
+        descriptor = dict(self.table.table_input()["StorageDescriptor"])
+        descriptor["Location"] = self.table.resolve_location(*partition)
+        return {"Values": list(partition), "StorageDescriptor": descriptor}
+
+    def batch_requests(self, partitions: List[Partition]) -> List[Dict]:
+        """BatchCreatePartition request payloads, BATCH_SIZE partitions per call"""
+        requests = []
+        for i in range(0, len(partitions), BATCH_SIZE):
+            requests.append({
+                "DatabaseName": self.database,
+                "TableName": self.table.table_name,
+                "PartitionInputList": [self.partition_input(p) for p in partitions[i:i + BATCH_SIZE]],
+            })
+        return requests
+
+
+class _CountingIterator:
+    """Wraps an iterable of lines and counts how many were consumed"""
+
+    def __init__(self, lines: Iterable[str]):
+        self._lines = iter(lines)
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        line = next(self._lines)
+        self.count += 1
+        return line
+
+
+def apply_requests(requests: List[Dict]) -> List[Partition]:
+    """Send BatchCreatePartition requests with boto3; returns the partitions now registered"""
+    import boto3
+
+    glue = boto3.client("glue")
+    registered: List[Partition] = []
+    for request in requests:
+        response = glue.batch_create_partition(**request)
+        failed = {tuple(e["PartitionValues"]) for e in response.get("Errors", [])
+                  if e.get("ErrorDetail", {}).get("ErrorCode") != "AlreadyExistsException"}
+        for partition_input in request["PartitionInputList"]:
+            values = tuple(partition_input["Values"])
+            if values in failed:
+                print(f"Failed to create partition {'/'.join(values)}")
+            else:
+                registered.append(values)
+    return registered
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Plan Glue partitions from S3 object-created events")
+    parser.add_argument("events", help="JSON-lines file of S3 events ('-' for stdin)")
+    parser.add_argument("--index", default=".crawl-index", help="On-disk index of known partitions")
+    parser.add_argument("--bucket", required=True, help="ALB logs bucket name")
+    parser.add_argument("--account-id", required=True, help="AWS account ID in the AWSLogs/ path")
+    parser.add_argument("--region", default="us-east-1", help="Load balancer region")
+    parser.add_argument("--prefix", default=LOG_PREFIX, help="Key prefix configured on the ALB")
+    parser.add_argument("--database", required=True, help="Glue database name")
+    parser.add_argument("--table-name", default="alb_access_logs", help="Glue table name")
+    parser.add_argument("--output", help="Write BatchCreatePartition payloads to this file")
+    parser.add_argument("--apply", action="store_true", help="Call BatchCreatePartition via boto3")
+    parser.add_argument("--update-index", action="store_true",
+                        help="Record planned partitions as known without applying them")
+
+    args = parser.parse_args()
+
+    table = ProjectionConfig(bucket=args.bucket, account_id=args.account_id, region=args.region,
+                             prefix=args.prefix, table_name=args.table_name)
+    index = PartitionIndex(args.index)
+    planner = CrawlPlanner(table, args.database, index)
+
+    if args.events == "-":
+        plan = planner.plan(sys.stdin)
+    else:
+        with open(args.events) as f:
+            plan = planner.plan(f)
+
+    requests = planner.batch_requests(plan.new_partitions)
+    print(f"Consumed {plan.events:,} events ({plan.objects:,} objects) in {plan.seconds * 1000:.1f} ms")
+    print(f"Known partitions: {len(index):,}; new partitions: {len(plan.new_partitions):,}; "
+          f"BatchCreatePartition calls: {len(requests)}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(requests, f, indent=2)
+        print(f"Payloads saved to {args.output}")
+
+    if args.apply:
+        index.add(apply_requests(requests))
+        index.save()
+    elif args.update_index:
+        index.add(plan.new_partitions)
+        index.save()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
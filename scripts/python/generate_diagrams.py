@@ -1,25 +1,72 @@
 #!/usr/bin/env python3
 """
 Infrastructure Diagram Generator
-Creates visual diagrams of multi-cloud infrastructure using diagrams library
+Creates visual diagrams of multi-cloud infrastructure using diagrams library,
+importing provider nodes only for the clouds being rendered and skipping
+diagrams whose Terraform inputs have not changed. The *-resources diagrams are
+drawn from the resource graph parsed out of the Terraform modules themselves
 """
 
-from diagrams import Diagram, Cluster, Edge
-from diagrams.aws.storage import S3
-from diagrams.aws.analytics import Athena, Glue
-from diagrams.aws.compute import LambdaFunction
-from diagrams.aws.network import ELB
-from diagrams.gcp.storage import GCS
-from diagrams.gcp.analytics import BigQuery
-from diagrams.gcp.compute import Functions
-from diagrams.azure.storage import BlobStorage
-from diagrams.azure.analytics import Synapse
-from diagrams.azure.compute import FunctionApps
-from diagrams.azure.network import LoadBalancers
+import argparse
+import hashlib
+import importlib
+import json
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import instrumentation
+import terraform_graph
+from common import require_diagrams
+from instrumentation import span
+from plan_cache import CONFIG_SUFFIXES, SKIP_DIRS
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_OUTPUT_DIR = os.path.join(REPO_ROOT, "map-diagram-infra")
+MODULES_DIR = os.path.join(REPO_ROOT, "terraform", "modules")
+
+# Node classes each cloud's diagrams use, by provider module; imported on first use
+PROVIDER_NODES = {
+    "aws": {
+        "diagrams.aws.storage": ["S3"],
+        "diagrams.aws.analytics": ["Athena", "Glue"],
+        "diagrams.aws.network": ["ELB"],
+    },
+    "gcp": {
+        "diagrams.gcp.storage": ["GCS"],
+        "diagrams.gcp.analytics": ["BigQuery"],
+        "diagrams.gcp.compute": ["Functions"],
+    },
+    "azure": {
+        "diagrams.azure.storage": ["BlobStorage"],
+        "diagrams.azure.analytics": ["Synapse"],
+        "diagrams.azure.network": ["LoadBalancers"],
+    },
+}
+
+# Rendered outputs and their inputs, recorded after each successful render
+STATE_FILE = ".diagram-state.json"
+
+
+def provider_nodes(*clouds: str) -> SimpleNamespace:
+    """Node classes for the given clouds, importing only their provider modules"""
+    diagrams = require_diagrams()
+    nodes = SimpleNamespace(Diagram=diagrams.Diagram, Cluster=diagrams.Cluster, Edge=diagrams.Edge)
+    for cloud in clouds:
+        for module_name, names in PROVIDER_NODES[cloud].items():
+            module = importlib.import_module(module_name)
+            for name in names:
+                setattr(nodes, name, getattr(module, name))
+    return nodes
+
 
 def create_aws_diagram(output_dir: str):
     """Create AWS infrastructure diagram"""
+    n = provider_nodes("aws")
+    Diagram, Cluster, Edge, ELB, S3, Glue, Athena = n.Diagram, n.Cluster, n.Edge, n.ELB, n.S3, n.Glue, n.Athena
     with Diagram("AWS - ALB Logs Analysis", 
                  filename=f"{output_dir}/aws-infrastructure",
                  show=False,
@@ -49,6 +96,8 @@ def create_aws_diagram(output_dir: str):
 
 def create_gcp_diagram(output_dir: str):
     """Create GCP infrastructure diagram"""
+    n = provider_nodes("gcp")
+    Diagram, Cluster, Edge, Functions, GCS, BigQuery = n.Diagram, n.Cluster, n.Edge, n.Functions, n.GCS, n.BigQuery
     with Diagram("GCP - Load Balancer Logs Analysis",
                  filename=f"{output_dir}/gcp-infrastructure",
                  show=False,
@@ -74,6 +123,9 @@ def create_gcp_diagram(output_dir: str):
 
 def create_azure_diagram(output_dir: str):
     """Create Azure infrastructure diagram"""
+    n = provider_nodes("azure")
+    Diagram, Cluster, Edge = n.Diagram, n.Cluster, n.Edge
+    LoadBalancers, BlobStorage, Synapse = n.LoadBalancers, n.BlobStorage, n.Synapse
     with Diagram("Azure - Load Balancer Logs Analysis",
                  filename=f"{output_dir}/azure-infrastructure",
                  show=False,
@@ -99,6 +151,10 @@ def create_azure_diagram(output_dir: str):
 
 def create_multi_cloud_diagram(output_dir: str):
     """Create unified multi-cloud infrastructure diagram"""
+    n = provider_nodes("aws", "gcp", "azure")
+    Diagram, Cluster = n.Diagram, n.Cluster
+    ELB, S3, Glue, Athena, Functions, GCS, BigQuery = n.ELB, n.S3, n.Glue, n.Athena, n.Functions, n.GCS, n.BigQuery
+    LoadBalancers, BlobStorage, Synapse = n.LoadBalancers, n.BlobStorage, n.Synapse
     with Diagram("Multi-Cloud Log Analysis Architecture",
                  filename=f"{output_dir}/multi-cloud-infrastructure",
                  show=False,
@@ -130,28 +186,182 @@ def create_multi_cloud_diagram(output_dir: str):
             
             azure_lb >> azure_storage >> azure_query
 
-def main():
-    """Main function to generate all diagrams"""
-    output_dir = os.path.join(os.path.dirname(__file__), "..", "..", "map-diagram-infra")
+
+def create_resource_diagram(spec: "DiagramSpec", output_dir: str, modules_dir: str = MODULES_DIR):
+    """Draw every resource of the spec's modules and the references between them"""
+    cache = terraform_graph.ParseCache(terraform_graph.default_cache_dir())
+    graph = terraform_graph.ResourceGraph()
+    for module in spec.modules:
+        with span(f"parse {module}", "parse") as timing:
+            module_graph = terraform_graph.graph_from_hcl(os.path.join(modules_dir, module), cache)
+            timing["resources"] = len(module_graph.resources)
+        for resource in module_graph.resources.values():
+            resource.module = resource.module or module
+        graph.resources.update(module_graph.resources)
+    with span(f"{spec.name} graph", "render", resources=len(graph.resources)):
+        terraform_graph.render(graph.collapse(), os.path.join(output_dir, spec.filename),
+                               f"{spec.name} resources")
+
+
+@dataclass(frozen=True)
+class DiagramSpec:
+    """One renderable diagram and the Terraform modules it depicts
+
+    Graph diagrams have no create function; they are drawn from the parsed
+    modules by create_resource_diagram.
+    """
+    name: str
+    filename: str
+    modules: tuple
+    create: object = None
+    graph: bool = False
+
+    def output_path(self, output_dir: str) -> str:
+        return os.path.join(output_dir, f"{self.filename}.png")
+
+
+DIAGRAMS: Dict[str, DiagramSpec] = {
+    spec.name: spec for spec in [
+        DiagramSpec("aws", "aws-infrastructure", ("aws",), create_aws_diagram),
+        DiagramSpec("gcp", "gcp-infrastructure", ("gcp",), create_gcp_diagram),
+        DiagramSpec("azure", "azure-infrastructure", ("azure",), create_azure_diagram),
+        DiagramSpec("multi-cloud", "multi-cloud-infrastructure", ("aws", "gcp", "azure"),
+                    create_multi_cloud_diagram),
+        DiagramSpec("aws-resources", "aws-resources", ("aws",), graph=True),
+        DiagramSpec("gcp-resources", "gcp-resources", ("gcp",), graph=True),
+        DiagramSpec("azure-resources", "azure-resources", ("azure",), graph=True),
+    ]
+}
+
+
+def diagram_fingerprint(spec: DiagramSpec, modules_dir: str = MODULES_DIR) -> str:
+    """SHA-256 over the generator sources and the .tf files of the modules a diagram depicts"""
+    digest = hashlib.sha256()
+
+    def add(label: str, data: bytes):
+        digest.update(label.encode() + b"\0" + len(data).to_bytes(8, "big") + data)
+
+    with open(os.path.abspath(__file__), "rb") as f:
+        add("generator", f.read())
+    if spec.graph:
+        with open(os.path.abspath(terraform_graph.__file__), "rb") as f:
+            add("terraform_graph", f.read())
+    add("diagram", spec.name.encode())
+    for module in spec.modules:
+        module_path = os.path.join(modules_dir, module)
+        for dirpath, dirnames, filenames in os.walk(module_path):
+            dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+            for filename in sorted(filenames):
+                if filename.endswith(CONFIG_SUFFIXES):
+                    path = os.path.join(dirpath, filename)
+                    with open(path, "rb") as f:
+                        add(f"{module}/{os.path.relpath(path, module_path)}", f.read())
+    return digest.hexdigest()
+
+
+def load_state(output_dir: str) -> Dict[str, str]:
+    try:
+        with open(os.path.join(output_dir, STATE_FILE)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_state(output_dir: str, state: Dict[str, str]):
+    path = os.path.join(output_dir, STATE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def stale_diagrams(names: List[str], output_dir: str, modules_dir: str = MODULES_DIR,
+                   force: bool = False) -> Dict[str, str]:
+    """{name: fingerprint} of the selected diagrams whose inputs changed or output is missing"""
+    state = load_state(output_dir)
+    stale = {}
+    for name in names:
+        spec = DIAGRAMS[name]
+        fingerprint = diagram_fingerprint(spec, modules_dir)
+        if force or state.get(name) != fingerprint or not os.path.exists(spec.output_path(output_dir)):
+            stale[name] = fingerprint
+    return stale
+
+
+def render_diagram(name: str, output_dir: str, modules_dir: str = MODULES_DIR) -> str:
+    """Render one diagram (in a worker process when run in parallel)"""
+    spec = DIAGRAMS[name]
+    if spec.graph:
+        create_resource_diagram(spec, output_dir, modules_dir)
+    else:
+        spec.create(output_dir)
+    return name
+
+
+def generate(names: Optional[List[str]] = None, output_dir: str = DEFAULT_OUTPUT_DIR,
+             modules_dir: str = MODULES_DIR, workers: Optional[int] = None,
+             force: bool = False) -> Dict[str, str]:
+    """Render the selected diagrams that are out of date; returns {name: "rendered" | "unchanged"}"""
+    names = names or list(DIAGRAMS)
+    unknown = [n for n in names if n not in DIAGRAMS]
+    if unknown:
+        raise ValueError(f"Unknown diagrams: {', '.join(unknown)}; expected {', '.join(DIAGRAMS)}")
+
     os.makedirs(output_dir, exist_ok=True)
-    
-    print("Generating infrastructure diagrams...")
-    print(f"Output directory: {output_dir}")
-    
-    print("  - Creating AWS diagram...")
-    create_aws_diagram(output_dir)
-    
-    print("  - Creating GCP diagram...")
-    create_gcp_diagram(output_dir)
-    
-    print("  - Creating Azure diagram...")
-    create_azure_diagram(output_dir)
-    
-    print("  - Creating multi-cloud diagram...")
-    create_multi_cloud_diagram(output_dir)
-    
-    print("\nDiagrams generated successfully!")
-    print(f"Check {output_dir}/ for the output files")
+    with span("fingerprint inputs", "parse", diagrams=len(names)):
+        stale = stale_diagrams(names, output_dir, modules_dir, force)
+    status = {name: "unchanged" for name in names if name not in stale}
+    if not stale:
+        return status
+
+    require_diagrams()
+    state = load_state(output_dir)
+    workers = min(workers or os.cpu_count() or 1, len(stale))
+    if workers == 1:
+        for name in stale:
+            with span(f"{name} diagram", "render"):
+                render_diagram(name, output_dir, modules_dir)
+            status[name] = "rendered"
+            state[name] = stale[name]
+    else:
+        with span("render diagrams", "render", workers=workers), \
+                ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(render_diagram, name, output_dir, modules_dir) for name in stale]
+            for future in as_completed(futures):
+                name = future.result()
+                status[name] = "rendered"
+                state[name] = stale[name]
+    save_state(output_dir, state)
+    return {name: status[name] for name in names}
+
+
+def main():
+    """Main function to generate the selected diagrams"""
+    parser = argparse.ArgumentParser(description="Generate infrastructure diagrams")
+    parser.add_argument("--only", help=f"Comma-separated diagrams (default: all of {', '.join(DIAGRAMS)})")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help="Where the PNG files are written")
+    parser.add_argument("--modules-dir", default=MODULES_DIR, help="Terraform modules the diagrams depict")
+    parser.add_argument("--workers", type=int, help="Diagrams rendered in parallel (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Render even if the inputs are unchanged")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else None
+    with instrumentation.session("generate_diagrams", args.trace, args.profile):
+        print("Generating infrastructure diagrams...")
+        print(f"Output directory: {args.output_dir}")
+        try:
+            status = generate(names, args.output_dir, args.modules_dir, args.workers, args.force)
+        except (RuntimeError, ValueError) as e:
+            print(f"Error: {e}")
+            return 1
+
+        for name, result in status.items():
+            print(f"  - {name}: {result}")
+        if "rendered" in status.values():
+            print(f"\nCheck {args.output_dir}/ for the output files")
+        else:
+            print("\nAll diagrams up to date")
+        return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -9,30 +9,149 @@ import subprocess
 import sys
 import os
 import json
-from typing import Optional, List, Dict
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Tuple
+
+import instrumentation
+from instrumentation import span
+from plan_cache import DEFAULT_MAX_BYTES, PlanCache, default_cache_dir, module_fingerprint
+
+CLOUDS = ["aws", "gcp", "azure"]
+
+# Commands whose result depends only on the module's configuration and state
+CACHEABLE_COMMANDS = ("plan", "validate")
+
+# Commands after which a module's cached plans are stale
+STATE_CHANGING_COMMANDS = ("apply", "destroy", "import", "refresh")
+
+# Saved plan written next to the module by cached plan runs
+PLAN_FILE = "tfplan"
+
+# Serializes prefixed output lines from concurrent Terraform runs
+_output_lock = threading.Lock()
+
+@dataclass
+class StageResult:
+    """Exit code and duration of one Terraform stage"""
+    stage: str
+    returncode: int
+    seconds: float
+
+@dataclass
+class DeploymentResult:
+    """Stages run for one cloud, stopping at the first failure"""
+    cloud: str
+    stages: List[StageResult] = field(default_factory=list)
+    
+    @property
+    def returncode(self) -> int:
+        return next((s.returncode for s in self.stages if s.returncode != 0), 0)
+    
+    @property
+    def seconds(self) -> float:
+        return sum(s.seconds for s in self.stages)
 
 class InfrastructureCLI:
     """Main CLI class for infrastructure management"""
     
-    def __init__(self):
+    def __init__(self, cache: Optional[PlanCache] = None):
         self.repo_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-        self.modules_dir = os.path.join(self.repo_root, "modules")
+        self.modules_dir = os.path.join(self.repo_root, "terraform", "modules")
+        self.cache = cache
     
-    def run_terraform(self, command: str, module: str, vars_file: Optional[str] = None) -> int:
-        """Run terraform command in specified module"""
+    def run_terraform(self, command: str, module: str, vars_file: Optional[str] = None,
+                      prefix: Optional[str] = None) -> int:
+        """Run terraform command in specified module
+        
+        With a prefix, output is streamed line by line as "[prefix] ..." so several
+        modules can run at once without interleaving mid-line.
+        """
         module_path = os.path.join(self.modules_dir, module)
         
         if not os.path.exists(module_path):
-            print(f"Error: Module '{module}' not found at {module_path}")
+            self._emit(f"Error: Module '{module}' not found at {module_path}", prefix)
             return 1
         
-        cmd = ["terraform", command]
+        cmd = ["terraform", *command.split()]
         if vars_file:
             cmd.extend(["-var-file", vars_file])
         
-        print(f"Running: {' '.join(cmd)} in {module_path}")
-        result = subprocess.run(cmd, cwd=module_path)
-        return result.returncode
+        if self.cache is not None and cmd[1] in CACHEABLE_COMMANDS:
+            return self._run_cached(cmd, module_path, vars_file, prefix)
+        
+        self._emit(f"Running: {' '.join(cmd)} in {module_path}", prefix)
+        if prefix is None:
+            returncode = instrumentation.run(cmd, cwd=module_path).returncode
+        else:
+            returncode = self._stream(cmd, module_path, prefix)[0]
+        # Cached plans describe the state before; even a failed apply may have changed it
+        if self.cache is not None and cmd[1] in STATE_CHANGING_COMMANDS:
+            removed = self.cache.invalidate(module_path)
+            if removed:
+                self._emit(f"Dropped {len(removed)} cached plan(s) for {module}", prefix)
+        return returncode
+    
+    def _stream(self, cmd: List[str], cwd: str, prefix: Optional[str] = None,
+                echo: bool = True) -> Tuple[int, str]:
+        """Run cmd, echoing (optionally prefixed) output lines and returning (exit code, output)"""
+        env = dict(os.environ, TF_IN_AUTOMATION="1")
+        with span(" ".join(cmd[:2]), "subprocess", cmd=" ".join(cmd), cwd=cwd) as timing:
+            process = subprocess.Popen(cmd, cwd=cwd, env=env, stdin=subprocess.DEVNULL,
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+            lines = []
+            for line in process.stdout:
+                lines.append(line)
+                if echo:
+                    self._emit(line.rstrip("\n"), prefix)
+            returncode = timing["returncode"] = process.wait()
+        return returncode, "".join(lines)
+    
+    def _run_cached(self, cmd: List[str], module_path: str, vars_file: Optional[str],
+                    prefix: Optional[str]) -> int:
+        """Serve plan/validate from the plan cache, or run and store a successful result"""
+        with span("plan cache lookup", "cache", module=os.path.basename(module_path)) as timing:
+            key = module_fingerprint(module_path, " ".join(cmd[1:]), vars_file)
+            entry = self.cache.get(key)
+            timing["hit"] = entry is not None
+        plan_path = os.path.join(module_path, PLAN_FILE)
+        
+        if entry is not None:
+            self._emit(f"Plan cache hit {key[:12]}: skipping {' '.join(cmd)} in {module_path}", prefix)
+            for line in entry.output.splitlines():
+                self._emit(line, prefix)
+            if entry.file(PLAN_FILE):
+                shutil.copyfile(entry.file(PLAN_FILE), plan_path)
+            return entry.returncode
+        
+        run_cmd = cmd + [f"-out={PLAN_FILE}"] if cmd[1] == "plan" else cmd
+        self._emit(f"Running: {' '.join(run_cmd)} in {module_path}", prefix)
+        returncode, output = self._stream(run_cmd, module_path, prefix)
+        if returncode != 0:
+            return returncode
+        
+        artifacts = {}
+        if cmd[1] == "plan" and os.path.exists(plan_path):
+            artifacts[PLAN_FILE] = plan_path
+            show_code, plan_json = self._stream(["terraform", "show", "-json", PLAN_FILE], module_path, echo=False)
+            if show_code == 0:
+                json_path = plan_path + ".json"
+                with open(json_path, "w") as f:
+                    f.write(plan_json)
+                artifacts["plan.json"] = json_path
+        self.cache.put(key, " ".join(cmd[1:]), output, artifacts, module=module_path)
+        return returncode
+    
+    @staticmethod
+    def _emit(message: str, prefix: Optional[str] = None):
+        if prefix is None:
+            print(message)
+            return
+        with _output_lock:
+            print(f"[{prefix}] {message}", flush=True)
     
     def init(self, cloud: str) -> int:
         """Initialize Terraform for specified cloud provider"""
@@ -72,8 +191,8 @@ class InfrastructureCLI:
             cmd += f" {output_name}"
         return self.run_terraform(cmd, cloud)
     
-    def generate_diagrams(self) -> int:
-        """Generate infrastructure diagrams"""
+    def generate_diagrams(self, only: Optional[str] = None, force: bool = False) -> int:
+        """Generate infrastructure diagrams (only those whose modules changed, unless forced)"""
         print("Generating infrastructure diagrams...")
         diagram_script = os.path.join(self.repo_root, "scripts", "python", "generate_diagrams.py")
         
@@ -81,7 +200,12 @@ class InfrastructureCLI:
             print(f"Error: Diagram script not found at {diagram_script}")
             return 1
         
-        result = subprocess.run([sys.executable, diagram_script])
+        cmd = [sys.executable, diagram_script]
+        if only:
+            cmd.extend(["--only", only])
+        if force:
+            cmd.append("--force")
+        result = instrumentation.run(cmd, name="generate_diagrams.py")
         return result.returncode
     
     def cost_estimate(self, cloud: str) -> int:
@@ -90,37 +214,66 @@ class InfrastructureCLI:
         print("Note: This is a placeholder. Integrate with Infracost or similar tool.")
         return 0
     
-    def deploy_all(self, auto_approve: bool = False) -> int:
-        """Deploy infrastructure to all cloud providers"""
-        clouds = ["aws", "gcp", "azure"]
+    def deploy_cloud(self, cloud: str, auto_approve: bool = False) -> DeploymentResult:
+        """Run init/validate/plan (and apply with auto-approve) for one cloud, streaming prefixed output"""
+        stages = [("init", "init"), ("validate", "validate"), ("plan", "plan")]
+        if auto_approve:
+            stages.append(("apply", "apply -auto-approve"))
+        
+        result = DeploymentResult(cloud)
+        for stage, command in stages:
+            start = time.perf_counter()
+            with span(f"{cloud} {stage}", "stage", cloud=cloud):
+                returncode = self.run_terraform(command, cloud, prefix=f"{cloud}:{stage}")
+            result.stages.append(StageResult(stage, returncode, round(time.perf_counter() - start, 3)))
+            if returncode != 0:
+                self._emit(f"Failed to {stage} {cloud}", cloud)
+                break
+        return result
+    
+    def deploy_all(self, auto_approve: bool = False, max_parallel: Optional[int] = None,
+                   clouds: Optional[List[str]] = None) -> int:
+        """Deploy infrastructure to all cloud providers, running independent modules concurrently"""
+        clouds = clouds or CLOUDS
+        workers = max(1, min(max_parallel or len(clouds), len(clouds)))
         
-        for cloud in clouds:
-            print(f"\n{'='*60}")
-            print(f"Deploying to {cloud.upper()}")
-            print(f"{'='*60}\n")
-            
-            # Initialize
-            if self.init(cloud) != 0:
-                print(f"Failed to initialize {cloud}")
-                continue
-            
-            # Validate
-            if self.validate(cloud) != 0:
-                print(f"Failed to validate {cloud}")
-                continue
-            
-            # Plan
-            if self.plan(cloud) != 0:
-                print(f"Failed to plan {cloud}")
-                continue
-            
-            # Apply (only if auto-approve)
-            if auto_approve:
-                if self.apply(cloud, auto_approve=True) != 0:
-                    print(f"Failed to apply {cloud}")
-                    return 1
+        print(f"\n{'='*60}")
+        print(f"Deploying to {', '.join(c.upper() for c in clouds)} ({workers} at a time)")
+        print(f"{'='*60}\n")
         
-        return 0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda cloud: self.deploy_cloud(cloud, auto_approve), clouds))
+        
+        self.print_deploy_summary(results, time.perf_counter() - start)
+        return 1 if any(r.returncode != 0 for r in results) else 0
+    
+    @staticmethod
+    def print_deploy_summary(results: List[DeploymentResult], wall_seconds: float):
+        """Print per-stage timings and exit codes for each cloud"""
+        stages = ["init", "validate", "plan", "apply"]
+        print(f"\n{'='*60}")
+        print("Deployment Summary")
+        print(f"{'='*60}")
+        print(f"{'Cloud':<8}" + "".join(f"{s:>11}" for s in stages) + f"{'Total':>9}  Status")
+        print("-" * 60)
+        for result in results:
+            timings = {s.stage: s for s in result.stages}
+            cells = []
+            for stage in stages:
+                timing = timings.get(stage)
+                if timing is None:
+                    text = "-"
+                elif timing.returncode == 0:
+                    text = f"{timing.seconds:.1f}s"
+                else:
+                    text = f"✗{timing.returncode} {timing.seconds:.1f}s"
+                cells.append(f"{text:>11}")
+            status = "✓ ok" if result.returncode == 0 else f"✗ exit {result.returncode}"
+            print(f"{result.cloud:<8}" + "".join(cells) + f"{result.seconds:>8.1f}s  {status}")
+        print("-" * 60)
+        print(f"Wall time: {wall_seconds:.1f}s (serial would be {sum(r.seconds for r in results):.1f}s)")
+        print(f"{'='*60}\n")
 
 def main():
     """Main entry point"""
@@ -146,6 +299,12 @@ Examples:
         """
     )
     
+    parser.add_argument("--no-cache", action="store_true", help="Always re-run plan/validate")
+    parser.add_argument("--cache-dir", help="Plan cache directory (default: .cache/terraform-plans)")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="Evict least recently used plans beyond this size")
+    instrumentation.add_arguments(parser)
+    
     subparsers = parser.add_subparsers(dest="command", help="Command to execute")
     
     # Init command
@@ -179,7 +338,9 @@ Examples:
     output_parser.add_argument("--name", help="Specific output name")
     
     # Diagrams command
-    subparsers.add_parser("diagrams", help="Generate infrastructure diagrams")
+    diagrams_parser = subparsers.add_parser("diagrams", help="Generate infrastructure diagrams")
+    diagrams_parser.add_argument("--only", help="Comma-separated diagrams: aws,gcp,azure,multi-cloud")
+    diagrams_parser.add_argument("--force", action="store_true", help="Re-render even if modules are unchanged")
     
     # Cost estimate command
     cost_parser = subparsers.add_parser("cost-estimate", help="Estimate infrastructure costs")
@@ -188,6 +349,8 @@ Examples:
     # Deploy all command
     deploy_all_parser = subparsers.add_parser("deploy-all", help="Deploy to all cloud providers")
     deploy_all_parser.add_argument("--auto-approve", action="store_true", help="Auto-approve changes")
+    deploy_all_parser.add_argument("--max-parallel", type=int, help="Clouds to run at once (default: all)")
+    deploy_all_parser.add_argument("--clouds", help="Comma-separated clouds (default: aws,gcp,azure)")
     
     args = parser.parse_args()
     
@@ -196,8 +359,15 @@ Examples:
         return 1
     
     cli = InfrastructureCLI()
+    if not args.no_cache:
+        cli.cache = PlanCache(args.cache_dir or default_cache_dir(cli.repo_root),
+                              args.cache_max_mb * 1024 * 1024)
     
-    # Execute command
+    with instrumentation.session("infra_cli", args.trace, args.profile):
+        return run_command(cli, args)
+
+def run_command(cli: InfrastructureCLI, args: argparse.Namespace) -> int:
+    """Dispatch a parsed command to the CLI"""
     if args.command == "init":
         return cli.init(args.cloud)
     elif args.command == "plan":
@@ -211,11 +381,12 @@ Examples:
     elif args.command == "output":
         return cli.output(args.cloud, args.name)
     elif args.command == "diagrams":
-        return cli.generate_diagrams()
+        return cli.generate_diagrams(args.only, args.force)
     elif args.command == "cost-estimate":
         return cli.cost_estimate(args.cloud)
     elif args.command == "deploy-all":
-        return cli.deploy_all(args.auto_approve)
+        clouds = args.clouds.split(",") if args.clouds else None
+        return cli.deploy_all(args.auto_approve, args.max_parallel, clouds)
     
     return 0
 
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Run Instrumentation
+Timing spans around subprocess calls, parsing and rendering for the CLI tools,
+written as JSON lines, with an optional cProfile/pyinstrument capture and a
+per-run summary of where time went
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+# JSON lines destination ("-" for stderr); setting it turns spans on
+ENV_TRACE = "INFRA_TRACE"
+# "cprofile" or "pyinstrument" (1/true mean cprofile); also turns spans on
+ENV_PROFILE = "INFRA_PROFILE"
+# Where the profile is written (default: <tool>.prof / <tool>-profile.html)
+ENV_PROFILE_OUTPUT = "INFRA_PROFILE_OUTPUT"
+
+PROFILERS = ["cprofile", "pyinstrument"]
+_TRUTHY = {"1", "true", "yes", "on"}
+_FALSY = {"", "0", "false", "no", "off"}
+
+SUMMARY_ROWS = 15
+
+
+class _NullSpan:
+    """Shared stand-in returned by span() while instrumentation is off"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setitem__(self, key, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """One timed region; item assignment adds attributes to its record"""
+
+    __slots__ = ("recorder", "name", "category", "attrs", "id", "parent", "start")
+
+    def __init__(self, recorder: "Recorder", name: str, category: str, attrs: Dict):
+        self.recorder = recorder
+        self.name = name
+        self.category = category
+        self.attrs = attrs
+        self.id = None
+        self.parent = None
+        self.start = 0.0
+
+    def __setitem__(self, key, value):
+        self.attrs[key] = value
+
+    def __enter__(self):
+        self.recorder._push(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.recorder._pop(self, seconds)
+        return False
+
+
+class Recorder:
+    """Collects finished spans for one run and appends them to a JSON lines sink"""
+
+    def __init__(self, tool: str, sink: Optional[str] = None):
+        self.tool = tool
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started = time.perf_counter()
+        self.spans: List[Dict] = []
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._sink = None
+        if sink == "-":
+            self._sink = sys.stderr
+        elif sink:
+            self._sink = open(sink, "a")
+
+    def span(self, name: str, category: str = "code", **attrs) -> Span:
+        return Span(self, name, category, attrs)
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _push(self, span: Span):
+        stack = self._stack()
+        span.parent = stack[-1].id if stack else None
+        with self._lock:
+            self._next_id += 1
+            span.id = self._next_id
+        stack.append(span)
+
+    def _pop(self, span: Span, seconds: float):
+        stack = self._stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+        record = {
+            "run": self.run_id,
+            "tool": self.tool,
+            "id": span.id,
+            "parent": span.parent,
+            "name": span.name,
+            "category": span.category,
+            "start": round(span.start - self.started, 6),
+            "seconds": round(seconds, 6),
+            "thread": threading.current_thread().name,
+        }
+        record.update(span.attrs)
+        with self._lock:
+            self.spans.append(record)
+            if self._sink is not None:
+                self._sink.write(json.dumps(record, default=str) + "\n")
+                self._sink.flush()
+
+    @property
+    def wall_seconds(self) -> float:
+        return time.perf_counter() - self.started
+
+    def close(self):
+        if self._sink is not None and self._sink is not sys.stderr:
+            self._sink.close()
+        self._sink = None
+
+
+_recorder: Optional[Recorder] = None
+
+
+def enabled() -> bool:
+    return _recorder is not None
+
+
+def span(name: str, category: str = "code", **attrs):
+    """Time a block: `with span("terraform plan", "subprocess", module="aws") as s: ...`
+
+    While instrumentation is off this returns a shared no-op object, so
+    instrumented hot paths cost one global lookup per call.
+    """
+    if _recorder is None:
+        return _NULL_SPAN
+    return _recorder.span(name, category, **attrs)
+
+
+def run(cmd: List[str], name: Optional[str] = None, **kwargs) -> subprocess.CompletedProcess:
+    """subprocess.run inside a "subprocess" span recording the command and exit code"""
+    with span(name or " ".join(os.path.basename(part) for part in cmd[:2]), "subprocess",
+              cmd=" ".join(cmd), cwd=kwargs.get("cwd")) as timing:
+        result = subprocess.run(cmd, **kwargs)
+        timing["returncode"] = result.returncode
+        return result
+
+
+def summarize(spans: List[Dict], wall_seconds: float) -> List[Dict]:
+    """Per (category, name) call counts, total/self/max seconds and share of wall time
+
+    Self time excludes child spans in the same thread, so nested spans are not
+    counted twice; spans running concurrently on threads can add up to more
+    than the wall time.
+    """
+    children: Dict[int, float] = {}
+    for record in spans:
+        if record["parent"] is not None:
+            children[record["parent"]] = children.get(record["parent"], 0.0) + record["seconds"]
+
+    rows: Dict[tuple, Dict] = {}
+    for record in spans:
+        key = (record["category"], record["name"])
+        row = rows.setdefault(key, {"category": key[0], "name": key[1], "calls": 0,
+                                    "total": 0.0, "self": 0.0, "max": 0.0})
+        row["calls"] += 1
+        row["total"] += record["seconds"]
+        row["self"] += max(0.0, record["seconds"] - children.get(record["id"], 0.0))
+        row["max"] = max(row["max"], record["seconds"])
+    for row in rows.values():
+        row["share"] = row["self"] / wall_seconds if wall_seconds else 0.0
+    return sorted(rows.values(), key=lambda r: -r["self"])
+
+
+def print_summary(recorder: Recorder, stream=None, limit: int = SUMMARY_ROWS):
+    """Print where time went, by self time"""
+    stream = stream or sys.stderr
+    wall = recorder.wall_seconds
+    rows = summarize(recorder.spans, wall)
+    print(f"\n{'='*80}", file=stream)
+    print(f"Timing Summary - {recorder.tool} (run {recorder.run_id}, wall {wall:.2f}s)", file=stream)
+    print(f"{'='*80}", file=stream)
+    print(f"{'Category':<12} {'Span':<34} {'Calls':>6} {'Self':>9} {'Total':>9} {'Max':>9} {'Wall':>6}",
+          file=stream)
+    print("-" * 80, file=stream)
+    for row in rows[:limit]:
+        print(f"{row['category']:<12} {row['name'][:34]:<34} {row['calls']:>6} {row['self']:>8.3f}s "
+              f"{row['total']:>8.3f}s {row['max']:>8.3f}s {row['share']:>6.1%}", file=stream)
+    accounted = sum(r["self"] for r in rows)
+    print("-" * 80, file=stream)
+    print(f"{len(recorder.spans)} spans; {accounted:.2f}s inside spans, "
+          f"{max(0.0, wall - accounted):.2f}s outside any span", file=stream)
+    print(f"{'='*80}\n", file=stream)
+
+
+def _require_pyinstrument():
+    try:
+        import pyinstrument
+    except ImportError:
+        raise RuntimeError("pyinstrument is required for --profile pyinstrument: pip install pyinstrument")
+    return pyinstrument
+
+
+class _Profiler:
+    """Starts cProfile or pyinstrument and writes the capture when stopped"""
+
+    def __init__(self, kind: str, tool: str, output: Optional[str] = None):
+        if kind not in PROFILERS:
+            raise ValueError(f"Unknown profiler {kind!r}; expected one of {', '.join(PROFILERS)}")
+        self.kind = kind
+        self.output = output or (f"{tool}.prof" if kind == "cprofile" else f"{tool}-profile.html")
+        if kind == "cprofile":
+            import cProfile
+            self._profiler = cProfile.Profile()
+        else:
+            self._profiler = _require_pyinstrument().Profiler()
+
+    def start(self):
+        if self.kind == "cprofile":
+            self._profiler.enable()
+        else:
+            self._profiler.start()
+
+    def stop(self, stream=None):
+        stream = stream or sys.stderr
+        if self.kind == "cprofile":
+            import pstats
+            self._profiler.disable()
+            self._profiler.dump_stats(self.output)
+            pstats.Stats(self._profiler, stream=stream).sort_stats("cumulative").print_stats(SUMMARY_ROWS)
+        else:
+            self._profiler.stop()
+            with open(self.output, "w") as f:
+                f.write(self._profiler.output_html())
+            print(self._profiler.output_text(), file=stream)
+        print(f"Profile written to {self.output}", file=stream)
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """--trace/--profile options shared by the CLI tools"""
+    group = parser.add_argument_group("instrumentation")
+    group.add_argument("--trace", metavar="FILE",
+                       help=f"Append timing spans as JSON lines ('-' for stderr; env {ENV_TRACE})")
+    group.add_argument("--profile", nargs="?", const="cprofile", choices=PROFILERS,
+                       help=f"Capture a profile of the run (default cprofile; env {ENV_PROFILE})")
+
+
+def _env_profiler() -> Optional[str]:
+    """The profiler INFRA_PROFILE asks for; an unknown value exits with a one-line error"""
+    value = os.environ.get(ENV_PROFILE, "").strip()
+    if value.lower() in _FALSY:
+        return None
+    if value.lower() in _TRUTHY:
+        return "cprofile"
+    if value.lower() in PROFILERS:
+        return value.lower()
+    sys.exit(f"Error: {ENV_PROFILE}={value!r} is not a profiler; use 1/true or one of {', '.join(PROFILERS)}")
+
+
+@contextmanager
+def session(tool: str, trace: Optional[str] = None, profile: Optional[str] = None) -> Iterator[Optional[Recorder]]:
+    """Instrument one CLI run; a no-op unless a trace sink or profiler is requested
+
+    Arguments fall back to the INFRA_TRACE / INFRA_PROFILE environment
+    variables. On exit the summary is printed to stderr and the profile saved.
+    """
+    global _recorder
+    trace = trace or os.environ.get(ENV_TRACE)
+    profile = profile or _env_profiler()
+    if not trace and not profile:
+        yield None
+        return
+
+    recorder = Recorder(tool, trace)
+    profiler = _Profiler(profile, tool, os.environ.get(ENV_PROFILE_OUTPUT)) if profile else None
+    previous, _recorder = _recorder, recorder
+    if profiler:
+        profiler.start()
+    try:
+        with recorder.span(tool, "run", argv=" ".join(sys.argv[1:])):
+            yield recorder
+    finally:
+        if profiler:
+            profiler.stop()
+        _recorder = previous
+        recorder.close()
+        print_summary(recorder)
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Latency Sketches
+Streams ALB logs once into per-hour, per-target-group DDSketches of the
+request/target/response processing times, stores them compactly and answers
+percentile queries over any time range by merging
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from alb_log_parser import iter_column_batches
+from common import content_version, read_varint, require_numpy, require_pyarrow, write_varint
+from log_layout import Partition
+from parquet_converter import hive_partition_path
+from query_engine import LocalTable
+from rollups import LATENCY_COLUMNS
+from sketches import DEFAULT_RELATIVE_ACCURACY, DDSketch
+
+# (hour as YYYY-MM-DDTHH, target group name, latency column)
+SketchKey = Tuple[str, str, str]
+
+DEFAULT_QUANTILES = [0.5, 0.9, 0.99, 0.999]
+
+_SOURCE_COLUMNS = ["time", "target_group_arn"] + LATENCY_COLUMNS
+_MAGIC = b"DDSK\x01"
+_FILENAME = "latency.ddsk"
+_STATE_FILE = "_state.json"
+# Key of _state.json recording the accuracy the index was built with; the others are partitions
+_ACCURACY_KEY = "relative_accuracy"
+
+
+@dataclass
+class BuildResult:
+    """Outcome of sketching one partition"""
+    partition: str
+    rows: int
+    sketches: int
+    bytes_out: int
+    seconds: float
+    skipped: bool = False
+
+
+def target_group_name(arn: Optional[str]) -> str:
+    """arn:...:targetgroup/<name>/<id> -> <name>; '-' for requests without a target
+
+    Values that are not ARNs (backend names in normalized cross-cloud batches)
+    are already names and pass through.
+    """
+    if not arn or arn == "-":
+        return "-"
+    if "targetgroup/" not in arn:
+        return arn if not arn.startswith("arn:") else "-"
+    return arn.split("targetgroup/", 1)[1].split("/", 1)[0]
+
+
+def encode_sketches(sketches: Dict[SketchKey, DDSketch]) -> bytes:
+    """Serialize sketches with shared string tables, zlib-compressed"""
+    strings: Dict[str, int] = {}
+    out = bytearray()
+    entries = bytearray()
+    for (hour, group, column), sketch in sorted(sketches.items()):
+        for text in (hour, group, column):
+            strings.setdefault(text, len(strings))
+        data = sketch.to_bytes()
+        for value in (strings[hour], strings[group], strings[column], len(data)):
+            write_varint(entries, value)
+        entries += data
+
+    write_varint(out, len(strings))
+    for text in strings:
+        encoded = text.encode()
+        write_varint(out, len(encoded))
+        out += encoded
+    write_varint(out, len(sketches))
+    return _MAGIC + zlib.compress(bytes(out + entries), 6)
+
+
+def decode_sketches(data: bytes) -> Dict[SketchKey, DDSketch]:
+    if not data.startswith(_MAGIC):
+        raise ValueError("Not a latency sketch file")
+    payload = zlib.decompress(data[len(_MAGIC):])
+    count, pos = read_varint(payload, 0)
+    strings = []
+    for _ in range(count):
+        size, pos = read_varint(payload, pos)
+        strings.append(payload[pos:pos + size].decode())
+        pos += size
+    entries, pos = read_varint(payload, pos)
+    sketches = {}
+    for _ in range(entries):
+        hour, pos = read_varint(payload, pos)
+        group, pos = read_varint(payload, pos)
+        column, pos = read_varint(payload, pos)
+        size, pos = read_varint(payload, pos)
+        sketches[(strings[hour], strings[group], strings[column])] = DDSketch.from_bytes(payload[pos:pos + size])
+        pos += size
+    return sketches
+
+
+def _iter_batches(source_format: str, files: List[str]) -> Iterator[Dict[str, list]]:
+    if source_format == "raw":
+        for path in files:
+            yield from iter_column_batches(path, _SOURCE_COLUMNS)
+        return
+    _, pq = require_pyarrow()
+    for path in files:
+        for batch in pq.ParquetFile(path).iter_batches(columns=_SOURCE_COLUMNS):
+            yield batch.to_pydict()
+
+
+def sketch_batches(batches: Iterable[Dict[str, list]],
+                   relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> Tuple[Dict[SketchKey, DDSketch], int]:
+    """One pass over column batches into sketches keyed by hour, target group and column"""
+    sketches: Dict[SketchKey, DDSketch] = {}
+    names: Dict[Optional[str], str] = {}
+    rows = 0
+    for batch in batches:
+        groups: Dict[Tuple[str, str], Tuple[list, list, list]] = {}
+        for stamp, arn, *times in zip(*(batch[c] for c in _SOURCE_COLUMNS)):
+            name = names.get(arn)
+            if name is None:
+                name = names[arn] = target_group_name(arn)
+            key = (stamp[:13] if stamp else "unknown", name)
+            values = groups.get(key)
+            if values is None:
+                values = groups[key] = ([], [], [])
+            # -1 marks a time that does not apply (e.g. the target never answered)
+            for pending, value in zip(values, times):
+                if value is not None and value >= 0:
+                    pending.append(value)
+            rows += 1
+        for (hour, name), values in groups.items():
+            for column, pending in zip(LATENCY_COLUMNS, values):
+                if pending:
+                    key = (hour, name, column)
+                    sketch = sketches.get(key)
+                    if sketch is None:
+                        sketch = sketches[key] = DDSketch(relative_accuracy)
+                    sketch.add_many(pending)
+    return sketches, rows
+
+
+def sketch_partition(partition: Partition, files: List[str], source_format: str, output_dir: str,
+                     relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> BuildResult:
+    start = time.perf_counter()
+    sketches, rows = sketch_batches(_iter_batches(source_format, files), relative_accuracy)
+    path = os.path.join(output_dir, hive_partition_path(*partition), _FILENAME)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        f.write(encode_sketches(sketches))
+    os.replace(path + ".tmp", path)
+    return BuildResult("/".join(partition), rows, len(sketches), os.path.getsize(path),
+                       round(time.perf_counter() - start, 3))
+
+
+class LatencyIndex:
+    """Sketch files under root/year=/month=/day=/, built incrementally from a log tree"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.state: Dict[str, str] = {}
+        self.relative_accuracy: Optional[float] = None
+        self._cache: Dict[Partition, Dict[SketchKey, DDSketch]] = {}
+        path = os.path.join(root, _STATE_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+            self.relative_accuracy = self.state.pop(_ACCURACY_KEY, None)
+
+    def build(self, table: LocalTable, workers: int = 1,
+              relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> List[BuildResult]:
+        """Sketch partitions whose source objects changed since the last build
+
+        Sketches of different accuracies cannot be merged, so a new accuracy
+        rebuilds every partition.
+        """
+        if self.relative_accuracy is not None and self.relative_accuracy != relative_accuracy:
+            self.state.clear()
+        self.relative_accuracy = relative_accuracy
+        results: List[BuildResult] = []
+        pending: Dict[Partition, str] = {}
+        for partition, files in table.partitions.items():
+            version = content_version((p, os.path.getsize(p), os.stat(p).st_mtime_ns) for p in files)
+            if self.state.get("/".join(partition)) == version:
+                results.append(BuildResult("/".join(partition), 0, 0, 0, 0.0, skipped=True))
+            else:
+                pending[partition] = version
+
+        args = [(p, table.partitions[p], table.format, self.root, relative_accuracy) for p in pending]
+        if workers == 1 or len(args) <= 1:
+            done = [sketch_partition(*a) for a in args]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(args))) as pool:
+                done = [f.result() for f in as_completed([pool.submit(sketch_partition, *a) for a in args])]
+
+        for result in done:
+            partition = tuple(result.partition.split("/"))
+            self.state[result.partition] = pending[partition]
+            self._cache.pop(partition, None)
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, _STATE_FILE), "w") as f:
+            json.dump({**self.state, _ACCURACY_KEY: relative_accuracy}, f, indent=2, sort_keys=True)
+        return sorted(results + done, key=lambda r: r.partition)
+
+    def load(self, partition: Partition) -> Dict[SketchKey, DDSketch]:
+        if partition not in self._cache:
+            path = os.path.join(self.root, hive_partition_path(*partition), _FILENAME)
+            with open(path, "rb") as f:
+                self._cache[partition] = decode_sketches(f.read())
+        return self._cache[partition]
+
+    @property
+    def partitions(self) -> List[Partition]:
+        return sorted(tuple(key.split("/")) for key in self.state)
+
+    def target_groups(self) -> List[str]:
+        return sorted({key[1] for p in self.partitions for key in self.load(p)})
+
+    def query(self, start: datetime, end: datetime, column: str = "target_processing_time",
+              target_group: Optional[str] = None, relative_accuracy: Optional[float] = None) -> DDSketch:
+        """Merge every sketch of column whose hour lies in [start, end), optionally for one target group
+
+        Days are pruned by partition; sketches of the ALB's 5-minute files
+        can spill into the neighbouring day, so one extra day is read on each side.
+        The result has the accuracy the index was built with (indexes from
+        before it was recorded take it from their first sketch).
+        """
+        first, last = f"{start:%Y-%m-%dT%H}", f"{end - timedelta(microseconds=1):%Y-%m-%dT%H}"
+        low, high = f"{start - timedelta(days=1):%Y/%m/%d}", f"{end + timedelta(days=1):%Y/%m/%d}"
+        accuracy = relative_accuracy or self.relative_accuracy
+        merged = DDSketch(accuracy) if accuracy else None
+        for partition in self.partitions:
+            if not low <= "/".join(partition) <= high:
+                continue
+            for (hour, group, name), sketch in self.load(partition).items():
+                if name == column and first <= hour <= last and target_group in (None, group):
+                    if merged is None:
+                        merged = DDSketch(sketch.relative_accuracy)
+                    merged.merge(sketch)
+        return merged if merged is not None else DDSketch()
+
+
+def run_benchmark(rate: float, days: int = 1, seed: int = 42, quantiles: Optional[List[float]] = None) -> Dict:
+    """Compare sketch percentiles with exact ones on freshly generated logs"""
+    from log_generator import GeneratorConfig, generate
+
+    np = require_numpy("the benchmark")
+    quantiles = quantiles or DEFAULT_QUANTILES
+    with tempfile.TemporaryDirectory() as workdir:
+        start_time = datetime(2024, 1, 1)
+        config = GeneratorConfig(os.path.join(workdir, "logs"), start_time, days=days,
+                                 requests_per_second=rate, seed=seed)
+        generate(config, workers=1)
+        table = LocalTable(config.output_dir)
+
+        index = LatencyIndex(os.path.join(workdir, "sketches"))
+        began = time.perf_counter()
+        built = index.build(table)
+        build_seconds = time.perf_counter() - began
+        sketch_bytes = sum(r.bytes_out for r in built)
+
+        # Exact: keep every value, then sort
+        began = time.perf_counter()
+        exact: Dict[str, list] = {}
+        for files in table.partitions.values():
+            for path in files:
+                for batch in iter_column_batches(path, ["target_group_arn", "target_processing_time"]):
+                    for arn, value in zip(batch["target_group_arn"], batch["target_processing_time"]):
+                        if value is not None and value >= 0:
+                            exact.setdefault(target_group_name(arn), []).append(value)
+        exact_quantiles = {group: np.quantile(np.array(values), quantiles, method="lower")
+                           for group, values in exact.items()}
+        exact_seconds = time.perf_counter() - began
+
+        end_time = start_time + timedelta(days=config.days + 1)
+        began = time.perf_counter()
+        merged = {group: index.query(start_time - timedelta(days=1), end_time, target_group=group)
+                  for group in exact}
+        merge_seconds = time.perf_counter() - began
+
+        rows = []
+        for group in sorted(exact):
+            for q, truth in zip(quantiles, exact_quantiles[group]):
+                estimate = merged[group].quantile(q)
+                rows.append({"target_group": group, "quantile": q, "exact": float(truth), "sketch": estimate,
+                             "relative_error": abs(estimate - truth) / truth if truth else 0.0})
+        return {
+            "rows": sum(r.rows for r in built),
+            "raw_bytes": sum(os.path.getsize(p) for files in table.partitions.values() for p in files),
+            "sketch_bytes": sketch_bytes,
+            "build_seconds": round(build_seconds, 3),
+            "exact_seconds": round(exact_seconds, 3),
+            "merge_ms": round(merge_seconds * 1000, 2),
+            "max_relative_error": max(r["relative_error"] for r in rows),
+            "quantiles": rows,
+        }
+
+
+def _parse_time(text: str) -> datetime:
+    return datetime.fromisoformat(text.replace("Z", ""))
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Mergeable latency sketches for ALB processing times")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    build = subparsers.add_parser("build", help="Sketch new or changed partitions")
+    build.add_argument("source", help="Raw AWSLogs tree or Parquet tree")
+    build.add_argument("index", help="Sketch output directory")
+    build.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Partitions in parallel")
+    build.add_argument("--accuracy", type=float, default=DEFAULT_RELATIVE_ACCURACY, help="Relative accuracy")
+
+    query = subparsers.add_parser("query", help="Percentiles over a time range")
+    query.add_argument("index", help="Sketch directory")
+    query.add_argument("--start", type=_parse_time, required=True, help="Range start (ISO-8601, UTC)")
+    query.add_argument("--end", type=_parse_time, required=True, help="Range end, exclusive")
+    query.add_argument("--column", choices=LATENCY_COLUMNS, default="target_processing_time")
+    query.add_argument("--target-group", help="Only this target group (default: each group and all)")
+    query.add_argument("--quantiles", default=",".join(map(str, DEFAULT_QUANTILES)), help="Comma-separated")
+
+    bench = subparsers.add_parser("benchmark", help="Accuracy and speed against exact percentiles")
+    bench.add_argument("--rate", type=float, default=50.0, help="Requests per second to generate")
+    bench.add_argument("--days", type=int, default=1, help="Days of logs to generate")
+    bench.add_argument("--seed", type=int, default=42, help="Generator seed")
+
+    args = parser.parse_args()
+
+    if args.action == "build":
+        for r in LatencyIndex(args.index).build(LocalTable(args.source), args.workers, args.accuracy):
+            status = "unchanged" if r.skipped else (f"{r.rows:,} rows -> {r.sketches} sketches, "
+                                                   f"{r.bytes_out:,} bytes in {r.seconds:.2f}s")
+            print(f"  {r.partition}: {status}")
+        return 0
+
+    if args.action == "benchmark":
+        result = run_benchmark(args.rate, args.days, args.seed)
+        print(f"\n{result['rows']:,} rows, {result['raw_bytes']:,} log bytes -> {result['sketch_bytes']:,} sketch bytes")
+        print(f"Sketch build {result['build_seconds']:.2f}s; exact pass + sort {result['exact_seconds']:.2f}s; "
+              f"merge all hours {result['merge_ms']:.1f} ms")
+        print(f"\n{'Target group':<20} {'q':>6} {'Exact':>12} {'Sketch':>12} {'Rel. error':>11}")
+        print("-" * 65)
+        for row in result["quantiles"]:
+            print(f"{row['target_group']:<20} {row['quantile']:>6} {row['exact']:>12.6f} {row['sketch']:>12.6f} "
+                  f"{row['relative_error']:>10.3%}")
+        print(f"\nMax relative error: {result['max_relative_error']:.3%}")
+        return 0
+
+    index = LatencyIndex(args.index)
+    quantiles = [float(q) for q in args.quantiles.split(",")]
+    groups = [args.target_group] if args.target_group else index.target_groups() + [None]
+    began = time.perf_counter()
+    print(f"\n{'Target group':<20} {'Requests':>10} " + " ".join(f"{'p' + format(q * 100, 'g'):>10}" for q in quantiles))
+    print("-" * (32 + 11 * len(quantiles)))
+    for group in groups:
+        sketch = index.query(args.start, args.end, args.column, group)
+        values = [sketch.quantile(q) for q in quantiles]
+        print(f"{group or 'all':<20} {sketch.count:>10,} "
+              + " ".join(f"{v:>10.4f}" if v is not None else f"{'-':>10}" for v in values))
+    print(f"\nAnswered in {(time.perf_counter() - began) * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
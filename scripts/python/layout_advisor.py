@@ -0,0 +1,731 @@
+#!/usr/bin/env python3
+"""
+Partitioning and Clustering Advisor
+Simulates the bytes a query workload scans under candidate BigQuery
+partitioning/clustering layouts (or Athena partition keys) using column
+statistics from sample logs, and emits the Terraform change for the cheapest
+"""
+
+import argparse
+import difflib
+import itertools
+import json
+import os
+import re
+import sys
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from alb_log_parser import iter_column_batches
+from common import require_numpy
+from log_normalizer import ALB_SOURCES
+from parquet_converter import group_by_partition
+from query_linter import (DEFAULT_BYTES_PER_DAY, DEFAULT_RETENTION_DAYS, DEFAULT_RUNS_PER_MONTH, TB,
+                          ColumnConstraint, analyze, extract_queries, tokenize)
+
+TERRAFORM_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "terraform", "modules")
+BIGQUERY_TF = os.path.join(TERRAFORM_DIR, "gcp", "bigquery.tf")
+ATHENA_TF = os.path.join(TERRAFORM_DIR, "aws", "glue_projection.tf")
+
+# Both engines bill on-demand queries per TB scanned with a 10 MB minimum per query
+PRICE_PER_TB = 5.0
+MIN_BILLED_BYTES = 10 * 1024 ** 2
+
+# Clustered tables prune storage blocks of roughly this size by their min/max
+DEFAULT_BLOCK_BYTES = 128 * 1024 ** 2
+MAX_CLUSTER_COLUMNS = 4
+TIME_UNITS = {"HOUR": 13, "DAY": 10, "MONTH": 7}
+# Hours of data in one partition of each time unit or Hive time key
+_UNIT_HOURS = {"HOUR": 1, "DAY": 24, "MONTH": 730, "hour": 1, "day": 24, "month": 730, "year": 8760}
+
+# Logical bytes per value BigQuery bills for fixed-width types; STRING is 2 + UTF-8 length
+_FIXED_BYTES = {"INTEGER": 8, "INT64": 8, "FLOAT": 8, "FLOAT64": 8, "TIMESTAMP": 8, "BOOLEAN": 1,
+                "int": 4, "bigint": 8, "double": 8}
+_NUMERIC_TYPES = {"INTEGER", "INT64", "FLOAT", "FLOAT64", "int", "bigint", "double"}
+_SCHEMA_RE = re.compile(r'name\s*=\s*"(\w+)"\s*type\s*=\s*"(\w+)"')
+
+# DATE(col) compared with a day: DATE(col) >= '2024-12-16', DATE(l.col) BETWEEN DATE '...' AND DATE '...'
+_DAY = r"(?:DATE\s*)?'(\d{4}-\d{2}-\d{2})'"
+_DATE_CALL_RE = re.compile(r"\bDATE\s*\(\s*(?:\w+\.)*(\w+)\s*\)\s*"
+                           rf"(?:BETWEEN\s+{_DAY}\s+AND\s+{_DAY}|(>=|<=|=|<|>)\s*{_DAY})", re.I)
+# Clauses that end a WHERE at its own parenthesis depth
+_WHERE_END = {"group", "order", "limit", "having", "union", "intersect", "except", "window", "offset"}
+
+
+@dataclass(frozen=True)
+class Layout:
+    """A physical layout: partition columns (time columns truncated to time_unit), then cluster order"""
+    partition_by: Tuple[str, ...] = ()
+    time_unit: Optional[str] = None
+    cluster_by: Tuple[str, ...] = ()
+    columnar: bool = True
+
+    @property
+    def label(self) -> str:
+        parts = []
+        if self.partition_by:
+            keys = "/".join(self.partition_by)
+            parts.append(f"partition {keys}" + (f" by {self.time_unit}" if self.time_unit else ""))
+        else:
+            parts.append("unpartitioned")
+        if self.cluster_by:
+            parts.append(f"cluster {','.join(self.cluster_by)}")
+        if not self.columnar:
+            parts.append("text")
+        return ", ".join(parts)
+
+
+@dataclass
+class WorkloadQuery:
+    """One workload statement, its monthly runs and what it filters and groups on"""
+    name: str
+    sql: str
+    runs: float
+    columns: List[str] = field(default_factory=list)
+    constraints: Dict[str, ColumnConstraint] = field(default_factory=dict)
+    group_by: List[str] = field(default_factory=list)
+    # Time columns the query filters on in ways that were not understood
+    unparsed_time_filters: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Target:
+    """The table being laid out: its schema, time columns and Terraform file"""
+    engine: str
+    types: Dict[str, str]
+    time_column: str
+    time_columns: Tuple[str, ...]
+    terraform: str
+
+
+def bigquery_target(tf_path: str = BIGQUERY_TF) -> Target:
+    """lb_access_logs as declared in bigquery.tf"""
+    with open(tf_path) as f:
+        types = dict(_SCHEMA_RE.findall(f.read()))
+    return Target("bigquery", types, "timestamp", ("timestamp",), tf_path)
+
+
+def athena_target(tf_path: str = ATHENA_TF) -> Target:
+    """alb_access_logs with its year/month/day keys plus an hour key a Parquet copy can add"""
+    from alb_log_parser import COLUMNS, PARTITION_COLUMNS
+    types = dict(COLUMNS)
+    types.update({name: "string" for name in PARTITION_COLUMNS + ["hour"]})
+    return Target("athena", types, "time", ("time", "year", "month", "day", "hour"), tf_path)
+
+
+def group_by_columns(sql: str) -> List[str]:
+    """Bare column names in the outermost GROUP BY"""
+    tokens = tokenize(sql)
+    found: List[str] = []
+    depth = 0
+    inside = False
+    for i, token in enumerate(tokens):
+        if token.value == "(":
+            depth += 1
+        elif token.value == ")":
+            depth -= 1
+        elif depth == 0 and token.kind == "ident":
+            if token.lower == "by" and i and tokens[i - 1].lower == "group":
+                inside = True
+                continue
+            if token.lower in ("having", "order", "limit", "union", "window"):
+                inside = False
+        if inside and depth == 0 and token.kind == "ident" and token.lower not in found:
+            found.append(token.lower)
+    return found
+
+
+def where_columns(sql: str) -> List[str]:
+    """Identifiers (column names and keywords) in any WHERE clause, including those of subqueries"""
+    found: List[str] = []
+    depth = 0
+    open_at: List[int] = []  # parenthesis depth of each WHERE being read
+    for token in tokenize(sql):
+        if token.value == "(":
+            depth += 1
+        elif token.value == ")":
+            depth -= 1
+            while open_at and open_at[-1] > depth:
+                open_at.pop()
+        elif token.kind == "ident":
+            if token.lower == "where":
+                open_at.append(depth)
+            elif open_at and open_at[-1] == depth and token.lower in _WHERE_END:
+                open_at.pop()
+            elif open_at and token.lower not in found:
+                found.append(token.lower)
+    return found
+
+
+def _date_calls_as_ranges(sql: str) -> str:
+    """Rewrite DATE(col) compared with a day into the same range on col itself"""
+    def next_day(day: str) -> str:
+        return (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+
+    def rewrite(match) -> str:
+        column, first, last, op, day = match.groups()
+        if first is not None:
+            return f"{column} >= '{first}' AND {column} < '{next_day(last)}'"
+        low, high = {"=": (day, next_day(day)), ">=": (day, None), ">": (next_day(day), None),
+                     "<": (None, day), "<=": (None, next_day(day))}[op]
+        bounds = ([f"{column} >= '{low}'"] if low else []) + ([f"{column} < '{high}'"] if high else [])
+        return " AND ".join(bounds)
+
+    return _DATE_CALL_RE.sub(rewrite, sql)
+
+
+def _iso_times(constraint: ColumnConstraint) -> ColumnConstraint:
+    """Compare TIMESTAMP '2024-12-16 10:00:00' literals against the ISO 8601 times of the logs"""
+    def iso(value: Optional[str]) -> Optional[str]:
+        return re.sub(r"^(\d{4}-\d{2}-\d{2}) ", r"\1T", value) if value is not None else None
+
+    values = {iso(v) for v in constraint.values} if constraint.values is not None else None
+    return ColumnConstraint(values, iso(constraint.low), constraint.low_inclusive,
+                            iso(constraint.high), constraint.high_inclusive)
+
+
+def load_workload(path: Optional[str] = None, tf_paths: Sequence[str] = (), target: Optional[Target] = None,
+                  runs: float = DEFAULT_RUNS_PER_MONTH) -> List[WorkloadQuery]:
+    """Queries from a JSON lines log ({"sql", "runs", "name"}) and/or Terraform named queries
+
+    Filters are read by query_linter.analyze, after DATE(col) comparisons are
+    rewritten into ranges on col. Time columns the WHERE clauses reference
+    without a parsed constraint are recorded in unparsed_time_filters.
+    """
+    entries: List[Tuple[str, str, float]] = []
+    if path:
+        with open(path) as f:
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    record = json.loads(line)
+                    entries.append((record.get("name", f"query{number}"), record["sql"],
+                                    float(record.get("runs", record.get("count", 1)))))
+    entries.extend((q.name, q.sql, runs) for q in extract_queries(tf_paths))
+
+    queries = []
+    for name, sql, count in entries:
+        analysis = analyze(_date_calls_as_ranges(sql))
+        if not analysis.scans_data:
+            continue
+        known = target.types if target else {}
+        columns = list(known) if analysis.select_star else [c for c in analysis.columns if c in known]
+        constraints = {c: v for c, v in analysis.constraints.items() if c in known}
+        time_columns = target.time_columns if target else ()
+        if target and target.time_column in constraints:
+            constraints[target.time_column] = _iso_times(constraints[target.time_column])
+        queries.append(WorkloadQuery(
+            name, sql, count, columns, constraints,
+            [c for c in group_by_columns(sql) if c in known],
+            [c for c in where_columns(sql) if c in time_columns and c not in constraints],
+        ))
+    return queries
+
+
+@dataclass
+class SampleTable:
+    """Sample rows as arrays: numeric columns as float64 (NaN for NULL), text as sorted-dictionary codes"""
+    rows: int
+    days: int
+    numeric: Dict[str, object] = field(default_factory=dict)
+    codes: Dict[str, object] = field(default_factory=dict)
+    dictionaries: Dict[str, object] = field(default_factory=dict)
+    sizes: Dict[str, object] = field(default_factory=dict)
+    raw_bytes: object = None
+
+    @property
+    def columns(self) -> Set[str]:
+        return set(self.numeric) | set(self.codes)
+
+    def values(self, column: str):
+        """Orderable per-row values: floats, or codes whose order matches the text order"""
+        return self.numeric[column] if column in self.numeric else self.codes[column]
+
+
+def load_sample(root: str, target: Target, max_rows: Optional[int] = None) -> SampleTable:
+    """Column arrays and per-row byte sizes for the target's schema from a local AWSLogs tree"""
+    np = require_numpy("the layout simulation")
+    sources = {name: (ALB_SOURCES.get(name, name) if target.engine == "bigquery" else name)
+               for name in target.types}
+    derived = {"year", "month", "day", "hour"}
+    wanted = sorted({source for name, source in sources.items() if name not in derived} | {"time"})
+
+    data: Dict[str, list] = {name: [] for name in wanted}
+    raw_bytes: List[float] = []
+    for partition, files in group_by_partition(root).items():
+        for path in files:
+            rows_before = len(data["time"])
+            for batch in iter_column_batches(path, wanted):
+                for name in wanted:
+                    data[name].extend(batch[name])
+            rows = len(data["time"]) - rows_before
+            if rows:
+                # Athena reads text tables whole, billing the compressed object bytes
+                raw_bytes.extend([os.path.getsize(path) / rows] * rows)
+            if max_rows and len(data["time"]) >= max_rows:
+                break
+        if max_rows and len(data["time"]) >= max_rows:
+            break
+    if not data["time"]:
+        raise ValueError(f"No log records found under {root}")
+
+    times = data["time"]
+    table = SampleTable(rows=len(times), days=len({t[:10] for t in times}))
+    table.raw_bytes = np.asarray(raw_bytes, dtype=np.float64)
+    for name, kind in target.types.items():
+        if name == "year":
+            values = [t[0:4] for t in times]
+        elif name == "month":
+            values = [t[5:7] for t in times]
+        elif name == "day":
+            values = [t[8:10] for t in times]
+        elif name == "hour":
+            values = [t[11:13] for t in times]
+        else:
+            values = data[sources[name]]
+        if kind in _NUMERIC_TYPES:
+            array = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            table.numeric[name] = array
+            table.sizes[name] = np.where(np.isnan(array), 0, _FIXED_BYTES[kind]).astype(np.float64)
+        else:
+            text = np.array(["" if v is None else str(v) for v in values], dtype=object)
+            dictionary, codes = np.unique(text, return_inverse=True)
+            table.codes[name] = codes.astype(np.int64)
+            table.dictionaries[name] = dictionary
+            if kind in _FIXED_BYTES:
+                table.sizes[name] = np.full(len(text), _FIXED_BYTES[kind], dtype=np.float64)
+            else:
+                lengths = np.array([len(v.encode()) + 2 for v in dictionary], dtype=np.float64)
+                table.sizes[name] = lengths[codes]
+    return table
+
+
+def _constraint_mask(table: SampleTable, column: str, constraint: ColumnConstraint, low, high):
+    """Which [low, high] ranges of a column (arrays) could hold a row matching the constraint"""
+    np = require_numpy("the layout simulation")
+    numeric = column in table.numeric
+    dictionary = table.dictionaries.get(column)
+    try:
+        keep = np.ones(len(low), dtype=bool)
+        if constraint.values is not None:
+            hit = np.zeros(len(low), dtype=bool)
+            for value in constraint.values:
+                if numeric:
+                    v = float(value)
+                    hit |= (low <= v) & (v <= high)
+                else:
+                    code = int(np.searchsorted(dictionary, value))
+                    if code < len(dictionary) and dictionary[code] == value:
+                        hit |= (low <= code) & (code <= high)
+            keep &= hit
+        if constraint.low is not None:
+            if numeric:
+                bound = float(constraint.low)
+                keep &= high >= bound if constraint.low_inclusive else high > bound
+            else:
+                side = "left" if constraint.low_inclusive else "right"
+                keep &= high >= int(np.searchsorted(dictionary, constraint.low, side))
+        if constraint.high is not None:
+            if numeric:
+                bound = float(constraint.high)
+                keep &= low <= bound if constraint.high_inclusive else low < bound
+            else:
+                side = "right" if constraint.high_inclusive else "left"
+                keep &= low <= int(np.searchsorted(dictionary, constraint.high, side)) - 1
+    except ValueError:
+        # A literal that does not fit the column type cannot be used for pruning
+        return np.ones(len(low), dtype=bool)
+    return keep
+
+
+@dataclass
+class LayoutResult:
+    """Monthly scan volume of the workload under one layout"""
+    layout: Layout
+    partitions: int
+    blocks: int
+    bytes_per_query: Dict[str, float] = field(default_factory=dict)
+    monthly_bytes: float = 0.0
+    current: bool = False
+
+    @property
+    def monthly_cost(self) -> float:
+        return self.monthly_bytes / TB * PRICE_PER_TB
+
+
+class Simulator:
+    """Bytes each workload query scans under a layout, scaled from the sample to the real table
+
+    Rows are grouped into partitions, sorted by the cluster columns inside each
+    partition and cut into blocks of block_bytes. A query reads the partitions
+    whose partition-column ranges can satisfy its filters, and inside those the
+    blocks whose cluster-column min/max can; columnar layouts bill only the
+    referenced columns of those blocks, text layouts every byte. Sample bytes
+    scale to bytes_per_day of raw logs; queries without a time filter read
+    retention_days of data.
+    """
+
+    def __init__(self, table: SampleTable, target: Target, queries: List[WorkloadQuery],
+                 bytes_per_day: float = DEFAULT_BYTES_PER_DAY, retention_days: int = DEFAULT_RETENTION_DAYS,
+                 block_bytes: float = DEFAULT_BLOCK_BYTES):
+        np = require_numpy("the layout simulation")
+        self.table = table
+        self.target = target
+        self.queries = queries
+        self.retention_days = retention_days
+        sample_raw_per_day = float(table.raw_bytes.sum()) / table.days
+        # Real rows per sample row, per day of data
+        self.scale = bytes_per_day / sample_raw_per_day if sample_raw_per_day else 1.0
+        row_bytes = sum(float(s.mean()) for s in table.sizes.values())
+        # BigQuery bills logical bytes; Athena bills stored bytes, so Parquet columns are
+        # assumed to compress about as well as the gzipped logs do
+        self.compression = 1.0
+        if target.engine == "athena":
+            self.compression = float(table.raw_bytes.mean()) / row_bytes
+        self.rows_per_block = max(1, int(block_bytes / (row_bytes * self.scale)))
+        self._time = table.codes.get(target.time_column)
+        self._dictionary = table.dictionaries.get(target.time_column)
+        hours = np.array([v[:13] for v in self._dictionary], dtype=object)
+        self._hours = np.unique(hours, return_inverse=True)[1].reshape(-1)[self._time]
+        self._np = np
+
+    def _partition_ids(self, layout: Layout):
+        np = self._np
+        if not layout.partition_by:
+            return np.zeros(self.table.rows, dtype=np.int64)
+        keys = []
+        for column in layout.partition_by:
+            if layout.time_unit and column == self.target.time_column:
+                width = TIME_UNITS[layout.time_unit]
+                truncated = np.array([v[:width] for v in self._dictionary], dtype=object)
+                _, units = np.unique(truncated, return_inverse=True)
+                keys.append(units[self._time])
+            else:
+                values = self.table.values(column)
+                keys.append(np.unique(values, return_inverse=True)[1])
+        _, ids = np.unique(np.stack(keys, axis=1), axis=0, return_inverse=True)
+        return ids.reshape(-1)
+
+    def _partition_weights(self, layout: Layout, partitions):
+        """Real data per sampled data in each partition: a month partition the sample covers for
+        two days holds fifteen times what the sample shows"""
+        np = self._np
+        units = [_UNIT_HOURS[layout.time_unit]] if layout.time_unit else []
+        units += [_UNIT_HOURS[c] for c in layout.partition_by if c in _UNIT_HOURS]
+        if not units:
+            return np.ones(int(partitions.max()) + 1)
+        pairs = np.unique(np.stack([partitions, self._hours], axis=1), axis=0)
+        sampled_hours = np.bincount(pairs[:, 0])
+        return np.minimum(min(units), self.retention_days * 24) / sampled_hours
+
+    def simulate(self, layout: Layout) -> LayoutResult:
+        np = self._np
+        table = self.table
+        partitions = self._partition_ids(layout)
+        weights = self._partition_weights(layout, partitions)
+        order = np.lexsort([table.values(c) for c in reversed(layout.cluster_by)] + [partitions])
+        partitions = partitions[order]
+
+        # Block boundaries: every rows_per_block rows, restarting at each partition
+        starts_of_partitions = np.flatnonzero(np.r_[True, partitions[1:] != partitions[:-1]])
+        position = np.arange(len(order)) - np.repeat(starts_of_partitions,
+                                                     np.diff(np.r_[starts_of_partitions, len(order)]))
+        block_start = np.flatnonzero(np.r_[True, (partitions[1:] != partitions[:-1])
+                                           | (position[1:] % self.rows_per_block == 0)])
+        block_partition = partitions[block_start]
+        block_weight = weights[block_partition]
+
+        def per_block(values, reducer):
+            return reducer.reduceat(values[order], block_start)
+
+        def per_partition(values, reducer):
+            reduced = reducer.reduceat(values[order], starts_of_partitions)
+            return reduced[block_partition]
+
+        ranges: Dict[str, Tuple] = {}
+        for column in set(layout.partition_by) | set(layout.cluster_by):
+            values = table.values(column)
+            if column in table.numeric:
+                values = np.nan_to_num(values, nan=np.inf)
+            if column in layout.partition_by:
+                ranges[column] = (per_partition(values, np.minimum), per_partition(values, np.maximum))
+            else:
+                ranges[column] = (per_block(values, np.minimum), per_block(values, np.maximum))
+        if layout.time_unit and self.target.time_column not in ranges:
+            time_values = self._time
+            ranges[self.target.time_column] = (per_partition(time_values, np.minimum),
+                                               per_partition(time_values, np.maximum))
+
+        column_bytes = {column: per_block(sizes, np.add) for column, sizes in table.sizes.items()}
+        raw = per_block(table.raw_bytes, np.add)
+
+        result = LayoutResult(layout, int(partitions.max()) + 1 if len(partitions) else 0, len(block_start))
+        for query in self.queries:
+            read = np.ones(len(block_start), dtype=bool)
+            for column, constraint in query.constraints.items():
+                if column in ranges:
+                    low, high = ranges[column]
+                    read &= _constraint_mask(table, column, constraint, low, high)
+            if layout.columnar:
+                block_bytes = sum(column_bytes[c] for c in query.columns if c in column_bytes) * self.compression
+            else:
+                block_bytes = raw
+            # Without a time filter the layout can prune on, every retained day is read
+            if any(c in ranges for c in query.constraints if c in self.target.time_columns):
+                scanned = float((block_bytes * block_weight)[read].sum())
+            else:
+                scanned = float(block_bytes[read].sum()) * self.retention_days / table.days
+            scanned *= self.scale
+            billed = max(scanned, MIN_BILLED_BYTES)
+            result.bytes_per_query[query.name] = billed
+            result.monthly_bytes += billed * query.runs
+        return result
+
+
+def filter_columns(queries: List[WorkloadQuery], limit: int) -> List[str]:
+    """Columns worth clustering on, by monthly runs filtering (then grouping) on them"""
+    weight: Dict[str, float] = {}
+    for query in queries:
+        for column in query.constraints:
+            weight[column] = weight.get(column, 0.0) + query.runs
+        for column in query.group_by:
+            weight[column] = weight.get(column, 0.0) + query.runs / 10
+    return [c for c, _ in sorted(weight.items(), key=lambda item: (-item[1], item[0]))][:limit]
+
+
+def current_layout(target: Target) -> Layout:
+    """The layout the Terraform file declares today"""
+    with open(target.terraform) as f:
+        text = f.read()
+    if target.engine == "bigquery":
+        partition = re.search(r'time_partitioning\s*\{[^}]*type\s*=\s*"(\w+)"[^}]*field\s*=\s*"(\w+)"', text)
+        clustering = re.search(r"clustering\s*=\s*\[([^\]]*)\]", text)
+        return Layout((partition.group(2),) if partition else (), partition.group(1) if partition else None,
+                      tuple(re.findall(r'"(\w+)"', clustering.group(1))) if clustering else ())
+    keys = tuple(re.findall(r'partition_keys\s*\{\s*name\s*=\s*"(\w+)"', text))
+    return Layout(keys, columnar=False)
+
+
+def candidate_layouts(target: Target, queries: List[WorkloadQuery], columns: int = 5,
+                      depth: int = 2) -> List[Layout]:
+    """Partitionings crossed with cluster orders over the most filtered columns"""
+    if target.engine == "athena":
+        keys = [("year", "month"), ("year", "month", "day")]
+        layouts = [Layout(k, columnar=False) for k in keys]
+        layouts += [Layout(k) for k in keys + [("year", "month", "day", "hour")]]
+        return layouts
+
+    partitionings = [Layout()] + [Layout((target.time_column,), unit) for unit in TIME_UNITS]
+    candidates = [c for c in filter_columns(queries, columns + 1) if c != target.time_column][:columns]
+    orders = [()] + [order for size in range(1, depth + 1) for order in itertools.permutations(candidates, size)]
+    return [Layout(p.partition_by, p.time_unit, order) for p in partitionings for order in orders]
+
+
+def advise(simulator: Simulator, target: Target, queries: List[WorkloadQuery],
+           columns: int = 5, depth: int = 2) -> List[LayoutResult]:
+    """Every candidate's monthly scan volume, cheapest first, with the current layout marked
+
+    The best cluster orders of the exhaustive pass are extended greedily, one
+    column at a time, up to BigQuery's four clustering columns.
+    """
+    current = current_layout(target)
+    results: Dict[Layout, LayoutResult] = {}
+    for layout in [current] + candidate_layouts(target, queries, columns, depth):
+        if layout not in results:
+            results[layout] = simulator.simulate(layout)
+
+    if target.engine == "bigquery":
+        extra = [c for c in filter_columns(queries, columns + 1) if c != target.time_column][:columns]
+        for result in sorted(results.values(), key=lambda r: r.monthly_bytes)[:3]:
+            layout = result.layout
+            while len(layout.cluster_by) < MAX_CLUSTER_COLUMNS:
+                options = [Layout(layout.partition_by, layout.time_unit, layout.cluster_by + (c,))
+                           for c in extra if c not in layout.cluster_by]
+                scored = [results.get(o) or simulator.simulate(o) for o in options]
+                for option, score in zip(options, scored):
+                    results[option] = score
+                best = min(scored, key=lambda r: r.monthly_bytes, default=None)
+                if best is None or best.monthly_bytes >= results[layout].monthly_bytes:
+                    break
+                layout = best.layout
+
+    results[current].current = True
+    # Cheapest first; among equals prefer fewer partition and cluster columns
+    return sorted(results.values(), key=lambda r: (round(r.monthly_bytes), len(r.layout.partition_by),
+                                                    len(r.layout.cluster_by), r.layout.label))
+
+
+def terraform_result(results: List[LayoutResult], target: Target, queries: List[WorkloadQuery]) -> LayoutResult:
+    """The cheapest result the Terraform file may be changed to
+
+    Only text layouts are applied to the Athena table. A time filter the
+    advisor could not parse prices the same under every partitioning, so while
+    the workload has one, layouts dropping a time partition key of the current
+    layout are never applied.
+    """
+    current = next(r for r in results if r.current)
+    keep: Set[str] = set()
+    if any(q.unparsed_time_filters for q in queries):
+        keep = {c for c in current.layout.partition_by if c in target.time_columns}
+    return next(r for r in results if (target.engine == "bigquery" or not r.layout.columnar)
+                and keep <= set(r.layout.partition_by))
+
+
+def terraform_change(target: Target, layout: Layout) -> Tuple[str, str]:
+    """(original, updated) Terraform text declaring layout
+
+    Athena changes are limited to the partitioning of the text table over the
+    raw logs: a Parquet layout needs the converted copy, its own location and
+    a different SerDe, so it is reported as advice and never applied here.
+    """
+    if target.engine == "athena" and layout.columnar:
+        raise ValueError(f"Parquet layout {layout.label!r} needs a converted table; only text layouts are applied")
+    with open(target.terraform) as f:
+        original = f.read()
+    text = original
+    if target.engine == "bigquery":
+        block = ""
+        if layout.partition_by:
+            block = (f'  time_partitioning {{\n    type  = "{layout.time_unit}"\n'
+                     f'    field = "{layout.partition_by[0]}"\n  }}\n')
+        clustering = ""
+        if layout.cluster_by:
+            clustering = "  clustering = [" + ", ".join(f'"{c}"' for c in layout.cluster_by) + "]\n"
+        text = re.sub(r"\n  time_partitioning \{.*?\n  \}\n", "\n", text, flags=re.S)
+        text = re.sub(r"\n  clustering = \[[^\]]*\]\n", "\n", text)
+        body = block + ("\n" if block and clustering else "") + clustering
+        # Layout settings go last in the lb_access_logs block
+        end = re.search(r'resource "google_bigquery_table" "lb_access_logs" \{.*?\n\}', text, re.S).end() - 1
+        text = text[:end].rstrip() + ("\n\n" + body if body else "\n") + text[end:]
+        return original, text
+
+    keys = list(layout.partition_by)
+    blocks = "".join(f'  partition_keys {{\n    name = "{k}"\n    type = "string"\n  }}\n\n' for k in keys)
+    text = re.sub(r"(  partition_keys \{\n.*?\n  \}\n\n)+", lambda _: blocks, text, flags=re.S)
+    for key, (kind, value, digits) in {"day": ("integer", "1,31", "2"), "hour": ("integer", "0,23", "2")}.items():
+        present = f'"projection.{key}.type"' in text
+        if key in keys and not present:
+            anchor = re.search(r'\n(\s*)"storage.location.template"', text)
+            indent = anchor.group(1)
+            lines = "".join(f'\n{indent}{name:<27} = "{setting}"' for name, setting in (
+                (f'"projection.{key}.type"', kind), (f'"projection.{key}.range"', value),
+                (f'"projection.{key}.digits"', digits)))
+            text = text[:anchor.start()] + lines + text[anchor.start():]
+        elif key not in keys and present:
+            text = re.sub(rf'\n\s*"projection\.{key}\.\w+"\s*=\s*"[^"]*"', "", text)
+    # The ALB writes the raw logs under plain year/month/day directories
+    template = "".join(f"$${{{k}}}/" for k in keys)
+    text = re.sub(r'("storage.location.template" = "\$\{local.alb_log_location\})[^"]*"',
+                  lambda m: f'{m.group(1)}{template}"', text)
+    return original, text
+
+
+def terraform_diff(target: Target, layout: Layout) -> str:
+    """Unified diff turning the Terraform file into one declaring layout ("" when unchanged)"""
+    original, updated = terraform_change(target, layout)
+    name = os.path.relpath(target.terraform, os.path.join(TERRAFORM_DIR, "..", ".."))
+    return "".join(difflib.unified_diff(original.splitlines(True), updated.splitlines(True),
+                                        f"a/{name}", f"b/{name}"))
+
+
+def print_report(results: List[LayoutResult], queries: List[WorkloadQuery], limit: int = 12):
+    """Print the cheapest layouts against the current one"""
+    current = next(r for r in results if r.current)
+    best = results[0]
+    print(f"\n{'='*104}")
+    print(f"Layout Advice ({len(queries)} queries, {sum(q.runs for q in queries):.0f} runs/month)")
+    print(f"{'='*104}")
+    print(f"{'Layout':<70} {'Parts':>6} {'TB/month':>10} {'$/month':>9} {'vs now':>6}")
+    print("-" * 104)
+    shown = results[:limit] + ([current] if current not in results[:limit] else [])
+    for result in shown:
+        marker = "*" if result.current else " "
+        change = result.monthly_bytes / current.monthly_bytes - 1 if current.monthly_bytes else 0.0
+        print(f"{marker}{result.layout.label[:69]:<69} {result.partitions:>6} {result.monthly_bytes / TB:>10.3f} "
+              f"{result.monthly_cost:>9.2f} {change:>+6.0%}")
+    print("-" * 104)
+    print(f"* current layout. Recommended: {best.layout.label}")
+    print(f"\n{'Query':<28} {'Runs':>6} {'GB now':>10} {'GB best':>10}  Filters")
+    for query in queries:
+        print(f"{query.name[:28]:<28} {query.runs:>6.0f} {current.bytes_per_query[query.name] / 1024 ** 3:>10.2f} "
+              f"{best.bytes_per_query[query.name] / 1024 ** 3:>10.2f}  {','.join(query.constraints) or '-'}")
+    print(f"{'='*104}\n")
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Recommend partitioning/clustering from a query workload")
+    parser.add_argument("sample", help="Local AWSLogs tree of sample logs for column statistics")
+    parser.add_argument("--engine", choices=["bigquery", "athena"], default="bigquery", help="Table to lay out")
+    parser.add_argument("--workload", help="JSON lines of {\"sql\", \"runs\"[, \"name\"]} (runs per month)")
+    parser.add_argument("--tf-queries", action="append", default=[],
+                        help="Also use the named queries in these .tf files (default for athena: athena.tf)")
+    parser.add_argument("--tf", help="Terraform file declaring the layout (default: bigquery.tf / "
+                                     "glue_projection.tf)")
+    parser.add_argument("--bytes-per-day", type=float, default=DEFAULT_BYTES_PER_DAY,
+                        help="Raw log bytes per day in the real table")
+    parser.add_argument("--retention-days", type=int, default=DEFAULT_RETENTION_DAYS,
+                        help="Days read by queries without a time filter")
+    parser.add_argument("--block-mb", type=float, default=DEFAULT_BLOCK_BYTES / 1024 ** 2,
+                        help="Storage block size for cluster pruning")
+    parser.add_argument("--max-rows", type=int, help="Rows of the sample to load")
+    parser.add_argument("--columns", type=int, default=5, help="Filter columns considered for clustering")
+    parser.add_argument("--apply", action="store_true", help="Write the recommended layout to the .tf file")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    if args.engine == "bigquery":
+        target = bigquery_target(args.tf or BIGQUERY_TF)
+        tf_queries = args.tf_queries
+    else:
+        target = athena_target(args.tf or ATHENA_TF)
+        tf_queries = args.tf_queries or [os.path.join(TERRAFORM_DIR, "aws", "athena.tf")]
+    queries = load_workload(args.workload, tf_queries, target)
+    if not queries:
+        parser.error("no queries: pass --workload or --tf-queries")
+
+    try:
+        table = load_sample(args.sample, target, args.max_rows)
+        simulator = Simulator(table, target, queries, args.bytes_per_day, args.retention_days,
+                              args.block_mb * 1024 ** 2)
+        results = advise(simulator, target, queries, args.columns)
+    except (RuntimeError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+
+    best = results[0]
+    # Only the text table is rewritten; a Parquet recommendation is advice on top of it
+    applied = terraform_result(results, target, queries)
+    diff = terraform_diff(target, applied.layout)
+    unparsed = [q.name for q in queries if q.unparsed_time_filters]
+    if args.json:
+        print(json.dumps({
+            "recommended": best.layout.label,
+            "terraform_layout": applied.layout.label,
+            "unparsed_time_filters": unparsed,
+            "layouts": [{"layout": r.layout.label, "current": r.current, "partitions": r.partitions,
+                         "monthly_bytes": r.monthly_bytes, "monthly_cost": round(r.monthly_cost, 2)}
+                        for r in results],
+            "terraform_diff": diff,
+        }, indent=2))
+    else:
+        print_report(results, queries)
+        if target.engine == "athena" and best.layout.columnar:
+            hour = " --partition-by-hour" if "hour" in best.layout.partition_by else ""
+            print(f"Convert the logs with parquet_converter.py{hour} and create a Parquet table over the "
+                  f"converted prefix (Hive-style partitions, ParquetHiveSerDe); that migration is not applied.")
+            print(f"Best layout for the existing text table: {applied.layout.label}\n")
+        if unparsed:
+            print(f"Time filters not understood in: {', '.join(unparsed)}; "
+                  f"keeping time partitioning, applying: {applied.layout.label}\n")
+        print(diff or "Terraform already declares the recommended layout")
+    if args.apply and diff:
+        _, updated = terraform_change(target, applied.layout)
+        with open(target.terraform, "w") as f:
+            f.write(updated)
+        print(f"Updated {target.terraform}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Local AWS Stand-ins
+Directory-backed S3 and an Athena that runs queries with query_engine.py,
+shaped like the boto3 clients so runners and readers can be exercised offline
+"""
+
+import itertools
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from query_engine import LocalTable, QueryEngine
+
+# GetQueryResults returns at most this many rows per call
+MAX_RESULTS_PER_PAGE = 1000
+
+# Athena's default DML active-query quota per account and region
+DEFAULT_ACTIVE_QUERIES = 20
+
+FINAL_STATES = ("SUCCEEDED", "FAILED", "CANCELLED")
+
+
+class ClientError(Exception):
+    """Same shape as botocore's ClientError: the code is in response["Error"]["Code"]"""
+
+    def __init__(self, code: str, message: str, operation: str):
+        super().__init__(f"An error occurred ({code}) when calling the {operation} operation: {message}")
+        self.response = {"Error": {"Code": code, "Message": message}}
+        self.operation_name = operation
+
+
+def error_code(error: Exception) -> Optional[str]:
+    """AWS error code of a botocore (or local) ClientError, None for anything else"""
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        return response.get("Error", {}).get("Code")
+    return None
+
+
+def split_s3_uri(uri: str) -> Tuple[str, str]:
+    """("bucket", "key/prefix") of an s3:// URI"""
+    if not uri.startswith("s3://"):
+        raise ValueError(f"Not an s3:// URI: {uri}")
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    return bucket, key
+
+
+class _Paginator:
+    """get_paginator() result: follows a token between calls of one operation"""
+
+    def __init__(self, operation, request_token: str, response_token: str):
+        self.operation = operation
+        self.request_token = request_token
+        self.response_token = response_token
+
+    def paginate(self, **kwargs) -> Iterator[Dict]:
+        while True:
+            page = self.operation(**kwargs)
+            yield page
+            token = page.get(self.response_token)
+            if not token:
+                return
+            kwargs[self.request_token] = token
+
+
+class _Body:
+    """StreamingBody stand-in over bytes already read"""
+
+    def __init__(self, data: bytes):
+        self._data = data
+        self._offset = 0
+
+    def read(self, amount: Optional[int] = None) -> bytes:
+        end = len(self._data) if amount is None else min(len(self._data), self._offset + amount)
+        chunk = self._data[self._offset:end]
+        self._offset = end
+        return chunk
+
+    def iter_chunks(self, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        pass
+
+
+class _Exceptions:
+    class NoSuchKey(ClientError):
+        def __init__(self, key: str):
+            super().__init__("NoSuchKey", f"The specified key does not exist: {key}", "GetObject")
+
+
+class LocalS3:
+    """S3 client subset over <root>/<bucket>/<key> files
+
+    request_latency and bytes_per_second simulate the time to first byte and
+    the per-connection throughput of a GET, so ranged-read strategies can be
+    compared without a network.
+    """
+
+    exceptions = _Exceptions
+
+    def __init__(self, root: str, request_latency: float = 0.0, bytes_per_second: Optional[float] = None):
+        self.root = root
+        self.request_latency = request_latency
+        self.bytes_per_second = bytes_per_second
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, bucket: str, key: str) -> str:
+        return os.path.join(self.root, bucket, *key.split("/"))
+
+    def _count(self, operation: str):
+        with self._lock:
+            self.requests[operation] = self.requests.get(operation, 0) + 1
+        if self.request_latency:
+            time.sleep(self.request_latency)
+
+    def _stat(self, bucket: str, key: str) -> os.stat_result:
+        try:
+            return os.stat(self._path(bucket, key))
+        except FileNotFoundError:
+            raise self.exceptions.NoSuchKey(key)
+
+    @staticmethod
+    def _etag(stat: os.stat_result) -> str:
+        return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+    def put_object(self, Bucket: str, Key: str, Body=b"", **kwargs) -> Dict:
+        self._count("PutObject")
+        data = Body.encode() if isinstance(Body, str) else Body if isinstance(Body, bytes) else Body.read()
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return {"ETag": self._etag(os.stat(path))}
+
+    def head_object(self, Bucket: str, Key: str, **kwargs) -> Dict:
+        self._count("HeadObject")
+        stat = self._stat(Bucket, Key)
+        return {"ContentLength": stat.st_size, "ETag": self._etag(stat),
+                "LastModified": datetime.fromtimestamp(stat.st_mtime, timezone.utc)}
+
+    def get_object(self, Bucket: str, Key: str, Range: Optional[str] = None, **kwargs) -> Dict:
+        self._count("GetObject")
+        stat = self._stat(Bucket, Key)
+        start, end = 0, stat.st_size - 1
+        if Range:
+            first, _, last = Range[len("bytes="):].partition("-")
+            start = int(first)
+            end = min(end, int(last)) if last else end
+        with open(self._path(Bucket, Key), "rb") as f:
+            f.seek(start)
+            data = f.read(max(0, end - start + 1))
+        if self.bytes_per_second:
+            time.sleep(len(data) / self.bytes_per_second)
+        response = {"Body": _Body(data), "ContentLength": len(data), "ETag": self._etag(stat)}
+        if Range:
+            response["ContentRange"] = f"bytes {start}-{end}/{stat.st_size}"
+        return response
+
+    def delete_object(self, Bucket: str, Key: str, **kwargs) -> Dict:
+        self._count("DeleteObject")
+        try:
+            os.remove(self._path(Bucket, Key))
+        except FileNotFoundError:
+            pass
+        return {}
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = "", ContinuationToken: Optional[str] = None,
+                        MaxKeys: int = 1000, StartAfter: str = "", Delimiter: str = "", **kwargs) -> Dict:
+        self._count("ListObjectsV2")
+        base = os.path.join(self.root, Bucket)
+        keys = []
+        for dirpath, dirnames, filenames in os.walk(base):
+            dirnames.sort()
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                key = os.path.relpath(os.path.join(dirpath, filename), base).replace(os.sep, "/")
+                if key.startswith(Prefix) and key > StartAfter:
+                    keys.append(key)
+        keys.sort()
+        # With a delimiter, keys sharing a prefix up to the next delimiter roll up into one CommonPrefix
+        entries: List[Tuple[str, bool]] = []
+        for key in keys:
+            rest = key[len(Prefix):]
+            if Delimiter and Delimiter in rest:
+                common = Prefix + rest[:rest.index(Delimiter) + len(Delimiter)]
+                if not entries or entries[-1] != (common, True):
+                    entries.append((common, True))
+            else:
+                entries.append((key, False))
+        start = int(ContinuationToken or 0)
+        page = entries[start:start + MaxKeys]
+        response = {"KeyCount": len(page), "Contents": []}
+        if Delimiter:
+            response["CommonPrefixes"] = [{"Prefix": key} for key, common in page if common]
+        for key, common in page:
+            if common:
+                continue
+            stat = os.stat(self._path(Bucket, key))
+            response["Contents"].append({"Key": key, "Size": stat.st_size, "ETag": self._etag(stat)})
+        if start + MaxKeys < len(entries):
+            response["NextContinuationToken"] = str(start + MaxKeys)
+        return response
+
+    def get_paginator(self, operation: str) -> _Paginator:
+        if operation != "list_objects_v2":
+            raise ValueError(f"No local paginator for {operation}")
+        return _Paginator(self.list_objects_v2, "ContinuationToken", "NextContinuationToken")
+
+
+def _athena_type(values: List) -> str:
+    sample = next((v for v in values if v is not None), None)
+    if isinstance(sample, bool):
+        return "boolean"
+    if isinstance(sample, int):
+        return "bigint"
+    if isinstance(sample, float):
+        return "double"
+    return "varchar"
+
+
+def _csv_field(value) -> str:
+    # Athena quotes every value and leaves NULL as an empty, unquoted field
+    if value is None:
+        return ""
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+class _Execution:
+    def __init__(self, execution_id: str, sql: str, workgroup: str, output: str):
+        self.id = execution_id
+        self.sql = sql
+        self.workgroup = workgroup
+        self.bucket, prefix = split_s3_uri(output)
+        self.key = f"{prefix.rstrip('/')}/{execution_id}.csv".lstrip("/")
+        self.state = "QUEUED"
+        self.reason = ""
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        self.completed: Optional[float] = None
+        self.scanned = 0
+        self.columns: List[Tuple[str, str]] = []
+        self.rows: List[Tuple] = []
+
+
+class LocalAthena:
+    """Athena client subset: queries run with query_engine.py in background threads
+
+    Each execution waits queue_seconds in QUEUED and at least run_seconds in
+    RUNNING, then writes its result CSV to the output location in the local S3
+    like Athena does. Starting a query while max_active are still queued or
+    running raises TooManyRequestsException, as the active-query quota does.
+    """
+
+    def __init__(self, table_root: str, s3: LocalS3, output_location: str = "s3://athena-results/query-results/",
+                 queue_seconds: float = 0.0, run_seconds: float = 0.0, max_active: int = DEFAULT_ACTIVE_QUERIES,
+                 request_latency: float = 0.0):
+        self.engine = QueryEngine(LocalTable(table_root))
+        self.s3 = s3
+        self.output_location = output_location
+        self.queue_seconds = queue_seconds
+        self.run_seconds = run_seconds
+        self.max_active = max_active
+        self.request_latency = request_latency
+        self.requests: Dict[str, int] = {}
+        self.peak_active = 0
+        self._executions: Dict[str, _Execution] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, operation: str):
+        with self._lock:
+            self.requests[operation] = self.requests.get(operation, 0) + 1
+        if self.request_latency:
+            time.sleep(self.request_latency)
+
+    def _get(self, execution_id: str, operation: str) -> _Execution:
+        execution = self._executions.get(execution_id)
+        if execution is None:
+            raise ClientError("InvalidRequestException", f"QueryExecution {execution_id} was not found", operation)
+        return execution
+
+    def start_query_execution(self, QueryString: str, QueryExecutionContext: Optional[Dict] = None,
+                              WorkGroup: str = "primary", ResultConfiguration: Optional[Dict] = None,
+                              **kwargs) -> Dict:
+        self._count("StartQueryExecution")
+        output = (ResultConfiguration or {}).get("OutputLocation") or self.output_location
+        with self._lock:
+            active = sum(e.state not in FINAL_STATES for e in self._executions.values())
+            if active >= self.max_active:
+                raise ClientError("TooManyRequestsException",
+                                  f"You have exceeded the limit for the number of queries you can run "
+                                  f"concurrently ({self.max_active})", "StartQueryExecution")
+            execution = _Execution(str(uuid.uuid4()), QueryString, WorkGroup, output)
+            self._executions[execution.id] = execution
+            self.peak_active = max(self.peak_active, active + 1)
+        threading.Thread(target=self._execute, args=(execution,), daemon=True).start()
+        return {"QueryExecutionId": execution.id}
+
+    def _execute(self, execution: _Execution):
+        time.sleep(self.queue_seconds)
+        execution.started = time.time()
+        execution.state = "RUNNING"
+        try:
+            result = self.engine.execute(execution.sql)
+            rows = [tuple(row) for row in result.rows]
+            execution.columns = [(name, _athena_type([row[i] for row in rows]))
+                                 for i, name in enumerate(result.columns)]
+            execution.rows = rows
+            execution.scanned = result.bytes_read
+            lines = [",".join(_csv_field(name) for name in result.columns)]
+            lines.extend(",".join(_csv_field(value) for value in row) for row in rows)
+            self.s3.put_object(Bucket=execution.bucket, Key=execution.key,
+                               Body=("\n".join(lines) + "\n").encode())
+            remaining = self.run_seconds - (time.time() - execution.started)
+            if remaining > 0:
+                time.sleep(remaining)
+            execution.state = "SUCCEEDED"
+        except Exception as e:
+            execution.reason = str(e)
+            execution.state = "FAILED"
+        execution.completed = time.time()
+
+    def get_query_execution(self, QueryExecutionId: str) -> Dict:
+        self._count("GetQueryExecution")
+        execution = self._get(QueryExecutionId, "GetQueryExecution")
+        now = time.time()
+        started = execution.started or now
+        completed = execution.completed or now
+        status = {"State": execution.state, "SubmissionDateTime": datetime.fromtimestamp(execution.submitted,
+                                                                                          timezone.utc)}
+        if execution.reason:
+            status["StateChangeReason"] = execution.reason
+        statistics = {
+            "QueryQueueTimeInMillis": int((started - execution.submitted) * 1000),
+            "EngineExecutionTimeInMillis": int((completed - started) * 1000) if execution.started else 0,
+            "TotalExecutionTimeInMillis": int((completed - execution.submitted) * 1000),
+            "DataScannedInBytes": execution.scanned,
+        }
+        return {"QueryExecution": {
+            "QueryExecutionId": execution.id,
+            "Query": execution.sql,
+            "WorkGroup": execution.workgroup,
+            "Status": status,
+            "Statistics": statistics,
+            "ResultConfiguration": {"OutputLocation": f"s3://{execution.bucket}/{execution.key}"},
+        }}
+
+    def stop_query_execution(self, QueryExecutionId: str) -> Dict:
+        self._count("StopQueryExecution")
+        execution = self._get(QueryExecutionId, "StopQueryExecution")
+        if execution.state not in FINAL_STATES:
+            execution.state = "CANCELLED"
+            execution.completed = time.time()
+        return {}
+
+    def get_query_results(self, QueryExecutionId: str, NextToken: Optional[str] = None,
+                          MaxResults: int = MAX_RESULTS_PER_PAGE) -> Dict:
+        self._count("GetQueryResults")
+        execution = self._get(QueryExecutionId, "GetQueryResults")
+        if execution.state != "SUCCEEDED":
+            raise ClientError("InvalidRequestException", f"Query has not yet finished. Current state: "
+                              f"{execution.state}", "GetQueryResults")
+        if not 0 < MaxResults <= MAX_RESULTS_PER_PAGE:
+            raise ClientError("InvalidRequestException", f"MaxResults must be 1-{MAX_RESULTS_PER_PAGE}",
+                              "GetQueryResults")
+        # Like Athena, the first page starts with a row holding the column names
+        header = [tuple(name for name, _ in execution.columns)]
+        start = int(NextToken or 0)
+        rows = list(itertools.islice(itertools.chain(header, execution.rows), start, start + MaxResults))
+        response = {"ResultSet": {
+            "Rows": [{"Data": [{} if value is None else {"VarCharValue": str(value)} for value in row]}
+                     for row in rows],
+            "ResultSetMetadata": {"ColumnInfo": [{"Name": name, "Label": name, "Type": kind}
+                                                 for name, kind in execution.columns]},
+        }}
+        if start + MaxResults < len(execution.rows) + 1:
+            response["NextToken"] = str(start + MaxResults)
+        return response
+
+    def get_paginator(self, operation: str) -> _Paginator:
+        if operation != "get_query_results":
+            raise ValueError(f"No local paginator for {operation}")
+        return _Paginator(self.get_query_results, "NextToken", "NextToken")
+
+    def wait(self, timeout: float = 30.0):
+        """Block until every execution reached a final state (test helper)"""
+        deadline = time.time() + timeout
+        while any(e.state not in FINAL_STATES for e in self._executions.values()):
+            if time.time() > deadline:
+                raise TimeoutError("Local Athena executions still running")
+            time.sleep(0.01)
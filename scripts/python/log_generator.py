@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Synthetic ALB Log Generator
+Writes realistic, reproducible ALB access logs into the AWSLogs/.../YYYY/MM/DD/
+layout, vectorized with numpy and parallel across processes
+"""
+
+import argparse
+import gzip
+import hashlib
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from common import require_numpy
+from log_layout import LOG_PREFIX, object_key
+
+# ALB writes one object per load balancer node every five minutes
+INTERVAL_MINUTES = 5
+
+# Lines generated and written per batch inside one object
+BATCH_LINES = 100_000
+
+# Mean uncompressed line length of generated entries, used to turn a size into a rate
+APPROX_LINE_BYTES = 640
+
+# Latencies up to this many milliseconds are formatted through a lookup table
+_LATENCY_TABLE_MS = 60_000
+
+# (status, weight, target status or None when the ELB answers itself)
+STATUS_MIX = [
+    (200, 0.830, 200), (201, 0.020, 201), (204, 0.010, 204), (301, 0.010, 301),
+    (302, 0.020, 302), (304, 0.030, 304), (400, 0.010, 400), (401, 0.010, 401),
+    (403, 0.005, 403), (404, 0.030, 404), (429, 0.005, 429), (500, 0.006, 500),
+    (502, 0.005, None), (503, 0.005, None), (504, 0.004, None),
+]
+
+# (type, weight); ws/wss always answer 101
+REQUEST_TYPES = [("https", 0.55), ("h2", 0.35), ("http", 0.07), ("wss", 0.02), ("ws", 0.01)]
+
+METHODS = [("GET", 0.80), ("POST", 0.12), ("PUT", 0.04), ("DELETE", 0.02), ("HEAD", 0.01), ("OPTIONS", 0.01)]
+
+USER_AGENTS = [
+    ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36", 0.35),
+    ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Safari/605.1.15", 0.20),
+    ("Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148", 0.15),
+    ("Mozilla/5.0 (Linux; Android 14) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Mobile Safari/537.36", 0.12),
+    ("okhttp/4.12.0", 0.08),
+    ("python-requests/2.31.0", 0.05),
+    ("curl/8.4.0", 0.03),
+    ("ELB-HealthChecker/2.0", 0.02),
+]
+
+# Path templates by target group; {id} is replaced with a per-path number
+TARGET_GROUPS = [
+    ("web", ["/", "/index.html", "/products/{id}", "/category/{id}", "/search", "/cart", "/checkout"], -6.2, 0.9),
+    ("api", ["/api/v1/users/{id}", "/api/v1/orders/{id}", "/api/v1/products/{id}", "/api/v1/session"], -4.8, 1.1),
+    ("static", ["/static/js/app.{id}.js", "/static/css/site.{id}.css", "/images/{id}.png"], -7.5, 0.6),
+]
+
+TLS_CIPHER = "ECDHE-RSA-AES128-GCM-SHA256"
+TLS_PROTOCOL = "TLSv1.2"
+
+
+@dataclass
+class GeneratorConfig:
+    """What to generate and where; the same config and seed always yield the same bytes"""
+    output_dir: str
+    start: datetime
+    days: int = 1
+    requests_per_second: float = 100.0
+    seed: int = 42
+    account: str = "123456789012"
+    region: str = "us-east-1"
+    load_balancer: str = "app/my-loadbalancer/50dc6c495c0c9188"
+    domain: str = "www.example.com"
+    nodes: int = 2
+    url_count: int = 10_000
+    zipf_exponent: float = 1.1
+    client_count: int = 50_000
+    diurnal_amplitude: float = 0.5
+    prefix: str = LOG_PREFIX
+    compress: bool = True
+    compress_level: int = 1
+    target_ips: Dict[str, List[str]] = field(default_factory=dict)
+
+    @property
+    def intervals_per_day(self) -> int:
+        return 24 * 60 // INTERVAL_MINUTES
+
+    def node_ip(self, node: int) -> str:
+        return f"52.78.12.{34 + node}"
+
+    def target_group_arn(self, name: str) -> str:
+        return (f"arn:aws:elasticloadbalancing:{self.region}:{self.account}:"
+                f"targetgroup/{name}-targets/{hashlib.sha1(f'{name}:{self.seed}'.encode()).hexdigest()[:16]}")
+
+
+@dataclass
+class GenerationResult:
+    """Totals across all generated objects"""
+    files: int = 0
+    lines: int = 0
+    raw_bytes: int = 0
+    file_bytes: int = 0
+    seconds: float = 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return round(self.raw_bytes / self.seconds / 1e6, 1) if self.seconds else 0.0
+
+
+class _Catalog:
+    """Seed-derived lookup tables shared by every object of one run"""
+
+    def __init__(self, config: GeneratorConfig):
+        np = require_numpy("log generation")
+        rng = np.random.default_rng([config.seed, 0])
+
+        # URL popularity follows a Zipf law over url_count paths spread across target groups
+        group_of_url = rng.integers(0, len(TARGET_GROUPS), config.url_count)
+        paths = []
+        for group in group_of_url.tolist():
+            templates = TARGET_GROUPS[group][1]
+            template = templates[int(rng.integers(0, len(templates)))]
+            paths.append(template.replace("{id}", str(int(rng.integers(1, 10 ** 6)))))
+        self.paths = np.array(paths, dtype=object)
+        self.url_group = group_of_url
+        ranks = np.arange(1, config.url_count + 1, dtype=np.float64)
+        self.url_cdf = np.cumsum(ranks ** -config.zipf_exponent)
+        self.url_cdf /= self.url_cdf[-1]
+
+        # Clients are skewed too: a few NAT gateways and crawlers send a lot of traffic
+        client_ints = rng.integers(0x0B000000, 0xDF000000, config.client_count)
+        self.clients = np.array([f"{v >> 24}.{v >> 16 & 255}.{v >> 8 & 255}.{v & 255}"
+                                 for v in client_ints.tolist()], dtype=object)
+        client_ranks = np.arange(1, config.client_count + 1, dtype=np.float64)
+        self.client_cdf = np.cumsum(client_ranks ** -0.8)
+        self.client_cdf /= self.client_cdf[-1]
+
+        self.targets = []
+        self.arns = []
+        for index, (name, _, _, _) in enumerate(TARGET_GROUPS):
+            ips = config.target_ips.get(name) or [f"10.0.{index}.{host}" for host in range(10, 18)]
+            self.targets.append(np.array([f"{ip}:80" for ip in ips], dtype=object))
+            self.arns.append(config.target_group_arn(name))
+
+        self.latency = np.array([f"{ms / 1000:.3f}" for ms in range(_LATENCY_TABLE_MS + 1)], dtype=object)
+        self.numbers = np.array([str(n) for n in range(65536)], dtype=object)
+
+    @staticmethod
+    def weights(choices) -> Tuple[List, object]:
+        np = require_numpy("log generation")
+        values = [c[0] for c in choices]
+        cdf = np.cumsum([c[1] for c in choices])
+        return values, cdf / cdf[-1]
+
+
+_CATALOGS: Dict[tuple, _Catalog] = {}
+
+
+def _catalog(config: GeneratorConfig) -> _Catalog:
+    key = (config.seed, config.url_count, config.zipf_exponent, config.client_count, config.region,
+           config.account, tuple(sorted((k, tuple(v)) for k, v in config.target_ips.items())))
+    if key not in _CATALOGS:
+        _CATALOGS[key] = _Catalog(config)
+    return _CATALOGS[key]
+
+
+def _format_latency(catalog: _Catalog, seconds) -> List[str]:
+    """Format non-negative latencies with three decimals; -1 stays "-1" like the ELB writes it"""
+    np = require_numpy("log generation")
+    ms = np.rint(seconds * 1000).astype(np.int64)
+    out = catalog.latency[np.clip(ms, 0, _LATENCY_TABLE_MS)]
+    slow = np.nonzero((ms > _LATENCY_TABLE_MS) | (ms < 0))[0]
+    for i in slow.tolist():
+        out[i] = "-1" if ms[i] < 0 else f"{ms[i] / 1000:.3f}"
+    return out.tolist()
+
+
+def interval_lines(config: GeneratorConfig, interval: int) -> int:
+    """Requests served in one five-minute interval, before splitting across nodes"""
+    hour = (interval * INTERVAL_MINUTES) / 60
+    # Traffic peaks mid-afternoon UTC and bottoms out before dawn
+    shape = 1 + config.diurnal_amplitude * math.sin((hour - 9) / 24 * 2 * math.pi)
+    return int(config.requests_per_second * INTERVAL_MINUTES * 60 * shape)
+
+
+def render_batch(config: GeneratorConfig, rng, start_us: int, end_us: int, count: int) -> bytes:
+    """Render count log lines with timestamps spread over [start_us, end_us)"""
+    np = require_numpy("log generation")
+    catalog = _catalog(config)
+
+    timestamps = np.sort(rng.integers(start_us, end_us, count)).astype("datetime64[us]")
+
+    url = np.searchsorted(catalog.url_cdf, rng.random(count))
+    group = catalog.url_group[url]
+
+    types, type_cdf = _Catalog.weights(REQUEST_TYPES)
+    request_type = np.searchsorted(type_cdf, rng.random(count))
+    websocket = request_type >= 3
+
+    statuses, status_cdf = _Catalog.weights(STATUS_MIX)
+    status_index = np.searchsorted(status_cdf, rng.random(count))
+    elb_status = np.array([s[0] for s in STATUS_MIX])[status_index]
+    elb_status[websocket] = 101
+    elb_only = np.array([s[2] is None for s in STATUS_MIX])[status_index] & ~websocket
+
+    # Latency: lognormal per target group, WebSocket connections stay open for seconds to minutes
+    mu = np.array([g[2] for g in TARGET_GROUPS])[group]
+    sigma = np.array([g[3] for g in TARGET_GROUPS])[group]
+    target_time = np.exp(mu + sigma * rng.standard_normal(count))
+    target_time[websocket] = rng.lognormal(3.0, 1.2, int(websocket.sum()))
+    target_time[elb_status >= 500] *= 8
+    target_time[elb_status == 504] = 60.0
+    request_time = rng.exponential(0.0004, count)
+    response_time = rng.exponential(0.0002, count)
+    for times in (target_time, request_time, response_time):
+        times[elb_only] = -1.0
+    timeouts = elb_status == 504
+    request_time[timeouts] = rng.exponential(0.0004, int(timeouts.sum()))
+    target_time[timeouts] = -1.0
+    response_time[timeouts] = -1.0
+
+    received = rng.integers(80, 900, count)
+    sent = np.where(elb_status < 300, rng.lognormal(8.5, 1.5, count).astype(np.int64), rng.integers(0, 600, count))
+
+    methods, method_cdf = _Catalog.weights(METHODS)
+    method = np.array(methods, dtype=object)[np.searchsorted(method_cdf, rng.random(count))]
+    method[websocket] = "GET"
+    agents, agent_cdf = _Catalog.weights(USER_AGENTS)
+    agent = np.array(agents, dtype=object)[np.searchsorted(agent_cdf, rng.random(count))]
+
+    client = catalog.clients[np.searchsorted(catalog.client_cdf, rng.random(count))]
+    client_port = catalog.numbers[rng.integers(1024, 65536, count)]
+    tls = np.array([t in ("https", "h2", "wss") for t in types])[request_type]
+
+    target = np.empty(count, dtype=object)
+    target_status = np.empty(count, dtype=object)
+    arn = np.empty(count, dtype=object)
+    for index in range(len(TARGET_GROUPS)):
+        mask = group == index
+        target[mask] = catalog.targets[index][rng.integers(0, len(catalog.targets[index]), int(mask.sum()))]
+        arn[mask] = catalog.arns[index]
+    target_status[:] = catalog.numbers[elb_status]
+    target[elb_only] = "-"
+    target_status[elb_only | timeouts] = "-"
+
+    trace_hex = rng.bytes(12 * count).hex()
+    traces = [trace_hex[i:i + 24] for i in range(0, 24 * count, 24)]
+    epoch = [format(second, "08x") for second in (timestamps.astype(np.int64) // 1_000_000).tolist()]
+    created = (timestamps - np.rint(np.clip(request_time + np.maximum(target_time, 0), 0, None) * 1e6)
+               .astype("timedelta64[us]"))
+
+    # Per-request TLS, scheme and protocol fragments are chosen vectorized, so the
+    # per-line work below is a single % substitution
+    cert = f'"arn:aws:acm:{config.region}:{config.account}:certificate/5f1e0b2c-0000-4000-8000-000000000001"'
+    tls_fields = np.where(tls, f"{TLS_CIPHER} {TLS_PROTOCOL}", "- -").astype(object)
+    cert_field = np.where(tls, cert, '"-"').astype(object)
+    origin = np.where(tls, f"https://{config.domain}:443", f"http://{config.domain}:80").astype(object)
+    protocol = np.where(request_type == 1, "HTTP/2.0", "HTTP/1.1").astype(object)
+
+    template = (f'%s %sZ {config.load_balancer} %s:%s %s %s %s %s %s %s %s %s "%s %s%s %s" "%s" %s %s '
+                f'"Root=1-%s-%s" "{config.domain}" %s 0 %sZ "forward" "-" "-" "%s" "%s" "-" "-"')
+    rows = zip(
+        np.array(types, dtype=object)[request_type].tolist(),
+        np.datetime_as_string(timestamps, unit="us").tolist(),
+        client.tolist(), client_port.tolist(), target.tolist(),
+        _format_latency(catalog, request_time), _format_latency(catalog, target_time),
+        _format_latency(catalog, response_time),
+        catalog.numbers[elb_status].tolist(), target_status.tolist(), catalog.numbers[received].tolist(),
+        list(map(str, sent.tolist())),
+        method.tolist(), origin.tolist(), catalog.paths[url].tolist(), protocol.tolist(),
+        agent.tolist(), tls_fields.tolist(), arn.tolist(), epoch, traces, cert_field.tolist(),
+        np.datetime_as_string(created, unit="us").tolist(), target.tolist(), target_status.tolist(),
+    )
+    return ("\n".join(map(template.__mod__, rows)) + "\n").encode()
+
+
+def generate_object(config: GeneratorConfig, day: int, interval: int, node: int) -> Tuple[str, int, int, int]:
+    """Write the object one node delivers for one interval; returns (key, lines, raw bytes, file bytes)"""
+    np = require_numpy("log generation")
+    rng = np.random.default_rng([config.seed, 1, day, interval, node])
+
+    interval_start = config.start + timedelta(days=day, minutes=interval * INTERVAL_MINUTES)
+    interval_end = interval_start + timedelta(minutes=INTERVAL_MINUTES)
+    total = interval_lines(config, interval)
+    count = total // config.nodes + (1 if node < total % config.nodes else 0)
+
+    suffix = "".join(chr(c) for c in rng.choice(np.frombuffer(b"abcdefghijklmnopqrstuvwxyz0123456789", np.uint8), 8))
+    key = object_key(config.account, config.region, config.load_balancer.replace("/", "."), interval_end,
+                     config.node_ip(node), suffix, prefix=config.prefix, compressed=config.compress)
+    path = os.path.join(config.output_dir, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    epoch = datetime(1970, 1, 1)
+    start_us = int((interval_start - epoch).total_seconds() * 1_000_000)
+    span_us = INTERVAL_MINUTES * 60 * 1_000_000
+    batches = max(1, math.ceil(count / BATCH_LINES))
+
+    raw = 0
+    tmp_path = path + ".tmp"
+    opener = (gzip.open(tmp_path, "wb", compresslevel=config.compress_level) if config.compress
+              else open(tmp_path, "wb"))
+    with opener as out:
+        for batch in range(batches):
+            lines = count * (batch + 1) // batches - count * batch // batches
+            # Consecutive batches cover consecutive slices of the interval so the object stays time-ordered
+            data = render_batch(config, rng, start_us + span_us * batch // batches,
+                                start_us + span_us * (batch + 1) // batches, lines)
+            out.write(data)
+            raw += len(data)
+    os.replace(tmp_path, path)
+    return key, count, raw, os.path.getsize(path)
+
+
+def _generate_day_slice(config: GeneratorConfig, tasks: List[Tuple[int, int, int]]) -> Tuple[int, int, int, int]:
+    files = lines = raw = size = 0
+    for day, interval, node in tasks:
+        _, count, raw_bytes, file_bytes = generate_object(config, day, interval, node)
+        files += 1
+        lines += count
+        raw += raw_bytes
+        size += file_bytes
+    return files, lines, raw, size
+
+
+def generate(config: GeneratorConfig, workers: Optional[int] = None) -> GenerationResult:
+    """Generate every object for config.days days, spreading objects across worker processes"""
+    require_numpy("log generation")
+    start = time.perf_counter()
+    tasks = [(day, interval, node)
+             for day in range(config.days)
+             for interval in range(config.intervals_per_day)
+             for node in range(config.nodes)]
+
+    workers = workers or os.cpu_count() or 1
+    # Strided slices keep busy and quiet hours evenly spread across workers
+    slices = [tasks[i::workers] for i in range(min(workers, len(tasks)))]
+    if len(slices) == 1:
+        totals = [_generate_day_slice(config, slices[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=len(slices)) as pool:
+            totals = list(pool.map(_generate_day_slice, [config] * len(slices), slices))
+
+    result = GenerationResult(seconds=round(time.perf_counter() - start, 3))
+    for files, lines, raw, size in totals:
+        result.files += files
+        result.lines += lines
+        result.raw_bytes += raw
+        result.file_bytes += size
+    return result
+
+
+def rate_for_size(size_bytes: int, days: int) -> float:
+    """Requests per second that produce roughly size_bytes of uncompressed logs"""
+    return size_bytes / APPROX_LINE_BYTES / (days * 86400)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Generate synthetic ALB access logs in the AWSLogs layout")
+    parser.add_argument("output_dir", help="Root directory to write the AWSLogs tree into")
+    parser.add_argument("--start", type=lambda s: datetime.strptime(s, "%Y-%m-%d"),
+                        default=datetime(2024, 12, 16), help="First day (YYYY-MM-DD)")
+    parser.add_argument("--days", type=int, default=1, help="Number of days to generate")
+    rate = parser.add_mutually_exclusive_group()
+    rate.add_argument("--rate", type=float, default=100.0, help="Average requests per second")
+    rate.add_argument("--size-gb", type=float, help="Target uncompressed size instead of a rate")
+    parser.add_argument("--nodes", type=int, default=2, help="Load balancer nodes (objects per interval)")
+    parser.add_argument("--urls", type=int, default=10_000, help="Distinct request paths")
+    parser.add_argument("--zipf", type=float, default=1.1, help="URL popularity skew")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--no-gzip", action="store_true", help="Write plain .log objects")
+    parser.add_argument("--compress-level", type=int, default=1, help="gzip level (1-9)")
+
+    args = parser.parse_args()
+
+    config = GeneratorConfig(
+        output_dir=args.output_dir,
+        start=args.start,
+        days=args.days,
+        requests_per_second=rate_for_size(int(args.size_gb * 1024 ** 3), args.days) if args.size_gb else args.rate,
+        seed=args.seed,
+        nodes=args.nodes,
+        url_count=args.urls,
+        zipf_exponent=args.zipf,
+        compress=not args.no_gzip,
+        compress_level=args.compress_level,
+    )
+
+    print(f"Generating {config.days} day(s) at {config.requests_per_second:,.0f} req/s "
+          f"({config.nodes} nodes, seed {config.seed})...")
+    result = generate(config, args.workers)
+    print(f"Wrote {result.files:,} objects, {result.lines:,} lines")
+    print(f"  Uncompressed: {result.raw_bytes / 1e9:.2f} GB; on disk: {result.file_bytes / 1e9:.2f} GB")
+    print(f"  Time: {result.seconds:.1f}s ({result.mb_per_second} MB/s uncompressed)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
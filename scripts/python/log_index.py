@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+ALB Log Lookup Index
+Writes a sidecar per log object (Bloom filters on high-cardinality columns,
+min/max on time and latencies) and uses them to list exactly the objects a
+point lookup such as one trace_id has to scan
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from alb_log_parser import iter_column_batches
+from common import read_varint, write_varint
+from log_layout import Partition, parse_key
+from parquet_converter import group_by_partition
+from sketches import DEFAULT_FALSE_POSITIVE_RATE, BloomFilter
+
+BLOOM_COLUMNS = ["trace_id", "client_ip", "target_group_arn"]
+RANGE_COLUMNS = ["time", "request_processing_time", "target_processing_time", "response_processing_time"]
+
+# X-Ray trace ids (Root=1-<epoch hex>-<id>) generated by the ALB carry the second
+# it received the request; the logged time is when the response completed, at
+# most the 4000s maximum idle timeout later. A client or upstream proxy may send
+# its own Root= with any epoch, so lookups only trust it when asked to.
+TRACE_SLACK_SECONDS = 4000
+
+SIDECAR_SUFFIX = ".idx"
+_MAGIC = b"ALBI\x01"
+
+
+@dataclass
+class FileIndex:
+    """Sidecar contents for one log object"""
+    path: str
+    size: int
+    mtime_ns: int
+    rows: int
+    ranges: Dict[str, List] = field(default_factory=dict)
+    blooms: Dict[str, BloomFilter] = field(default_factory=dict)
+
+    def is_current(self, path: str) -> bool:
+        stat = os.stat(path)
+        return (self.size, self.mtime_ns) == (stat.st_size, stat.st_mtime_ns)
+
+    def may_match(self, lookup: "Lookup") -> bool:
+        """False only when the object certainly holds no matching row"""
+        for column, value in lookup.equalities().items():
+            if value not in self.blooms[column]:
+                return False
+        if not self.rows:
+            return False
+        low, high = lookup.time_window()
+        span = self.ranges["time"]
+        if (low is not None and span[1] < low) or (high is not None and span[0] >= high):
+            return False
+        latency = self.ranges.get("target_processing_time")
+        if lookup.min_latency is not None and (latency is None or latency[1] < lookup.min_latency):
+            return False
+        return True
+
+    def to_bytes(self) -> bytes:
+        header = {
+            "path": self.path, "size": self.size, "mtime_ns": self.mtime_ns, "rows": self.rows,
+            "ranges": self.ranges, "blooms": list(self.blooms),
+        }
+        encoded = json.dumps(header, separators=(",", ":")).encode()
+        out = bytearray(_MAGIC)
+        write_varint(out, len(encoded))
+        out += encoded
+        for bloom in self.blooms.values():
+            data = bloom.to_bytes()
+            write_varint(out, len(data))
+            out += data
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "FileIndex":
+        if not data.startswith(_MAGIC):
+            raise ValueError("Not a log index sidecar")
+        size, pos = read_varint(data, len(_MAGIC))
+        header = json.loads(data[pos:pos + size])
+        pos += size
+        blooms = {}
+        for column in header["blooms"]:
+            size, pos = read_varint(data, pos)
+            blooms[column] = BloomFilter.from_bytes(data[pos:pos + size])
+            pos += size
+        return cls(header["path"], header["size"], header["mtime_ns"], header["rows"], header["ranges"], blooms)
+
+
+@dataclass
+class Lookup:
+    """Point lookup: every criterion given must hold for a row to match
+
+    start and end bound the logged time (ISO-8601, end exclusive);
+    min_latency is a lower bound on target_processing_time in seconds.
+    trust_trace_time narrows the search to the window after the epoch in
+    trace_id, which is only safe for trace ids the ALB generated itself.
+    """
+    trace_id: Optional[str] = None
+    client_ip: Optional[str] = None
+    target_group_arn: Optional[str] = None
+    start: Optional[str] = None
+    end: Optional[str] = None
+    min_latency: Optional[float] = None
+    trust_trace_time: bool = False
+
+    def __post_init__(self):
+        if self.trace_id and not self.trace_id.startswith("Root="):
+            self.trace_id = f"Root={self.trace_id}"
+
+    def equalities(self) -> Dict[str, str]:
+        return {column: getattr(self, column) for column in BLOOM_COLUMNS if getattr(self, column)}
+
+    def time_window(self) -> Tuple[Optional[str], Optional[str]]:
+        """[low, high) on the time column, narrowed by the trace id's timestamp when trusted"""
+        low, high = self.start, self.end
+        received = trace_time(self.trace_id) if self.trace_id and self.trust_trace_time else None
+        if received is not None:
+            trace_low = f"{received:%Y-%m-%dT%H:%M:%S}"
+            trace_high = f"{received + timedelta(seconds=TRACE_SLACK_SECONDS + 1):%Y-%m-%dT%H:%M:%S}"
+            low = max(low, trace_low) if low else trace_low
+            high = min(high, trace_high) if high else trace_high
+        return low, high
+
+    def matches(self, row: Dict[str, object]) -> bool:
+        if any(row[column] != value for column, value in self.equalities().items()):
+            return False
+        if self.start and (row["time"] or "") < self.start:
+            return False
+        if self.end and (row["time"] or "") >= self.end:
+            return False
+        latency = row["target_processing_time"]
+        return self.min_latency is None or (latency is not None and latency >= self.min_latency)
+
+
+@dataclass
+class IndexResult:
+    """Outcome of indexing one partition"""
+    partition: str
+    files: int
+    indexed: int
+    rows: int
+    bytes_out: int
+    seconds: float
+
+
+@dataclass
+class LookupResult:
+    """Objects to scan for a lookup, and how many sidecars it took to decide"""
+    files: List[str]
+    sidecars_read: int
+    total_files: int
+    seconds: float
+
+
+def trace_time(trace_id: str) -> Optional[datetime]:
+    """When the ALB received a request, from its Root=1-<epoch hex>-<id> trace id"""
+    parts = trace_id.split("Root=", 1)[-1].split("-")
+    if len(parts) < 3 or len(parts[1]) != 8:
+        return None
+    try:
+        return datetime(1970, 1, 1) + timedelta(seconds=int(parts[1], 16))
+    except ValueError:
+        return None
+
+
+def index_file(path: str, false_positive_rate: float = DEFAULT_FALSE_POSITIVE_RATE) -> FileIndex:
+    """Read one log object and summarize it"""
+    stat = os.stat(path)
+    distinct: Dict[str, set] = {column: set() for column in BLOOM_COLUMNS}
+    ranges: Dict[str, List] = {}
+    rows = 0
+    for batch in iter_column_batches(path, BLOOM_COLUMNS + RANGE_COLUMNS):
+        rows += len(batch["time"])
+        for column in BLOOM_COLUMNS:
+            distinct[column].update(batch[column])
+        for column in RANGE_COLUMNS:
+            values = [v for v in batch[column] if v is not None]
+            if values:
+                low, high = min(values), max(values)
+                if column in ranges:
+                    low, high = min(low, ranges[column][0]), max(high, ranges[column][1])
+                ranges[column] = [low, high]
+
+    blooms = {}
+    for column, values in distinct.items():
+        values.discard(None)
+        bloom = BloomFilter.for_capacity(len(values), false_positive_rate)
+        bloom.update(values)
+        blooms[column] = bloom
+    return FileIndex(os.path.abspath(path), stat.st_size, stat.st_mtime_ns, rows, ranges, blooms)
+
+
+def _write_sidecar(path: str, index: FileIndex) -> int:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        f.write(index.to_bytes())
+    os.replace(path + ".tmp", path)
+    return os.path.getsize(path)
+
+
+def index_partition(partition: Partition, files: List[Tuple[str, str]],
+                    false_positive_rate: float = DEFAULT_FALSE_POSITIVE_RATE) -> IndexResult:
+    """Write sidecars for (log path, sidecar path) pairs of one partition"""
+    start = time.perf_counter()
+    rows = bytes_out = 0
+    for path, sidecar in files:
+        index = index_file(path, false_positive_rate)
+        bytes_out += _write_sidecar(sidecar, index)
+        rows += index.rows
+    return IndexResult("/".join(partition), len(files), len(files), rows, bytes_out,
+                       round(time.perf_counter() - start, 3))
+
+
+def _load(path: str) -> Optional[FileIndex]:
+    try:
+        with open(path, "rb") as f:
+            return FileIndex.from_bytes(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+class LogIndex:
+    """Sidecars under root, mirroring the AWSLogs layout of the indexed tree"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def sidecar_path(self, log_root: str, path: str) -> str:
+        return os.path.join(self.root, os.path.relpath(path, log_root) + SIDECAR_SUFFIX)
+
+    def build(self, log_root: str, workers: int = 1,
+              false_positive_rate: float = DEFAULT_FALSE_POSITIVE_RATE) -> List[IndexResult]:
+        """Index new or changed objects and drop sidecars of objects no longer live"""
+        results: List[IndexResult] = []
+        pending: Dict[Partition, List[Tuple[str, str]]] = {}
+        live = set()
+        for partition, files in group_by_partition(log_root).items():
+            stale = []
+            for path in files:
+                sidecar = self.sidecar_path(log_root, path)
+                live.add(os.path.abspath(sidecar))
+                existing = _load(sidecar)
+                if existing is None or not existing.is_current(path):
+                    stale.append((path, sidecar))
+            if stale:
+                pending[partition] = stale
+            else:
+                results.append(IndexResult("/".join(partition), len(files), 0, 0, 0, 0.0))
+
+        # Objects merged away by compaction.py or deleted leave orphaned sidecars
+        for sidecar in list(self._iter_sidecars()):
+            if os.path.abspath(sidecar) not in live:
+                os.remove(sidecar)
+
+        args = [(p, files, false_positive_rate) for p, files in pending.items()]
+        if workers == 1 or len(args) <= 1:
+            done = [index_partition(*a) for a in args]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(args))) as pool:
+                done = [f.result() for f in as_completed([pool.submit(index_partition, *a) for a in args])]
+        return sorted(results + done, key=lambda r: r.partition)
+
+    def _iter_sidecars(self, low_day: Optional[str] = None, high_day: Optional[str] = None) -> Iterator[str]:
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if not filename.endswith(SIDECAR_SUFFIX):
+                    continue
+                path = os.path.join(dirpath, filename)
+                obj = parse_key(path[:-len(SIDECAR_SUFFIX)])
+                day = "/".join(obj.partition) if obj else None
+                if day and ((low_day and day < low_day) or (high_day and day > high_day)):
+                    continue
+                yield path
+
+    def lookup(self, lookup: Lookup) -> LookupResult:
+        """Log objects that may hold rows matching lookup; never misses one that does
+
+        Days outside the lookup's time window are skipped without reading their
+        sidecars; objects straddling midnight sit in the next day's directory,
+        so one extra day is kept on each side.
+        """
+        began = time.perf_counter()
+        low, high = lookup.time_window()
+        low_day = (datetime.fromisoformat(low[:10]) - timedelta(days=1)).strftime("%Y/%m/%d") if low else None
+        high_day = (datetime.fromisoformat(high[:10]) + timedelta(days=1)).strftime("%Y/%m/%d") if high else None
+
+        total = sum(1 for _ in self._iter_sidecars())
+        files = []
+        read = 0
+        for sidecar in self._iter_sidecars(low_day, high_day):
+            index = _load(sidecar)
+            read += 1
+            if index is not None and index.may_match(lookup):
+                files.append(index.path)
+        return LookupResult(files, read, total, round(time.perf_counter() - began, 4))
+
+
+def scan(files: List[str], lookup: Lookup, columns: Optional[List[str]] = None) -> Iterator[Dict[str, object]]:
+    """Rows of files that match lookup exactly"""
+    needed = BLOOM_COLUMNS + RANGE_COLUMNS
+    columns = columns or needed
+    read = needed + [c for c in columns if c not in needed]
+    for path in files:
+        for batch in iter_column_batches(path, read):
+            for values in zip(*(batch[c] for c in read)):
+                row = dict(zip(read, values))
+                if lookup.matches(row):
+                    yield {column: row[column] for column in columns}
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Bloom filter and min/max sidecars for ALB log point lookups")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    build = subparsers.add_parser("build", help="Index new or changed log objects")
+    build.add_argument("source", help="Local directory containing an AWSLogs/ tree")
+    build.add_argument("index", help="Sidecar output directory")
+    build.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Partitions in parallel")
+    build.add_argument("--fpp", type=float, default=DEFAULT_FALSE_POSITIVE_RATE,
+                       help="Bloom filter false positive rate")
+
+    find = subparsers.add_parser("lookup", help="List the log objects a lookup has to scan")
+    find.add_argument("index", help="Sidecar directory")
+    for column in BLOOM_COLUMNS:
+        find.add_argument(f"--{column.replace('_', '-')}", dest=column)
+    find.add_argument("--start", help="Logged time lower bound (ISO-8601, UTC)")
+    find.add_argument("--end", help="Logged time upper bound, exclusive")
+    find.add_argument("--min-latency", type=float, help="target_processing_time at least this many seconds")
+    find.add_argument("--trust-trace-time", action="store_true",
+                      help="Only search the hour after the epoch in --trace-id (ALB-generated ids only)")
+    find.add_argument("--scan", action="store_true", help="Also scan the listed objects and print matching rows")
+    find.add_argument("--json", action="store_true", help="Print the object list as JSON")
+
+    args = parser.parse_args()
+
+    if args.action == "build":
+        for r in LogIndex(args.index).build(args.source, args.workers, args.fpp):
+            status = (f"{r.indexed} of {r.files} objects indexed, {r.rows:,} rows -> {r.bytes_out:,} bytes "
+                      f"in {r.seconds:.2f}s") if r.indexed else "unchanged"
+            print(f"  {r.partition}: {status}")
+        return 0
+
+    lookup = Lookup(args.trace_id, args.client_ip, args.target_group_arn, args.start, args.end, args.min_latency,
+                    args.trust_trace_time)
+    if not (lookup.equalities() or lookup.start or lookup.end or lookup.min_latency is not None):
+        parser.error("lookup needs at least one criterion")
+    result = LogIndex(args.index).lookup(lookup)
+    if args.json:
+        print(json.dumps(vars(result), indent=2))
+    else:
+        for path in result.files:
+            print(path)
+        print(f"\n{len(result.files)} of {result.total_files} objects to scan "
+              f"({result.sidecars_read} sidecars read in {result.seconds * 1000:.1f} ms)")
+
+    if args.scan:
+        rows = list(scan(result.files, lookup, ["time", "client_ip", "elb_status_code",
+                                                "target_processing_time", "request_url", "trace_id"]))
+        for row in rows:
+            print("  " + " ".join(str(value) for value in row.values()))
+        print(f"{len(rows)} matching rows")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+ALB Log Layout Helpers
+Maps between ALB access log object keys and year/month/day partitions
+"""
+
+import json
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+# Prefix the ALB writes under in the logs bucket (see glue.tf s3_target)
+LOG_PREFIX = "alb-logs"
+
+# AWSLogs/<account>/elasticloadbalancing/<region>/YYYY/MM/DD/<file>
+KEY_RE = re.compile(
+    r"AWSLogs/(?P<account>\d{12})/elasticloadbalancing/(?P<region>[a-z0-9-]+)/"
+    r"(?P<year>\d{4})/(?P<month>\d{2})/(?P<day>\d{2})/(?P<filename>[^/]+)$"
+)
+
+# <account>_elasticloadbalancing_<region>_<lb-id>_<YYYYMMDDTHHMMZ>_<ip>_<random>.log[.gz]
+FILENAME_RE = re.compile(
+    r"^(?P<account>\d{12})_elasticloadbalancing_(?P<region>[a-z0-9-]+)_(?P<load_balancer>.+)_"
+    r"(?P<timestamp>\d{8}T\d{4}Z)_(?P<ip>[0-9a-fA-F.:]+)_(?P<suffix>[^_.]+)\.log(?:\.gz)?$"
+)
+
+# Written into a day directory by compaction.py; lists which objects are live
+MANIFEST_FILE = "_compaction.json"
+
+# File name suffix of compacted objects, which are only live once a manifest lists them
+COMPACTED_SUFFIX = "compacted"
+
+# (year, month, day) as zero-padded strings, matching the Athena partition values
+Partition = Tuple[str, str, str]
+
+
+@dataclass(frozen=True)
+class LogObject:
+    """A single ALB log object located in the AWSLogs tree"""
+    key: str
+    account: str
+    region: str
+    year: str
+    month: str
+    day: str
+    filename: str
+    load_balancer: Optional[str] = None
+    hour: Optional[str] = None
+    minute: Optional[str] = None
+
+    @property
+    def partition(self) -> Partition:
+        return (self.year, self.month, self.day)
+
+
+def parse_key(key: str) -> Optional[LogObject]:
+    """Parse an object key or local path; returns None if it is not an ALB log object"""
+    normalized = key.replace(os.sep, "/")
+    match = KEY_RE.search(normalized)
+    if not match:
+        return None
+
+    filename = match.group("filename")
+    name_match = FILENAME_RE.match(filename)
+    load_balancer = hour = minute = None
+    if name_match:
+        load_balancer = name_match.group("load_balancer")
+        hour = name_match.group("timestamp")[9:11]
+        minute = name_match.group("timestamp")[11:13]
+
+    return LogObject(
+        key=key,
+        account=match.group("account"),
+        region=match.group("region"),
+        year=match.group("year"),
+        month=match.group("month"),
+        day=match.group("day"),
+        filename=filename,
+        load_balancer=load_balancer,
+        hour=hour,
+        minute=minute,
+    )
+
+
+def partition_prefix(account: str, region: str, year: str, month: str, day: str,
+                     prefix: str = LOG_PREFIX) -> str:
+    """Key prefix holding one day of logs, e.g. alb-logs/AWSLogs/.../2024/12/16/"""
+    base = f"AWSLogs/{account}/elasticloadbalancing/{region}/{year}/{month}/{day}/"
+    return f"{prefix}/{base}" if prefix else base
+
+
+def object_key(account: str, region: str, load_balancer: str, timestamp: datetime,
+               ip: str, suffix: str, prefix: str = LOG_PREFIX, compressed: bool = True) -> str:
+    """Build the key the ALB would write for a log interval ending at timestamp"""
+    directory = partition_prefix(account, region, f"{timestamp:%Y}", f"{timestamp:%m}",
+                                 f"{timestamp:%d}", prefix)
+    filename = (f"{account}_elasticloadbalancing_{region}_{load_balancer}_"
+                f"{timestamp:%Y%m%dT%H%MZ}_{ip}_{suffix}.log")
+    return directory + filename + (".gz" if compressed else "")
+
+
+def is_compacted(filename: str) -> bool:
+    return f"_{COMPACTED_SUFFIX}" in filename
+
+
+def read_manifest(directory: str) -> Optional[dict]:
+    """The compaction manifest of a day directory, or None if it was never compacted"""
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def live_filenames(directory: str, filenames: List[str]) -> List[str]:
+    """Drop objects a compaction superseded and compacted objects not yet committed
+
+    The manifest is replaced atomically, so a reader sees either the original
+    small objects or the compacted ones, never both and never a partial set.
+    """
+    manifest = read_manifest(directory) if MANIFEST_FILE in filenames else None
+    live = set(manifest["files"]) if manifest else set()
+    superseded = set(manifest["superseded"]) if manifest else set()
+    return [f for f in filenames
+            if f in live or (f not in superseded and not is_compacted(f))]
+
+
+def iter_log_objects(root: str) -> Iterator[LogObject]:
+    """Walk a local AWSLogs tree in sorted order, yielding live log objects by local path
+
+    Like Athena, directories starting with '_' or '.' (superseded objects,
+    staging areas) are skipped.
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith(("_", ".")))
+        for filename in sorted(live_filenames(dirpath, filenames)):
+            if not (filename.endswith(".log") or filename.endswith(".log.gz")):
+                continue
+            obj = parse_key(os.path.join(dirpath, filename))
+            if obj is not None:
+                yield obj
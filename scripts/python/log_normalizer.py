@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+"""
+Cross-Cloud Log Normalizer
+Maps AWS ALB access logs, GCP load balancer logs (rows of the BigQuery
+lb_access_logs schema) and Azure Application Gateway access logs into one
+columnar schema in a single streaming pass, converting types a batch at a time
+"""
+
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import instrumentation
+from alb_log_parser import DEFAULT_CHUNK_SIZE, iter_blocks, iter_column_batches, open_log
+from common import require_pyarrow
+from instrumentation import span
+from latency_sketches import target_group_name
+from sketches import DDSketch
+
+PROVIDERS = ("aws", "gcp", "azure")
+
+# (name, Athena type) pairs of the unified schema. Names follow the BigQuery
+# lb_access_logs table; latencies are seconds and NULL where they do not apply.
+UNIFIED_COLUMNS: List[Tuple[str, str]] = [
+    ("provider", "string"),
+    ("timestamp", "string"),
+    ("client_ip", "string"),
+    ("client_port", "int"),
+    ("backend_ip", "string"),
+    ("backend_port", "int"),
+    ("backend_group", "string"),
+    ("request_processing_time", "double"),
+    ("backend_processing_time", "double"),
+    ("response_processing_time", "double"),
+    ("total_time", "double"),
+    ("lb_status_code", "int"),
+    ("backend_status_code", "int"),
+    ("received_bytes", "bigint"),
+    ("sent_bytes", "bigint"),
+    ("request_method", "string"),
+    ("request_url", "string"),
+    ("request_protocol", "string"),
+    ("user_agent", "string"),
+]
+UNIFIED_NAMES = [name for name, _ in UNIFIED_COLUMNS]
+
+# Unified column -> ALB access log column it is read from
+ALB_SOURCES = {
+    "timestamp": "time",
+    "client_ip": "client_ip",
+    "client_port": "client_port",
+    "backend_ip": "target_ip",
+    "backend_port": "target_port",
+    "backend_group": "target_group_arn",
+    "request_processing_time": "request_processing_time",
+    "backend_processing_time": "target_processing_time",
+    "response_processing_time": "response_processing_time",
+    "lb_status_code": "elb_status_code",
+    "backend_status_code": "target_status_code",
+    "received_bytes": "received_bytes",
+    "sent_bytes": "sent_bytes",
+    "request_method": "request_verb",
+    "request_url": "request_url",
+    "request_protocol": "request_proto",
+    "user_agent": "user_agent",
+}
+
+# Columns of the BigQuery lb_access_logs table (bigquery.tf), i.e. the GCP rows
+GCP_COLUMNS = [name for name in UNIFIED_NAMES if name not in ("provider", "backend_group", "total_time")]
+
+LATENCY_COLUMNS = ["request_processing_time", "backend_processing_time", "response_processing_time"]
+
+# Rows per batch when a file is one JSON document rather than JSON lines
+DOCUMENT_BATCH_ROWS = 10000
+
+_TIMESTAMP_RE = re.compile(r"(\d{4}-\d\d-\d\d)[T ](\d\d:\d\d:\d\d)(?:\.(\d+))?\s*(Z|UTC|[+-]\d\d:?\d\d)?$")
+
+
+def _timestamp(value) -> Optional[str]:
+    """One timestamp (ISO 8601 text, BigQuery text or epoch seconds) as ALB-style UTC text"""
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    match = _TIMESTAMP_RE.match(value.strip())
+    if not match:
+        raise ValueError(f"Unrecognized timestamp: {value!r}")
+    day, clock, fraction, zone = match.groups()
+    fraction = (fraction or "").ljust(6, "0")[:6]
+    if zone and zone not in ("Z", "UTC", "+00:00", "+0000", "-00:00", "-0000"):
+        parsed = datetime.fromisoformat(f"{day}T{clock}.{fraction}{zone}").astimezone(timezone.utc)
+        return parsed.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    return f"{day}T{clock}.{fraction}Z"
+
+
+def _timestamps(values: List) -> List[Optional[str]]:
+    """Batch version of _timestamp; values already in the ALB format pass through untouched"""
+    return [v if (v.__class__ is str and len(v) == 27 and v[10] == "T" and v[26] == "Z")
+            else None if v is None or v == "" else _timestamp(v) for v in values]
+
+
+def _ints(values: List) -> List[Optional[int]]:
+    return [None if v is None or v == "" or v == "-" else int(v) for v in values]
+
+
+def _floats(values: List) -> List[Optional[float]]:
+    return [None if v is None or v == "" or v == "-" else float(v) for v in values]
+
+
+def _latencies(values: List) -> List[Optional[float]]:
+    """Seconds as floats; negative values (ALB's -1 for "not applicable") become NULL"""
+    converted = _floats(values)
+    return [None if v is not None and v < 0 else v for v in converted]
+
+
+def _texts(values: List) -> List[Optional[str]]:
+    return [None if v is None or v == "" or v == "-" else str(v) for v in values]
+
+
+def _totals(request: List, backend: List, response: List) -> List[Optional[float]]:
+    """Load balancer time per request: the three phases summed when all were measured"""
+    return [a + b + c if a is not None and b is not None and c is not None else None
+            for a, b, c in zip(request, backend, response)]
+
+
+def _host_ports(values: List) -> Tuple[List[Optional[str]], List[Optional[int]]]:
+    """Split "host:port" values"""
+    hosts, ports = [], []
+    for value in values:
+        if not value or value == "-":
+            hosts.append(None)
+            ports.append(None)
+            continue
+        host, sep, port = str(value).rpartition(":")
+        hosts.append(host if sep else str(value))
+        ports.append(int(port) if sep and port.isdigit() else None)
+    return hosts, ports
+
+
+def _aws_batches(path: str, chunk_size: int) -> Iterator[Dict[str, list]]:
+    columns = sorted(set(ALB_SOURCES.values()))
+    groups: Dict[Optional[str], str] = {}
+    for batch in iter_column_batches(path, columns, chunk_size=chunk_size):
+        out = {name: batch[source] for name, source in ALB_SOURCES.items()}
+        for name in LATENCY_COLUMNS:
+            out[name] = _latencies(out[name])
+        names = []
+        for arn in out["backend_group"]:
+            name = groups.get(arn)
+            if name is None:
+                name = groups[arn] = target_group_name(arn)
+            names.append(None if name == "-" else name)
+        out["backend_group"] = names
+        out["total_time"] = _totals(*(out[name] for name in LATENCY_COLUMNS))
+        yield out
+
+
+def _json_records(path: str, chunk_size: int) -> Iterator[List[dict]]:
+    """Lists of JSON objects from JSON lines, or from one {"records": [...]} document"""
+    with open_log(path) as stream:
+        first = stream.read(chunk_size).split(b"\n", 1)[0].strip()
+        stream.seek(0)
+        try:
+            json.loads(first) if first else None
+        except ValueError:
+            # A pretty-printed document (e.g. an Azure diagnostics blob): bounded per hourly blob
+            document = json.loads(stream.read())
+            records = document.get("records", []) if isinstance(document, dict) else document
+            for start in range(0, len(records), DOCUMENT_BATCH_ROWS):
+                yield records[start:start + DOCUMENT_BATCH_ROWS]
+            return
+        for _, lines in iter_blocks(stream, chunk_size):
+            # One parse per block instead of one per line
+            records = json.loads(b"[" + b",".join(lines) + b"]")
+            if any("records" in r for r in records):
+                records = [item for r in records for item in (r["records"] if "records" in r else [r])]
+            yield records
+
+
+def _gcp_batches(path: str, chunk_size: int) -> Iterator[Dict[str, list]]:
+    for records in _json_records(path, chunk_size):
+        raw = {name: [r.get(name) for r in records] for name in GCP_COLUMNS}
+        out = {
+            "timestamp": _timestamps(raw["timestamp"]),
+            "backend_group": [None] * len(records),
+        }
+        for name, kind in UNIFIED_COLUMNS:
+            if name not in raw or name == "timestamp":
+                continue
+            if name in LATENCY_COLUMNS:
+                out[name] = _latencies(raw[name])
+            elif kind in ("int", "bigint"):
+                out[name] = _ints(raw[name])
+            else:
+                out[name] = _texts(raw[name])
+        out["total_time"] = _totals(*(out[name] for name in LATENCY_COLUMNS))
+        yield out
+
+
+def _azure_batches(path: str, chunk_size: int) -> Iterator[Dict[str, list]]:
+    for records in _json_records(path, chunk_size):
+        properties = [r.get("properties") or {} for r in records]
+        properties = [json.loads(p) if isinstance(p, str) else p for p in properties]
+
+        def field(name: str) -> list:
+            return [p.get(name) for p in properties]
+
+        backend_ip, backend_port = _host_ports(field("serverRouted"))
+        hosts = field("host")
+        uris = [p.get("originalRequestUriWithArgs") or p.get("requestUri") for p in properties]
+        schemes = ["https" if ssl == "on" else "http" for ssl in field("sslEnabled")]
+        yield {
+            "timestamp": _timestamps([r.get("time") or r.get("timeStamp") for r in records]),
+            "client_ip": _texts(field("clientIP")),
+            "client_port": _ints(field("clientPort")),
+            "backend_ip": backend_ip,
+            "backend_port": backend_port,
+            "backend_group": _texts(field("backendPoolName")),
+            # Application Gateway reports the backend's latency and the end-to-end time only
+            "request_processing_time": [None] * len(records),
+            "backend_processing_time": _latencies(field("serverResponseLatency")),
+            "response_processing_time": [None] * len(records),
+            "total_time": _latencies(field("timeTaken")),
+            "lb_status_code": _ints(field("httpStatus")),
+            "backend_status_code": _ints(field("serverStatus")),
+            "received_bytes": _ints(field("receivedBytes")),
+            "sent_bytes": _ints(field("sentBytes")),
+            "request_method": _texts(field("httpMethod")),
+            "request_url": [f"{scheme}://{host}{uri or ''}" if host else uri
+                            for scheme, host, uri in zip(schemes, hosts, uris)],
+            "request_protocol": _texts(field("httpVersion")),
+            "user_agent": _texts(field("userAgent")),
+        }
+
+
+_READERS = {"aws": _aws_batches, "gcp": _gcp_batches, "azure": _azure_batches}
+
+
+@dataclass
+class NormalizeStats:
+    """Input volume and rate of one provider's normalized logs"""
+    provider: str
+    files: int = 0
+    bytes: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes / self.seconds / 1024 ** 2 if self.seconds else 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def log_files(path: str) -> List[str]:
+    """A file, or every log file under a directory in name order"""
+    if os.path.isfile(path):
+        return [path]
+    found = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        found.extend(os.path.join(dirpath, f) for f in sorted(filenames)
+                     if not f.startswith(".") and not f.endswith(".tmp"))
+    return sorted(found)
+
+
+def normalize(provider: str, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+              stats: Optional[NormalizeStats] = None) -> Iterator[Dict[str, list]]:
+    """Yield unified {column: values} batches from one provider's log file or directory"""
+    if provider not in _READERS:
+        raise ValueError(f"Unknown provider {provider!r}; expected one of {', '.join(PROVIDERS)}")
+    read = _READERS[provider]
+    for file in log_files(path):
+        if stats is not None:
+            stats.files += 1
+            stats.bytes += os.path.getsize(file)
+        batches = read(file, chunk_size)
+        while True:
+            start = time.perf_counter()
+            batch = next(batches, None)
+            if batch is None:
+                break
+            rows = len(batch["timestamp"])
+            batch["provider"] = [provider] * rows
+            batch = {name: batch[name] for name in UNIFIED_NAMES}
+            if stats is not None:
+                stats.rows += rows
+                stats.seconds += time.perf_counter() - start
+            yield batch
+
+
+def normalize_sources(sources: Iterable[Tuple[str, str]], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                      stats: Optional[Dict[str, NormalizeStats]] = None) -> Iterator[Dict[str, list]]:
+    """One stream of unified batches over (provider, path) sources"""
+    for provider, path in sources:
+        provider_stats = None
+        if stats is not None:
+            provider_stats = stats.setdefault(provider, NormalizeStats(provider))
+        with span(f"normalize {provider}", "io", path=path):
+            yield from normalize(provider, path, chunk_size, provider_stats)
+
+
+def alb_view(batch: Dict[str, list]) -> Dict[str, list]:
+    """A unified batch under ALB column names, for the rollup and sketch builders (no copies)"""
+    return {source: batch[name] for name, source in ALB_SOURCES.items()}
+
+
+def write_parquet(batches: Iterable[Dict[str, list]], path: str, compression: str = "zstd") -> int:
+    """Stream unified batches into one Parquet file (one row group per batch); returns rows written"""
+    pa, pq = require_pyarrow()
+    types = {"string": pa.string(), "int": pa.int32(), "bigint": pa.int64(), "double": pa.float64()}
+    schema = pa.schema([pa.field(name, types[kind]) for name, kind in UNIFIED_COLUMNS])
+    rows = 0
+    tmp = path + ".tmp"
+    with pq.ParquetWriter(tmp, schema, compression=compression) as writer:
+        for batch in batches:
+            writer.write_batch(pa.RecordBatch.from_pydict(batch, schema=schema))
+            rows += len(batch["timestamp"])
+    os.replace(tmp, path)
+    return rows
+
+
+def _gcp_rows(batch: Dict[str, list]) -> Iterator[dict]:
+    for i, stamp in enumerate(batch["timestamp"]):
+        row = {name: batch[name][i] for name in GCP_COLUMNS if batch[name][i] is not None}
+        if stamp:
+            # BigQuery's JSON export spelling
+            row["timestamp"] = f"{stamp[:10]} {stamp[11:26]} UTC"
+        yield row
+
+
+def _azure_rows(batch: Dict[str, list]) -> Iterator[dict]:
+    for i, stamp in enumerate(batch["timestamp"]):
+        url = urlsplit(batch["request_url"][i] or "")
+        backend = batch["backend_ip"][i]
+        latency = batch["backend_processing_time"][i]
+        total = batch["total_time"][i]
+        yield {
+            "time": f"{stamp[:26]}0Z" if stamp else None,
+            "category": "ApplicationGatewayAccessLog",
+            "operationName": "ApplicationGatewayAccess",
+            "properties": {
+                "clientIP": batch["client_ip"][i],
+                "clientPort": batch["client_port"][i],
+                "httpMethod": batch["request_method"][i],
+                "originalRequestUriWithArgs": url.path + (f"?{url.query}" if url.query else ""),
+                "host": url.netloc,
+                "sslEnabled": "on" if url.scheme == "https" else "off",
+                "httpVersion": batch["request_protocol"][i],
+                "userAgent": batch["user_agent"][i],
+                "httpStatus": batch["lb_status_code"][i],
+                "receivedBytes": batch["received_bytes"][i],
+                "sentBytes": batch["sent_bytes"][i],
+                "timeTaken": total,
+                "serverRouted": f"{backend}:{batch['backend_port'][i]}" if backend else "",
+                "serverStatus": str(batch["backend_status_code"][i] or "-"),
+                "serverResponseLatency": "-" if latency is None else f"{latency:.3f}",
+                "backendPoolName": batch["backend_group"][i],
+            },
+        }
+
+
+def export(batches: Iterable[Dict[str, list]], provider: str, path: str) -> int:
+    """Write unified batches in a provider's native format (JSON lines, gzip for .gz); returns rows
+
+    Used to build GCP and Azure fixtures and benchmark inputs from generated ALB logs.
+    """
+    rows_of = {"gcp": _gcp_rows, "azure": _azure_rows}.get(provider)
+    if rows_of is None:
+        raise ValueError(f"Cannot export to {provider!r}; expected gcp or azure")
+    rows = 0
+    tmp = path + ".tmp"
+    with (gzip.open(tmp, "wt", compresslevel=1) if path.endswith(".gz") else open(tmp, "w")) as out:
+        for batch in batches:
+            for row in rows_of(batch):
+                out.write(json.dumps(row, separators=(",", ":")) + "\n")
+                rows += 1
+    os.replace(tmp, path)
+    return rows
+
+
+class ProviderSummary:
+    """Requests, 5xx share and total-time percentiles per provider, fed batch by batch"""
+
+    def __init__(self):
+        self.requests: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.sketches: Dict[str, DDSketch] = {}
+
+    def add(self, batch: Dict[str, list]):
+        if not batch["provider"]:
+            return
+        provider = batch["provider"][0]
+        self.requests[provider] = self.requests.get(provider, 0) + len(batch["provider"])
+        self.errors[provider] = self.errors.get(provider, 0) + sum(
+            1 for status in batch["lb_status_code"] if status is not None and status >= 500)
+        sketch = self.sketches.get(provider)
+        if sketch is None:
+            sketch = self.sketches[provider] = DDSketch()
+        sketch.add_many([v for v in batch["total_time"] if v is not None])
+
+    def to_dict(self) -> Dict[str, Dict[str, object]]:
+        summary = {}
+        for provider, requests in self.requests.items():
+            entry = {"requests": requests, "error_rate": round(self.errors[provider] / requests, 4)}
+            for q in (0.5, 0.99):
+                value = self.sketches[provider].quantile(q)
+                entry[f"p{int(q * 100)}_seconds"] = round(value, 4) if value is not None else None
+            summary[provider] = entry
+        return summary
+
+
+def benchmark(rate: float = 5.0, days: int = 1, chunk_size: int = DEFAULT_CHUNK_SIZE,
+              work_dir: Optional[str] = None) -> List[NormalizeStats]:
+    """Normalize the same generated requests from each provider's format and time every pass"""
+    from log_generator import GeneratorConfig, generate
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as scratch:
+        logs = os.path.join(scratch, "aws")
+        generate(GeneratorConfig(logs, datetime(2024, 12, 16), days=days, requests_per_second=rate), workers=1)
+        sources = [("aws", logs)]
+        for provider in ("gcp", "azure"):
+            path = os.path.join(scratch, f"{provider}.json.gz")
+            export(normalize("aws", logs, chunk_size), provider, path)
+            sources.append((provider, path))
+
+        results = []
+        for provider, path in sources:
+            stats = NormalizeStats(provider)
+            for _ in normalize_sources([(provider, path)], chunk_size, {provider: stats}):
+                pass
+            results.append(stats)
+        return results
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Normalize AWS, GCP and Azure load balancer logs into one schema")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("normalize", help="Normalize logs into one stream (optionally Parquet)")
+    for provider in PROVIDERS:
+        run.add_argument(f"--{provider}", action="append", default=[], metavar="PATH",
+                         help=f"{provider.upper()} log file or directory (repeatable)")
+    run.add_argument("--parquet", help="Write the unified rows to this Parquet file")
+    run.add_argument("--rows", type=int, default=0, help="Print this many unified rows as JSON lines")
+
+    convert = sub.add_parser("export", help="Rewrite ALB logs in another provider's format (for fixtures)")
+    convert.add_argument("source", help="ALB log file or AWSLogs directory")
+    convert.add_argument("provider", choices=["gcp", "azure"], help="Target format")
+    convert.add_argument("output", help="Output JSON lines file (.gz to compress)")
+
+    bench = sub.add_parser("benchmark", help="Per-provider normalization throughput on generated logs")
+    bench.add_argument("--rate", type=float, default=5.0, help="Generated requests per second of logs")
+    bench.add_argument("--days", type=int, default=1, help="Days of generated logs")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.session("log_normalizer", args.trace, args.profile):
+        try:
+            if args.command == "benchmark":
+                print(f"{'Provider':<10} {'MB':>8} {'Rows':>10} {'Seconds':>9} {'MB/s':>8} {'Rows/s':>10}")
+                for stats in benchmark(args.rate, args.days):
+                    print(f"{stats.provider:<10} {stats.bytes / 1024 ** 2:>8.2f} {stats.rows:>10} "
+                          f"{stats.seconds:>9.2f} {stats.mb_per_second:>8.2f} {stats.rows_per_second:>10.0f}")
+                return 0
+
+            if args.command == "export":
+                rows = export(normalize("aws", args.source), args.provider, args.output)
+                print(f"Wrote {rows} rows to {args.output}")
+                return 0
+
+            sources = [(provider, path) for provider in PROVIDERS for path in getattr(args, provider)]
+            if not sources:
+                parser.error("pass at least one of --aws, --gcp, --azure")
+            stats: Dict[str, NormalizeStats] = {}
+            summary = ProviderSummary()
+            printed = 0
+
+            def observed() -> Iterator[Dict[str, list]]:
+                # Summary and output share the one pass over the logs
+                for batch in normalize_sources(sources, stats=stats):
+                    summary.add(batch)
+                    yield batch
+
+            if args.parquet:
+                write_parquet(observed(), args.parquet)
+            else:
+                for batch in observed():
+                    for i in range(min(args.rows - printed, len(batch["timestamp"]))):
+                        print(json.dumps({name: batch[name][i] for name in UNIFIED_NAMES}))
+                        printed += 1
+        except (RuntimeError, ValueError) as e:
+            print(f"Error: {e}")
+            return 1
+
+    print(f"{'Provider':<10} {'Rows':>10} {'MB/s':>8} {'5xx':>7} {'p50 s':>8} {'p99 s':>8}")
+    for provider, entry in summary.to_dict().items():
+        print(f"{provider:<10} {entry['requests']:>10} {stats[provider].mb_per_second:>8.1f} "
+              f"{entry['error_rate']:>7.2%} {entry['p50_seconds'] or 0:>8.3f} {entry['p99_seconds'] or 0:>8.3f}")
+    if args.parquet:
+        print(f"Wrote {args.parquet}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,542 @@
+#!/usr/bin/env python3
+"""
+Log Tail
+Follows a local (or S3-mirrored) AWSLogs tree, parsing new objects and appended
+lines incrementally from checkpointed offsets into sliding-window aggregates:
+5xx rate, p99 target processing time and top client IPs
+"""
+
+import argparse
+import base64
+import calendar
+import gzip
+import io
+import json
+import math
+import os
+import re
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import instrumentation
+from alb_log_parser import DEFAULT_CHUNK_SIZE, ALBLogParseError, is_gzip, iter_column_batches
+from instrumentation import span
+from local_aws import split_s3_uri
+from log_generator import INTERVAL_MINUTES
+from log_layout import LogObject, iter_log_objects, parse_key
+from sketches import DDSketch, SpaceSaving
+
+DEFAULT_WINDOW_SECONDS = 300
+DEFAULT_BUCKET_SECONDS = 10
+# ALB delivers each node's log every 5 minutes, so rows can arrive this far behind the newest
+DEFAULT_LATENESS_SECONDS = INTERVAL_MINUTES * 60
+DEFAULT_CLIENT_CAPACITY = 1000
+DEFAULT_TOP_CLIENTS = 10
+DEFAULT_POLL_SECONDS = 5.0
+DEFAULT_CHECKPOINT_SECONDS = 10.0
+CHECKPOINT_VERSION = 1
+
+_COLUMNS = ["time", "elb_status_code", "target_processing_time", "client_ip"]
+_REGION_PREFIX_RE = re.compile(r"elasticloadbalancing/[a-z0-9-]+/$")
+
+
+def _epoch(stamp: str) -> int:
+    """Whole seconds of an ALB timestamp (2024-12-16T00:05:01.123456Z)"""
+    return calendar.timegm(time.strptime(stamp[:19], "%Y-%m-%dT%H:%M:%S"))
+
+
+def _iso(seconds: float) -> str:
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def object_end(obj: LogObject) -> int:
+    """Epoch seconds at which an object's delivery interval ends (end of its day if unknown)"""
+    day = calendar.timegm((int(obj.year), int(obj.month), int(obj.day), 0, 0, 0))
+    if obj.hour is None:
+        return day + 86400
+    return day + int(obj.hour) * 3600 + int(obj.minute) * 60
+
+
+class _Bucket:
+    """Aggregates of the rows whose timestamps fall in one bucket_seconds slice"""
+
+    __slots__ = ("requests", "errors", "latency", "clients")
+
+    def __init__(self, client_capacity: int):
+        self.requests = 0
+        self.errors = 0
+        self.latency = DDSketch()
+        self.clients = SpaceSaving(client_capacity)
+
+    def to_dict(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency": base64.b64encode(self.latency.to_bytes()).decode("ascii"),
+            "clients": [[key, *counter] for key, counter in self.clients.counters.items()],
+            "clients_total": self.clients.total,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, client_capacity: int) -> "_Bucket":
+        bucket = cls(client_capacity)
+        bucket.requests = data["requests"]
+        bucket.errors = data["errors"]
+        bucket.latency = DDSketch.from_bytes(base64.b64decode(data["latency"]))
+        bucket.clients.counters = {key: list(counter) for key, *counter in data["clients"]}
+        bucket.clients.total = data["clients_total"]
+        return bucket
+
+
+@dataclass
+class WindowSnapshot:
+    """Aggregates over the window ending at the newest row seen"""
+    start: str
+    end: str
+    requests: int
+    errors: int
+    p99_target_seconds: Optional[float]
+    top_clients: List[Tuple[str, int]] = field(default_factory=list)
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.requests if self.requests else 0.0
+
+
+class SlidingWindow:
+    """Event-time sliding window over fixed buckets, with bounded state
+
+    Rows are bucketed by their own timestamps. The window is the
+    window_seconds ending at the newest bucket seen; buckets are kept for
+    lateness_seconds longer so rows from objects delivered late still count,
+    and anything older is dropped (counted in .late). State is at most
+    (window + lateness) / bucket buckets, each a DDSketch and a SpaceSaving
+    summary of client_capacity counters.
+    """
+
+    def __init__(self, window_seconds: int = DEFAULT_WINDOW_SECONDS, bucket_seconds: int = DEFAULT_BUCKET_SECONDS,
+                 lateness_seconds: int = DEFAULT_LATENESS_SECONDS, client_capacity: int = DEFAULT_CLIENT_CAPACITY):
+        if window_seconds % bucket_seconds:
+            raise ValueError("window_seconds must be a multiple of bucket_seconds")
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.lateness_seconds = lateness_seconds
+        self.client_capacity = client_capacity
+        self.buckets: Dict[int, _Bucket] = {}
+        self.newest: Optional[int] = None
+        self.late = 0
+        self._minutes: Dict[str, int] = {}
+
+    @property
+    def kept_buckets(self) -> int:
+        return (self.window_seconds + self.lateness_seconds + self.bucket_seconds - 1) // self.bucket_seconds
+
+    def add_batch(self, times: List[Optional[str]], statuses: List[Optional[int]],
+                  latencies: List[Optional[float]], clients: List[Optional[str]]) -> int:
+        """Fold one column batch in; returns the rows counted (late and untimed rows are not)"""
+        minutes = self._minutes
+        if len(minutes) > 4096:
+            minutes.clear()
+        width = self.bucket_seconds
+        groups: Dict[int, list] = {}
+        for stamp, status, latency, client in zip(times, statuses, latencies, clients):
+            if not stamp:
+                continue
+            base = minutes.get(stamp[:16])
+            if base is None:
+                base = minutes[stamp[:16]] = _epoch(stamp[:16] + ":00")
+            index = (base + int(stamp[17:19])) // width
+            group = groups.get(index)
+            if group is None:
+                group = groups[index] = [0, 0, [], {}]
+            group[0] += 1
+            if status is not None and status >= 500:
+                group[1] += 1
+            if latency is not None and latency >= 0:
+                group[2].append(latency)
+            counts = group[3]
+            counts[client] = counts.get(client, 0) + 1
+
+        if groups:
+            newest = max(groups)
+            if self.newest is None or newest > self.newest:
+                self.newest = newest
+                self._evict()
+        added = 0
+        oldest = self.newest - self.kept_buckets + 1 if self.newest is not None else None
+        for index, (requests, errors, values, counts) in groups.items():
+            if index < oldest:
+                self.late += requests
+                continue
+            bucket = self.buckets.get(index)
+            if bucket is None:
+                bucket = self.buckets[index] = _Bucket(self.client_capacity)
+            bucket.requests += requests
+            bucket.errors += errors
+            bucket.latency.add_many(values)
+            bucket.clients.update({key: [count, 0, 0.0, 0, -math.inf] for key, count in counts.items()})
+            added += requests
+        return added
+
+    def _evict(self):
+        oldest = self.newest - self.kept_buckets + 1
+        for index in [i for i in self.buckets if i < oldest]:
+            del self.buckets[index]
+
+    def snapshot(self, top: int = DEFAULT_TOP_CLIENTS) -> Optional[WindowSnapshot]:
+        """Merged aggregates of the buckets inside the window, or None before any row"""
+        if self.newest is None:
+            return None
+        first = self.newest - self.window_seconds // self.bucket_seconds + 1
+        requests = errors = 0
+        latency = DDSketch()
+        clients = SpaceSaving(self.client_capacity)
+        for index, bucket in self.buckets.items():
+            if index >= first:
+                requests += bucket.requests
+                errors += bucket.errors
+                latency.merge(bucket.latency)
+                clients.merge(bucket.clients)
+        p99 = latency.quantile(0.99)
+        return WindowSnapshot(
+            _iso(first * self.bucket_seconds), _iso((self.newest + 1) * self.bucket_seconds), requests, errors,
+            round(p99, 4) if p99 is not None else None,
+            [(key, int(counter[0])) for key, counter in
+             sorted(clients.counters.items(), key=lambda item: (-item[1][0], str(item[0])))[:top]],
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            "window_seconds": self.window_seconds,
+            "bucket_seconds": self.bucket_seconds,
+            "newest": self.newest,
+            "late": self.late,
+            "buckets": {str(index): bucket.to_dict() for index, bucket in self.buckets.items()},
+        }
+
+    def restore(self, data: Dict):
+        """Load buckets saved by to_dict (ignored if the bucket size changed)"""
+        if data.get("bucket_seconds") != self.bucket_seconds:
+            return
+        self.newest = data["newest"]
+        self.late = data["late"]
+        self.buckets = {int(index): _Bucket.from_dict(bucket, self.client_capacity)
+                        for index, bucket in data["buckets"].items()}
+        if self.newest is not None:
+            self._evict()
+
+
+@dataclass
+class TailStats:
+    """Work done by the tailer since it started (or was restored)"""
+    objects: int = 0
+    bytes: int = 0
+    rows: int = 0
+    malformed: int = 0
+    truncated: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+class Tailer:
+    """Incrementally folds a log tree into a SlidingWindow, checkpointing offsets and window state
+
+    Each file's checkpoint is the offset (decompressed, for gzip) just past the
+    last complete line folded into the window. Window and offsets are saved
+    together in one atomic write, so after a restart every line is counted
+    exactly once. Plain .log files may still be growing: a trailing partial
+    line is left for the next poll. Objects that ended before the retained
+    window are skipped, and their entries pruned, so the checkpoint stays
+    bounded as the tree grows.
+    """
+
+    def __init__(self, root: str, checkpoint: Optional[str] = None, window: Optional[SlidingWindow] = None,
+                 since: Optional[float] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 checkpoint_seconds: float = DEFAULT_CHECKPOINT_SECONDS):
+        self.root = root
+        self.checkpoint_path = checkpoint
+        self.window = window or SlidingWindow()
+        self.since = since
+        self.chunk_size = chunk_size
+        self.checkpoint_seconds = checkpoint_seconds
+        self.offsets: Dict[str, List[int]] = {}  # relative path -> [offset, size when finished or -1]
+        self.stats = TailStats()
+        self._last_checkpoint = time.monotonic()
+        if checkpoint and os.path.exists(checkpoint):
+            self._load()
+
+    def _load(self):
+        with open(self.checkpoint_path) as f:
+            state = json.load(f)
+        if state.get("version") != CHECKPOINT_VERSION:
+            return
+        self.since = state["since"] if self.since is None else max(self.since, state["since"])
+        self.offsets = {path: list(entry) for path, entry in state["files"].items()}
+        self.window.restore(state["window"])
+
+    def save(self):
+        """Write offsets and window state atomically"""
+        if not self.checkpoint_path:
+            return
+        state = {
+            "version": CHECKPOINT_VERSION,
+            "root": os.path.abspath(self.root),
+            "since": self.since,
+            "files": self.offsets,
+            "window": self.window.to_dict(),
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(self.checkpoint_path)), exist_ok=True)
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f, separators=(",", ":"))
+        os.replace(tmp, self.checkpoint_path)
+        self._last_checkpoint = time.monotonic()
+
+    def _retained_since(self) -> Optional[float]:
+        """Objects ending before this cannot hold rows the window still keeps"""
+        if self.window.newest is None:
+            return self.since
+        kept = self.window.kept_buckets * self.window.bucket_seconds
+        cutoff = (self.window.newest + 1) * self.window.bucket_seconds - kept - INTERVAL_MINUTES * 60
+        return max(cutoff, self.since) if self.since is not None else cutoff
+
+    def _fold(self, data: bytes) -> int:
+        """Parse complete lines into the window; returns rows read"""
+        try:
+            batches = list(iter_column_batches(io.BytesIO(data), _COLUMNS, chunk_size=len(data) + 1))
+        except ALBLogParseError:
+            batches = []
+            for line in data.split(b"\n"):
+                if line.strip():
+                    try:
+                        batches.extend(iter_column_batches(io.BytesIO(line), _COLUMNS))
+                    except ALBLogParseError:
+                        self.stats.malformed += 1
+        rows = 0
+        for batch in batches:
+            self.window.add_batch(*(batch[c] for c in _COLUMNS))
+            rows += len(batch["time"])
+        return rows
+
+    def _read(self, path: str, entry: List[int]) -> int:
+        """Fold everything after entry's offset; advances the offset past complete lines only
+
+        A gzip object that ends early is still being copied: the lines read so
+        far are kept and the entry stays unfinished for the next poll.
+        """
+        compressed = is_gzip(path)
+        rows = 0
+        opener = gzip.open if compressed else open
+        try:
+            with opener(path, "rb") as stream:
+                stream.seek(entry[0])
+                tail = b""
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    data = tail + chunk
+                    cut = data.rfind(b"\n") + 1
+                    tail = data[cut:]
+                    if cut:
+                        rows += self._fold(data[:cut])
+                        entry[0] += cut
+                        self.stats.bytes += cut
+                    if time.monotonic() - self._last_checkpoint >= self.checkpoint_seconds:
+                        self.save()
+                if compressed:
+                    # A delivered object is complete: its last line needs no newline
+                    if tail.strip():
+                        rows += self._fold(tail)
+                    entry[0] += len(tail)
+                    self.stats.bytes += len(tail)
+                    entry[1] = os.path.getsize(path)
+        except (EOFError, gzip.BadGzipFile):
+            self.stats.truncated += 1
+        return rows
+
+    def poll(self) -> int:
+        """Fold whatever is new under root; returns rows read"""
+        start = time.perf_counter()
+        objects = list(iter_log_objects(self.root))
+        if self.since is None and objects:
+            # First run: backfill just the retained window before the newest object
+            window = self.window
+            self.since = max(object_end(o) for o in objects) - window.window_seconds - window.lateness_seconds \
+                - INTERVAL_MINUTES * 60
+
+        rows = 0
+        since = self._retained_since()
+        for obj in objects:
+            relative = os.path.relpath(obj.key, self.root)
+            entry = self.offsets.get(relative)
+            if entry is None:
+                if since is not None and object_end(obj) < since:
+                    continue
+                entry = self.offsets[relative] = [0, -1]
+            elif entry[1] >= 0:
+                continue  # a finished gzip object
+            elif entry[0] >= os.path.getsize(obj.key) and not is_gzip(obj.key):
+                continue  # nothing appended
+            with span("tail object", "io", path=relative):
+                rows += self._read(obj.key, entry)
+            self.stats.objects += 1
+
+        since = self._retained_since()
+        if since is not None:
+            self.since = since
+            ends = {os.path.relpath(o.key, self.root): object_end(o) for o in objects}
+            for relative in [p for p in self.offsets if ends.get(p, 0) < since]:
+                del self.offsets[relative]
+        self.stats.rows += rows
+        self.stats.seconds += time.perf_counter() - start
+        if rows:
+            self.save()
+        return rows
+
+    def follow(self, interval: float = DEFAULT_POLL_SECONDS, report: Optional[Callable[["Tailer"], None]] = None,
+               polls: Optional[int] = None, before_poll: Optional[Callable[[], None]] = None):
+        """Poll every interval seconds until interrupted (or for polls rounds), then checkpoint"""
+        done = 0
+        try:
+            while polls is None or done < polls:
+                if before_poll:
+                    before_poll()
+                self.poll()
+                if report:
+                    report(self)
+                done += 1
+                if polls is None or done < polls:
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.save()
+
+
+class S3Mirror:
+    """Copies new ALB log objects under an s3:// prefix into a local tree for the tailer
+
+    Objects are immutable once delivered, so a key already mirrored at the
+    same size is skipped. When the prefix ends at the region level, listing
+    starts at the oldest day still retained instead of the first key.
+    """
+
+    def __init__(self, client, uri: str, root: str):
+        self.client = client
+        self.bucket, self.prefix = split_s3_uri(uri)
+        self.root = root
+        self.downloaded = 0
+
+    def sync(self, since: Optional[float] = None) -> int:
+        """Download objects ending at or after since; returns how many were copied"""
+        params = {"Bucket": self.bucket, "Prefix": self.prefix}
+        if since is not None and _REGION_PREFIX_RE.search(self.prefix):
+            params["StartAfter"] = self.prefix + datetime.fromtimestamp(since, timezone.utc).strftime("%Y/%m/%d/")
+        copied = 0
+        for page in self.client.get_paginator("list_objects_v2").paginate(**params):
+            for item in page.get("Contents", []):
+                obj = parse_key(item["Key"])
+                if obj is None or (since is not None and object_end(obj) < since):
+                    continue
+                path = os.path.join(self.root, *item["Key"].split("/"))
+                if os.path.exists(path) and os.path.getsize(path) == item["Size"]:
+                    continue
+                body = self.client.get_object(Bucket=self.bucket, Key=item["Key"])["Body"].read()
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path + ".tmp", "wb") as f:
+                    f.write(body)
+                os.replace(path + ".tmp", path)
+                copied += 1
+        self.downloaded += copied
+        return copied
+
+
+def print_snapshot(tailer: Tailer, as_json: bool = False):
+    """One report line for the current window"""
+    snapshot = tailer.window.snapshot()
+    if snapshot is None:
+        return
+    if as_json:
+        print(json.dumps({**snapshot.__dict__, "error_rate": round(snapshot.error_rate, 4),
+                          "late": tailer.window.late, "rows_per_second": round(tailer.stats.rows_per_second)}))
+        return
+    clients = ", ".join(f"{ip} ({count})" for ip, count in snapshot.top_clients[:3])
+    p99 = f"{snapshot.p99_target_seconds:.3f}s" if snapshot.p99_target_seconds is not None else "-"
+    print(f"{snapshot.start} .. {snapshot.end}  {snapshot.requests:>8} req  5xx {snapshot.error_rate:6.2%}  "
+          f"p99 {p99:>8}  top {clients}")
+
+
+def benchmark(rate: float = 50.0, hours: int = 1, work_dir: Optional[str] = None) -> TailStats:
+    """Time one catch-up poll over freshly generated logs (single process)"""
+    from log_generator import GeneratorConfig, generate
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as scratch:
+        logs = os.path.join(scratch, "logs")
+        generate(GeneratorConfig(logs, datetime(2024, 12, 16), days=1, requests_per_second=rate), workers=1)
+        # Fold only the last hours of the day, as a tailer catching up would
+        tailer = Tailer(logs, since=calendar.timegm((2024, 12, 17, 0, 0, 0)) - hours * 3600,
+                        window=SlidingWindow(lateness_seconds=hours * 3600))
+        tailer.poll()
+        return tailer.stats
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Follow an ALB log tree with sliding-window aggregates")
+    parser.add_argument("root", nargs="?", help="Local AWSLogs tree (the mirror directory with --s3)")
+    parser.add_argument("--s3", help="s3://bucket/prefix to mirror into root before each poll")
+    parser.add_argument("--region", default="us-east-1", help="AWS region for --s3")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <root>/.log-tail.json)")
+    parser.add_argument("--since", help="Ignore objects that ended before this UTC time (YYYY-MM-DDTHH:MM)")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW_SECONDS, help="Window length in seconds")
+    parser.add_argument("--bucket", type=int, default=DEFAULT_BUCKET_SECONDS, help="Window bucket in seconds")
+    parser.add_argument("--lateness", type=int, default=DEFAULT_LATENESS_SECONDS,
+                        help="Seconds behind the newest row that late rows are still counted")
+    parser.add_argument("--clients", type=int, default=DEFAULT_CLIENT_CAPACITY,
+                        help="Client IP counters kept per bucket")
+    parser.add_argument("--interval", type=float, default=DEFAULT_POLL_SECONDS, help="Seconds between polls")
+    parser.add_argument("--once", action="store_true", help="Poll once, report and exit")
+    parser.add_argument("--json", action="store_true", help="Report windows as JSON lines")
+    parser.add_argument("--benchmark", action="store_true", help="Measure lines/s on generated logs and exit")
+    parser.add_argument("--rate", type=float, default=50.0, help="Generated requests per second for --benchmark")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.session("log_tail", args.trace, args.profile):
+        if args.benchmark:
+            stats = benchmark(args.rate)
+            print(f"{stats.rows} lines from {stats.objects} objects ({stats.bytes / 1024 ** 2:.1f} MB) in "
+                  f"{stats.seconds:.2f}s: {stats.rows_per_second:,.0f} lines/s")
+            return 0
+        if not args.root:
+            parser.error("root is required")
+
+        try:
+            since = calendar.timegm(time.strptime(args.since, "%Y-%m-%dT%H:%M")) if args.since else None
+            window = SlidingWindow(args.window, args.bucket, args.lateness, args.clients)
+            tailer = Tailer(args.root, args.checkpoint or os.path.join(args.root, ".log-tail.json"), window, since)
+            before_poll = None
+            if args.s3:
+                import boto3
+                mirror = S3Mirror(boto3.client("s3", region_name=args.region), args.s3, args.root)
+
+                def before_poll():
+                    mirror.sync(tailer._retained_since())
+            tailer.follow(args.interval, lambda t: print_snapshot(t, args.json), 1 if args.once else None,
+                          before_poll)
+        except (RuntimeError, ValueError, OSError) as e:
+            print(f"Error: {e}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+ALB Log Parquet Converter
+Converts a local AWSLogs tree of raw ALB logs into partitioned Parquet for Athena
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from alb_log_parser import COLUMNS, iter_column_batches
+from common import require_pyarrow
+from log_layout import iter_log_objects
+
+COMPRESSION_CODECS = ["snappy", "zstd", "gzip", "none"]
+
+# Low-cardinality columns that benefit from dictionary encoding
+DICTIONARY_COLUMNS = [
+    "type",
+    "elb",
+    "target_ip",
+    "target_port",
+    "elb_status_code",
+    "target_status_code",
+    "request_verb",
+    "request_proto",
+    "ssl_cipher",
+    "ssl_protocol",
+    "target_group_arn",
+    "domain_name",
+    "chosen_cert_arn",
+    "matched_rule_priority",
+    "actions_executed",
+    "lambda_error_reason",
+    "target_status_code_list",
+    "classification",
+    "classification_reason",
+]
+
+DEFAULT_ROW_GROUP_SIZE = 500_000
+
+
+@dataclass
+class ConversionOptions:
+    """Options shared by every partition conversion"""
+    compression: str = "snappy"
+    compression_level: Optional[int] = None
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE
+    partition_by_hour: bool = False
+    columns: List[str] = field(default_factory=lambda: [name for name, _ in COLUMNS])
+
+
+@dataclass
+class PartitionResult:
+    """Outcome of converting one partition"""
+    partition: str
+    input_files: int
+    input_bytes: int
+    rows: int
+    output_files: List[str]
+    output_bytes: int
+    seconds: float
+
+
+def arrow_schema(columns: List[str]):
+    """Arrow schema for the given ALB columns, matching the Athena column types"""
+    pa, _ = require_pyarrow("Parquet conversion")
+    types = {"string": pa.string(), "int": pa.int32(), "bigint": pa.int64(), "double": pa.float64()}
+    athena_types = dict(COLUMNS)
+    return pa.schema([pa.field(name, types[athena_types[name]]) for name in columns])
+
+
+def hive_partition_path(year: str, month: str, day: str, hour: Optional[str] = None) -> str:
+    """Relative Hive-style directory for a partition"""
+    path = os.path.join(f"year={year}", f"month={month}", f"day={day}")
+    return os.path.join(path, f"hour={hour}") if hour is not None else path
+
+
+class _PartitionWriter:
+    """Buffers columnar rows for one output partition and flushes full row groups"""
+
+    def __init__(self, path: str, schema, options: ConversionOptions):
+        _, pq = require_pyarrow("Parquet conversion")
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.schema = schema
+        self.options = options
+        self.buffer: Dict[str, list] = {name: [] for name in schema.names}
+        self.buffered = 0
+        self.rows = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        dictionary = [c for c in DICTIONARY_COLUMNS if c in schema.names]
+        self.writer = pq.ParquetWriter(
+            self.tmp_path,
+            schema,
+            compression=None if options.compression == "none" else options.compression,
+            compression_level=options.compression_level,
+            use_dictionary=dictionary,
+        )
+
+    def append(self, batch: Dict[str, list], rows: Optional[List[int]] = None):
+        for name, values in batch.items():
+            if rows is None:
+                self.buffer[name].extend(values)
+            else:
+                self.buffer[name].extend(values[i] for i in rows)
+        self.buffered += len(rows) if rows is not None else len(next(iter(batch.values())))
+        if self.buffered >= self.options.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffered:
+            return
+        pa, _ = require_pyarrow("Parquet conversion")
+        table = pa.Table.from_pydict(self.buffer, schema=self.schema)
+        self.writer.write_table(table, row_group_size=self.options.row_group_size)
+        self.rows += self.buffered
+        self.buffer = {name: [] for name in self.schema.names}
+        self.buffered = 0
+
+    def close(self) -> int:
+        self.flush()
+        self.writer.close()
+        # Readers never see a partially written file
+        os.replace(self.tmp_path, self.path)
+        return os.path.getsize(self.path)
+
+
+def convert_files(partition: Tuple[str, str, str], files: List[str], staging_dir: str,
+                  options: ConversionOptions) -> PartitionResult:
+    """Convert some raw log files of one day partition into one Parquet file (per hour) under staging_dir
+
+    Output paths are relative to staging_dir; the file name is derived from the
+    inputs, so chunks of the same day converted in parallel never collide.
+    """
+    start = time.perf_counter()
+    schema = arrow_schema(options.columns)
+    digest = hashlib.sha1("\n".join(sorted(files)).encode()).hexdigest()[:12]
+    filename = f"part-{digest}.parquet"
+
+    read_columns = list(options.columns)
+    if options.partition_by_hour and "time" not in read_columns:
+        read_columns.append("time")
+
+    writers: Dict[Optional[str], _PartitionWriter] = {}
+
+    def writer_for(hour: Optional[str]) -> _PartitionWriter:
+        if hour not in writers:
+            path = os.path.join(staging_dir, f"hour={hour}" if hour is not None else "", filename)
+            writers[hour] = _PartitionWriter(path, schema, options)
+        return writers[hour]
+
+    for path in files:
+        for batch in iter_column_batches(path, read_columns):
+            times = batch["time"] if options.partition_by_hour else None
+            if times is not None and "time" not in options.columns:
+                del batch["time"]
+            if times is None:
+                writer_for(None).append(batch)
+                continue
+
+            rows_by_hour: Dict[str, List[int]] = defaultdict(list)
+            for i, value in enumerate(times):
+                rows_by_hour[value[11:13] if value else "00"].append(i)
+            for hour, rows in rows_by_hour.items():
+                writer_for(hour).append(batch, rows if len(rows) != len(times) else None)
+
+    output_bytes = rows = 0
+    for writer in writers.values():
+        output_bytes += writer.close()
+        rows += writer.rows
+    return PartitionResult(
+        partition=hive_partition_path(*partition),
+        input_files=len(files),
+        input_bytes=sum(os.path.getsize(p) for p in files),
+        rows=rows,
+        output_files=sorted(os.path.relpath(w.path, staging_dir) for w in writers.values()),
+        output_bytes=output_bytes,
+        seconds=round(time.perf_counter() - start, 3),
+    )
+
+
+def _partition_directories(output_dir: str, partition: Tuple[str, str, str]) -> Tuple[str, str]:
+    """(final, staging) directories of a day partition
+
+    The whole partition is rebuilt in a hidden staging directory (Athena and
+    pyarrow skip dot-prefixed paths) and swapped in, so a re-run after new
+    objects arrive replaces the earlier output instead of adding to it.
+    """
+    final_dir = os.path.join(output_dir, hive_partition_path(*partition))
+    staging_dir = os.path.join(os.path.dirname(final_dir), f".{os.path.basename(final_dir)}.staging")
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+    return final_dir, staging_dir
+
+
+def _publish(staging_dir: str, final_dir: str, chunks: List[PartitionResult]) -> PartitionResult:
+    """Swap a fully converted partition in and merge the results of its chunks"""
+    _swap_directory(staging_dir, final_dir)
+    return PartitionResult(
+        partition=chunks[0].partition,
+        input_files=sum(c.input_files for c in chunks),
+        input_bytes=sum(c.input_bytes for c in chunks),
+        rows=sum(c.rows for c in chunks),
+        output_files=sorted(os.path.join(final_dir, f) for c in chunks for f in c.output_files),
+        output_bytes=sum(c.output_bytes for c in chunks),
+        # Worker seconds; chunks of a day may have run side by side
+        seconds=round(sum(c.seconds for c in chunks), 3),
+    )
+
+
+def convert_partition(partition: Tuple[str, str, str], files: List[str], output_dir: str,
+                      options: ConversionOptions) -> PartitionResult:
+    """Convert all raw log files of one day partition into Parquet"""
+    final_dir, staging_dir = _partition_directories(output_dir, partition)
+    return _publish(staging_dir, final_dir, [convert_files(partition, files, staging_dir, options)])
+
+
+def split_files(files: List[str], parts: int) -> List[List[str]]:
+    """Cut files, in order, into at most parts runs of roughly equal bytes"""
+    sizes = [os.path.getsize(p) for p in files]
+    share = sum(sizes) / max(1, min(parts, len(files)))
+    chunks: List[List[str]] = [[]]
+    filled = 0.0
+    for path, size in zip(files, sizes):
+        if chunks[-1] and filled + size / 2 > share * len(chunks) and len(chunks) < parts:
+            chunks.append([])
+        chunks[-1].append(path)
+        filled += size
+    return chunks
+
+
+def _swap_directory(staging_dir: str, final_dir: str):
+    """Replace final_dir with staging_dir, removing the previous contents"""
+    previous = None
+    if os.path.exists(final_dir):
+        previous = staging_dir[:-len(".staging")] + ".old"
+        shutil.rmtree(previous, ignore_errors=True)
+        os.replace(final_dir, previous)
+    os.replace(staging_dir, final_dir)
+    if previous:
+        shutil.rmtree(previous)
+
+
+def group_by_partition(source_dir: str) -> Dict[Tuple[str, str, str], List[str]]:
+    """Group the raw log files under source_dir by (year, month, day)"""
+    partitions: Dict[Tuple[str, str, str], List[str]] = defaultdict(list)
+    for obj in iter_log_objects(source_dir):
+        partitions[obj.partition].append(obj.key)
+    return dict(sorted(partitions.items()))
+
+
+def convert_tree(source_dir: str, output_dir: str, options: ConversionOptions,
+                 workers: Optional[int] = None) -> List[PartitionResult]:
+    """Convert every partition under source_dir in worker processes
+
+    Days are cut into chunks of about (total bytes / workers), so a single
+    large day is converted by every worker; each chunk writes its own file
+    into the day's staging directory, which is swapped in once all are done.
+    """
+    require_pyarrow("Parquet conversion")
+    partitions = group_by_partition(source_dir)
+    if not partitions:
+        return []
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return [convert_partition(p, files, output_dir, options) for p, files in partitions.items()]
+
+    sizes = {p: sum(os.path.getsize(f) for f in files) for p, files in partitions.items()}
+    share = max(1.0, sum(sizes.values()) / workers)
+    chunks = {p: split_files(files, max(1, round(sizes[p] / share))) for p, files in partitions.items()}
+    directories = {p: _partition_directories(output_dir, p) for p in partitions}
+    converted: Dict[Tuple[str, str, str], List[PartitionResult]] = defaultdict(list)
+
+    results = []
+    tasks = sum(len(c) for c in chunks.values())
+    with ProcessPoolExecutor(max_workers=min(workers, tasks)) as pool:
+        futures = {pool.submit(convert_files, p, chunk, directories[p][1], options): p
+                   for p, day_chunks in chunks.items() for chunk in day_chunks}
+        for future in as_completed(futures):
+            partition = futures[future]
+            converted[partition].append(future.result())
+            if len(converted[partition]) == len(chunks[partition]):
+                final_dir, staging_dir = directories[partition]
+                results.append(_publish(staging_dir, final_dir, converted.pop(partition)))
+    return sorted(results, key=lambda r: r.partition)
+
+
+def print_summary(results: List[PartitionResult]):
+    """Print formatted conversion summary"""
+    print("\n" + "=" * 80)
+    print("PARQUET CONVERSION SUMMARY")
+    print("=" * 80)
+    for r in results:
+        ratio = r.input_bytes / r.output_bytes if r.output_bytes else 0
+        print(f"  {r.partition}: {r.input_files} files, {r.rows:,} rows, "
+              f"{r.input_bytes:,} -> {r.output_bytes:,} bytes ({ratio:.1f}x) in {r.seconds}s")
+
+    total_in = sum(r.input_bytes for r in results)
+    total_out = sum(r.output_bytes for r in results)
+    print("-" * 80)
+    print(f"  TOTAL: {len(results)} partitions, {sum(r.rows for r in results):,} rows, "
+          f"{total_in:,} -> {total_out:,} bytes")
+    print("=" * 80 + "\n")
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Convert raw ALB logs to partitioned Parquet")
+    parser.add_argument("source", help="Local directory containing an AWSLogs/ tree")
+    parser.add_argument("output", help="Output directory for year=/month=/day= partitions")
+    parser.add_argument("--compression", choices=COMPRESSION_CODECS, default="snappy",
+                        help="Parquet compression codec")
+    parser.add_argument("--compression-level", type=int, help="Codec level (e.g. 1-22 for zstd)")
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE,
+                        help="Rows per Parquet row group")
+    parser.add_argument("--partition-by-hour", action="store_true", help="Add an hour= partition level")
+    parser.add_argument("--columns", help="Comma-separated subset of columns to keep")
+    parser.add_argument("--workers", type=int,
+                        help="Worker processes, splitting large days between them (default: CPU count)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    args = parser.parse_args()
+
+    options = ConversionOptions(
+        compression=args.compression,
+        compression_level=args.compression_level,
+        row_group_size=args.row_group_size,
+        partition_by_hour=args.partition_by_hour,
+    )
+    if args.columns:
+        options.columns = args.columns.split(",")
+        unknown = sorted(set(options.columns) - {name for name, _ in COLUMNS})
+        if unknown:
+            parser.error(f"unknown columns: {', '.join(unknown)}")
+
+    try:
+        results = convert_tree(args.source, args.output, options, args.workers)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        return 1
+
+    if not results:
+        print(f"No ALB log files found under {args.source}")
+        return 1
+
+    if args.json:
+        print(json.dumps([vars(r) for r in results], indent=2))
+    else:
+        print_summary(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Partition Projection Generator
+Emits a Glue table definition for ALB logs that uses Athena partition projection
+instead of a Glue crawler
+"""
+
+import argparse
+import json
+import sys
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterator, Optional
+
+from alb_log_parser import COLUMNS, PARTITION_COLUMNS
+from log_layout import LOG_PREFIX, Partition
+
+# RegexSerDe pattern for the ALB log format; one capture group per column in COLUMNS
+SERDE_REGEX = (
+    r'([^ ]*) ([^ ]*) ([^ ]*) ([^ ]*):([0-9]*) ([^ ]*)[:-]([0-9]*) ([-.0-9]*) ([-.0-9]*) '
+    r'([-.0-9]*) (|[-0-9]*) (-|[-0-9]*) ([-0-9]*) ([-0-9]*) "([^ ]*) (.*) (- |[^ ]*)" '
+    r'"([^"]*)" ([A-Z0-9-_]+) ([A-Za-z0-9.-]*) ([^ ]*) "([^"]*)" "([^"]*)" "([^"]*)" '
+    r'([-.0-9]*) ([^ ]*) "([^"]*)" "([^"]*)" "([^ ]*)" "([^ ]+?)" "([^ ]+)" "([^ ]*)" '
+    r'"([^ ]*)" ?"?([^ "]*)"?'
+)
+
+SERDE_LIBRARY = "org.apache.hadoop.hive.serde2.RegexSerDe"
+INPUT_FORMAT = "org.apache.hadoop.mapred.TextInputFormat"
+OUTPUT_FORMAT = "org.apache.hadoop.hive.ql.io.HiveIgnoreKeyTextOutputFormat"
+
+
+@dataclass
+class ProjectionConfig:
+    """Where the logs live and which partition values Athena should project"""
+    bucket: str
+    account_id: str
+    region: str
+    start_year: int = 2024
+    end_year: int = 2030
+    prefix: str = LOG_PREFIX
+    table_name: str = "alb_access_logs"
+
+    @property
+    def location(self) -> str:
+        """Table root: everything above the YYYY/MM/DD levels"""
+        prefix = f"{self.prefix}/" if self.prefix else ""
+        return f"s3://{self.bucket}/{prefix}AWSLogs/{self.account_id}/elasticloadbalancing/{self.region}/"
+
+    @property
+    def location_template(self) -> str:
+        """storage.location.template with ${year}/${month}/${day} placeholders"""
+        return self.location + "${year}/${month}/${day}/"
+
+    def projection_parameters(self) -> Dict[str, str]:
+        """Table parameters enabling partition projection for year/month/day"""
+        return {
+            "projection.enabled": "true",
+            "projection.year.type": "integer",
+            "projection.year.range": f"{self.start_year},{self.end_year}",
+            "projection.month.type": "integer",
+            "projection.month.range": "1,12",
+            "projection.month.digits": "2",
+            "projection.day.type": "integer",
+            "projection.day.range": "1,31",
+            "projection.day.digits": "2",
+            "storage.location.template": self.location_template,
+        }
+
+    def table_input(self) -> Dict:
+        """Glue CreateTable TableInput for the projected table"""
+        return {
+            "Name": self.table_name,
+            "TableType": "EXTERNAL_TABLE",
+            "Parameters": {"EXTERNAL": "TRUE", "classification": "alb_logs", **self.projection_parameters()},
+            "PartitionKeys": [{"Name": name, "Type": "string"} for name in PARTITION_COLUMNS],
+            "StorageDescriptor": {
+                "Columns": [{"Name": name, "Type": athena_type} for name, athena_type in COLUMNS],
+                "Location": self.location,
+                "InputFormat": INPUT_FORMAT,
+                "OutputFormat": OUTPUT_FORMAT,
+                "SerdeInfo": {
+                    "SerializationLibrary": SERDE_LIBRARY,
+                    "Parameters": {"serialization.format": "1", "input.regex": SERDE_REGEX},
+                },
+            },
+        }
+
+    def resolve_location(self, year: str, month: str, day: str) -> str:
+        """Expand the location template the way Athena does for one partition"""
+        return (self.location_template
+                .replace("${year}", year)
+                .replace("${month}", month)
+                .replace("${day}", day))
+
+    def projected_partitions(self, start: Optional[date] = None,
+                             end: Optional[date] = None) -> Iterator[Partition]:
+        """Enumerate the (year, month, day) values the projection ranges produce"""
+        for year in range(self.start_year, self.end_year + 1):
+            for month in range(1, 13):
+                for day in range(1, 32):
+                    if start or end:
+                        try:
+                            current = date(year, month, day)
+                        except ValueError:
+                            continue
+                        if (start and current < start) or (end and current > end):
+                            continue
+                    yield (f"{year:04d}", f"{month:02d}", f"{day:02d}")
+
+
+def _hcl_string(value: str) -> str:
+    """Quote a string for HCL, escaping template sequences"""
+    escaped = json.dumps(value)
+    return escaped.replace("${", "$${").replace("%{", "%%{")
+
+
+def to_terraform(config: ProjectionConfig, database: str = "aws_glue_catalog_database.alb_logs.name",
+                 resource_name: str = "alb_access_logs") -> str:
+    """Render an aws_glue_catalog_table resource for the projected table"""
+    lines = [
+        f'resource "aws_glue_catalog_table" "{resource_name}" {{',
+        f"  name          = {_hcl_string(config.table_name)}",
+        f"  database_name = {database}",
+        '  table_type    = "EXTERNAL_TABLE"',
+        "",
+        "  parameters = {",
+    ]
+    parameters = config.table_input()["Parameters"]
+    width = max(len(key) for key in parameters) + 2
+    for key, value in parameters.items():
+        lines.append(f"    {json.dumps(key):<{width}} = {_hcl_string(value)}")
+    lines.append("  }")
+
+    for name in PARTITION_COLUMNS:
+        lines += ["", "  partition_keys {", f'    name = "{name}"', '    type = "string"', "  }"]
+
+    lines += [
+        "",
+        "  storage_descriptor {",
+        f"    location      = {_hcl_string(config.location)}",
+        f'    input_format  = "{INPUT_FORMAT}"',
+        f'    output_format = "{OUTPUT_FORMAT}"',
+        "",
+        "    ser_de_info {",
+        f'      serialization_library = "{SERDE_LIBRARY}"',
+        "      parameters = {",
+        '        "serialization.format" = "1"',
+        f'        "input.regex"          = {_hcl_string(SERDE_REGEX)}',
+        "      }",
+        "    }",
+    ]
+    for name, athena_type in COLUMNS:
+        lines += ["", "    columns {", f'      name = "{name}"', f'      type = "{athena_type}"', "    }"]
+    lines += ["  }", "}"]
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Generate a partition-projected Glue table for ALB logs")
+    parser.add_argument("--bucket", required=True, help="ALB logs bucket name")
+    parser.add_argument("--account-id", required=True, help="AWS account ID in the AWSLogs/ path")
+    parser.add_argument("--region", default="us-east-1", help="Load balancer region")
+    parser.add_argument("--prefix", default=LOG_PREFIX, help="Key prefix configured on the ALB")
+    parser.add_argument("--start-year", type=int, default=date.today().year - 1, help="First projected year")
+    parser.add_argument("--end-year", type=int, default=date.today().year + 5, help="Last projected year")
+    parser.add_argument("--table-name", default="alb_access_logs", help="Glue table name")
+    parser.add_argument("--format", choices=["json", "terraform"], default="json",
+                        help="Glue TableInput JSON or a Terraform resource")
+
+    args = parser.parse_args()
+
+    config = ProjectionConfig(
+        bucket=args.bucket,
+        account_id=args.account_id,
+        region=args.region,
+        start_year=args.start_year,
+        end_year=args.end_year,
+        prefix=args.prefix,
+        table_name=args.table_name,
+    )
+
+    if args.format == "terraform":
+        print(to_terraform(config), end="")
+    else:
+        print(json.dumps(config.table_input(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
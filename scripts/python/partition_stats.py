@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Partition Statistics
+Indexes bytes and rows per year/month/day/hour from a local log tree, a
+Parquet tree or an S3 inventory report, and estimates the bytes each query
+scans after partition pruning and column projection
+"""
+
+import argparse
+import csv
+import gzip
+import json
+import os
+import re
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import unquote
+
+from alb_log_parser import COLUMNS, iter_column_batches, open_log
+from common import require_pyarrow
+from cost_estimator import AWSCostEstimator, CostEstimate
+from log_layout import Partition, iter_log_objects, parse_key
+from query_linter import (DEFAULT_RUNS_PER_MONTH, TB, PartitionCatalog, QueryAnalysis, analyze,
+                          extract_queries)
+
+# (year, month, day, hour); hour is None when the source has no hourly breakdown
+HourKey = Tuple[str, str, str, Optional[str]]
+
+# Athena bills at least 10 MB per query that reads data
+ATHENA_MIN_BYTES = 10 * 1024 ** 2
+
+# Parquet size relative to gzip text (config/pricing.yaml columnar.storage_ratio)
+DEFAULT_COLUMNAR_RATIO = 0.6
+
+# Gzip-compressed bytes per log line, used to estimate rows from inventory sizes
+DEFAULT_COMPRESSED_ROW_BYTES = 80
+
+# Rows sampled from a raw tree to estimate each column's share of the bytes
+DEFAULT_SAMPLE_ROWS = 10_000
+
+_HIVE_RE = re.compile(r"year=(\d{4})[/\\]month=(\d{2})[/\\]day=(\d{2})(?:[/\\]hour=(\d{2}))?(?:[/\\]|$)")
+_COLUMN_NAMES = [name for name, _ in COLUMNS]
+
+
+@dataclass
+class HourStats:
+    """Objects, bytes and rows stored for one hour (or day)"""
+    objects: int = 0
+    bytes: int = 0
+    rows: int = 0
+
+
+@dataclass
+class ScanEstimate:
+    """Bytes one execution of a query reads"""
+    partitions: int
+    objects: int
+    rows: int
+    bytes_matched: int
+    bytes_scanned: int
+    columns: List[str] = field(default_factory=list)
+
+    @property
+    def bytes_billed(self) -> int:
+        return max(self.bytes_scanned, ATHENA_MIN_BYTES) if self.objects else 0
+
+
+def _hour_key(text: str) -> HourKey:
+    parts = text.split("/")
+    return (parts[0], parts[1], parts[2], parts[3] if len(parts) > 3 else None)
+
+
+def _count_lines(path: str) -> int:
+    with open_log(path, use_mmap=False) as stream:
+        return sum(chunk.count(b"\n") for chunk in iter(lambda: stream.read(1 << 20), b""))
+
+
+class PartitionStats:
+    """Per-hour storage statistics plus each column's share of the stored bytes
+
+    Raw text is read in full by every query, so column shares only matter for
+    Parquet sources and for what-if estimates of a columnar conversion.
+    """
+
+    def __init__(self, hours: Optional[Dict[HourKey, HourStats]] = None, format: str = "raw",
+                 column_weights: Optional[Dict[str, float]] = None):
+        self.hours: Dict[HourKey, HourStats] = dict(hours or {})
+        self.format = format
+        self.column_weights: Dict[str, float] = dict(column_weights or {})
+
+    @classmethod
+    def from_tree(cls, root: str, count_rows: bool = True,
+                  sample_rows: int = DEFAULT_SAMPLE_ROWS) -> "PartitionStats":
+        """Index a local AWSLogs tree, or a year=/month=/day=[/hour=] Parquet tree"""
+        stats = cls._from_parquet(root)
+        if stats is not None:
+            return stats
+
+        stats = cls(format="raw")
+        widths = {name: 0 for name in _COLUMN_NAMES}
+        sampled = 0
+        for obj in iter_log_objects(root):
+            entry = stats.hours.setdefault(obj.partition + (obj.hour,), HourStats())
+            entry.objects += 1
+            entry.bytes += os.path.getsize(obj.key)
+            if count_rows:
+                entry.rows += _count_lines(obj.key)
+            if sampled < sample_rows:
+                for batch in iter_column_batches(obj.key, _COLUMN_NAMES):
+                    for name, values in batch.items():
+                        # +1 for the separator
+                        widths[name] += sum(len(str(v)) + 1 for v in values[:sample_rows - sampled])
+                    sampled += len(batch["time"])
+                    if sampled >= sample_rows:
+                        break
+        stats.column_weights = stats._normalize(widths)
+        return stats
+
+    @classmethod
+    def _from_parquet(cls, root: str) -> Optional["PartitionStats"]:
+        paths = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            match = _HIVE_RE.search(os.path.relpath(dirpath, root) + "/")
+            if match:
+                paths.extend((match.groups(), os.path.join(dirpath, f))
+                             for f in sorted(filenames) if f.endswith(".parquet"))
+        if not paths:
+            return None
+
+        _, pq = require_pyarrow()
+        stats = cls(format="parquet")
+        widths: Dict[str, int] = {}
+        for key, path in paths:
+            metadata = pq.ParquetFile(path).metadata
+            entry = stats.hours.setdefault(key, HourStats())
+            entry.objects += 1
+            entry.bytes += os.path.getsize(path)
+            entry.rows += metadata.num_rows
+            for group in range(metadata.num_row_groups):
+                row_group = metadata.row_group(group)
+                for index in range(row_group.num_columns):
+                    chunk = row_group.column(index)
+                    widths[chunk.path_in_schema] = widths.get(chunk.path_in_schema, 0) + chunk.total_compressed_size
+        stats.column_weights = stats._normalize(widths)
+        return stats
+
+    @classmethod
+    def from_inventory(cls, path: str, prefix: Optional[str] = None,
+                       row_bytes: int = DEFAULT_COMPRESSED_ROW_BYTES) -> "PartitionStats":
+        """Index an S3 inventory CSV (plain or gzip)
+
+        Inventory files have no header; the first three fields are bucket, key
+        and size. A header row naming Key and Size columns is also accepted.
+        Rows are estimated from object sizes since inventory does not count lines.
+        """
+        opener = gzip.open if path.endswith(".gz") else open
+        stats = cls(format="raw")
+        with opener(path, "rt", newline="") as f:
+            reader = csv.reader(f)
+            key_index, size_index = 1, 2
+            for number, row in enumerate(reader):
+                if number == 0:
+                    lowered = [value.strip().lower() for value in row]
+                    if "key" in lowered and "size" in lowered:
+                        key_index, size_index = lowered.index("key"), lowered.index("size")
+                        continue
+                if len(row) <= max(key_index, size_index) or not row[size_index]:
+                    continue
+                key = unquote(row[key_index])
+                if prefix and not key.startswith(prefix):
+                    continue
+                obj = parse_key(key)
+                if obj is None:
+                    continue
+                size = int(row[size_index])
+                entry = stats.hours.setdefault(obj.partition + (obj.hour,), HourStats())
+                entry.objects += 1
+                entry.bytes += size
+                entry.rows += size // row_bytes
+        return stats
+
+    @staticmethod
+    def _normalize(widths: Dict[str, int]) -> Dict[str, float]:
+        total = sum(widths.values())
+        return {name: width / total for name, width in widths.items()} if total else {}
+
+    @classmethod
+    def load(cls, path: str) -> "PartitionStats":
+        with open(path) as f:
+            data = json.load(f)
+        hours = {_hour_key(key): HourStats(**value) for key, value in data["hours"].items()}
+        return cls(hours, data.get("format", "raw"), data.get("column_weights"))
+
+    def save(self, path: str):
+        hours = {"/".join(p for p in key if p is not None): vars(value)
+                 for key, value in sorted(self.hours.items(), key=lambda item: tuple(p or "" for p in item[0]))}
+        with open(path, "w") as f:
+            json.dump({"format": self.format, "column_weights": self.column_weights, "hours": hours}, f, indent=2)
+
+    def days(self) -> Dict[Partition, HourStats]:
+        """Statistics rolled up to the year/month/day partitions Athena prunes on"""
+        days: Dict[Partition, HourStats] = {}
+        for key, value in self.hours.items():
+            entry = days.setdefault(key[:3], HourStats())
+            entry.objects += value.objects
+            entry.bytes += value.bytes
+            entry.rows += value.rows
+        return dict(sorted(days.items()))
+
+    def to_catalog(self) -> PartitionCatalog:
+        """Partition sizes in the form query_linter.py prices queries against"""
+        return PartitionCatalog({partition: value.bytes for partition, value in self.days().items()})
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(v.bytes for v in self.hours.values())
+
+    @property
+    def total_rows(self) -> int:
+        return sum(v.rows for v in self.hours.values())
+
+    def column_fraction(self, columns: Iterable[str]) -> float:
+        """Share of stored bytes belonging to the given columns (1.0 when unknown)"""
+        if not self.column_weights:
+            return 1.0
+        return min(1.0, sum(self.column_weights.get(c, 0.0) for c in columns))
+
+    def estimate(self, query, columnar: bool = False,
+                 columnar_ratio: float = DEFAULT_COLUMNAR_RATIO) -> ScanEstimate:
+        """Bytes scanned by one run of query (SQL text or a QueryAnalysis)
+
+        Partitions are pruned with the WHERE clause's year/month/day predicates
+        (and hour, for hour-partitioned Parquet). Raw text reads every byte of
+        the remaining objects; Parquet, or raw data with columnar=True, reads
+        only the referenced columns' share.
+        """
+        analysis: QueryAnalysis = analyze(query) if isinstance(query, str) else query
+        if not analysis.scans_data:
+            return ScanEstimate(0, 0, 0, 0, 0)
+
+        hour_constraint = analysis.constraints.get("hour")
+        matched = HourStats()
+        partitions = set()
+        for key, value in self.hours.items():
+            if not analysis.partition_matches(key[:3]):
+                continue
+            if hour_constraint is not None and key[3] is not None and not hour_constraint.matches(key[3]):
+                continue
+            partitions.add(key[:3])
+            matched.objects += value.objects
+            matched.bytes += value.bytes
+            matched.rows += value.rows
+
+        columns = _COLUMN_NAMES if analysis.select_star else [c for c in _COLUMN_NAMES if c in analysis.columns]
+        if self.format == "parquet":
+            scanned = matched.bytes * self.column_fraction(columns)
+        elif columnar:
+            scanned = matched.bytes * columnar_ratio * self.column_fraction(columns)
+        else:
+            scanned = matched.bytes
+        return ScanEstimate(len(partitions), matched.objects, matched.rows, matched.bytes, int(scanned), columns)
+
+
+def monthly_scanned_tb(stats: PartitionStats, sqls: Iterable[str], runs_per_month: int = DEFAULT_RUNS_PER_MONTH,
+                       columnar: bool = False) -> float:
+    """TB billed per month when every query runs runs_per_month times"""
+    billed = sum(stats.estimate(sql, columnar).bytes_billed for sql in sqls)
+    return billed * runs_per_month / TB
+
+
+def query_cost(estimate: ScanEstimate, runs_per_month: int = DEFAULT_RUNS_PER_MONTH) -> CostEstimate:
+    return AWSCostEstimator.estimate_athena_costs(estimate.bytes_billed * runs_per_month / TB)
+
+
+def _load_stats(source: str, count_rows: bool) -> PartitionStats:
+    if os.path.isdir(source):
+        return PartitionStats.from_tree(source, count_rows=count_rows)
+    if source.endswith((".csv", ".csv.gz")):
+        return PartitionStats.from_inventory(source)
+    return PartitionStats.load(source)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Build partition statistics and estimate query scan bytes")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    build = subparsers.add_parser("build", help="Index a log tree, Parquet tree or S3 inventory CSV")
+    build.add_argument("source", help="Local tree or inventory CSV (.csv / .csv.gz)")
+    build.add_argument("-o", "--output", default="partition-stats.json", help="Statistics file to write")
+    build.add_argument("--catalog", help="Also write a query_linter.py partition-size catalog")
+    build.add_argument("--no-rows", action="store_true", help="Skip counting lines in raw logs")
+
+    estimate = subparsers.add_parser("estimate", help="Estimate bytes scanned per named query")
+    estimate.add_argument("stats", help="Statistics file, local tree or inventory CSV")
+    estimate.add_argument("--tf", nargs="*", default=["terraform/modules/aws"], help="Terraform files or dirs")
+    estimate.add_argument("--sql", help="Estimate this SQL instead of the named queries")
+    estimate.add_argument("--runs-per-month", type=int, default=DEFAULT_RUNS_PER_MONTH,
+                          help="Executions per query per month")
+
+    args = parser.parse_args()
+
+    if args.action == "build":
+        stats = _load_stats(args.source, not args.no_rows)
+        stats.save(args.output)
+        if args.catalog:
+            stats.to_catalog().save(args.catalog)
+        print(f"Indexed {len(stats.hours)} hours in {len(stats.days())} partitions: "
+              f"{stats.total_bytes:,} bytes, {stats.total_rows:,} rows ({stats.format}) -> {args.output}")
+        return 0
+
+    stats = _load_stats(args.stats, count_rows=False)
+    queries = [("sql", args.sql)] if args.sql else [(q.name, q.sql) for q in extract_queries(args.tf)]
+
+    print(f"\n{'Query':<28} {'Parts':>6} {'Rows':>12} {'Scanned':>14} {'Parquet':>14} {'$/month':>10}")
+    print("-" * 90)
+    total = 0.0
+    for name, sql in queries:
+        result = stats.estimate(sql)
+        if not analyze(sql).scans_data:
+            continue
+        columnar = stats.estimate(sql, columnar=True)
+        cost = query_cost(result, args.runs_per_month)
+        total += cost.monthly_cost
+        print(f"{name:<28} {result.partitions:>6} {result.rows:>12,} {result.bytes_scanned:>14,} "
+              f"{columnar.bytes_scanned:>14,} {cost.monthly_cost:>10.2f}")
+    print("-" * 90)
+    print(f"{'Total':<28} {'':>6} {'':>12} {'':>14} {'':>14} {total:>10.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
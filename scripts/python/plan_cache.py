@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Terraform Plan Cache
+Content-addressed cache of plan/validate results keyed on a module's
+configuration, with size-bounded LRU eviction
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Directories inside a module that never affect the plan
+SKIP_DIRS = {".terraform", ".git", "__pycache__"}
+CONFIG_SUFFIXES = (".tf", ".tf.json", ".tfvars", ".tfvars.json")
+_LOCK_FILE = ".terraform.lock.hcl"
+_STATE_FILE = "terraform.tfstate"
+# Local state of a workspace other than "default" lives under terraform.tfstate.d/<workspace>/
+_WORKSPACE_STATE_DIR = "terraform.tfstate.d"
+_META_FILE = "meta.json"
+
+
+def default_cache_dir(repo_root: str) -> str:
+    """INFRA_CLI_CACHE_DIR, or .cache/terraform-plans under the repository"""
+    return os.environ.get("INFRA_CLI_CACHE_DIR") or os.path.join(repo_root, ".cache", "terraform-plans")
+
+
+def selected_workspace(module_path: str) -> str:
+    """TF_WORKSPACE, else the workspace `terraform workspace select` recorded, else default"""
+    workspace = os.environ.get("TF_WORKSPACE")
+    if workspace:
+        return workspace
+    data_dir = os.path.join(module_path, os.environ.get("TF_DATA_DIR", ".terraform"))
+    try:
+        with open(os.path.join(data_dir, "environment")) as f:
+            return f.read().strip() or "default"
+    except FileNotFoundError:
+        return "default"
+
+
+def module_fingerprint(module_path: str, command: str, vars_file: Optional[str] = None) -> str:
+    """SHA-256 over everything that determines a plan's inputs
+
+    Covers every .tf/.tfvars file under the module (including nested local
+    modules), the provider lock file, the selected workspace and the lineage
+    and serial of its local state, the vars file, TF_VAR_* environment variables, the terraform binary and
+    the command line. Remote state is not part of the key: infra_cli drops a
+    module's entries after apply/destroy, but drift outside Terraform still
+    needs --no-cache.
+    """
+    digest = hashlib.sha256()
+
+    def add(label: str, data: bytes):
+        digest.update(label.encode() + b"\0" + len(data).to_bytes(8, "big") + data)
+
+    add("command", command.encode())
+    for dirpath, dirnames, filenames in os.walk(module_path):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+        for filename in sorted(filenames):
+            if filename.endswith(CONFIG_SUFFIXES) or filename == _LOCK_FILE:
+                path = os.path.join(dirpath, filename)
+                with open(path, "rb") as f:
+                    add(os.path.relpath(path, module_path).replace(os.sep, "/"), f.read())
+
+    workspace = selected_workspace(module_path)
+    add("workspace", workspace.encode())
+    state_path = os.path.join(module_path, _STATE_FILE)
+    if workspace != "default":
+        state_path = os.path.join(module_path, _WORKSPACE_STATE_DIR, workspace, _STATE_FILE)
+    if os.path.exists(state_path):
+        try:
+            with open(state_path) as f:
+                state = json.load(f)
+            add("state", f"{state.get('lineage')}:{state.get('serial')}".encode())
+        except ValueError:
+            with open(state_path, "rb") as f:
+                add("state", f.read())
+
+    if vars_file:
+        with open(vars_file, "rb") as f:
+            add("vars_file", f.read())
+
+    for name in sorted(k for k in os.environ if k.startswith("TF_VAR_")):
+        add(f"env:{name}", os.environ[name].encode())
+
+    terraform = shutil.which("terraform")
+    if terraform:
+        stat = os.stat(terraform)
+        add("terraform", f"{os.path.realpath(terraform)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    """A stored plan/validate result"""
+    key: str
+    path: str
+    command: str
+    returncode: int
+    created: float
+    size: int
+    module: str = ""
+
+    @property
+    def output(self) -> str:
+        return self.read_text("stdout.txt")
+
+    def file(self, name: str) -> Optional[str]:
+        path = os.path.join(self.path, name)
+        return path if os.path.exists(path) else None
+
+    def read_text(self, name: str) -> str:
+        path = self.file(name)
+        if not path:
+            return ""
+        with open(path) as f:
+            return f.read()
+
+
+class PlanCache:
+    """Directory of cache entries, one subdirectory per fingerprint
+
+    Each entry holds stdout.txt, any artifacts (the -out plan file and its
+    JSON rendering) and meta.json. The mtime of meta.json is the LRU clock.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, key: str, touch: bool = True) -> Optional[CacheEntry]:
+        """Return the entry for key, marking it recently used unless touch is False"""
+        path = self._entry_path(key)
+        meta_path = os.path.join(path, _META_FILE)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if touch:
+            os.utime(meta_path)
+        return CacheEntry(key=key, path=path, **meta)
+
+    def put(self, key: str, command: str, output: str, artifacts: Optional[Dict[str, str]] = None,
+            returncode: int = 0, module: str = "") -> CacheEntry:
+        """Store output and copies of artifact files (name -> source path) under key"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        staging = os.path.join(self.cache_dir, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(staging)
+        with open(os.path.join(staging, "stdout.txt"), "w") as f:
+            f.write(output)
+        for name, source in (artifacts or {}).items():
+            shutil.copyfile(source, os.path.join(staging, name))
+
+        size = sum(os.path.getsize(os.path.join(staging, n)) for n in os.listdir(staging))
+        meta = {"command": command, "returncode": returncode, "created": time.time(), "size": size,
+                "module": os.path.abspath(module) if module else ""}
+        with open(os.path.join(staging, _META_FILE), "w") as f:
+            json.dump(meta, f)
+
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            shutil.rmtree(path, ignore_errors=True)
+        os.replace(staging, path)
+        self.evict()
+        return CacheEntry(key=key, path=path, **meta)
+
+    def entries(self) -> List[CacheEntry]:
+        """All entries, least recently used first"""
+        found = []
+        if not os.path.isdir(self.cache_dir):
+            return found
+        for shard in os.listdir(self.cache_dir):
+            shard_path = os.path.join(self.cache_dir, shard)
+            if shard.startswith(".") or not os.path.isdir(shard_path):
+                continue
+            for key in os.listdir(shard_path):
+                entry = self.get(key, touch=False)
+                if entry:
+                    found.append(entry)
+        return sorted(found, key=lambda e: os.path.getmtime(os.path.join(e.path, _META_FILE)))
+
+    def evict(self) -> List[str]:
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = self.entries()
+        total = sum(e.size for e in entries)
+        removed = []
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry.path, ignore_errors=True)
+            total -= entry.size
+            removed.append(entry.key)
+        return removed
+
+    def invalidate(self, module_path: str) -> List[str]:
+        """Remove every entry stored for a module, e.g. once apply/destroy changed its state"""
+        module = os.path.abspath(module_path)
+        removed = []
+        for entry in self.entries():
+            if entry.module == module:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed.append(entry.key)
+        return removed
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Inspect or clear the Terraform plan cache")
+    parser.add_argument("action", choices=["list", "clear", "fingerprint"], help="What to do")
+    parser.add_argument("--cache-dir", default=default_cache_dir(
+        os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))), help="Cache directory")
+    parser.add_argument("--module", help="Module path (for fingerprint)")
+    parser.add_argument("--command", default="plan", help="Terraform command (for fingerprint)")
+    parser.add_argument("--vars-file", help="Variables file (for fingerprint)")
+
+    args = parser.parse_args()
+    cache = PlanCache(args.cache_dir)
+
+    if args.action == "clear":
+        cache.clear()
+        print(f"Cleared {args.cache_dir}")
+    elif args.action == "fingerprint":
+        if not args.module:
+            parser.error("--module is required for fingerprint")
+        print(module_fingerprint(args.module, args.command, args.vars_file))
+    else:
+        entries = cache.entries()
+        for entry in entries:
+            age = time.time() - entry.created
+            print(f"{entry.key[:16]}  {entry.command:<24} {entry.size:>12,} bytes  {age / 60:>8.1f} min old")
+        print(f"{len(entries)} entries, {sum(e.size for e in entries):,} bytes (limit {cache.max_bytes:,})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
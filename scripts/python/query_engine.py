@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Local Query Engine
+Runs the Athena named queries against local ALB logs or Parquet with an
+embedded SQLite database, reporting rows and bytes read per partition
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from alb_log_parser import COLUMNS, PARTITION_COLUMNS, iter_column_batches
+from common import require_pyarrow
+from log_layout import Partition
+from parquet_converter import group_by_partition
+from query_linter import QueryAnalysis, analyze, extract_queries
+
+TABLE_NAME = "alb_access_logs"
+
+_SQLITE_TYPES = {"string": "TEXT", "int": "INTEGER", "bigint": "INTEGER", "double": "REAL"}
+_HIVE_RE = re.compile(r"year=(\d{4})[/\\]month=(\d{2})[/\\]day=(\d{2})(?:[/\\]|$)")
+
+# Presto/MySQL date_format specifiers -> strftime
+_DATE_FORMAT = {
+    "Y": "%Y", "y": "%y", "m": "%m", "d": "%d", "H": "%H", "h": "%I", "I": "%I", "i": "%M",
+    "s": "%S", "S": "%S", "f": "%f", "p": "%p", "j": "%j", "a": "%a", "W": "%A", "b": "%b",
+    "M": "%B", "T": "%H:%M:%S", "r": "%I:%M:%S %p", "%": "%%",
+}
+
+
+def from_iso8601_timestamp(value: Optional[str]) -> Optional[str]:
+    """Normalize an ISO-8601 timestamp; SQLite has no timestamp type so it stays text"""
+    if value is None:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).isoformat()
+
+
+def date_format(value: Optional[str], fmt: str) -> Optional[str]:
+    """Presto date_format() over an ISO-8601 timestamp string"""
+    if value is None:
+        return None
+    stamp = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    pattern = re.sub(r"%(.)", lambda m: _DATE_FORMAT.get(m.group(1), m.group(1)), fmt)
+    return stamp.strftime(pattern)
+
+
+@dataclass
+class PartitionScan:
+    """What one query read from one partition"""
+    partition: str
+    files: int
+    rows: int
+    bytes: int
+
+
+@dataclass
+class QueryResult:
+    """Result rows plus the I/O and timing needed to compare query shapes"""
+    name: str
+    columns: List[str]
+    rows: List[Tuple]
+    partitions_total: int
+    scans: List[PartitionScan] = field(default_factory=list)
+    load_seconds: float = 0.0
+    execute_seconds: float = 0.0
+
+    @property
+    def rows_read(self) -> int:
+        return sum(s.rows for s in self.scans)
+
+    @property
+    def bytes_read(self) -> int:
+        return sum(s.bytes for s in self.scans)
+
+    @property
+    def wall_seconds(self) -> float:
+        return self.load_seconds + self.execute_seconds
+
+
+class LocalTable:
+    """The alb_access_logs table over a local raw-log or Parquet tree
+
+    Raw trees use the AWSLogs/<account>/elasticloadbalancing/<region>/YYYY/MM/DD
+    layout; Parquet trees use the year=/month=/day= layout written by
+    parquet_converter.py. Partitions are discovered once and read on demand.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        parquet = self._find_parquet()
+        self.format = "parquet" if parquet else "raw"
+        self.partitions = parquet or group_by_partition(root)
+
+    def _find_parquet(self) -> Dict[Partition, List[str]]:
+        found: Dict[Partition, List[str]] = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames.sort()
+            match = _HIVE_RE.search(os.path.relpath(dirpath, self.root) + "/")
+            for filename in sorted(filenames):
+                if match and filename.endswith(".parquet"):
+                    found.setdefault(match.groups(), []).append(os.path.join(dirpath, filename))
+        return dict(sorted(found.items()))
+
+    def read(self, partition: Partition, columns: List[str]) -> Tuple[Dict[str, list], int]:
+        """Column values of one partition and the bytes a scan engine would read"""
+        files = self.partitions[partition]
+        data: Dict[str, list] = {name: [] for name in columns}
+        if self.format == "raw":
+            # Text formats have no column pruning: every byte of every object is read
+            for path in files:
+                for batch in iter_column_batches(path, columns):
+                    for name in columns:
+                        data[name].extend(batch[name])
+            return data, sum(os.path.getsize(p) for p in files)
+
+        _, pq = require_pyarrow()
+        scanned = 0
+        for path in files:
+            parquet = pq.ParquetFile(path)
+            metadata = parquet.metadata
+            for group in range(metadata.num_row_groups):
+                row_group = metadata.row_group(group)
+                for index in range(row_group.num_columns):
+                    chunk = row_group.column(index)
+                    if chunk.path_in_schema in columns:
+                        scanned += chunk.total_compressed_size
+            table = parquet.read(columns=columns)
+            for name in columns:
+                data[name].extend(table.column(name).to_pylist())
+        return data, scanned
+
+
+class QueryEngine:
+    """Executes Athena SQL locally, loading only the partitions the WHERE clause keeps"""
+
+    def __init__(self, table: LocalTable):
+        self.table = table
+
+    def _connect(self, columns: List[str]) -> sqlite3.Connection:
+        connection = sqlite3.connect(":memory:")
+        connection.create_function("from_iso8601_timestamp", 1, from_iso8601_timestamp, deterministic=True)
+        connection.create_function("date_format", 2, date_format, deterministic=True)
+        types = dict(COLUMNS)
+        definition = ", ".join(f'"{name}" {_SQLITE_TYPES[types[name]]}' for name in columns)
+        partition_definition = ", ".join(f'"{name}" TEXT' for name in PARTITION_COLUMNS)
+        connection.execute(f"CREATE TABLE {TABLE_NAME} ({definition}, {partition_definition})")
+        return connection
+
+    def _columns(self, analysis: QueryAnalysis) -> List[str]:
+        if analysis.select_star:
+            return [name for name, _ in COLUMNS]
+        referenced = set(analysis.columns)
+        columns = [name for name, _ in COLUMNS if name in referenced]
+        # A table needs at least one column even for SELECT COUNT(*)
+        return columns or [COLUMNS[0][0]]
+
+    def execute(self, sql: str, name: str = "query") -> QueryResult:
+        """Run one statement against the partitions its predicates select"""
+        analysis = analyze(sql)
+        if analysis.statement == "show":
+            rows = [("/".join(f"{c}={v}" for c, v in zip(PARTITION_COLUMNS, p)),)
+                    for p in self.table.partitions]
+            return QueryResult(name, ["partition"], rows, len(self.table.partitions))
+
+        columns = self._columns(analysis)
+        result = QueryResult(name, [], [], len(self.table.partitions))
+
+        start = time.perf_counter()
+        connection = self._connect(columns)
+        placeholders = ", ".join("?" * (len(columns) + len(PARTITION_COLUMNS)))
+        for partition, files in self.table.partitions.items():
+            if not analysis.partition_matches(partition):
+                continue
+            data, scanned = self.table.read(partition, columns)
+            rows = len(data[columns[0]])
+            connection.executemany(
+                f"INSERT INTO {TABLE_NAME} VALUES ({placeholders})",
+                zip(*(data[name] for name in columns), *([value] * rows for value in partition)))
+            result.scans.append(PartitionScan("/".join(partition), len(files), rows, scanned))
+        result.load_seconds = round(time.perf_counter() - start, 6)
+
+        start = time.perf_counter()
+        # Database-qualified names (db.alb_access_logs) resolve to the single local table
+        statement = re.sub(rf"\b[\w]+\.{TABLE_NAME}\b", TABLE_NAME, sql).strip().rstrip(";")
+        cursor = connection.execute(statement)
+        result.rows = cursor.fetchall()
+        result.columns = [d[0] for d in cursor.description or []]
+        result.execute_seconds = round(time.perf_counter() - start, 6)
+        connection.close()
+        return result
+
+
+def print_results(results: List[QueryResult], show_rows: int = 0):
+    """Print a comparison of rows/bytes read and wall time per query"""
+    print("\n" + "=" * 96)
+    print(f"{'Query':<28} {'Rows out':>9} {'Partitions':>11} {'Rows read':>11} "
+          f"{'Bytes read':>13} {'Wall ms':>9}")
+    print("-" * 96)
+    for result in results:
+        print(f"{result.name[:28]:<28} {len(result.rows):>9,} "
+              f"{len(result.scans):>5}/{result.partitions_total:<5} {result.rows_read:>11,} "
+              f"{result.bytes_read:>13,} {result.wall_seconds * 1000:>9.1f}")
+    print("=" * 96)
+
+    for result in results:
+        if show_rows and result.scans:
+            print(f"\n{result.name}:")
+            for scan in result.scans:
+                print(f"  {scan.partition}: {scan.files} files, {scan.rows:,} rows, {scan.bytes:,} bytes")
+            print("  " + " | ".join(result.columns))
+            for row in result.rows[:show_rows]:
+                print("  " + " | ".join(str(v) for v in row))
+    print()
+
+
+def main():
+    """Main function"""
+    default_tf = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              "..", "..", "terraform", "modules", "aws", "athena.tf")
+    parser = argparse.ArgumentParser(description="Run Athena named queries against local ALB logs")
+    parser.add_argument("source", help="Raw AWSLogs tree or Parquet tree from parquet_converter.py")
+    parser.add_argument("--tf", default=default_tf, help="Terraform file(s) holding the named queries")
+    parser.add_argument("--query", action="append", help="Named query to run (repeatable; default: all)")
+    parser.add_argument("--sql", help="Run this SQL instead of the named queries")
+    parser.add_argument("--rows", type=int, default=0, help="Print up to N result rows per query")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    args = parser.parse_args()
+
+    engine = QueryEngine(LocalTable(args.source))
+    if args.sql:
+        queries = [("sql", args.sql)]
+    else:
+        queries = [(q.name, q.sql) for q in extract_queries([args.tf])
+                   if not args.query or q.name in args.query]
+
+    results = [engine.execute(sql, name) for name, sql in queries]
+
+    if args.json:
+        print(json.dumps([{
+            "name": r.name,
+            "rows": len(r.rows),
+            "partitions": [vars(s) for s in r.scans],
+            "rows_read": r.rows_read,
+            "bytes_read": r.bytes_read,
+            "wall_seconds": round(r.wall_seconds, 6),
+        } for r in results], indent=2))
+    else:
+        print_results(results, args.rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,766 @@
+#!/usr/bin/env python3
+"""
+Athena Query Linter
+Statically checks the SQL embedded in Terraform files for partition pruning
+problems and estimates bytes scanned and cost per query
+"""
+
+import argparse
+import functools
+import itertools
+import json
+import os
+import re
+import sys
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from cost_estimator import AWSCostEstimator, CostEstimate
+from log_layout import Partition
+
+PARTITION_COLUMNS = ["year", "month", "day"]
+
+# Default catalog: 90 days of logs (the S3 lifecycle in s3.tf) at the standard
+# scenario's 100 GB/month
+DEFAULT_RETENTION_DAYS = 90
+DEFAULT_BYTES_PER_DAY = 100 * 1024 ** 3 // 30
+
+# Monthly executions assumed per named query (standard scenario: 10 queries/day)
+DEFAULT_RUNS_PER_MONTH = 300
+
+TB = 1024 ** 4
+
+_SUPPRESS_RE = re.compile(r"--\s*athena-lint:\s*ignore=([\w,-]+)")
+
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<quoted>"(?:[^"]|"")*")
+  | (?P<number>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<op><>|!=|>=|<=|\|\||[=<>])
+  | (?P<punct>[(),.;*+\-/%])
+""", re.X | re.S)
+
+_CLAUSE_END = {"group", "order", "limit", "having", "union", "intersect", "except", "window", "offset"}
+_SET_OPERATORS = {"union", "intersect", "except"}
+
+
+@dataclass
+class Token:
+    kind: str
+    value: str
+
+    @property
+    def lower(self) -> str:
+        return self.value.lower()
+
+
+@dataclass
+class NamedQuery:
+    """An SQL body found in a Terraform file"""
+    name: str
+    file: str
+    line: int
+    sql: str
+
+
+@dataclass
+class Finding:
+    """A lint finding for one query"""
+    rule: str
+    severity: str
+    message: str
+    suppressed: bool = False
+
+
+@dataclass
+class ColumnConstraint:
+    """Allowed values for one partition column: an explicit set and/or a range"""
+    values: Optional[Set[str]] = None
+    low: Optional[str] = None
+    low_inclusive: bool = True
+    high: Optional[str] = None
+    high_inclusive: bool = True
+
+    def matches(self, value: str) -> bool:
+        if self.values is not None and value not in self.values:
+            return False
+        if self.low is not None:
+            cmp = _compare(value, self.low)
+            if cmp < 0 or (cmp == 0 and not self.low_inclusive):
+                return False
+        if self.high is not None:
+            cmp = _compare(value, self.high)
+            if cmp > 0 or (cmp == 0 and not self.high_inclusive):
+                return False
+        return True
+
+
+@dataclass
+class TableScan:
+    """One read of a base table with the predicates that reach it"""
+    table: str
+    scope: str = ""
+    constraints: Dict[str, ColumnConstraint] = field(default_factory=dict)
+
+    def partition_matches(self, partition: Partition) -> bool:
+        """Whether the predicates let Athena read this partition"""
+        for column, value in zip(PARTITION_COLUMNS, partition):
+            constraint = self.constraints.get(column)
+            if constraint is not None and not constraint.matches(value):
+                return False
+        return True
+
+
+@dataclass
+class QueryAnalysis:
+    """What the linter learned about one statement"""
+    statement: str
+    tables: List[str] = field(default_factory=list)
+    columns: List[str] = field(default_factory=list)
+    select_star: bool = False
+    constraints: Dict[str, ColumnConstraint] = field(default_factory=dict)
+    findings: List[Finding] = field(default_factory=list)
+    scans: List[TableScan] = field(default_factory=list)
+
+    @property
+    def scans_data(self) -> bool:
+        return self.statement in ("select", "with")
+
+    def partition_matches(self, partition: Partition) -> bool:
+        """Whether any base table read of the statement lets Athena read this partition"""
+        return any(scan.partition_matches(partition) for scan in self.scans)
+
+
+@dataclass
+class QueryReport:
+    """Lint and cost result for one named query"""
+    query: NamedQuery
+    analysis: QueryAnalysis
+    partitions_scanned: int
+    bytes_scanned: int
+    cost: Optional[CostEstimate]
+
+    @property
+    def errors(self) -> List[Finding]:
+        return [f for f in self.analysis.findings if f.severity == "error" and not f.suppressed]
+
+
+def _compare(a: str, b: str) -> int:
+    if a.isdigit() and b.isdigit():
+        a_num, b_num = int(a), int(b)
+        return (a_num > b_num) - (a_num < b_num)
+    return (a > b) - (a < b)
+
+
+def tokenize(sql: str, keep_quoted: bool = False) -> List[Token]:
+    """Split SQL into tokens, dropping whitespace and comments
+
+    Quoted identifiers become plain "ident" tokens unless keep_quoted is set,
+    in which case they stay "quoted" tokens with their quotes.
+    """
+    tokens = []
+    pos = 0
+    while pos < len(sql):
+        match = _TOKEN_RE.match(sql, pos)
+        if not match:
+            tokens.append(Token("punct", sql[pos]))
+            pos += 1
+            continue
+        pos = match.end()
+        kind = match.lastgroup
+        if kind in ("ws", "comment"):
+            continue
+        value = match.group()
+        if kind == "quoted" and not keep_quoted:
+            kind, value = "ident", value[1:-1].replace('""', '"')
+        tokens.append(Token(kind, value))
+    return tokens
+
+
+class PartitionCatalog:
+    """Bytes stored per (year, month, day) partition"""
+
+    def __init__(self, sizes: Optional[Dict[Partition, int]] = None):
+        self.sizes: Dict[Partition, int] = dict(sizes or {})
+
+    @classmethod
+    def uniform(cls, days: int = DEFAULT_RETENTION_DAYS, bytes_per_day: int = DEFAULT_BYTES_PER_DAY,
+                end: Optional[date] = None) -> "PartitionCatalog":
+        """Equal-sized daily partitions for the days up to and including end"""
+        end = end or date.today()
+        sizes = {}
+        for offset in range(days):
+            day = end - timedelta(days=offset)
+            sizes[(f"{day:%Y}", f"{day:%m}", f"{day:%d}")] = bytes_per_day
+        return cls(sizes)
+
+    @classmethod
+    def load(cls, path: str) -> "PartitionCatalog":
+        """Load a JSON object of {"YYYY/MM/DD": bytes}"""
+        with open(path) as f:
+            data = json.load(f)
+        return cls({tuple(key.split("/")): int(size) for key, size in data.items()})
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump({"/".join(p): size for p, size in sorted(self.sizes.items())}, f, indent=2)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self.sizes.values())
+
+
+_HEREDOC_RE = re.compile(r"<<-?(?P<tag>[A-Z_]+)\n(?P<body>.*?)\n[ \t]*(?P=tag)\b", re.S)
+_BLOCK_RE = re.compile(r'^(?:resource\s+"[\w-]+"\s+"(?P<resource>[\w-]+)"|output\s+"(?P<output>[\w-]+)")', re.M)
+_SQL_START_RE = re.compile(r"^\s*(?:--[^\n]*\n\s*)*(select|with|show|insert|create|msck|describe)\b", re.I)
+
+
+def extract_queries(paths: Iterable[str]) -> List[NamedQuery]:
+    """Find SQL heredocs in .tf files (or directories of them)"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, f) for f in sorted(os.listdir(path)) if f.endswith(".tf"))
+        else:
+            files.append(path)
+
+    queries = []
+    for path in files:
+        with open(path) as f:
+            text = f.read()
+        blocks = [(m.start(), m.group("resource") or m.group("output")) for m in _BLOCK_RE.finditer(text)]
+        for match in _HEREDOC_RE.finditer(text):
+            body = match.group("body")
+            if not _SQL_START_RE.match(body):
+                continue
+            owners = [name for start, name in blocks if start < match.start()]
+            queries.append(NamedQuery(
+                name=owners[-1] if owners else f"heredoc@{text.count(chr(10), 0, match.start()) + 1}",
+                file=path,
+                line=text.count("\n", 0, match.start()) + 1,
+                # Terraform interpolations are opaque to the linter
+                sql=re.sub(r"\$\{[^}]*\}", "tf_interpolation", body),
+            ))
+    return queries
+
+
+def top_level_split(tokens: List[Token], keyword: str) -> List[List[Token]]:
+    """Split tokens on a keyword at parenthesis depth 0, keeping BETWEEN ... AND together"""
+    parts: List[List[Token]] = [[]]
+    depth = 0
+    pending_between = False
+    for token in tokens:
+        if token.value == "(":
+            depth += 1
+        elif token.value == ")":
+            depth -= 1
+        if depth == 0 and token.kind == "ident":
+            if token.lower == "between":
+                pending_between = True
+            elif token.lower == keyword:
+                if keyword == "and" and pending_between:
+                    pending_between = False
+                else:
+                    parts.append([])
+                    continue
+        parts[-1].append(token)
+    return [p for p in parts if p]
+
+
+def strip_parens(tokens: List[Token]) -> List[Token]:
+    while len(tokens) >= 2 and tokens[0].value == "(" and tokens[-1].value == ")":
+        depth = 0
+        for i, token in enumerate(tokens):
+            depth += token.value == "("
+            depth -= token.value == ")"
+            if depth == 0 and i < len(tokens) - 1:
+                return tokens
+        tokens = tokens[1:-1]
+    return tokens
+
+
+def _literal(token: Token) -> Optional[str]:
+    if token.kind == "string":
+        return token.value[1:-1].replace("''", "'")
+    if token.kind == "number":
+        return token.value
+    return None
+
+
+_TYPED_LITERALS = {"date", "timestamp"}
+
+
+def _plain_operands(tokens: List[Token]) -> List[Token]:
+    """Drop table qualifiers (a.year -> year) and literal types (DATE '2024-12-16' -> '2024-12-16')"""
+    out = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if (token.kind == "ident" and i + 2 < len(tokens) and tokens[i + 1].value == "."
+                and tokens[i + 2].kind == "ident"):
+            i += 2
+            continue
+        if token.kind == "ident" and token.lower in _TYPED_LITERALS and i + 1 < len(tokens) \
+                and tokens[i + 1].kind == "string":
+            i += 1
+            continue
+        out.append(token)
+        i += 1
+    return out
+
+
+_FLIP = {"<": ">", ">": "<", "<=": ">=", ">=": "<=", "=": "=", "<>": "<>", "!=": "!="}
+
+
+def simple_constraint(tokens: List[Token]) -> Optional[Tuple[str, ColumnConstraint]]:
+    """Recognize col op literal, col IN (...), col BETWEEN a AND b (columns may be qualified)"""
+    tokens = strip_parens(_plain_operands(tokens))
+    if len(tokens) == 3 and tokens[1].kind == "op":
+        left, op, right = tokens
+        if left.kind != "ident" and right.kind == "ident":
+            left, right, op = right, left, Token("op", _FLIP[op.value])
+        value = _literal(right)
+        if left.kind != "ident" or value is None:
+            return None
+        column = left.lower
+        if op.value == "=":
+            return column, ColumnConstraint(values={value})
+        if op.value in (">", ">="):
+            return column, ColumnConstraint(low=value, low_inclusive=op.value == ">=")
+        if op.value in ("<", "<="):
+            return column, ColumnConstraint(high=value, high_inclusive=op.value == "<=")
+        return None
+
+    if len(tokens) >= 4 and tokens[0].kind == "ident" and tokens[1].lower == "in" and tokens[2].value == "(":
+        values = {_literal(t) for t in tokens[3:-1] if t.value != ","}
+        if tokens[-1].value != ")" or None in values:
+            return None
+        return tokens[0].lower, ColumnConstraint(values=values)
+
+    if (len(tokens) == 5 and tokens[0].kind == "ident" and tokens[1].lower == "between"
+            and tokens[3].lower == "and"):
+        low, high = _literal(tokens[2]), _literal(tokens[4])
+        if low is None or high is None:
+            return None
+        return tokens[0].lower, ColumnConstraint(low=low, high=high)
+    return None
+
+
+def _merge(existing: Optional[ColumnConstraint], new: ColumnConstraint) -> ColumnConstraint:
+    if existing is None:
+        return new
+    merged = ColumnConstraint(existing.values, existing.low, existing.low_inclusive,
+                              existing.high, existing.high_inclusive)
+    if new.values is not None:
+        merged.values = new.values if merged.values is None else merged.values & new.values
+    if new.low is not None and (merged.low is None or _compare(new.low, merged.low) > 0):
+        merged.low, merged.low_inclusive = new.low, new.low_inclusive
+    if new.high is not None and (merged.high is None or _compare(new.high, merged.high) < 0):
+        merged.high, merged.high_inclusive = new.high, new.high_inclusive
+    return merged
+
+
+def _partition_columns_in_functions(tokens: List[Token]) -> Set[str]:
+    """Partition columns referenced inside a function call or expression"""
+    found = set()
+    stack: List[bool] = []  # True when the parenthesis opened a function call
+    for i, token in enumerate(tokens):
+        if token.value == "(":
+            stack.append(i > 0 and tokens[i - 1].kind == "ident"
+                         and tokens[i - 1].lower not in ("in", "and", "or", "not"))
+        elif token.value == ")":
+            if stack:
+                stack.pop()
+        elif token.kind == "ident" and token.lower in PARTITION_COLUMNS and any(stack):
+            found.add(token.lower)
+    return found
+
+
+def _analyze_where(tokens: List[Token], constraints: Dict[str, ColumnConstraint], findings: List[Finding]):
+    for conjunct in top_level_split(_plain_operands(tokens), "and"):
+        conjunct = strip_parens(conjunct)
+        wrapped = _partition_columns_in_functions(conjunct)
+        for column in sorted(wrapped):
+            findings.append(Finding(
+                "function-on-partition-column", "error",
+                f"Function applied to partition column '{column}' prevents partition pruning"))
+        if wrapped:
+            continue
+
+        disjuncts = top_level_split(conjunct, "or")
+        if len(disjuncts) > 1:
+            # Pruning survives an OR only when every branch constrains the same column
+            parsed = [simple_constraint(d) for d in disjuncts]
+            columns = {p[0] for p in parsed if p}
+            if None not in parsed and len(columns) == 1 and all(p[1].values for p in parsed):
+                column = columns.pop()
+                values = set().union(*(p[1].values for p in parsed))
+                constraints[column] = _merge(constraints.get(column), ColumnConstraint(values=values))
+            continue
+
+        constraint = simple_constraint(conjunct)
+        if constraint:
+            column, value = constraint
+            constraints[column] = _merge(constraints.get(column), value)
+
+
+def _bounds(constraint: ColumnConstraint) -> Tuple[Optional[str], Optional[str]]:
+    low, high = constraint.low, constraint.high
+    if constraint.values:
+        ordered = sorted(constraint.values, key=functools.cmp_to_key(_compare))
+        low = ordered[0] if low is None else low
+        high = ordered[-1] if high is None else high
+    return low, high
+
+
+def _hull(a: ColumnConstraint, b: ColumnConstraint) -> Optional[ColumnConstraint]:
+    """Smallest simple constraint allowing every value either one allows (None when unconstrained)"""
+    if a.values is not None and b.values is not None and a.low is a.high is b.low is b.high is None:
+        return ColumnConstraint(values=a.values | b.values)
+    (low_a, high_a), (low_b, high_b) = _bounds(a), _bounds(b)
+    low = None if low_a is None or low_b is None else min(low_a, low_b, key=functools.cmp_to_key(_compare))
+    high = None if high_a is None or high_b is None else max(high_a, high_b, key=functools.cmp_to_key(_compare))
+    return ColumnConstraint(low=low, high=high) if low is not None or high is not None else None
+
+
+def _matching_paren(tokens: List[Token], start: int) -> int:
+    """Index of the parenthesis closing the one at start (len(tokens) when unbalanced)"""
+    depth = 0
+    for i in range(start, len(tokens)):
+        depth += tokens[i].value == "("
+        depth -= tokens[i].value == ")"
+        if depth == 0:
+            return i
+    return len(tokens)
+
+
+def _is_query(tokens: List[Token]) -> bool:
+    return bool(tokens) and tokens[0].kind == "ident" and tokens[0].lower in ("select", "with")
+
+
+def _split_with(tokens: List[Token]) -> Tuple[Dict[str, List[Token]], List[Token]]:
+    """({name: body} of a WITH clause, the statement it prefixes)"""
+    ctes: Dict[str, List[Token]] = {}
+    i = 2 if len(tokens) > 1 and tokens[1].lower == "recursive" else 1
+    while i < len(tokens) and tokens[i].kind == "ident":
+        name = tokens[i].lower
+        i += 1
+        if i < len(tokens) and tokens[i].value == "(":  # column list
+            i = _matching_paren(tokens, i) + 1
+        if i >= len(tokens) or tokens[i].lower != "as" or i + 1 >= len(tokens) or tokens[i + 1].value != "(":
+            break
+        end = _matching_paren(tokens, i + 1)
+        ctes[name] = tokens[i + 2:end]
+        i = end + 1
+        if i < len(tokens) and tokens[i].value == ",":
+            i += 1
+        else:
+            break
+    return ctes, tokens[i:]
+
+
+def _set_branches(tokens: List[Token]) -> List[List[Token]]:
+    """Split a query on top-level UNION / INTERSECT / EXCEPT"""
+    branches: List[List[Token]] = [[]]
+    depth = 0
+    skip = False
+    for token in tokens:
+        depth += token.value == "("
+        depth -= token.value == ")"
+        if depth == 0 and token.kind == "ident" and token.lower in _SET_OPERATORS:
+            branches.append([])
+            skip = True
+            continue
+        if skip and token.kind == "ident" and token.lower in ("all", "distinct"):
+            continue
+        skip = False
+        branches[-1].append(token)
+    return [b for b in branches if b]
+
+
+class _Walker:
+    """Follows a statement into its CTEs, subqueries and set-operation branches
+
+    Every read of a base table becomes a TableScan carrying the WHERE
+    predicates of its own SELECT and of the SELECTs it feeds, since Athena
+    pushes those down into CTEs and derived tables.
+    """
+
+    def __init__(self, analysis: QueryAnalysis):
+        self.analysis = analysis
+        self.expanding: Set[str] = set()
+
+    def query(self, tokens: List[Token], ctes: Dict[str, List[Token]],
+              inherited: Dict[str, ColumnConstraint], scope: str):
+        tokens = strip_parens(tokens)
+        if tokens and tokens[0].lower == "with":
+            local, tokens = _split_with(tokens)
+            ctes = {**ctes, **local}
+        branches = _set_branches(tokens)
+        for number, branch in enumerate(branches, 1):
+            label = scope
+            if len(branches) > 1:
+                label = f"{scope}, " if scope else ""
+                label += f"set branch {number}"
+            branch = strip_parens(branch)
+            if branch and branch[0].lower == "with":
+                self.query(branch, ctes, inherited, label)
+            else:
+                self.select(branch, ctes, inherited, label)
+
+    def select(self, tokens: List[Token], ctes: Dict[str, List[Token]],
+               inherited: Dict[str, ColumnConstraint], scope: str):
+        depth = 0
+        select_at = from_at = where_at = end_at = None
+        for i, token in enumerate(tokens):
+            if token.value == "(":
+                depth += 1
+            elif token.value == ")":
+                depth -= 1
+            elif depth == 0 and token.kind == "ident":
+                lower = token.lower
+                if lower == "select" and select_at is None:
+                    select_at = i
+                elif lower == "from" and select_at is not None and from_at is None:
+                    from_at = i
+                elif lower == "where" and from_at is not None and where_at is None:
+                    where_at = i
+                elif lower in _CLAUSE_END and from_at is not None and end_at is None:
+                    end_at = i
+        if select_at is None:
+            return
+        end_at = end_at if end_at is not None else len(tokens)
+
+        constraints = dict(inherited)
+        if where_at is not None:
+            _analyze_where(tokens[where_at + 1:end_at], constraints, self.analysis.findings)
+
+        star = False
+        select_list = tokens[select_at + 1:from_at if from_at is not None else end_at]
+        for i, token in enumerate(select_list):
+            if token.value == "*" and (i == 0 or select_list[i - 1].value in (",", ".")
+                                       or select_list[i - 1].lower in ("distinct", "all")):
+                star = True
+
+        sources: Set[int] = set()
+        if from_at is not None:
+            stop = where_at if where_at is not None else end_at
+            i = from_at + 1
+            while i < stop:
+                token = tokens[i]
+                starts_item = i == from_at + 1 or tokens[i - 1].value == "," or tokens[i - 1].lower == "join"
+                if starts_item and token.value == "(":
+                    close = _matching_paren(tokens, i)
+                    if _is_query(tokens[i + 1:close]):
+                        sources.add(i)
+                        self.query(tokens[i + 1:close], ctes, constraints, scope or "subquery")
+                    i = close + 1
+                    continue
+                if starts_item and token.kind == "ident" and not (i + 1 < stop and tokens[i + 1].value == "("):
+                    name = token.value
+                    j = i + 1
+                    while j + 1 < stop and tokens[j].value == ".":
+                        name += "." + tokens[j + 1].value
+                        j += 2
+                    if "." not in name and name.lower() in ctes:
+                        if name.lower() not in self.expanding:
+                            self.expanding.add(name.lower())
+                            self.query(ctes[name.lower()], ctes, constraints, f"CTE '{name.lower()}'")
+                            self.expanding.discard(name.lower())
+                    else:
+                        self.analysis.tables.append(name)
+                        self.analysis.scans.append(TableScan(name, scope, constraints))
+                        self.analysis.select_star |= star
+                    i = j
+                    continue
+                i += 1
+
+        # Subqueries elsewhere (IN (SELECT ...), scalar subqueries) read with their own predicates
+        i = select_at
+        while i < len(tokens):
+            if tokens[i].value == "(":
+                close = _matching_paren(tokens, i)
+                if i not in sources and _is_query(tokens[i + 1:close]):
+                    self.query(tokens[i + 1:close], ctes, {}, scope or "subquery")
+                if i in sources or _is_query(tokens[i + 1:close]):
+                    i = close + 1
+                    continue
+            i += 1
+
+
+def analyze(sql: str) -> QueryAnalysis:
+    """Analyze every base table read of a statement, including CTEs, subqueries and set branches"""
+    tokens = tokenize(sql)
+    if not tokens:
+        return QueryAnalysis(statement="empty")
+    analysis = QueryAnalysis(statement=tokens[0].lower)
+    if not analysis.scans_data:
+        return analysis
+
+    depth = 0
+    for i, token in enumerate(tokens):
+        depth += token.value == "("
+        depth -= token.value == ")"
+        if depth == 0 and token.value == ";":
+            tokens = tokens[:i]
+            break
+    _Walker(analysis).query(tokens, {}, {}, "")
+    analysis.columns = sorted({t.lower for t in tokens if t.kind == "ident"})
+
+    # Consumers that price or load partitions see the hull of every scan's predicates
+    if analysis.scans:
+        analysis.constraints = dict(analysis.scans[0].constraints)
+        for scan in analysis.scans[1:]:
+            for column in list(analysis.constraints):
+                other = scan.constraints.get(column)
+                hull = _hull(analysis.constraints[column], other) if other is not None else None
+                if hull is None:
+                    del analysis.constraints[column]
+                else:
+                    analysis.constraints[column] = hull
+
+    if analysis.select_star:
+        analysis.findings.append(Finding(
+            "select-star", "warning", "SELECT * reads every column; list the columns you need"))
+
+    for scan in analysis.scans:
+        where = f" in {scan.scope}" if scan.scope else ""
+        missing = [c for c in PARTITION_COLUMNS if c not in scan.constraints]
+        if len(missing) == len(PARTITION_COLUMNS):
+            finding = Finding("missing-partition-filter", "error",
+                              f"No predicate on year/month/day{where}: the query scans every partition")
+        elif missing:
+            finding = Finding("partial-partition-filter", "warning",
+                              f"No predicate on {', '.join(missing)}{where}: the query scans more than one day")
+        else:
+            continue
+        if finding not in analysis.findings:
+            analysis.findings.append(finding)
+
+    suppressed = {rule for match in _SUPPRESS_RE.finditer(sql) for rule in match.group(1).split(",")}
+    for finding in analysis.findings:
+        finding.suppressed = finding.rule in suppressed or "all" in suppressed
+    return analysis
+
+
+def lint_query(query: NamedQuery, catalog: PartitionCatalog,
+               runs_per_month: int = DEFAULT_RUNS_PER_MONTH) -> QueryReport:
+    """Lint one query and estimate its monthly Athena cost against the catalog"""
+    analysis = analyze(query.sql)
+    if not analysis.scans_data:
+        return QueryReport(query, analysis, 0, 0, None)
+
+    scanned = [partition for partition in catalog.sizes if analysis.partition_matches(partition)]
+    # Each read of the table (CTE, subquery, set branch) is billed separately
+    bytes_scanned = sum(size for partition, size in catalog.sizes.items()
+                        for scan in analysis.scans if scan.partition_matches(partition))
+    tb_per_month = bytes_scanned * runs_per_month / TB
+    cost = AWSCostEstimator.estimate_athena_costs(tb_per_month)
+    cost.resource = f"Named query: {query.name}"
+    cost.notes = f"{tb_per_month:.3f}TB scanned/month"
+    return QueryReport(query, analysis, len(scanned), bytes_scanned, cost)
+
+
+def _latest_pinned_day(queries: Iterable[NamedQuery]) -> Optional[date]:
+    """Latest day a query names exactly by year, month and day, to end the default catalog on"""
+    latest = None
+    for query in queries:
+        for scan in analyze(query.sql).scans:
+            parts = [scan.constraints.get(c) for c in PARTITION_COLUMNS]
+            if any(p is None or not p.values for p in parts):
+                continue
+            for values in itertools.product(*(sorted(p.values) for p in parts)):
+                try:
+                    day = date(*map(int, values))
+                except ValueError:
+                    continue
+                latest = max(latest, day) if latest else day
+    return latest
+
+
+def default_catalog(queries: Iterable[NamedQuery]) -> PartitionCatalog:
+    """The uniform catalog ending on the latest day the queries pin (today when none does)
+
+    Named queries hardcode example days; a catalog ending today would hold
+    none of them and price those queries at nothing.
+    """
+    return PartitionCatalog.uniform(end=_latest_pinned_day(queries))
+
+
+def lint_paths(paths: Iterable[str], catalog: Optional[PartitionCatalog] = None,
+               runs_per_month: int = DEFAULT_RUNS_PER_MONTH) -> List[QueryReport]:
+    """Lint every SQL heredoc under the given .tf files or directories"""
+    queries = extract_queries(paths)
+    catalog = catalog or default_catalog(queries)
+    return [lint_query(q, catalog, runs_per_month) for q in queries]
+
+
+def print_reports(reports: List[QueryReport], catalog: PartitionCatalog):
+    """Print formatted lint report"""
+    print("\n" + "=" * 80)
+    print(f"ATHENA QUERY LINT - catalog: {len(catalog.sizes)} partitions, "
+          f"{catalog.total_bytes / 1024 ** 3:.1f} GB")
+    print("=" * 80)
+    for report in reports:
+        print(f"\n  {report.query.name} ({os.path.basename(report.query.file)}:{report.query.line})")
+        if report.cost is None:
+            print(f"    {report.analysis.statement.upper()} statement: no data scanned")
+        else:
+            print(f"    Partitions scanned: {report.partitions_scanned}/{len(catalog.sizes)} "
+                  f"({report.bytes_scanned / 1024 ** 3:.2f} GB/run)")
+            print(f"    Cost: ${report.cost.monthly_cost:.2f} USD/month ({report.cost.notes})")
+        for finding in report.analysis.findings:
+            marker = "suppressed" if finding.suppressed else finding.severity
+            print(f"    [{marker}] {finding.rule}: {finding.message}")
+    errors = sum(len(r.errors) for r in reports)
+    print("\n" + "-" * 80)
+    print(f"  {len(reports)} queries, {errors} errors")
+    print("=" * 80 + "\n")
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Lint Athena SQL embedded in Terraform files")
+    parser.add_argument("paths", nargs="*", default=[os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "..", "terraform", "modules", "aws")],
+        help=".tf files or directories (default: the AWS module)")
+    parser.add_argument("--catalog", help='JSON partition catalog {"YYYY/MM/DD": bytes}')
+    parser.add_argument("--end-date", type=date.fromisoformat,
+                        help="Last day of the default 90-day catalog (default: the latest day the "
+                             "queries pin, else today)")
+    parser.add_argument("--runs-per-month", type=int, default=DEFAULT_RUNS_PER_MONTH,
+                        help="Executions per query per month for cost estimates")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    args = parser.parse_args()
+
+    if args.catalog:
+        catalog = PartitionCatalog.load(args.catalog)
+    elif args.end_date:
+        catalog = PartitionCatalog.uniform(end=args.end_date)
+    else:
+        catalog = default_catalog(extract_queries(args.paths))
+    reports = lint_paths(args.paths, catalog, args.runs_per_month)
+
+    if args.json:
+        print(json.dumps([{
+            "name": r.query.name,
+            "file": r.query.file,
+            "line": r.query.line,
+            "partitions_scanned": r.partitions_scanned,
+            "bytes_scanned": r.bytes_scanned,
+            "monthly_cost": r.cost.monthly_cost if r.cost else 0.0,
+            "findings": [vars(f) for f in r.analysis.findings],
+        } for r in reports], indent=2))
+    else:
+        print_reports(reports, catalog)
+
+    return 1 if any(r.errors for r in reports) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
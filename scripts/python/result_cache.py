@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+Query Result Cache
+Client-side cache of Athena query results keyed on normalized SQL, valid
+until a partition the query reads receives new objects
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from common import content_version
+from log_layout import LOG_PREFIX, Partition, live_filenames, parse_key, partition_prefix
+from query_engine import LocalTable, QueryEngine
+from query_linter import PARTITION_COLUMNS, QueryAnalysis, analyze, extract_queries, tokenize
+
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_INDEX = "index.json"
+_HIVE_RE = re.compile(r"year=(\d{4})[/\\]month=(\d{2})[/\\]day=(\d{2})(?:[/\\]|$)")
+
+
+def normalize_sql(sql: str) -> str:
+    """Canonical text for a statement: no comments, single spaces, lower-case outside quotes"""
+    parts = []
+    for token in tokenize(sql, keep_quoted=True):
+        if token.value == ";":
+            continue
+        parts.append(token.value if token.kind in ("string", "quoted") else token.lower)
+    return " ".join(parts)
+
+
+def _pinned_partitions(analysis: QueryAnalysis) -> Optional[List[Partition]]:
+    """Partitions named exactly by the WHERE clause, or None when it uses ranges or no filter"""
+    values = []
+    for column in PARTITION_COLUMNS:
+        constraint = analysis.constraints.get(column)
+        if constraint is None or constraint.values is None:
+            return None
+        values.append(sorted(constraint.values))
+    return [p for p in itertools.product(*values) if analysis.partition_matches(p)]
+
+
+class LocalBackend:
+    """Offline stand-in for Athena: query_engine.py over a local raw or Parquet tree"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def partition_versions(self, analysis: QueryAnalysis) -> Dict[Partition, str]:
+        """Version of every partition the query reads, from file names, sizes and mtimes"""
+        found: Dict[Partition, List[Tuple[str, int, int]]] = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames.sort()
+            match = _HIVE_RE.search(os.path.relpath(dirpath, self.root) + "/")
+            for filename in live_filenames(dirpath, filenames):
+                path = os.path.join(dirpath, filename)
+                if match and filename.endswith(".parquet"):
+                    partition = match.groups()
+                else:
+                    obj = parse_key(path)
+                    if obj is None:
+                        continue
+                    partition = obj.partition
+                if analysis.partition_matches(partition):
+                    stat = os.stat(path)
+                    found.setdefault(partition, []).append((path, stat.st_size, stat.st_mtime_ns))
+        return {partition: content_version(files) for partition, files in sorted(found.items())}
+
+    def execute(self, sql: str) -> Tuple[List[str], List[Tuple]]:
+        result = QueryEngine(LocalTable(self.root)).execute(sql)
+        return result.columns, result.rows
+
+
+class AthenaBackend:
+    """Runs queries in the Athena workgroup and versions partitions by listing the logs bucket"""
+
+    def __init__(self, workgroup: str, database: str, bucket: str, account_id: str,
+                 region: str = "us-east-1", prefix: str = LOG_PREFIX, poll_seconds: float = 0.5,
+                 athena=None, s3=None):
+        if athena is None or s3 is None:
+            import boto3
+
+        self.workgroup = workgroup
+        self.database = database
+        self.bucket = bucket
+        self.account_id = account_id
+        self.region = region
+        self.prefix = prefix
+        self.poll_seconds = poll_seconds
+        self.athena = athena or boto3.client("athena", region_name=region)
+        self.s3 = s3 or boto3.client("s3", region_name=region)
+
+    def _list(self, key_prefix: str) -> Iterable[Dict]:
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=key_prefix):
+            yield from page.get("Contents", [])
+
+    def _children(self, key_prefix: str) -> List[str]:
+        """Names of the "directories" directly under a key prefix"""
+        paginator = self.s3.get_paginator("list_objects_v2")
+        names = []
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=key_prefix, Delimiter="/"):
+            names.extend(common["Prefix"][len(key_prefix):-1] for common in page.get("CommonPrefixes", []))
+        return names
+
+    def _scoped_prefixes(self, analysis: QueryAnalysis) -> List[str]:
+        """Key prefixes covering the partitions a range-filtered query can read
+
+        The year, month and day levels are listed with a delimiter and only
+        matching branches are followed, stopping at the first level below
+        which some table read has no partition predicate left.
+        """
+        day = partition_prefix(self.account_id, self.region, "0000", "00", "00", prefix=self.prefix)
+        branches: List[Tuple[str, Tuple[str, ...]]] = [(day[:-len("0000/00/00/")], ())]
+        for depth in range(len(PARTITION_COLUMNS)):
+            deeper = PARTITION_COLUMNS[depth:]
+            if not all(any(column in scan.constraints for column in deeper) for scan in analysis.scans):
+                break
+            # partition_matches checks only the leading columns of a partial partition
+            branches = [(f"{key_prefix}{name}/", values + (name,))
+                        for key_prefix, values in branches for name in self._children(key_prefix)
+                        if analysis.partition_matches(values + (name,))]
+        return [key_prefix for key_prefix, _ in branches]
+
+    def partition_versions(self, analysis: QueryAnalysis) -> Dict[Partition, str]:
+        """Version of every partition the query reads, from key, size and ETag
+
+        Queries naming exact days list only those days; range filters list
+        the days they reach; unfiltered queries list the whole region prefix.
+        """
+        pinned = _pinned_partitions(analysis)
+        if pinned is not None:
+            prefixes = [partition_prefix(self.account_id, self.region, *p, prefix=self.prefix) for p in pinned]
+        else:
+            prefixes = self._scoped_prefixes(analysis)
+
+        found: Dict[Partition, List[Tuple[str, int, str]]] = {}
+        for key_prefix in prefixes:
+            for item in self._list(key_prefix):
+                obj = parse_key(item["Key"])
+                if obj is not None and analysis.partition_matches(obj.partition):
+                    found.setdefault(obj.partition, []).append((item["Key"], item["Size"], item["ETag"]))
+        return {partition: content_version(objects) for partition, objects in sorted(found.items())}
+
+    def execute(self, sql: str) -> Tuple[List[str], List[Tuple]]:
+        execution = self.athena.start_query_execution(
+            QueryString=sql, QueryExecutionContext={"Database": self.database}, WorkGroup=self.workgroup)
+        execution_id = execution["QueryExecutionId"]
+        while True:
+            status = self.athena.get_query_execution(QueryExecutionId=execution_id)["QueryExecution"]["Status"]
+            if status["State"] == "SUCCEEDED":
+                break
+            if status["State"] in ("FAILED", "CANCELLED"):
+                raise RuntimeError(f"Query {execution_id} {status['State']}: {status.get('StateChangeReason', '')}")
+            time.sleep(self.poll_seconds)
+
+        columns: List[str] = []
+        rows: List[Tuple] = []
+        paginator = self.athena.get_paginator("get_query_results")
+        for page in paginator.paginate(QueryExecutionId=execution_id):
+            if not columns:
+                columns = [c["Name"] for c in page["ResultSet"]["ResultSetMetadata"]["ColumnInfo"]]
+            for row in page["ResultSet"]["Rows"]:
+                values = tuple(d.get("VarCharValue") for d in row["Data"])
+                # The first row of the first page repeats the column names
+                if not rows and list(values) == columns:
+                    continue
+                rows.append(values)
+        return columns, rows
+
+
+class LocalStore:
+    """Cache blobs as files in a directory"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def get(self, name: str) -> Optional[bytes]:
+        try:
+            with open(os.path.join(self.path, name), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, name: str, data: bytes):
+        os.makedirs(self.path, exist_ok=True)
+        tmp = os.path.join(self.path, f".{name}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, os.path.join(self.path, name))
+
+    def delete(self, name: str):
+        try:
+            os.remove(os.path.join(self.path, name))
+        except OSError:
+            pass
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class S3Store:
+    """Cache blobs as objects under an S3 prefix, shareable between machines"""
+
+    def __init__(self, bucket: str, prefix: str = "query-cache/", s3=None):
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.s3 = s3 or boto3.client("s3")
+
+    def get(self, name: str) -> Optional[bytes]:
+        try:
+            return self.s3.get_object(Bucket=self.bucket, Key=self.prefix + name)["Body"].read()
+        except self.s3.exceptions.NoSuchKey:
+            return None
+
+    def put(self, name: str, data: bytes):
+        self.s3.put_object(Bucket=self.bucket, Key=self.prefix + name, Body=data)
+
+    def delete(self, name: str):
+        self.s3.delete_object(Bucket=self.bucket, Key=self.prefix + name)
+
+    def clear(self):
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get("Contents", []):
+                self.s3.delete_object(Bucket=self.bucket, Key=item["Key"])
+
+
+@dataclass
+class CacheStats:
+    """Counters kept across runs in the cache index"""
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    expirations: int = 0
+    evictions: int = 0
+    uncacheable: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+@dataclass
+class CachedResult:
+    """Rows for one statement and whether they came from the cache"""
+    key: str
+    columns: List[str]
+    rows: List[Tuple]
+    hit: bool
+    partitions: int
+    seconds: float = 0.0
+    reason: str = ""
+
+
+@dataclass
+class _Entry:
+    created: float
+    size: int
+    partitions: Dict[str, str] = field(default_factory=dict)
+
+
+class ResultCache:
+    """Serves repeated queries from a store until their partitions change
+
+    The key is a digest of the normalized SQL. Each entry records a version
+    per partition the query read (one digest of its objects); a lookup
+    re-lists those partitions and re-runs the query if any version differs
+    or a new matching partition appeared. Closed days never change, so
+    dashboard queries over them are served from the cache until the TTL.
+    The index lives in the store, so it is shared by every process using it
+    but not locked: concurrent writers may drop each other's entries.
+    """
+
+    def __init__(self, backend, store, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.backend = backend
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.stats = CacheStats()
+
+        raw = store.get(_INDEX)
+        if raw:
+            index = json.loads(raw)
+            # Stored least recently used first
+            for key, value in index["entries"]:
+                self._entries[key] = _Entry(**value)
+            self.stats = CacheStats(**index["stats"])
+
+    def _save_index(self):
+        index = {"entries": [[k, vars(v)] for k, v in self._entries.items()], "stats": vars(self.stats)}
+        self.store.put(_INDEX, json.dumps(index).encode())
+
+    def _drop(self, key: str):
+        self._entries.pop(key, None)
+        self.store.delete(key)
+
+    def _evict(self):
+        total = sum(e.size for e in self._entries.values())
+        while self._entries and (len(self._entries) > self.max_entries or total > self.max_bytes):
+            key, entry = next(iter(self._entries.items()))
+            total -= entry.size
+            self._drop(key)
+            self.stats.evictions += 1
+
+    def run(self, sql: str) -> CachedResult:
+        """Return rows for sql, from the cache when still valid"""
+        start = time.perf_counter()
+        analysis = analyze(sql)
+        key = hashlib.sha256(normalize_sql(sql).encode()).hexdigest()
+        if not analysis.scans_data:
+            columns, rows = self.backend.execute(sql)
+            with self._lock:
+                self.stats.uncacheable += 1
+            return CachedResult(key, columns, rows, False, 0, time.perf_counter() - start, "uncacheable")
+
+        versions = {"/".join(p): v for p, v in self.backend.partition_versions(analysis).items()}
+        with self._lock:
+            entry = self._entries.get(key)
+            reason = "miss"
+            if entry is not None and time.time() - entry.created > self.ttl_seconds:
+                reason = "expired"
+                self.stats.expirations += 1
+                self._drop(key)
+            elif entry is not None and entry.partitions != versions:
+                reason = "invalidated"
+                self.stats.invalidations += 1
+                self._drop(key)
+            elif entry is not None:
+                raw = self.store.get(key)
+                if raw is not None:
+                    self._entries.move_to_end(key)
+                    self.stats.hits += 1
+                    data = json.loads(raw)
+                    return CachedResult(key, data["columns"], [tuple(r) for r in data["rows"]], True,
+                                        len(versions), time.perf_counter() - start, "hit")
+                self._drop(key)
+            self.stats.misses += 1
+
+        columns, rows = self.backend.execute(sql)
+        data = json.dumps({"sql": sql, "columns": columns, "rows": rows}, default=str).encode()
+        with self._lock:
+            self.store.put(key, data)
+            self._entries[key] = _Entry(time.time(), len(data), versions)
+            self._entries.move_to_end(key)
+            self._evict()
+            self._save_index()
+        return CachedResult(key, columns, rows, False, len(versions), time.perf_counter() - start, reason)
+
+    def flush(self):
+        """Persist recency and hit counters (written automatically on every miss)"""
+        with self._lock:
+            self._save_index()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.stats = CacheStats()
+            self.store.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def main():
+    """Main function"""
+    default_tf = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              "..", "..", "terraform", "modules", "aws", "athena.tf")
+    parser = argparse.ArgumentParser(description="Run queries through the result cache")
+    parser.add_argument("source", nargs="?", help="Local raw or Parquet tree (offline backend)")
+    parser.add_argument("--athena", action="store_true", help="Run in Athena instead of locally")
+    parser.add_argument("--workgroup", help="Athena workgroup")
+    parser.add_argument("--database", help="Glue database")
+    parser.add_argument("--logs-bucket", help="ALB logs bucket (partition versions)")
+    parser.add_argument("--account-id", help="AWS account ID in the AWSLogs/ path")
+    parser.add_argument("--region", default="us-east-1", help="Load balancer region")
+    parser.add_argument("--cache-dir", default=".cache/query-results", help="Local cache directory")
+    parser.add_argument("--cache-bucket", help="Keep the cache in this S3 bucket instead")
+    parser.add_argument("--ttl", type=float, default=DEFAULT_TTL_SECONDS, help="Entry lifetime in seconds")
+    parser.add_argument("--max-entries", type=int, default=DEFAULT_MAX_ENTRIES, help="LRU entry limit")
+    parser.add_argument("--tf", default=default_tf, help="Terraform file(s) holding the named queries")
+    parser.add_argument("--query", action="append", help="Named query to run (repeatable; default: all)")
+    parser.add_argument("--sql", help="Run this SQL instead of the named queries")
+    parser.add_argument("--repeat", type=int, default=1, help="Run each query this many times")
+    parser.add_argument("--clear", action="store_true", help="Empty the cache and exit")
+
+    args = parser.parse_args()
+
+    store = S3Store(args.cache_bucket) if args.cache_bucket else LocalStore(args.cache_dir)
+    if args.athena:
+        if not (args.workgroup and args.database and args.logs_bucket and args.account_id):
+            parser.error("--athena needs --workgroup, --database, --logs-bucket and --account-id")
+        backend = AthenaBackend(args.workgroup, args.database, args.logs_bucket, args.account_id, args.region)
+    elif args.source:
+        backend = LocalBackend(args.source)
+    else:
+        backend = None
+
+    cache = ResultCache(backend, store, args.ttl, args.max_entries)
+    if args.clear:
+        cache.clear()
+        print("Cache cleared")
+        return 0
+    if backend is None:
+        parser.error("a local source or --athena is required")
+
+    if args.sql:
+        queries = [("sql", args.sql)]
+    else:
+        queries = [(q.name, q.sql) for q in extract_queries([args.tf])
+                   if not args.query or q.name in args.query]
+
+    for _ in range(args.repeat):
+        for name, sql in queries:
+            result = cache.run(sql)
+            print(f"{name[:28]:<28} {result.reason:<12} {len(result.rows):>6} rows "
+                  f"{result.partitions:>4} partitions {result.seconds * 1000:>9.1f} ms")
+    cache.flush()
+
+    stats = cache.stats
+    print(f"\n{len(cache)} entries; hits {stats.hits}, misses {stats.misses} "
+          f"(invalidated {stats.invalidations}, expired {stats.expirations}), evictions {stats.evictions}; "
+          f"hit rate {stats.hit_rate:.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
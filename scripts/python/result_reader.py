@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Athena Result Reader
+Streams a query's result CSV straight from the results bucket with parallel
+ranged GETs, decoding it incrementally into typed, array-backed column batches
+that can be spilled to local Parquet
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import instrumentation
+from common import require_numpy, require_pyarrow
+from instrumentation import span
+from local_aws import LocalAthena, LocalS3, split_s3_uri
+
+DEFAULT_CHUNK_BYTES = 8 * 1024 * 1024
+DEFAULT_WORKERS = 8
+
+# Athena result types -> numpy dtype; anything else (varchar, date, timestamp, ...) stays text
+_INTEGER_TYPES = ("tinyint", "smallint", "integer", "int", "bigint")
+_FLOAT_TYPES = ("float", "real", "double", "decimal")
+
+# Stands in for NULL fields between parsing and column conversion (ASCII unit
+# separator; numpy drops trailing NUL characters, so "\x00" would not survive)
+NULL = "\x1f"
+
+
+def dtype_for(athena_type: str) -> str:
+    """numpy dtype of a result column: int64, float64, bool or object (text)"""
+    base = athena_type.lower().split("(", 1)[0].strip()
+    if base in _INTEGER_TYPES:
+        return "int64"
+    if base in _FLOAT_TYPES:
+        return "float64"
+    if base == "boolean":
+        return "bool"
+    return "object"
+
+
+@dataclass
+class ColumnBatch:
+    """Rows of a result as one numpy array per column
+
+    Numeric and boolean columns carry a null mask (True where NULL, the array
+    holding 0 there); text columns hold None for NULL.
+    """
+    columns: Dict[str, object]
+    nulls: Dict[str, object] = field(default_factory=dict)
+    types: Dict[str, str] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def to_arrow(self):
+        """pyarrow RecordBatch with NULLs restored"""
+        pa, _ = require_pyarrow()
+        arrays = [pa.array(values, mask=self.nulls.get(name), from_pandas=False,
+                           type=pa.string() if values.dtype == object else None)
+                  for name, values in self.columns.items()]
+        return pa.RecordBatch.from_arrays(arrays, names=list(self.columns))
+
+
+def parse_block(text: str) -> List[List[str]]:
+    """Records of a block of complete CSV lines, with NULL fields as the NULL marker
+
+    Athena quotes every value and writes NULL as an empty, unquoted field,
+    which the csv module cannot tell from "". Splitting on quotes puts the
+    text between quoted values (commas and newlines only) at even indices, so
+    NULLs are marked there with a few block-wide replaces before one csv pass.
+    Doubled quotes inside values leave an empty segment and are untouched.
+    """
+    parts = text.split('"')
+    outside = "\x01".join(parts[0::2])
+    outside = outside.replace(",,", f",{NULL},").replace(",,", f",{NULL},")
+    outside = outside.replace(",\n", f",{NULL}\n").replace("\n,", f"\n{NULL},")
+    if outside.startswith(","):
+        outside = NULL + outside
+    if outside.endswith(","):
+        outside += NULL
+    parts[0::2] = outside.split("\x01")
+    # A blank line is a one-column record holding NULL
+    return [row or [NULL] for row in csv.reader(io.StringIO('"'.join(parts)))]
+
+
+def _record_boundary(data: bytes) -> int:
+    """Index just past the last newline outside a quoted value, or 0 if none
+
+    data starts at a record boundary and quotes inside values are doubled, so
+    a newline ends a record exactly when the quotes before it are balanced.
+    """
+    total = data.count(b'"') % 2
+    end = len(data)
+    while True:
+        newline = data.rfind(b"\n", 0, end)
+        if newline < 0:
+            return 0
+        if (total - data.count(b'"', newline)) % 2 == 0:
+            return newline + 1
+        end = newline
+
+
+class BatchDecoder:
+    """Turns string rows into a ColumnBatch, converting each column in one vectorized step"""
+
+    def __init__(self, columns: List[str], types: Optional[Dict[str, str]] = None):
+        self.columns = columns
+        self.types = {name: (types or {}).get(name, "varchar") for name in columns}
+        self.dtypes = {name: dtype_for(kind) for name, kind in self.types.items()}
+
+    def decode(self, rows: List[List[Optional[str]]], null: Optional[str] = None) -> ColumnBatch:
+        """Columns of rows; null is the value standing for NULL (None from GetQueryResults)"""
+        np = require_numpy("columnar result batches")
+        batch = ColumnBatch({}, {}, dict(self.types))
+        values_by_column = list(zip(*rows)) if rows else [()] * len(self.columns)
+        for name, values in zip(self.columns, values_by_column):
+            dtype = self.dtypes[name]
+            raw = np.empty(len(values), dtype=object)
+            raw[:] = values
+            nulls = np.equal(raw, null)
+            if dtype == "object":
+                if null is not None and nulls.any():
+                    raw[nulls] = None
+                batch.columns[name] = raw
+                continue
+            if nulls.any():
+                raw[nulls] = "false" if dtype == "bool" else "0"
+            text = raw.astype(str)
+            batch.columns[name] = text == "true" if dtype == "bool" else text.astype(dtype)
+            batch.nulls[name] = nulls
+        return batch
+
+
+@dataclass
+class TransferStats:
+    """Bytes moved, requests made and time taken by one read"""
+    method: str
+    bytes: int = 0
+    requests: int = 0
+    rows: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes / 1024 ** 2 / self.seconds if self.seconds else 0.0
+
+
+class ResultReader:
+    """Reads result objects with workers ranged GETs in flight, decoding in order as ranges land
+
+    Memory stays bounded by the ranges in flight plus one partial record, so a
+    multi-gigabyte result streams through in chunk_bytes steps.
+    """
+
+    def __init__(self, s3=None, chunk_bytes: int = DEFAULT_CHUNK_BYTES, workers: int = DEFAULT_WORKERS):
+        if s3 is None:
+            import boto3
+            s3 = boto3.client("s3")
+        self.s3 = s3
+        self.chunk_bytes = chunk_bytes
+        self.workers = workers
+        self.stats: Optional[TransferStats] = None
+
+    def _get_range(self, bucket: str, key: str, start: int, end: int) -> bytes:
+        return self.s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}")["Body"].read()
+
+    def chunks(self, uri: str) -> Iterator[bytes]:
+        """The object's bytes in order, fetched as parallel ranged GETs"""
+        bucket, key = split_s3_uri(uri)
+        size = self.s3.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        self.stats.requests += 1
+        ranges = [(start, min(size, start + self.chunk_bytes) - 1) for start in range(0, size, self.chunk_bytes)]
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ranged-get") as pool:
+            in_flight = deque()
+            pending = iter(ranges)
+            for start, end in pending:
+                in_flight.append(pool.submit(self._get_range, bucket, key, start, end))
+                if len(in_flight) >= self.workers:
+                    break
+            while in_flight:
+                data = in_flight.popleft().result()
+                following = next(pending, None)
+                if following:
+                    in_flight.append(pool.submit(self._get_range, bucket, key, *following))
+                self.stats.requests += 1
+                self.stats.bytes += len(data)
+                yield data
+
+    def read(self, uri: str, types: Optional[Dict[str, str]] = None) -> Iterator[ColumnBatch]:
+        """ColumnBatches of an Athena result CSV, one per fetched range
+
+        types maps column names to Athena types (see column_types); columns
+        without one are decoded as text.
+        """
+        self.stats = TransferStats("ranged")
+        started = time.perf_counter()
+        decoder: Optional[BatchDecoder] = None
+        carry = b""
+        for chunk in self.chunks(uri):
+            data = carry + chunk
+            boundary = _record_boundary(data)
+            complete, carry = data[:boundary], data[boundary:]
+            records = parse_block(complete.decode("utf-8"))
+            if decoder is None and records:
+                decoder = BatchDecoder(records.pop(0), types)
+            if records:
+                yield self._count(decoder.decode(records, NULL))
+        if carry.strip():
+            if carry.count(b'"') % 2:
+                raise ValueError(f"Unterminated quoted value at the end of {uri}")
+            records = parse_block(carry.decode("utf-8"))
+            if decoder is None:
+                decoder = BatchDecoder(records.pop(0), types)
+            if records:
+                yield self._count(decoder.decode(records, NULL))
+        self.stats.seconds = time.perf_counter() - started
+
+    def _count(self, batch: ColumnBatch) -> ColumnBatch:
+        self.stats.rows += len(batch)
+        self.stats.batches += 1
+        return batch
+
+    def read_execution(self, athena, execution_id: str) -> Iterator[ColumnBatch]:
+        """Batches of a finished query, locating its output and column types through Athena"""
+        execution = athena.get_query_execution(QueryExecutionId=execution_id)["QueryExecution"]
+        return self.read(execution["ResultConfiguration"]["OutputLocation"], column_types(athena, execution_id))
+
+
+def column_types(athena, execution_id: str) -> Dict[str, str]:
+    """{column: Athena type} of a finished query, from a one-row GetQueryResults call"""
+    info = athena.get_query_results(QueryExecutionId=execution_id, MaxResults=1)
+    return {c["Name"]: c["Type"] for c in info["ResultSet"]["ResultSetMetadata"]["ColumnInfo"]}
+
+
+def read_paginated(athena, execution_id: str, page_size: int = 1000,
+                   stats: Optional[TransferStats] = None) -> Iterator[ColumnBatch]:
+    """The same batches through GetQueryResults pagination, for comparison"""
+    stats = stats if stats is not None else TransferStats("paginated")
+    started = time.perf_counter()
+    decoder: Optional[BatchDecoder] = None
+    for page in athena.get_paginator("get_query_results").paginate(QueryExecutionId=execution_id,
+                                                                   MaxResults=page_size):
+        stats.requests += 1
+        info = page["ResultSet"]["ResultSetMetadata"]["ColumnInfo"]
+        rows = [[d.get("VarCharValue") for d in row["Data"]] for row in page["ResultSet"]["Rows"]]
+        if decoder is None:
+            decoder = BatchDecoder([c["Name"] for c in info], {c["Name"]: c["Type"] for c in info})
+            # The first row of the first page repeats the column names
+            if rows and rows[0] == decoder.columns:
+                rows = rows[1:]
+        if rows:
+            batch = decoder.decode(rows)
+            stats.rows += len(batch)
+            stats.batches += 1
+            yield batch
+    stats.seconds = time.perf_counter() - started
+
+
+def write_parquet(batches: Iterable[ColumnBatch], path: str, compression: str = "snappy") -> int:
+    """Stream batches into one Parquet file (one row group per batch); returns rows written"""
+    _, pq = require_pyarrow()
+    writer = None
+    rows = 0
+    tmp = path + ".tmp"
+    try:
+        for batch in batches:
+            record_batch = batch.to_arrow()
+            if writer is None:
+                writer = pq.ParquetWriter(tmp, record_batch.schema, compression=compression)
+            writer.write_batch(record_batch)
+            rows += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is not None:
+        os.replace(tmp, path)
+    return rows
+
+
+def benchmark(rate: float = 2.0, days: int = 1, chunk_bytes: int = 1024 * 1024, workers: int = DEFAULT_WORKERS,
+              get_latency: float = 0.03, connection_mbps: float = 40.0, page_latency: float = 0.1,
+              work_dir: Optional[str] = None) -> List[TransferStats]:
+    """Read one SELECT * result both ways against local stand-ins with simulated latency
+
+    Every S3 GET waits get_latency before its first byte and then moves data at
+    connection_mbps per connection; every GetQueryResults call waits
+    page_latency, roughly what each costs against the real services.
+    """
+    from log_generator import GeneratorConfig, generate
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as scratch:
+        logs = os.path.join(scratch, "logs")
+        generate(GeneratorConfig(logs, datetime(2024, 12, 16), days=days, requests_per_second=rate), workers=1)
+        s3 = LocalS3(os.path.join(scratch, "s3"))
+        athena = LocalAthena(logs, s3)
+        execution_id = athena.start_query_execution(QueryString="SELECT * FROM alb_access_logs")["QueryExecutionId"]
+        athena.wait()
+        execution = athena.get_query_execution(QueryExecutionId=execution_id)["QueryExecution"]
+        if execution["Status"]["State"] != "SUCCEEDED":
+            raise RuntimeError(execution["Status"].get("StateChangeReason", "benchmark query failed"))
+        uri = execution["ResultConfiguration"]["OutputLocation"]
+        size = s3.head_object(Bucket=split_s3_uri(uri)[0], Key=split_s3_uri(uri)[1])["ContentLength"]
+
+        s3.request_latency, s3.bytes_per_second = get_latency, connection_mbps * 1024 ** 2
+        athena.request_latency = page_latency
+        reader = ResultReader(s3, chunk_bytes, workers)
+        with span("ranged read", "io", bytes=size):
+            for _ in reader.read_execution(athena, execution_id):
+                pass
+        paginated = TransferStats("paginated", bytes=size)
+        with span("paginated read", "io", bytes=size):
+            for _ in read_paginated(athena, execution_id, stats=paginated):
+                pass
+        return [reader.stats, paginated]
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Stream Athena query results from the results bucket")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    read = sub.add_parser("read", help="Read a result object (or a query's result) into batches")
+    read.add_argument("source", help="s3://bucket/query-results/<id>.csv, or a query execution ID")
+    read.add_argument("--region", default="us-east-1", help="AWS region")
+    read.add_argument("--types", help="JSON {column: athena type} (looked up when source is an execution ID)")
+    read.add_argument("--chunk-mb", type=float, default=DEFAULT_CHUNK_BYTES / 1024 ** 2, help="Bytes per ranged GET")
+    read.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Ranged GETs in flight")
+    read.add_argument("--parquet", help="Spill the batches to this Parquet file")
+
+    bench = sub.add_parser("benchmark", help="Compare ranged reads with GetQueryResults pagination (offline)")
+    bench.add_argument("--rate", type=float, default=2.0, help="Generated requests per second of logs")
+    bench.add_argument("--days", type=int, default=1, help="Days of generated logs")
+    bench.add_argument("--chunk-mb", type=float, default=1.0, help="Bytes per ranged GET")
+    bench.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Ranged GETs in flight")
+    bench.add_argument("--get-latency", type=float, default=0.03, help="Seconds to first byte per S3 GET")
+    bench.add_argument("--connection-mbps", type=float, default=40.0, help="MB/s per S3 connection")
+    bench.add_argument("--page-latency", type=float, default=0.1, help="Seconds per GetQueryResults call")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.session("result_reader", args.trace, args.profile):
+        try:
+            if args.command == "benchmark":
+                results = benchmark(args.rate, args.days, int(args.chunk_mb * 1024 ** 2), args.workers,
+                                    args.get_latency, args.connection_mbps, args.page_latency)
+                print(f"{'Method':<12} {'MB':>8} {'Requests':>9} {'Rows':>9} {'Seconds':>9} {'MB/s':>8}")
+                for stats in results:
+                    print(f"{stats.method:<12} {stats.bytes / 1024 ** 2:>8.2f} {stats.requests:>9} "
+                          f"{stats.rows:>9} {stats.seconds:>9.2f} {stats.mb_per_second:>8.2f}")
+                print(f"\nRanged reads: {results[1].seconds / results[0].seconds:.1f}x faster")
+                return 0
+
+            reader = ResultReader(chunk_bytes=int(args.chunk_mb * 1024 ** 2), workers=args.workers)
+            if args.source.startswith("s3://"):
+                batches = reader.read(args.source, json.loads(args.types) if args.types else None)
+            else:
+                import boto3
+                batches = reader.read_execution(boto3.client("athena", region_name=args.region), args.source)
+            if args.parquet:
+                write_parquet(batches, args.parquet)
+            else:
+                for _ in batches:
+                    pass
+        except RuntimeError as e:
+            print(f"Error: {e}")
+            return 1
+
+        stats = reader.stats
+        print(f"{stats.rows} rows in {stats.batches} batches; {stats.bytes / 1024 ** 2:.2f} MB over "
+              f"{stats.requests} requests in {stats.seconds:.2f}s ({stats.mb_per_second:.1f} MB/s)")
+        if args.parquet:
+            print(f"Wrote {args.parquet}")
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,631 @@
+#!/usr/bin/env python3
+"""
+Dashboard Rollups
+Incrementally pre-aggregates each log partition into small hourly Parquet
+tables and routes eligible dashboard queries to them instead of raw rows
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from alb_log_parser import COLUMNS, iter_column_batches
+from common import content_version, require_pyarrow
+from log_layout import Partition
+from parquet_converter import hive_partition_path
+from query_engine import TABLE_NAME, LocalTable, PartitionScan, QueryEngine, QueryResult, date_format, \
+    from_iso8601_timestamp
+from query_linter import (PARTITION_COLUMNS, Token, simple_constraint, strip_parens, top_level_split,
+                          analyze, extract_queries, tokenize)
+from sketches import DEFAULT_CAPACITY, DEFAULT_RELATIVE_ACCURACY, DDSketch, SpaceSaving
+
+# Raw columns every rollup is computed from
+SOURCE_COLUMNS = [
+    "time", "elb_status_code", "target_status_code", "request_url", "request_processing_time",
+    "target_processing_time", "response_processing_time", "sent_bytes", "received_bytes",
+]
+LATENCY_COLUMNS = ["request_processing_time", "target_processing_time", "response_processing_time"]
+
+# Additive measures kept per group in the exact tables
+_MEASURES = [("requests", "bigint"), ("target_time_sum", "double"), ("target_time_count", "bigint"),
+             ("target_time_min", "double"), ("target_time_max", "double"),
+             ("sent_bytes", "bigint"), ("received_bytes", "bigint")]
+
+# Rollup table -> (dimension columns, measure columns) with Athena types.
+# status: every request by hour and status codes (exact)
+# errors: requests with an elb or target status >= 400, by hour, status codes and URL (exact)
+# latency: DDSketches of the three processing times by hour (quantiles within relative accuracy)
+# top_urls: Space-Saving heavy hitters by hour (counts overestimate by at most `error`)
+TABLES: Dict[str, Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]] = {
+    "status": ([("hour", "string"), ("elb_status_code", "int"), ("target_status_code", "int")], _MEASURES),
+    "errors": ([("hour", "string"), ("elb_status_code", "int"), ("target_status_code", "int"),
+                ("request_url", "string")], _MEASURES),
+    "latency": ([("hour", "string")], [("requests", "bigint")] + [(c, "binary") for c in LATENCY_COLUMNS]),
+    "top_urls": ([("hour", "string"), ("request_url", "string")],
+                 [("requests", "bigint"), ("error", "bigint"), ("target_time_sum", "double"),
+                  ("target_time_count", "bigint"), ("target_time_max", "double")]),
+}
+
+# Tables tried by the rewriter, exact ones first
+_ROUTE_ORDER = ["status", "errors", "latency", "top_urls"]
+
+_STATE_FILE = "_state.json"
+_FILENAME = "part-00000.parquet"
+_ERROR_STATUS = 400
+
+_HOUR_FORMAT = "'%Y-%m-%d %H:00:00'"
+_SQLITE_TYPES = {"string": "TEXT", "int": "INTEGER", "bigint": "INTEGER", "double": "REAL", "binary": "BLOB"}
+
+
+@dataclass
+class RollupResult:
+    """Outcome of rolling up one partition"""
+    partition: str
+    rows_in: int
+    bytes_in: int
+    bytes_out: int
+    seconds: float
+    skipped: bool = False
+
+
+@dataclass
+class Rewrite:
+    """A query re-targeted at a rollup table"""
+    table: str
+    sql: str
+    approximate: bool
+
+
+def _hour(value: Optional[str]) -> str:
+    return f"{value[:10]} {value[11:13]}:00:00" if value else "unknown"
+
+
+def _new_measures() -> list:
+    return [0, 0.0, 0, None, None, 0, 0]
+
+
+def _accumulate(measures: list, target_time, sent, received):
+    measures[0] += 1
+    if target_time is not None:
+        measures[1] += target_time
+        measures[2] += 1
+        measures[3] = target_time if measures[3] is None else min(measures[3], target_time)
+        measures[4] = target_time if measures[4] is None else max(measures[4], target_time)
+    measures[5] += sent or 0
+    measures[6] += received or 0
+
+
+class _PartitionRollup:
+    """Accumulates every rollup table for one day partition"""
+
+    def __init__(self, capacity: int, relative_accuracy: float):
+        self.capacity = capacity
+        self.relative_accuracy = relative_accuracy
+        self.status: Dict[tuple, list] = {}
+        self.errors: Dict[tuple, list] = {}
+        self.latency: Dict[str, List[DDSketch]] = {}
+        self.requests: Dict[str, int] = {}
+        self.urls: Dict[str, SpaceSaving] = {}
+        self.rows = 0
+
+    def add_batch(self, batch: Dict[str, list]):
+        hours: Dict[str, str] = {}
+        url_counts: Dict[str, Dict[str, list]] = {}
+        latency_values: Dict[str, Tuple[list, list, list]] = {}
+        columns = [batch[c] for c in SOURCE_COLUMNS]
+        for stamp, elb, target, url, request_time, target_time, response_time, sent, received in zip(*columns):
+            prefix = stamp[:13] if stamp else ""
+            hour = hours.get(prefix)
+            if hour is None:
+                hour = hours[prefix] = _hour(stamp)
+
+            key = (hour, elb, target)
+            measures = self.status.get(key)
+            if measures is None:
+                measures = self.status[key] = _new_measures()
+            _accumulate(measures, target_time, sent, received)
+
+            if (elb or 0) >= _ERROR_STATUS or (target or 0) >= _ERROR_STATUS:
+                key = (hour, elb, target, url)
+                measures = self.errors.get(key)
+                if measures is None:
+                    measures = self.errors[key] = _new_measures()
+                _accumulate(measures, target_time, sent, received)
+
+            values = latency_values.get(hour)
+            if values is None:
+                values = latency_values[hour] = ([], [], [])
+            # -1 marks a time that does not apply (e.g. the target never answered)
+            for pending, value in zip(values, (request_time, target_time, response_time)):
+                if value is not None and value >= 0:
+                    pending.append(value)
+
+            counts = url_counts.setdefault(hour, {})
+            counter = counts.get(url)
+            if counter is None:
+                counter = counts[url] = [0, 0, 0.0, 0, float("-inf")]
+            counter[0] += 1
+            if target_time is not None:
+                counter[2] += target_time
+                counter[3] += 1
+                counter[4] = max(counter[4], target_time)
+        self.rows += len(columns[0])
+
+        for hour, counts in url_counts.items():
+            self.urls.setdefault(hour, SpaceSaving(self.capacity)).update(counts)
+            sketches = self.latency.get(hour)
+            if sketches is None:
+                sketches = self.latency[hour] = [DDSketch(self.relative_accuracy) for _ in LATENCY_COLUMNS]
+                self.requests[hour] = 0
+            self.requests[hour] += sum(c[0] for c in counts.values())
+            for sketch, values in zip(sketches, latency_values[hour]):
+                sketch.add_many(values)
+
+    def tables(self) -> Dict[str, Dict[str, list]]:
+        def exact(groups: Dict[tuple, list], dimensions: List[str]) -> Dict[str, list]:
+            names = dimensions + [name for name, _ in _MEASURES]
+            rows = [key + tuple(measures) for key, measures in sorted(groups.items(), key=lambda i: str(i[0]))]
+            return {name: [row[i] for row in rows] for i, name in enumerate(names)}
+
+        latency = {"hour": sorted(self.latency), "requests": [self.requests[h] for h in sorted(self.latency)]}
+        for i, column in enumerate(LATENCY_COLUMNS):
+            latency[column] = [self.latency[h][i].to_bytes() for h in latency["hour"]]
+
+        top_urls: Dict[str, list] = {name: [] for name, _ in TABLES["top_urls"][0] + TABLES["top_urls"][1]}
+        for hour in sorted(self.urls):
+            for url, (count, error, value_sum, value_count, value_max) in self.urls[hour].top():
+                for name, value in zip(top_urls, (hour, url, count, error, value_sum, value_count,
+                                                  value_max if value_count else None)):
+                    top_urls[name].append(value)
+
+        return {
+            "status": exact(self.status, ["hour", "elb_status_code", "target_status_code"]),
+            "errors": exact(self.errors, ["hour", "elb_status_code", "target_status_code", "request_url"]),
+            "latency": latency,
+            "top_urls": top_urls,
+        }
+
+
+def _arrow_schema(name: str):
+    pa, _ = require_pyarrow()
+    types = {"string": pa.string(), "int": pa.int32(), "bigint": pa.int64(), "double": pa.float64(),
+             "binary": pa.binary()}
+    dimensions, measures = TABLES[name]
+    return pa.schema([pa.field(column, types[kind]) for column, kind in dimensions + measures])
+
+
+def _iter_batches(source_format: str, files: List[str]) -> Iterator[Dict[str, list]]:
+    if source_format == "raw":
+        for path in files:
+            yield from iter_column_batches(path, SOURCE_COLUMNS)
+        return
+    _, pq = require_pyarrow()
+    for path in files:
+        for batch in pq.ParquetFile(path).iter_batches(columns=SOURCE_COLUMNS):
+            yield batch.to_pydict()
+
+
+def rollup_partition(partition: Partition, files: List[str], source_format: str, output_dir: str,
+                     capacity: int = DEFAULT_CAPACITY,
+                     relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> RollupResult:
+    """Compute every rollup table for one day partition and replace its files"""
+    pa, pq = require_pyarrow()
+    start = time.perf_counter()
+    rollup = _PartitionRollup(capacity, relative_accuracy)
+    for batch in _iter_batches(source_format, files):
+        rollup.add_batch(batch)
+
+    bytes_out = 0
+    for name, data in rollup.tables().items():
+        path = os.path.join(output_dir, name, hive_partition_path(*partition), _FILENAME)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pq.write_table(pa.Table.from_pydict(data, schema=_arrow_schema(name)), path + ".tmp", compression="zstd")
+        os.replace(path + ".tmp", path)
+        bytes_out += os.path.getsize(path)
+
+    return RollupResult("/".join(partition), rollup.rows, sum(os.path.getsize(p) for p in files), bytes_out,
+                        round(time.perf_counter() - start, 3))
+
+
+class RollupStore:
+    """Rollup tables under root/<table>/year=/month=/day=/, plus the source version of each partition
+
+    update() skips partitions whose source objects are unchanged since the
+    last run. It is not incremental within a day: one new delivery makes it
+    re-aggregate every object of that day, so its cost per run grows with the
+    size of the current day rather than with the delivery.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.state: Dict[str, str] = {}
+        path = os.path.join(root, _STATE_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def _save_state(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = os.path.join(self.root, _STATE_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(tmp, os.path.join(self.root, _STATE_FILE))
+
+    def update(self, table: LocalTable, workers: int = 1, capacity: int = DEFAULT_CAPACITY,
+               relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> List[RollupResult]:
+        """Roll up new and changed partitions of a local raw or Parquet tree"""
+        require_pyarrow()
+        results: List[RollupResult] = []
+        pending: Dict[Partition, Tuple[List[str], str]] = {}
+        for partition, files in table.partitions.items():
+            version = content_version((p, os.path.getsize(p), os.stat(p).st_mtime_ns) for p in files)
+            if self.state.get("/".join(partition)) == version:
+                results.append(RollupResult("/".join(partition), 0, 0, 0, 0.0, skipped=True))
+            else:
+                pending[partition] = (files, version)
+
+        args = [(p, files, table.format, self.root, capacity, relative_accuracy) for p, (files, _) in pending.items()]
+        if workers == 1 or len(args) <= 1:
+            done = [rollup_partition(*a) for a in args]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(args))) as pool:
+                done = [f.result() for f in as_completed([pool.submit(rollup_partition, *a) for a in args])]
+
+        for result in done:
+            self.state[result.partition] = pending[tuple(result.partition.split("/"))][1]
+        self._save_state()
+        return sorted(results + done, key=lambda r: r.partition)
+
+    def partitions(self, name: str) -> Dict[Partition, str]:
+        found = {}
+        for key in self.state:
+            path = os.path.join(self.root, name, hive_partition_path(*key.split("/")), _FILENAME)
+            if os.path.exists(path):
+                found[tuple(key.split("/"))] = path
+        return dict(sorted(found.items()))
+
+    def read(self, name: str, partition: Partition) -> Dict[str, list]:
+        _, pq = require_pyarrow()
+        return pq.read_table(self.partitions(name)[partition]).to_pydict()
+
+
+# Expression rewrites: (pattern, replacement, tables). Pattern items are
+# lower-cased token values; None matches any number.
+_TIME_TABLES = {"status", "errors", "top_urls"}
+_REWRITES: List[Tuple[List[Optional[str]], str, set]] = [
+    (["count", "(", "*", ")"], "SUM(requests)", set(TABLES)),
+    (["count", "(", "1", ")"], "SUM(requests)", set(TABLES)),
+    (["date_format", "(", "from_iso8601_timestamp", "(", "time", ")", ",", _HOUR_FORMAT, ")"], "hour",
+     set(TABLES)),
+    (["avg", "(", "target_processing_time", ")"], "(SUM(target_time_sum) / SUM(target_time_count))", _TIME_TABLES),
+    (["sum", "(", "target_processing_time", ")"], "SUM(target_time_sum)", _TIME_TABLES),
+    (["max", "(", "target_processing_time", ")"], "MAX(target_time_max)", _TIME_TABLES),
+    (["min", "(", "target_processing_time", ")"], "MIN(target_time_min)", {"status", "errors"}),
+    (["sum", "(", "sent_bytes", ")"], "SUM(sent_bytes)", {"status", "errors"}),
+    (["sum", "(", "received_bytes", ")"], "SUM(received_bytes)", {"status", "errors"}),
+    (["sum", "(", "sent_bytes", "+", "received_bytes", ")"], "SUM(sent_bytes + received_bytes)", {"status", "errors"}),
+    (["sum", "(", "received_bytes", "+", "sent_bytes", ")"], "SUM(sent_bytes + received_bytes)", {"status", "errors"}),
+] + [
+    (["approx_percentile", "(", column, ",", None, ")"], f"sketch_quantile({column}, {{0}})", {"latency"})
+    for column in LATENCY_COLUMNS
+]
+
+_BASE_COLUMNS = {name for name, _ in COLUMNS}
+
+# Aggregates are only exact over rollup rows when they match a measure rewrite
+# above. Of the rest, MIN/MAX of a dimension and COUNT(dimension) (as requests
+# where it is not NULL) are also exact; anything else would aggregate rollup
+# rows rather than requests.
+_AGGREGATES = {"count", "sum", "avg", "min", "max", "count_if", "arbitrary", "any_value", "stddev", "variance",
+               "approx_distinct", "approx_percentile", "approx_most_frequent", "array_agg", "bool_and",
+               "bool_or", "checksum", "geometric_mean", "max_by", "min_by", "histogram", "map_agg"}
+
+
+def _where_tokens(tokens: List[Token]) -> List[Token]:
+    depth = 0
+    start = None
+    for i, token in enumerate(tokens):
+        depth += token.value == "("
+        depth -= token.value == ")"
+        if depth == 0 and token.kind == "ident":
+            if token.lower == "where":
+                start = i + 1
+            elif start is not None and token.lower in ("group", "order", "limit", "having"):
+                return tokens[start:i]
+    return tokens[start:] if start is not None else []
+
+
+def _only_errors(tokens: List[Token]) -> bool:
+    """Whether a top-level WHERE conjunct keeps only elb or target status >= 400"""
+    for conjunct in top_level_split(_where_tokens(tokens), "and"):
+        parsed = [simple_constraint(d) for d in top_level_split(strip_parens(conjunct), "or")]
+        if not parsed or None in parsed:
+            continue
+        columns = {column for column, _ in parsed}
+        if len(columns) != 1 or columns.pop() not in ("elb_status_code", "target_status_code"):
+            continue
+        lows = []
+        for _, constraint in parsed:
+            if constraint.values is not None:
+                lows.extend(constraint.values)
+            elif constraint.low is not None:
+                lows.append(constraint.low)
+            else:
+                lows.append("0")
+        if all(value.isdigit() and int(value) >= _ERROR_STATUS for value in lows):
+            return True
+    return False
+
+
+def _limit(tokens: List[Token]) -> Optional[int]:
+    for i, token in enumerate(tokens[:-1]):
+        if token.lower == "limit" and tokens[i + 1].kind == "number":
+            return int(tokens[i + 1].value)
+    return None
+
+
+def _top_level(tokens: List[Token], keyword: str) -> Optional[int]:
+    depth = 0
+    for i, token in enumerate(tokens):
+        depth += token.value == "("
+        depth -= token.value == ")"
+        if depth == 0 and token.kind == "ident" and token.lower == keyword:
+            return i
+    return None
+
+
+def _split_commas(tokens: List[Token]) -> List[List[Token]]:
+    parts: List[List[Token]] = [[]]
+    depth = 0
+    for token in tokens:
+        depth += token.value == "("
+        depth -= token.value == ")"
+        if depth == 0 and token.value == ",":
+            parts.append([])
+        else:
+            parts[-1].append(token)
+    return parts
+
+
+def _is_count(tokens: List[Token]) -> bool:
+    return [t.lower for t in tokens] in (["count", "(", "*", ")"], ["count", "(", "1", ")"])
+
+
+def _orders_by_count_desc(tokens: List[Token]) -> bool:
+    """Whether the first ORDER BY key is COUNT(*) (directly, by alias or by position) descending
+
+    Space-Saving keeps the most frequent URLs only, so top_urls answers
+    "most requested" lists and nothing else.
+    """
+    select_at, from_at, order_at = (_top_level(tokens, k) for k in ("select", "from", "order"))
+    if select_at is None or from_at is None or order_at is None or order_at + 1 >= len(tokens):
+        return False
+    items = _split_commas(tokens[select_at + 1:from_at])
+    key = _split_commas(tokens[order_at + 2:])[0]
+    limit_at = _top_level(key, "limit")
+    key = key[:limit_at] if limit_at is not None else key
+    if len(key) < 2 or key[-1].lower != "desc":
+        return False
+    key = key[:-1]
+    if _is_count(key):
+        return True
+    if len(key) == 1 and key[0].kind == "number":
+        position = int(key[0].value) - 1
+        item = items[position] if 0 <= position < len(items) else []
+        return _is_count(item[:4]) and len(item) in (4, 5, 6)
+    if len(key) == 1 and key[0].kind == "ident":
+        return any(_is_count(item[:4]) and item[-1].kind == "ident" and item[-1].lower == key[0].lower
+                   and len(item) in (5, 6) for item in items)
+    return False
+
+
+def _rewrite_for(tokens: List[Token], table: str) -> Optional[str]:
+    dimensions = {name for name, _ in TABLES[table][0]} | set(PARTITION_COLUMNS)
+    out: List[str] = []
+    i = 0
+    while i < len(tokens):
+        for pattern, replacement, tables in _REWRITES:
+            if table not in tables or i + len(pattern) > len(tokens):
+                continue
+            window = tokens[i:i + len(pattern)]
+            if all((t.kind == "number") if p is None else
+                   ((t.value if t.kind == "string" else t.lower) == p) for p, t in zip(pattern, window)):
+                numbers = [t.value for p, t in zip(pattern, window) if p is None]
+                out.append(replacement.format(*numbers))
+                i += len(pattern)
+                break
+        else:
+            token = tokens[i]
+            if (token.kind == "ident" and token.lower in _AGGREGATES
+                    and i + 1 < len(tokens) and tokens[i + 1].value == "("):
+                argument = tokens[i + 2:i + 4]
+                if (len(argument) != 2 or argument[1].value != ")" or argument[0].kind != "ident"
+                        or argument[0].lower not in dimensions or token.lower not in ("count", "min", "max")):
+                    return None
+                if token.lower == "count":
+                    out.append(f'SUM(CASE WHEN "{argument[0].lower}" IS NOT NULL THEN requests ELSE 0 END)')
+                    i += 4
+                    continue
+            if token.kind == "ident" and token.lower in _BASE_COLUMNS and token.lower not in dimensions:
+                return None
+            if token.kind == "ident" and token.lower == TABLE_NAME:
+                if out and out[-1] == ".":
+                    del out[-2:]
+                out.append(f"rollup_{table}")
+            elif token.kind == "ident" and not token.value.isidentifier():
+                out.append(f'"{token.value}"')
+            else:
+                out.append(token.value)
+            i += 1
+    return " ".join(out)
+
+
+def rewrite(sql: str, capacity: int = DEFAULT_CAPACITY) -> Optional[Rewrite]:
+    """Re-target a query at the first rollup table that answers it, or None
+
+    A query is eligible when it reads only alb_access_logs, every raw column
+    it references is a dimension of the rollup or appears inside a supported
+    aggregate (COUNT(*), AVG/SUM/MIN/MAX of target_processing_time,
+    SUM of sent/received bytes, approx_percentile of a processing time), and
+    its WHERE clause needs no other columns. Aggregates over dimensions are
+    limited to COUNT/MIN/MAX of a bare column; any other aggregate would be
+    computed over rollup rows instead of requests, so it is not rewritten. The errors table additionally
+    needs a status >= 400 filter; top_urls approximately answers queries
+    ordered by COUNT(*) DESC with LIMIT n <= capacity.
+    """
+    analysis = analyze(sql)
+    tokens = tokenize(sql)
+    if (not analysis.scans_data or len(analysis.tables) != 1
+            or analysis.tables[0].split(".")[-1].lower() != TABLE_NAME
+            or sum(t.lower == "select" for t in tokens) != 1):
+        return None
+    tokens = [t for t in tokens if t.value != ";"]
+
+    for table in _ROUTE_ORDER:
+        if table == "errors" and not _only_errors(tokens):
+            continue
+        if table == "top_urls" and ((_limit(tokens) or capacity + 1) > capacity
+                                    or not _orders_by_count_desc(tokens)):
+            continue
+        rewritten = _rewrite_for(tokens, table)
+        if rewritten is not None:
+            return Rewrite(table, rewritten, approximate=table in ("latency", "top_urls"))
+    return None
+
+
+class _SketchQuantile:
+    """SQLite aggregate merging serialized DDSketches and returning one quantile"""
+
+    def __init__(self):
+        self.sketch: Optional[DDSketch] = None
+        self.q = 0.5
+
+    def step(self, blob, q):
+        if blob is None:
+            return
+        self.q = q
+        sketch = DDSketch.from_bytes(blob)
+        self.sketch = sketch if self.sketch is None else self.sketch.merge(sketch)
+
+    def finalize(self):
+        return self.sketch.quantile(self.q) if self.sketch else None
+
+
+class RollupEngine:
+    """Answers eligible queries from rollups; falls back to raw data through query_engine.py"""
+
+    def __init__(self, store: RollupStore, fallback: Optional[QueryEngine] = None,
+                 capacity: int = DEFAULT_CAPACITY):
+        self.store = store
+        self.fallback = fallback
+        self.capacity = capacity
+
+    def execute(self, sql: str, name: str = "query") -> Tuple[Optional[Rewrite], QueryResult]:
+        plan = rewrite(sql, self.capacity)
+        if plan is None:
+            if self.fallback is None:
+                raise ValueError(f"{name}: no rollup can answer this query and no raw fallback is configured")
+            return None, self.fallback.execute(sql, name)
+
+        analysis = analyze(sql)
+        partitions = self.store.partitions(plan.table)
+        result = QueryResult(name, [], [], len(partitions))
+        dimensions, measures = TABLES[plan.table]
+        columns = [c for c, _ in dimensions + measures]
+
+        start = time.perf_counter()
+        connection = sqlite3.connect(":memory:")
+        connection.create_function("from_iso8601_timestamp", 1, from_iso8601_timestamp, deterministic=True)
+        connection.create_function("date_format", 2, date_format, deterministic=True)
+        connection.create_aggregate("sketch_quantile", 2, _SketchQuantile)
+        definition = ", ".join(f'"{c}" {_SQLITE_TYPES[kind]}' for c, kind in dimensions + measures)
+        connection.execute(f"CREATE TABLE rollup_{plan.table} ({definition}, "
+                           + ", ".join(f'"{c}" TEXT' for c in PARTITION_COLUMNS) + ")")
+        placeholders = ", ".join("?" * (len(columns) + len(PARTITION_COLUMNS)))
+        for partition, path in partitions.items():
+            if not analysis.partition_matches(partition):
+                continue
+            data = self.store.read(plan.table, partition)
+            rows = len(data["hour"])
+            connection.executemany(f"INSERT INTO rollup_{plan.table} VALUES ({placeholders})",
+                                   zip(*(data[c] for c in columns), *([v] * rows for v in partition)))
+            result.scans.append(PartitionScan("/".join(partition), 1, rows, os.path.getsize(path)))
+        result.load_seconds = round(time.perf_counter() - start, 6)
+
+        start = time.perf_counter()
+        cursor = connection.execute(plan.sql)
+        result.rows = cursor.fetchall()
+        result.columns = [d[0] for d in cursor.description or []]
+        result.execute_seconds = round(time.perf_counter() - start, 6)
+        connection.close()
+        return plan, result
+
+
+def main():
+    """Main function"""
+    default_tf = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              "..", "..", "terraform", "modules", "aws", "athena.tf")
+    parser = argparse.ArgumentParser(description="Build dashboard rollups and route queries to them")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    build = subparsers.add_parser("build", help="Roll up new or changed partitions")
+    build.add_argument("source", help="Raw AWSLogs tree or Parquet tree")
+    build.add_argument("rollups", help="Rollup output directory")
+    build.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Partitions in parallel")
+    build.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY, help="Top URLs kept per hour")
+    build.add_argument("--accuracy", type=float, default=DEFAULT_RELATIVE_ACCURACY,
+                       help="Relative accuracy of latency quantiles")
+
+    query = subparsers.add_parser("query", help="Run queries against rollups, comparing with raw data")
+    query.add_argument("rollups", help="Rollup directory")
+    query.add_argument("--source", help="Raw or Parquet tree for queries rollups cannot answer")
+    query.add_argument("--tf", default=default_tf, help="Terraform file(s) holding the named queries")
+    query.add_argument("--sql", help="Run this SQL instead of the named queries")
+    query.add_argument("--rows", type=int, default=0, help="Result rows to print per query")
+
+    args = parser.parse_args()
+
+    if args.action == "build":
+        store = RollupStore(args.rollups)
+        results = store.update(LocalTable(args.source), args.workers, args.capacity, args.accuracy)
+        for r in results:
+            if r.skipped:
+                print(f"  {r.partition}: unchanged")
+            else:
+                print(f"  {r.partition}: {r.rows_in:,} rows, {r.bytes_in:,} -> {r.bytes_out:,} bytes "
+                      f"in {r.seconds:.2f}s")
+        return 0
+
+    store = RollupStore(args.rollups)
+    raw = QueryEngine(LocalTable(args.source)) if args.source else None
+    engine = RollupEngine(store, raw)
+    queries = [("sql", args.sql)] if args.sql else [(q.name, q.sql) for q in extract_queries([args.tf])]
+
+    print(f"\n{'Query':<28} {'Source':<18} {'Rows out':>9} {'Bytes read':>13} {'Raw bytes':>13} {'Wall ms':>9}")
+    print("-" * 96)
+    for name, sql in queries:
+        if not analyze(sql).scans_data:
+            continue
+        plan, result = engine.execute(sql, name)
+        source = "raw" if plan is None else f"rollup_{plan.table}" + ("~" if plan.approximate else "")
+        if raw is None:
+            raw_bytes = "-"
+        else:
+            raw_bytes = f"{raw.execute(sql, name).bytes_read if plan else result.bytes_read:,}"
+        print(f"{name[:28]:<28} {source:<18} {len(result.rows):>9,} {result.bytes_read:>13,} "
+              f"{raw_bytes:>13} {result.wall_seconds * 1000:>9.1f}")
+        for row in result.rows[:args.rows]:
+            print("    " + " | ".join(str(v) for v in row))
+    print("-" * 96)
+    print("~ approximate: latency quantiles within the sketch accuracy, top URL counts within their error")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
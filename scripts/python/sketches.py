@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Mergeable Sketches
+Quantile (DDSketch), heavy-hitter (Space-Saving) and membership (Bloom)
+summaries that can be computed per partition and merged across any time range
+"""
+
+import hashlib
+import math
+import struct
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+from common import optional_numpy, read_varint, write_varint
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+DEFAULT_MAX_BINS = 2048
+DEFAULT_CAPACITY = 200
+DEFAULT_FALSE_POSITIVE_RATE = 0.01
+
+# Values below this are counted in the zero bucket
+MIN_INDEXABLE = 1e-9
+
+_HEADER = struct.Struct("<dqqddd")
+_BLOOM_HEADER = struct.Struct("<II")
+
+# Below this many values the per-value loop beats numpy's setup cost
+_BULK_THRESHOLD = 64
+
+
+class DDSketch:
+    """Quantile sketch with a relative error guarantee
+
+    Values fall in logarithmic buckets of ratio gamma = (1 + a) / (1 - a), so
+    every quantile is returned within relative accuracy a of the true value.
+    Sketches with the same accuracy merge exactly by adding bucket counts.
+    When more than max_bins buckets exist the lowest ones are collapsed,
+    which only affects the lowest quantiles.
+    """
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY, max_bins: int = DEFAULT_MAX_BINS):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sum = 0.0
+
+    def key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def value(self, key: int) -> float:
+        """Representative value of a bucket (minimizes relative error)"""
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value: float, count: int = 1):
+        if value < 0:
+            raise ValueError(f"DDSketch only accepts non-negative values, got {value}")
+        if value < MIN_INDEXABLE:
+            self.zero_count += count
+        else:
+            key = self.key(value)
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.count += count
+        self.sum += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def update(self, values: Iterable[float]):
+        for value in values:
+            self.add(value)
+
+    def add_many(self, values) -> int:
+        """Add a batch of values (list or array), skipping None/NaN; returns how many were added
+
+        Bucket keys for the whole batch are computed in one vectorized step
+        and counted with np.unique, which is what makes a single streaming
+        pass over millions of log lines cheap.
+        """
+        np = optional_numpy()
+        if np is None or len(values) < _BULK_THRESHOLD:
+            added = 0
+            for value in values:
+                if value is not None and value == value:
+                    self.add(value)
+                    added += 1
+            return added
+
+        array = np.asarray(values, dtype=np.float64)
+        array = array[~np.isnan(array)]
+        if not array.size:
+            return 0
+        if array.min() < 0:
+            raise ValueError(f"DDSketch only accepts non-negative values, got {array.min()}")
+        indexable = array[array >= MIN_INDEXABLE]
+        keys, counts = np.unique(np.ceil(np.log(indexable) / self._log_gamma).astype(np.int64),
+                                 return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += int(array.size - indexable.size)
+        self.count += int(array.size)
+        self.sum += float(array.sum())
+        self.min = min(self.min, float(array.min()))
+        self.max = max(self.max, float(array.max()))
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+        return int(array.size)
+
+    def _collapse(self):
+        keys = sorted(self.bins)
+        excess = keys[:len(keys) - self.max_bins + 1]
+        target = keys[len(excess)]
+        self.bins[target] += sum(self.bins.pop(k) for k in excess)
+
+    def merge(self, other: "DDSketch"):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Value at quantile q (0-1), or None for an empty sketch"""
+        if not self.count:
+            return None
+        if not 0 <= q <= 1:
+            raise ValueError("q must be between 0 and 1")
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return max(self.min, 0.0)
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                return min(max(self.value(key), self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def to_bytes(self) -> bytes:
+        """Header plus delta/varint-encoded buckets; typically a few hundred bytes"""
+        out = bytearray(_HEADER.pack(self.relative_accuracy, self.count, self.zero_count,
+                                     self.min, self.max, self.sum))
+        keys = sorted(self.bins)
+        write_varint(out, len(keys))
+        previous = 0
+        for key in keys:
+            delta = key - previous
+            write_varint(out, (delta << 1) ^ (delta >> 63))  # zigzag
+            write_varint(out, self.bins[key])
+            previous = key
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, max_bins: int = DEFAULT_MAX_BINS) -> "DDSketch":
+        accuracy, count, zero_count, low, high, total = _HEADER.unpack_from(data)
+        sketch = cls(accuracy, max_bins)
+        sketch.count, sketch.zero_count, sketch.min, sketch.max, sketch.sum = count, zero_count, low, high, total
+        pos = _HEADER.size
+        size, pos = read_varint(data, pos)
+        key = 0
+        for _ in range(size):
+            encoded, pos = read_varint(data, pos)
+            key += (encoded >> 1) ^ -(encoded & 1)
+            sketch.bins[key], pos = read_varint(data, pos)
+        return sketch
+
+
+class SpaceSaving:
+    """Top-k heavy hitters with per-key value aggregates
+
+    Keeps at most capacity counters. A key's count overestimates its true
+    count by at most its error, and any key with true count above
+    total / capacity is retained. Each counter also carries the sum, count
+    and max of an optional value (e.g. processing time) seen with the key.
+    Updates are applied in batches (exact counts merged in), which is both
+    faster than per-row updates and the same operation as merging sketches.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        # key -> [count, error, value_sum, value_count, value_max]
+        self.counters: Dict[Hashable, List[float]] = {}
+        self.total = 0
+
+    @property
+    def floor(self) -> int:
+        """Smallest retained count once full: the most an unseen key can have"""
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(c[0] for c in self.counters.values())
+
+    def add(self, key: Hashable, count: int = 1, value: Optional[float] = None):
+        self.update({key: [count, 0, value or 0.0, 1 if value is not None else 0,
+                           value if value is not None else -math.inf]})
+
+    def update(self, counters: Dict[Hashable, List[float]], floor: int = 0, total: Optional[int] = None):
+        """Merge another summary's counters (exact counts when floor is 0)"""
+        own_floor = self.floor
+        merged = {}
+        for key in self.counters.keys() | counters.keys():
+            mine = self.counters.get(key)
+            theirs = counters.get(key)
+            count = (mine[0] if mine else own_floor) + (theirs[0] if theirs else floor)
+            error = (mine[1] if mine else own_floor) + (theirs[1] if theirs else floor)
+            value_sum = (mine[2] if mine else 0.0) + (theirs[2] if theirs else 0.0)
+            value_count = (mine[3] if mine else 0) + (theirs[3] if theirs else 0)
+            value_max = max(mine[4] if mine else -math.inf, theirs[4] if theirs else -math.inf)
+            merged[key] = [count, error, value_sum, value_count, value_max]
+        if len(merged) > self.capacity:
+            merged = dict(sorted(merged.items(), key=lambda item: -item[1][0])[:self.capacity])
+        self.counters = merged
+        self.total += total if total is not None else sum(c[0] for c in counters.values())
+
+    def merge(self, other: "SpaceSaving"):
+        self.update(other.counters, other.floor, other.total)
+        return self
+
+    def top(self, n: Optional[int] = None) -> List[Tuple[Hashable, List[float]]]:
+        """(key, [count, error, value_sum, value_count, value_max]) by descending count"""
+        ranked = sorted(self.counters.items(), key=lambda item: -item[1][0])
+        return ranked[:n] if n is not None else ranked
+
+
+class BloomFilter:
+    """Set membership with no false negatives and a bounded false positive rate
+
+    Positions come from double hashing one 128-bit blake2b digest per value,
+    so adding or probing costs a single hash regardless of the number of
+    hash functions. Filters of the same size merge by OR-ing their bits.
+    """
+
+    def __init__(self, bits: int, hashes: int, data: Optional[bytes] = None):
+        self.bits = bits
+        self.hashes = hashes
+        self.data = bytearray(data) if data is not None else bytearray((bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, items: int, false_positive_rate: float = DEFAULT_FALSE_POSITIVE_RATE) -> "BloomFilter":
+        """Smallest filter holding items values at the given false positive rate"""
+        if not 0 < false_positive_rate < 1:
+            raise ValueError("false_positive_rate must be between 0 and 1")
+        items = max(items, 1)
+        bits = max(64, math.ceil(-items * math.log(false_positive_rate) / math.log(2) ** 2))
+        bits = (bits + 7) // 8 * 8
+        return cls(bits, max(1, round(bits / items * math.log(2))))
+
+    def _positions(self, value: str) -> Iterator[int]:
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.bits
+
+    def add(self, value: str):
+        for position in self._positions(value):
+            self.data[position >> 3] |= 1 << (position & 7)
+
+    def update(self, values: Iterable[str]):
+        for value in values:
+            self.add(value)
+
+    def __contains__(self, value: str) -> bool:
+        return all(self.data[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    def merge(self, other: "BloomFilter"):
+        if (other.bits, other.hashes) != (self.bits, self.hashes):
+            raise ValueError("Cannot merge Bloom filters of different sizes")
+        self.data = bytearray(a | b for a, b in zip(self.data, other.data))
+        return self
+
+    def to_bytes(self) -> bytes:
+        return _BLOOM_HEADER.pack(self.bits, self.hashes) + bytes(self.data)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "BloomFilter":
+        bits, hashes = _BLOOM_HEADER.unpack_from(data)
+        return cls(bits, hashes, data[_BLOOM_HEADER.size:_BLOOM_HEADER.size + (bits + 7) // 8])
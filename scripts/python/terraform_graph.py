@@ -0,0 +1,582 @@
+#!/usr/bin/env python3
+"""
+Terraform Resource Graph
+Parses Terraform modules (HCL files or `terraform show -json` plan output)
+into resources and the references between them, so diagrams follow the code
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from common import require_diagrams
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Bumped whenever the parsed-file format changes, invalidating cached parses
+PARSER_VERSION = 1
+
+_HEREDOC_RE = re.compile(r"<<-?([A-Za-z_][A-Za-z0-9_]*)[ \t]*\n")
+_HEADER_RE = re.compile(r'^([A-Za-z_][\w-]*)((?:\s+(?:"[^"\n]*"|[A-Za-z_][\w-]*))*)\s*$')
+_LABEL_RE = re.compile(r'"([^"\n]*)"|([A-Za-z_][\w-]*)')
+_REFERENCE_RE = re.compile(
+    r"(?<![\w.])((?:data\.)?[a-z][a-z0-9]*_[a-z0-9_]+\.[A-Za-z_][\w-]*"
+    r"|(?:module|local|var)\.[A-Za-z_][\w-]*(?:\.[A-Za-z_][\w-]*)?)"
+)
+
+# Resource type prefix -> (diagrams module, node class); first match wins
+RESOURCE_NODES = [
+    ("aws_s3_", "diagrams.aws.storage", "S3"),
+    ("aws_glue_", "diagrams.aws.analytics", "Glue"),
+    ("aws_athena_", "diagrams.aws.analytics", "Athena"),
+    ("aws_iam_", "diagrams.aws.security", "IAMRole"),
+    ("aws_lb", "diagrams.aws.network", "ELB"),
+    ("aws_alb", "diagrams.aws.network", "ELB"),
+    ("aws_", "diagrams.aws.general", "General"),
+    ("google_storage_", "diagrams.gcp.storage", "GCS"),
+    ("google_bigquery_", "diagrams.gcp.analytics", "BigQuery"),
+    ("google_", "diagrams.gcp.compute", "Functions"),
+    ("azurerm_storage_", "diagrams.azure.storage", "BlobStorage"),
+    ("azurerm_synapse_", "diagrams.azure.analytics", "Synapse"),
+    ("azurerm_resource_group", "diagrams.azure.general", "Resourcegroups"),
+    ("azurerm_", "diagrams.azure.general", "Resource"),
+    ("", "diagrams.generic.blank", "Blank"),
+]
+
+
+def default_cache_dir(repo_root: str = REPO_ROOT) -> str:
+    """TERRAFORM_GRAPH_CACHE_DIR, or .cache/terraform-graph under the repository"""
+    return os.environ.get("TERRAFORM_GRAPH_CACHE_DIR") or os.path.join(repo_root, ".cache", "terraform-graph")
+
+
+def _mask(text: str) -> Tuple[str, str]:
+    """(structure, expressions): both the length of text with comments blanked out
+
+    structure also blanks string and heredoc contents, so brackets in it are
+    real HCL structure; expressions only blanks their literal text, keeping
+    ${...} interpolations where references can appear.
+    """
+    structure, source = list(text), list(text)
+    n = len(text)
+
+    def blank(chars: List[str], start: int, end: int):
+        for k in range(start, end):
+            if chars[k] != "\n":
+                chars[k] = " "
+
+    def blank_literal(start: int, end: int):
+        k = start
+        while k < end:
+            if text.startswith("${", k):
+                depth = 1
+                k += 2
+                while k < end and depth:
+                    depth += {"{": 1, "}": -1}.get(text[k], 0)
+                    k += 1
+            else:
+                if source[k] != "\n":
+                    source[k] = " "
+                k += 1
+
+    i = 0
+    while i < n:
+        c = text[i]
+        if c == "#" or text.startswith("//", i):
+            end = text.find("\n", i)
+            end = n if end < 0 else end
+            blank(structure, i, end)
+            blank(source, i, end)
+            i = end
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            end = n if end < 0 else end + 2
+            blank(structure, i, end)
+            blank(source, i, end)
+            i = end
+        elif text.startswith("<<", i) and _HEREDOC_RE.match(text, i):
+            match = _HEREDOC_RE.match(text, i)
+            close = re.compile(rf"^[ \t]*{re.escape(match.group(1))}[ \t]*$", re.M).search(text, match.end())
+            end = close.start() if close else n
+            blank(structure, match.end(), end)
+            blank_literal(match.end(), end)
+            i = close.end() if close else n
+        elif c == '"':
+            j, depth = i + 1, 0
+            while j < n:
+                if text[j] == "\\":
+                    j += 2
+                    continue
+                if text.startswith("${", j):
+                    depth += 1
+                    j += 2
+                    continue
+                if depth and text[j] == "}":
+                    depth -= 1
+                elif depth and text[j] == "{":
+                    depth += 1
+                elif not depth and text[j] in '"\n':
+                    break
+                j += 1
+            blank(structure, i + 1, min(j, n))
+            blank_literal(i + 1, min(j, n))
+            i = j + 1
+        else:
+            i += 1
+    return "".join(structure), "".join(source)
+
+
+def _statements(structure: str, text: str, start: int, end: int) -> List[Tuple]:
+    """Top-level ("block", header, body start, body end) and ("attr", name, expr start, expr end) items"""
+    items = []
+    depth = 0
+    statement = start
+    block_open = None
+    for i in range(start, end):
+        c = structure[i]
+        if c in "{[(":
+            if depth == 0 and c == "{" and "=" not in structure[statement:i]:
+                block_open = i
+            depth += 1
+        elif c in "}])":
+            depth -= 1
+            if depth == 0 and c == "}" and block_open is not None:
+                items.append(("block", text[statement:block_open].strip(), block_open + 1, i))
+                block_open = None
+                statement = i + 1
+        elif c == "\n" and depth == 0:
+            _attribute(items, structure, statement, i)
+            statement = i + 1
+    _attribute(items, structure, statement, end)
+    return items
+
+
+def _attribute(items: List[Tuple], structure: str, start: int, end: int):
+    equals = structure.find("=", start, end)
+    if equals > start and structure[equals + 1:equals + 2] != "=":
+        name = structure[start:equals].strip()
+        if re.fullmatch(r"[A-Za-z_][\w-]*", name):
+            items.append(("attr", name, equals + 1, end))
+
+
+def _references(text: str) -> List[str]:
+    """Candidate addresses in an expression: type.name, data.type.name, module.x.y, local.x, var.x"""
+    found = []
+    for match in _REFERENCE_RE.finditer(text):
+        reference = match.group(1)
+        head = reference.split(".", 1)[0]
+        if head in ("local", "var"):
+            reference = ".".join(reference.split(".")[:2])
+        elif head not in ("module", "data"):
+            reference = ".".join(reference.split(".")[:2])
+        elif head == "data":
+            reference = ".".join(reference.split(".")[:3])
+        if reference not in found:
+            found.append(reference)
+    return found
+
+
+def parse_file(text: str) -> List[Dict]:
+    """Blocks of one .tf file with their labels, line and referenced addresses
+
+    Attributes are kept for locals, outputs and module calls (whose inputs
+    and values are resolved across modules); other blocks only keep the
+    references found anywhere in their body, including nested blocks.
+    """
+    structure, source = _mask(text)
+    blocks = []
+    for kind, header, body_start, body_end in (s for s in _statements(structure, text, 0, len(text))
+                                               if s[0] == "block"):
+        match = _HEADER_RE.match(header)
+        if not match:
+            continue
+        labels = [quoted or bare for quoted, bare in _LABEL_RE.findall(match.group(2))]
+        block = {
+            "kind": match.group(1),
+            "labels": labels,
+            "line": text.count("\n", 0, body_start) + 1,
+            "references": _references(source[body_start:body_end]),
+        }
+        if block["kind"] in ("locals", "output", "module"):
+            block["attributes"] = {}
+            for item in _statements(structure, text, body_start, body_end):
+                if item[0] == "attr":
+                    block["attributes"][item[1]] = {
+                        "references": _references(source[item[2]:item[3]]),
+                        "literal": text[item[2]:item[3]].strip().strip('"') if item[1] == "source" else None,
+                    }
+        blocks.append(block)
+    return blocks
+
+
+@dataclass
+class ParseStats:
+    """How much of a graph build came from the parse cache"""
+    files: int = 0
+    parsed: int = 0
+    cached: int = 0
+
+
+class ParseCache:
+    """Parsed files by content hash, so unchanged files are never re-parsed"""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root
+        self.stats = ParseStats()
+
+    def parse(self, path: str) -> List[Dict]:
+        with open(path, "rb") as f:
+            data = f.read()
+        self.stats.files += 1
+        key = hashlib.sha256(b"%d\0" % PARSER_VERSION + data).hexdigest()
+        cached = os.path.join(self.root, key[:2], f"{key}.json") if self.root else None
+        if cached and os.path.exists(cached):
+            with open(cached) as f:
+                self.stats.cached += 1
+                return json.load(f)
+
+        blocks = parse_file(data.decode("utf-8", errors="replace"))
+        self.stats.parsed += 1
+        if cached:
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            with open(cached + ".tmp", "w") as f:
+                json.dump(blocks, f)
+            os.replace(cached + ".tmp", cached)
+        return blocks
+
+
+@dataclass
+class Resource:
+    """A resource or data source, with the addresses it references"""
+    address: str
+    type: str
+    name: str
+    module: str = ""
+    file: str = ""
+    line: int = 0
+    mode: str = "managed"
+    references: List[str] = field(default_factory=list)
+    members: List[str] = field(default_factory=list)
+
+
+@dataclass
+class ResourceGraph:
+    """Resources by address; an edge a -> b means a references b"""
+    resources: Dict[str, Resource] = field(default_factory=dict)
+
+    @property
+    def edges(self) -> List[Tuple[str, str]]:
+        return [(address, target) for address, resource in sorted(self.resources.items())
+                for target in resource.references]
+
+    def collapse(self) -> "ResourceGraph":
+        """Fold satellite resources into the resource they configure
+
+        A resource whose type extends a type it references (aws_s3_bucket_policy
+        -> aws_s3_bucket, aws_iam_role_policy -> aws_iam_role) becomes a member
+        of that resource; edges to and from it move to the parent.
+        """
+        parent: Dict[str, str] = {}
+        for address, resource in self.resources.items():
+            for target in resource.references:
+                other = self.resources.get(target)
+                if other and other.module == resource.module and resource.type.startswith(other.type + "_"):
+                    parent[address] = target
+                    break
+
+        def root(address: str) -> str:
+            while address in parent:
+                address = parent[address]
+            return address
+
+        collapsed = ResourceGraph()
+        for address, resource in self.resources.items():
+            if address not in parent:
+                collapsed.resources[address] = Resource(**{**asdict(resource), "references": [], "members": []})
+        for address, resource in sorted(self.resources.items()):
+            owner = collapsed.resources[root(address)]
+            if address != owner.address:
+                owner.members.append(address)
+            for target in resource.references:
+                target = root(target)
+                if target != owner.address and target not in owner.references:
+                    owner.references.append(target)
+        return collapsed
+
+    def to_dict(self) -> Dict:
+        return {"resources": [asdict(r) for _, r in sorted(self.resources.items())], "edges": self.edges}
+
+    def to_dot(self, title: str = "terraform") -> str:
+        """Graphviz DOT with one cluster per module"""
+        lines = [f'digraph "{title}" {{', "  rankdir=LR;", '  node [shape=box, fontname="Helvetica"];']
+        by_module: Dict[str, List[Resource]] = {}
+        for resource in self.resources.values():
+            by_module.setdefault(resource.module, []).append(resource)
+        for index, (module, resources) in enumerate(sorted(by_module.items())):
+            indent = "  "
+            if module:
+                lines.append(f'  subgraph "cluster_{index}" {{')
+                lines.append(f'    label="{module}";')
+                indent = "    "
+            for resource in sorted(resources, key=lambda r: r.address):
+                label = f"{resource.type}\\n{resource.name}"
+                if resource.members:
+                    label += f"\\n(+{len(resource.members)})"
+                lines.append(f'{indent}"{resource.address}" [label="{label}"];')
+            if module:
+                lines.append("  }")
+        for source, target in self.edges:
+            lines.append(f'  "{source}" -> "{target}";')
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+
+def _module_label(prefix: str) -> str:
+    return ".".join(part for part in prefix.split(".") if part and part != "module")
+
+
+def _resolve(references: Iterable[str], addresses: Set[str], locals_: Dict[str, List[str]],
+             outputs: Dict[str, Dict[str, List[str]]], inputs: Dict[str, List[str]],
+             prefix: str, seen: Optional[Set[str]] = None) -> List[str]:
+    """Turn candidate references into resource addresses, following locals, module outputs and inputs"""
+    seen = seen if seen is not None else set()
+    resolved: List[str] = []
+    for reference in references:
+        if reference in seen:
+            continue
+        seen.add(reference)
+        parts = reference.split(".")
+        if parts[0] == "local":
+            targets = _resolve(locals_.get(parts[1], []), addresses, locals_, outputs, inputs, prefix, seen)
+        elif parts[0] == "var":
+            targets = inputs.get(parts[1], [])
+        elif parts[0] == "module":
+            module_outputs = outputs.get(parts[1], {})
+            targets = (module_outputs.get(parts[2], []) if len(parts) > 2
+                       else [a for values in module_outputs.values() for a in values])
+        else:
+            address = prefix + reference
+            targets = [address] if address in addresses else []
+        for target in targets:
+            if target not in resolved:
+                resolved.append(target)
+    return resolved
+
+
+def _load_module(path: str, cache: ParseCache) -> List[Tuple[str, Dict]]:
+    blocks = []
+    for filename in sorted(os.listdir(path)):
+        if filename.endswith(".tf"):
+            blocks.extend((filename, block) for block in cache.parse(os.path.join(path, filename)))
+    return blocks
+
+
+def _build(path: str, cache: ParseCache, graph: ResourceGraph, prefix: str = "",
+           inputs: Optional[Dict[str, List[str]]] = None, depth: int = 0) -> Dict[str, List[str]]:
+    """Add a module's resources (and its child modules') to graph; returns its outputs"""
+    if depth > 16:
+        raise ValueError(f"Module nesting too deep at {path}")
+    inputs = inputs or {}
+    blocks = _load_module(path, cache)
+    module = _module_label(prefix)
+
+    addresses: Set[str] = set()
+    locals_: Dict[str, List[str]] = {}
+    for filename, block in blocks:
+        if block["kind"] == "resource" and len(block["labels"]) == 2:
+            addresses.add(prefix + ".".join(block["labels"]))
+        elif block["kind"] == "data" and len(block["labels"]) == 2:
+            addresses.add(prefix + "data." + ".".join(block["labels"]))
+        elif block["kind"] == "locals":
+            for name, attribute in block["attributes"].items():
+                locals_[name] = attribute["references"]
+
+    # Child modules first, so references to module.<name>.<output> resolve
+    module_outputs: Dict[str, Dict[str, List[str]]] = {}
+    for filename, block in blocks:
+        if block["kind"] != "module" or not block["labels"]:
+            continue
+        name = block["labels"][0]
+        source = (block["attributes"].get("source") or {}).get("literal") or ""
+        child_path = os.path.normpath(os.path.join(path, source))
+        if not source.startswith(".") or not os.path.isdir(child_path):
+            continue  # registry and remote modules are not walked
+        child_inputs = {
+            key: _resolve(attribute["references"], addresses, locals_, {}, inputs, prefix)
+            for key, attribute in block["attributes"].items() if key != "source"
+        }
+        module_outputs[name] = _build(child_path, cache, graph, f"{prefix}module.{name}.", child_inputs, depth + 1)
+        addresses.update(a for a in graph.resources if a.startswith(f"{prefix}module.{name}."))
+
+    for filename, block in blocks:
+        if block["kind"] not in ("resource", "data") or len(block["labels"]) != 2:
+            continue
+        data = block["kind"] == "data"
+        address = prefix + ("data." if data else "") + ".".join(block["labels"])
+        references = [a for a in _resolve(block["references"], addresses, locals_, module_outputs, inputs, prefix)
+                      if a != address]
+        graph.resources[address] = Resource(
+            address=address, type=block["labels"][0], name=block["labels"][1], module=module,
+            file=os.path.relpath(os.path.join(path, filename), REPO_ROOT), line=block["line"],
+            mode="data" if data else "managed", references=references,
+        )
+
+    outputs: Dict[str, List[str]] = {}
+    for filename, block in blocks:
+        if block["kind"] == "output" and block["labels"]:
+            value = block["attributes"].get("value", {"references": []})
+            outputs[block["labels"][0]] = _resolve(value["references"], addresses, locals_, module_outputs,
+                                                   inputs, prefix)
+    return outputs
+
+
+def graph_from_hcl(path: str, cache: Optional[ParseCache] = None) -> ResourceGraph:
+    """Resource graph of the module at path, walking local child modules"""
+    graph = ResourceGraph()
+    _build(path, cache or ParseCache(), graph)
+    return graph
+
+
+def _plan_references(expressions) -> List[str]:
+    found: List[str] = []
+    if isinstance(expressions, dict):
+        for key, value in expressions.items():
+            if key == "references" and isinstance(value, list):
+                found.extend(v for v in value if isinstance(v, str))
+            else:
+                found.extend(_plan_references(value))
+    elif isinstance(expressions, list):
+        for value in expressions:
+            found.extend(_plan_references(value))
+    return found
+
+
+def _build_plan_module(config: Dict, graph: ResourceGraph, prefix: str = "",
+                       inputs: Optional[Dict[str, List[str]]] = None) -> Dict[str, List[str]]:
+    inputs = inputs or {}
+    module = _module_label(prefix)
+    resources = config.get("resources", [])
+    addresses = {prefix + r["address"] for r in resources}
+
+    module_outputs: Dict[str, Dict[str, List[str]]] = {}
+    for name, call in sorted(config.get("module_calls", {}).items()):
+        child_inputs = {
+            key: _resolve(_plan_references(value), addresses, {}, {}, inputs, prefix)
+            for key, value in call.get("expressions", {}).items()
+        }
+        module_outputs[name] = _build_plan_module(call.get("module", {}), graph, f"{prefix}module.{name}.",
+                                                  child_inputs)
+        addresses.update(a for a in graph.resources if a.startswith(f"{prefix}module.{name}."))
+
+    for resource in resources:
+        address = prefix + resource["address"]
+        candidates = [".".join(r.split(".")[:3 if r.startswith(("data.", "module.")) else 2])
+                      for r in _plan_references(resource.get("expressions", {}))]
+        graph.resources[address] = Resource(
+            address=address, type=resource["type"], name=resource["name"], module=module,
+            mode=resource.get("mode", "managed"),
+            references=[a for a in _resolve(dict.fromkeys(candidates), addresses, {}, module_outputs, inputs, prefix)
+                        if a != address],
+        )
+
+    return {name: _resolve(dict.fromkeys(".".join(r.split(".")[:3 if r.startswith(("data.", "module.")) else 2])
+                                         for r in _plan_references(output.get("expression", {}))),
+                           addresses, {}, module_outputs, inputs, prefix)
+            for name, output in config.get("outputs", {}).items()}
+
+
+def graph_from_plan(plan: Dict) -> ResourceGraph:
+    """Resource graph from `terraform show -json <planfile>` (its configuration section)"""
+    graph = ResourceGraph()
+    _build_plan_module(plan.get("configuration", {}).get("root_module", {}), graph)
+    return graph
+
+
+def node_class(resource_type: str) -> Tuple[str, str]:
+    """(diagrams module, class name) used to draw a resource type"""
+    for prefix, module, name in RESOURCE_NODES:
+        if resource_type.startswith(prefix):
+            return module, name
+    raise AssertionError("RESOURCE_NODES ends with a catch-all")
+
+
+def render(graph: ResourceGraph, filename: str, title: str, direction: str = "LR"):
+    """Draw graph with the diagrams library: one cluster per module and file"""
+    import importlib
+
+    diagrams = require_diagrams()
+    classes = {}
+    for resource in graph.resources.values():
+        module, name = node_class(resource.type)
+        if (module, name) not in classes:
+            classes[(module, name)] = getattr(importlib.import_module(module), name)
+
+    groups: Dict[Tuple[str, str], List[Resource]] = {}
+    for resource in graph.resources.values():
+        groups.setdefault((resource.module, os.path.basename(resource.file)), []).append(resource)
+
+    nodes = {}
+    with diagrams.Diagram(title, filename=filename, show=False, direction=direction):
+        for (module, file), resources in sorted(groups.items()):
+            with diagrams.Cluster(" / ".join(part for part in (module, file) if part) or "root"):
+                for resource in sorted(resources, key=lambda r: r.address):
+                    label = f"{resource.type}\n{resource.name}"
+                    if resource.members:
+                        label += f"\n(+{len(resource.members)})"
+                    nodes[resource.address] = classes[node_class(resource.type)](label)
+        for source, target in graph.edges:
+            nodes[source] >> diagrams.Edge() >> nodes[target]
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Build a resource graph from Terraform code")
+    parser.add_argument("path", help="Module directory, or a `terraform show -json` file with --plan")
+    parser.add_argument("--plan", action="store_true", help="path is terraform show -json output")
+    parser.add_argument("--no-collapse", action="store_true", help="Keep satellite resources as separate nodes")
+    parser.add_argument("--cache-dir", help="Parsed-file cache (default: .cache/terraform-graph)")
+    parser.add_argument("--no-cache", action="store_true", help="Parse every file")
+    parser.add_argument("--dot", help="Write Graphviz DOT to this file ('-' for stdout)")
+    parser.add_argument("--render", help="Render a PNG with the diagrams library to this path (no extension)")
+    parser.add_argument("--json", action="store_true", help="Print resources and edges as JSON")
+    args = parser.parse_args()
+
+    cache = ParseCache(None if args.no_cache else (args.cache_dir or default_cache_dir()))
+    if args.plan:
+        with open(args.path) as f:
+            graph = graph_from_plan(json.load(f))
+    else:
+        graph = graph_from_hcl(args.path, cache)
+    if not args.no_collapse:
+        graph = graph.collapse()
+
+    title = os.path.basename(os.path.normpath(args.path))
+    if args.dot:
+        dot = graph.to_dot(title)
+        if args.dot == "-":
+            sys.stdout.write(dot)
+        else:
+            with open(args.dot, "w") as f:
+                f.write(dot)
+    if args.render:
+        try:
+            render(graph, args.render, title)
+        except RuntimeError as e:
+            print(f"Error: {e}")
+            return 1
+    if args.json:
+        print(json.dumps(graph.to_dict(), indent=2))
+    elif args.dot != "-":
+        for source, target in graph.edges:
+            print(f"  {source} -> {target}")
+        print(f"\n{len(graph.resources)} resources, {len(graph.edges)} edges "
+              f"({cache.stats.parsed} files parsed, {cache.stats.cached} from cache)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,11 +4,27 @@ Infrastructure Validation Utility
 Validates Terraform configurations and cloud resource deployments
 """
 
-import subprocess
+import argparse
 import json
+import shutil
 import sys
 import os
-from typing import Dict, List, Tuple
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import instrumentation
+from instrumentation import span
+from query_linter import lint_paths
+
+@lru_cache(maxsize=None)
+def find_tool(name: str) -> Optional[str]:
+    """Locate an executable once per process instead of spawning `which` per check"""
+    return shutil.which(name)
 
 class TerraformValidator:
     """Validates Terraform configurations"""
@@ -19,7 +35,7 @@ class TerraformValidator:
     def validate_syntax(self) -> Tuple[bool, str]:
         """Validate Terraform syntax"""
         try:
-            result = subprocess.run(
+            result = instrumentation.run(
                 ["terraform", "validate", "-json"],
                 cwd=self.module_path,
                 capture_output=True,
@@ -39,7 +55,7 @@ class TerraformValidator:
     def validate_formatting(self) -> Tuple[bool, str]:
         """Validate Terraform formatting"""
         try:
-            result = subprocess.run(
+            result = instrumentation.run(
                 ["terraform", "fmt", "-check", "-recursive"],
                 cwd=self.module_path,
                 capture_output=True,
@@ -57,12 +73,12 @@ class TerraformValidator:
         """Run security scan using tfsec (if available)"""
         try:
             # Check if tfsec is installed
-            check = subprocess.run(["which", "tfsec"], capture_output=True)
-            if check.returncode != 0:
+            tfsec = find_tool("tfsec")
+            if tfsec is None:
                 return True, "tfsec not installed, skipping security scan"
             
-            result = subprocess.run(
-                ["tfsec", self.module_path, "--format", "json"],
+            result = instrumentation.run(
+                [tfsec, self.module_path, "--format", "json"],
                 capture_output=True,
                 text=True
             )
@@ -78,6 +94,19 @@ class TerraformValidator:
         except Exception as e:
             return True, f"Security scan skipped: {str(e)}"
 
+    def lint_queries(self) -> Tuple[bool, str]:
+        """Lint embedded Athena SQL for partition pruning and scan cost"""
+        with span("lint queries", "parse", module=os.path.basename(self.module_path)):
+            reports = [r for r in lint_paths([self.module_path]) if r.cost is not None]
+        if not reports:
+            return True, "No Athena queries found"
+
+        errors = [f"{r.query.name}: {f.rule}" for r in reports for f in r.errors]
+        monthly_cost = sum(r.cost.monthly_cost for r in reports)
+        if errors:
+            return False, f"Query lint errors: {'; '.join(errors)}"
+        return True, f"{len(reports)} queries linted (est. ${monthly_cost:.2f} USD/month scanned)"
+
 class CloudResourceValidator:
     """Validates deployed cloud resources"""
     
@@ -124,59 +153,196 @@ class CloudResourceValidator:
         
         return True, "Azure resources validated"
 
-def validate_module(module_path: str, module_name: str) -> int:
-    """Validate a Terraform module"""
-    print(f"\n{'='*60}")
-    print(f"Validating {module_name.upper()} module")
-    print(f"{'='*60}\n")
-    
-    validator = TerraformValidator(module_path)
+@dataclass
+class Check:
+    """A validation step; blocking failures fail the module, dependents are skipped on failure"""
+    name: str
+    method: str
+    description: str
+    blocking: bool = True
+    depends_on: List[str] = field(default_factory=list)
+
+CHECKS = [
+    Check("syntax", "validate_syntax", "Checking syntax"),
+    Check("formatting", "validate_formatting", "Checking formatting", blocking=False),
+    Check("security", "security_scan", "Running security scan", blocking=False, depends_on=["syntax"]),
+    Check("queries", "lint_queries", "Linting Athena queries"),
+]
+
+@dataclass
+class CheckResult:
+    """Outcome of one module x check pair"""
+    module: str
+    check: str
+    status: str  # passed, failed or skipped
+    message: str
+    seconds: float
+    blocking: bool
+
+class ValidationScheduler:
+    """Runs every module x check pair on a bounded thread pool
     
-    # Syntax validation
-    print("1. Checking syntax...")
-    success, message = validator.validate_syntax()
-    print(f"   {'✓' if success else '✗'} {message}")
-    if not success:
-        return 1
+    A check starts as soon as the checks it depends on have passed, so total
+    time approaches the slowest single chain rather than the sum of all checks.
+    """
     
-    # Formatting validation
-    print("2. Checking formatting...")
-    success, message = validator.validate_formatting()
-    print(f"   {'✓' if success else '✗'} {message}")
+    def __init__(self, modules: Dict[str, str], max_workers: Optional[int] = None,
+                 checks: Optional[List[Check]] = None):
+        self.modules = modules
+        self.checks = checks or CHECKS
+        self.max_workers = max_workers or max(1, len(self.modules) * len(self.checks))
+        self._lock = threading.Lock()
     
-    # Security scan
-    print("3. Running security scan...")
-    success, message = validator.security_scan()
-    print(f"   {'✓' if success else '✗'} {message}")
+    def _run_check(self, module: str, check: Check) -> CheckResult:
+        start = time.perf_counter()
+        validator = TerraformValidator(self.modules[module])
+        with span(f"{module}/{check.name}", "check") as timing:
+            try:
+                success, message = getattr(validator, check.method)()
+            except Exception as e:
+                success, message = False, f"Error during {check.name}: {str(e)}"
+            timing["passed"] = success
+        result = CheckResult(module, check.name, "passed" if success else "failed", message,
+                             round(time.perf_counter() - start, 3), check.blocking)
+        with self._lock:
+            print(f"   {'✓' if success else '✗'} {module}/{check.name} ({result.seconds:.1f}s)", flush=True)
+        return result
     
+    def run(self) -> List[CheckResult]:
+        """Run all checks, returning results in module then check order"""
+        results: Dict[Tuple[str, str], CheckResult] = {}
+        pending = {(m, c.name): c for m in self.modules for c in self.checks}
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            running = {}
+            while pending or running:
+                for key, check in list(pending.items()):
+                    module = key[0]
+                    deps = [results.get((module, d)) for d in check.depends_on]
+                    if any(d is not None and d.status != "passed" for d in deps):
+                        del pending[key]
+                        results[key] = CheckResult(module, check.name, "skipped",
+                                                   f"Skipped: {', '.join(check.depends_on)} did not pass",
+                                                   0.0, check.blocking)
+                    elif all(d is not None for d in deps):
+                        del pending[key]
+                        running[pool.submit(self._run_check, module, check)] = key
+                if not running:
+                    if pending:
+                        raise ValueError(f"Unresolvable check dependencies: {sorted(pending)}")
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+        
+        return [results[(m, c.name)] for m in self.modules for c in self.checks]
+
+def failed_modules(results: List[CheckResult]) -> List[str]:
+    """Modules with a failed blocking check"""
+    failed = []
+    for result in results:
+        if result.blocking and result.status == "failed" and result.module not in failed:
+            failed.append(result.module)
+    return failed
+
+def print_results(results: List[CheckResult]):
+    """Print results grouped by module"""
+    markers = {"passed": "✓", "failed": "✗", "skipped": "-"}
+    descriptions = {c.name: c.description for c in CHECKS}
+    for module in dict.fromkeys(r.module for r in results):
+        print(f"\n{'='*60}")
+        print(f"Validating {module.upper()} module")
+        print(f"{'='*60}\n")
+        for index, result in enumerate(r for r in results if r.module == module):
+            print(f"{index + 1}. {descriptions.get(result.check, result.check)}... ({result.seconds:.1f}s)")
+            print(f"   {markers[result.status]} {result.message}")
+
+def write_json(results: List[CheckResult], path: str):
+    """Write results as a JSON list"""
+    with open(path, "w") as f:
+        json.dump([asdict(r) for r in results], f, indent=2)
+
+def write_junit(results: List[CheckResult], path: str):
+    """Write results as JUnit XML, one testsuite per module"""
+    suites = ET.Element("testsuites", name="validate_infrastructure")
+    for module in dict.fromkeys(r.module for r in results):
+        module_results = [r for r in results if r.module == module]
+        suite = ET.SubElement(suites, "testsuite", name=module,
+                              tests=str(len(module_results)),
+                              failures=str(sum(r.status == "failed" for r in module_results)),
+                              skipped=str(sum(r.status == "skipped" for r in module_results)),
+                              time=f"{sum(r.seconds for r in module_results):.3f}")
+        for result in module_results:
+            case = ET.SubElement(suite, "testcase", classname=f"validate.{module}",
+                                 name=result.check, time=f"{result.seconds:.3f}")
+            if result.status == "failed":
+                failure = ET.SubElement(case, "failure", message=result.message,
+                                        type="error" if result.blocking else "warning")
+                failure.text = result.message
+            elif result.status == "skipped":
+                ET.SubElement(case, "skipped", message=result.message)
+    ET.ElementTree(suites).write(path, encoding="utf-8", xml_declaration=True)
+
+def validate_module(module_path: str, module_name: str) -> int:
+    """Validate a Terraform module"""
+    results = ValidationScheduler({module_name: module_path}).run()
+    print_results(results)
+    if failed_modules(results):
+        return 1
     print(f"\n{module_name.upper()} module validation complete!\n")
     return 0
 
 def main():
     """Main validation function"""
     repo_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-    modules_dir = os.path.join(repo_root, "modules")
+    modules_dir = os.path.join(repo_root, "terraform", "modules")
     
-    modules = ["aws", "gcp", "azure", "common"]
+    parser = argparse.ArgumentParser(description="Validate Terraform modules")
+    parser.add_argument("--modules", default="aws,gcp,azure,common", help="Comma-separated modules")
+    parser.add_argument("--modules-dir", default=modules_dir, help="Directory holding the modules")
+    parser.add_argument("--workers", type=int, help="Concurrent checks (default: all at once)")
+    parser.add_argument("--json", help="Write results as JSON to this file")
+    parser.add_argument("--junit", help="Write results as JUnit XML to this file")
+    instrumentation.add_arguments(parser)
     
+    args = parser.parse_args()
+    
+    with instrumentation.session("validate_infrastructure", args.trace, args.profile):
+        return run_validation(args)
+
+def run_validation(args: argparse.Namespace) -> int:
+    """Validate the selected modules and report the results"""
     print("="*60)
     print("Infrastructure Validation Suite")
     print("="*60)
     
-    failed = []
-    
-    for module in modules:
-        module_path = os.path.join(modules_dir, module)
+    modules = {}
+    for module in args.modules.split(","):
+        module_path = os.path.join(args.modules_dir, module)
         if os.path.exists(module_path):
-            if validate_module(module_path, module) != 0:
-                failed.append(module)
+            modules[module] = module_path
         else:
             print(f"Warning: Module {module} not found at {module_path}")
     
+    start = time.perf_counter()
+    results = ValidationScheduler(modules, args.workers).run()
+    elapsed = time.perf_counter() - start
+    with span("print results", "render"):
+        print_results(results)
+    
+    with span("write reports", "render"):
+        if args.json:
+            write_json(results, args.json)
+        if args.junit:
+            write_junit(results, args.junit)
+    
+    failed = failed_modules(results)
+    
     # Summary
     print("\n" + "="*60)
     print("Validation Summary")
     print("="*60)
+    print(f"{len(results)} checks in {elapsed:.1f}s (sequential: {sum(r.seconds for r in results):.1f}s)")
     
     if failed:
         print(f"✗ Failed modules: {', '.join(failed)}")
@@ -19,6 +19,8 @@ module "aws_alb_logs" {
   environment           = var.environment
   project_name          = var.project_name
   glue_crawler_schedule = var.glue_crawler_schedule
+
+  enable_partition_projection = var.enable_partition_projection
 }
 
 # Outputs from AWS module
@@ -129,6 +129,7 @@ resource "aws_athena_named_query" "full_scan_comparison" {
   query = <<-EOQ
     -- This query does NOT use partition pruning - scans all data
     -- Use this to compare performance with partitioned queries
+    -- athena-lint: ignore=missing-partition-filter
     SELECT 
       target_status_code,
       COUNT(*) as request_count
@@ -7,6 +7,9 @@ resource "aws_glue_catalog_database" "alb_logs" {
 # Glue Crawler for ALB access logs
 # Uses built-in ALB classifier to automatically detect schema and partitions
 resource "aws_glue_crawler" "alb_logs" {
+  # Not needed when the table uses partition projection (glue_projection.tf)
+  count = var.enable_partition_projection ? 0 : 1
+
   name          = "${var.project_name}-crawler"
   role          = aws_iam_role.glue_crawler.arn
   database_name = aws_glue_catalog_database.alb_logs.name
@@ -15,6 +18,13 @@ resource "aws_glue_crawler" "alb_logs" {
   # Target S3 path for ALB logs
   s3_target {
     path = "s3://${aws_s3_bucket.alb_logs.id}/alb-logs/"
+
+    # Objects merged by scripts/python/compaction.py are moved under _superseded/;
+    # its manifests and in-flight temp files are not log data either
+    exclusions = ["_superseded/**", "**/_compaction.json", "**/*.tmp"]
+
+    # S3 event notifications queue, required for CRAWL_EVENT_MODE
+    event_queue_arn = var.glue_crawler_recrawl_behavior == "CRAWL_EVENT_MODE" ? var.glue_crawler_event_queue_arn : null
   }
 
   # Configure the crawler to use built-in classifiers
@@ -22,8 +32,9 @@ resource "aws_glue_crawler" "alb_logs" {
   classifiers = []
 
   # Schema change policy - update table and add new columns
+  # Incremental crawls only support logging schema changes
   schema_change_policy {
-    update_behavior = "UPDATE_IN_DATABASE"
+    update_behavior = var.glue_crawler_recrawl_behavior == "CRAWL_EVERYTHING" ? "UPDATE_IN_DATABASE" : "LOG"
     delete_behavior = "LOG"
   }
 
@@ -41,9 +52,11 @@ resource "aws_glue_crawler" "alb_logs" {
     }
   })
 
-  # Recrawl policy - crawl everything on each run to detect new partitions
+  # Recrawl policy - CRAWL_EVERYTHING re-lists the whole bucket on each run;
+  # CRAWL_NEW_FOLDERS_ONLY and CRAWL_EVENT_MODE only visit new prefixes.
+  # For crawler-free registration see scripts/python/crawl_planner.py.
   recrawl_policy {
-    recrawl_behavior = "CRAWL_EVERYTHING"
+    recrawl_behavior = var.glue_crawler_recrawl_behavior
   }
 
   # LineageConfiguration - disable for performance
@@ -57,4 +70,11 @@ resource "aws_glue_crawler" "alb_logs" {
   tags = {
     Name = "${var.project_name}-crawler"
   }
+
+  lifecycle {
+    precondition {
+      condition     = var.glue_crawler_recrawl_behavior != "CRAWL_EVENT_MODE" || var.glue_crawler_event_queue_arn != ""
+      error_message = "glue_crawler_event_queue_arn must be set when glue_crawler_recrawl_behavior is CRAWL_EVENT_MODE."
+    }
+  }
 }
@@ -0,0 +1,109 @@
+# Glue table with Athena partition projection
+# Alternative to the crawler: Athena computes partition locations from the
+# table properties, so new days are queryable as soon as the ALB writes them.
+# Columns and input.regex mirror scripts/python/partition_projection.py
+
+locals {
+  alb_log_account_id = var.alb_log_account_id != "" ? var.alb_log_account_id : data.aws_caller_identity.current.account_id
+  alb_log_location   = "s3://${aws_s3_bucket.alb_logs.id}/alb-logs/AWSLogs/${local.alb_log_account_id}/elasticloadbalancing/${var.aws_region}/"
+
+  # Column order must match the capture groups of input.regex
+  alb_log_columns = [
+    { name = "type", type = "string" },
+    { name = "time", type = "string" },
+    { name = "elb", type = "string" },
+    { name = "client_ip", type = "string" },
+    { name = "client_port", type = "int" },
+    { name = "target_ip", type = "string" },
+    { name = "target_port", type = "int" },
+    { name = "request_processing_time", type = "double" },
+    { name = "target_processing_time", type = "double" },
+    { name = "response_processing_time", type = "double" },
+    { name = "elb_status_code", type = "int" },
+    { name = "target_status_code", type = "int" },
+    { name = "received_bytes", type = "bigint" },
+    { name = "sent_bytes", type = "bigint" },
+    { name = "request_verb", type = "string" },
+    { name = "request_url", type = "string" },
+    { name = "request_proto", type = "string" },
+    { name = "user_agent", type = "string" },
+    { name = "ssl_cipher", type = "string" },
+    { name = "ssl_protocol", type = "string" },
+    { name = "target_group_arn", type = "string" },
+    { name = "trace_id", type = "string" },
+    { name = "domain_name", type = "string" },
+    { name = "chosen_cert_arn", type = "string" },
+    { name = "matched_rule_priority", type = "string" },
+    { name = "request_creation_time", type = "string" },
+    { name = "actions_executed", type = "string" },
+    { name = "redirect_url", type = "string" },
+    { name = "lambda_error_reason", type = "string" },
+    { name = "target_port_list", type = "string" },
+    { name = "target_status_code_list", type = "string" },
+    { name = "classification", type = "string" },
+    { name = "classification_reason", type = "string" },
+    { name = "conn_trace_id", type = "string" },
+  ]
+}
+
+data "aws_caller_identity" "current" {}
+
+resource "aws_glue_catalog_table" "alb_access_logs" {
+  count = var.enable_partition_projection ? 1 : 0
+
+  name          = "alb_access_logs"
+  database_name = aws_glue_catalog_database.alb_logs.name
+  table_type    = "EXTERNAL_TABLE"
+
+  parameters = {
+    "EXTERNAL"                  = "TRUE"
+    "classification"            = "alb_logs"
+    "projection.enabled"        = "true"
+    "projection.year.type"      = "integer"
+    "projection.year.range"     = "${var.partition_projection_start_year},${var.partition_projection_end_year}"
+    "projection.month.type"     = "integer"
+    "projection.month.range"    = "1,12"
+    "projection.month.digits"   = "2"
+    "projection.day.type"       = "integer"
+    "projection.day.range"      = "1,31"
+    "projection.day.digits"     = "2"
+    "storage.location.template" = "${local.alb_log_location}$${year}/$${month}/$${day}/"
+  }
+
+  partition_keys {
+    name = "year"
+    type = "string"
+  }
+
+  partition_keys {
+    name = "month"
+    type = "string"
+  }
+
+  partition_keys {
+    name = "day"
+    type = "string"
+  }
+
+  storage_descriptor {
+    location      = local.alb_log_location
+    input_format  = "org.apache.hadoop.mapred.TextInputFormat"
+    output_format = "org.apache.hadoop.hive.ql.io.HiveIgnoreKeyTextOutputFormat"
+
+    ser_de_info {
+      serialization_library = "org.apache.hadoop.hive.serde2.RegexSerDe"
+      parameters = {
+        "serialization.format" = "1"
+        "input.regex"          = "([^ ]*) ([^ ]*) ([^ ]*) ([^ ]*):([0-9]*) ([^ ]*)[:-]([0-9]*) ([-.0-9]*) ([-.0-9]*) ([-.0-9]*) (|[-0-9]*) (-|[-0-9]*) ([-0-9]*) ([-0-9]*) \"([^ ]*) (.*) (- |[^ ]*)\" \"([^\"]*)\" ([A-Z0-9-_]+) ([A-Za-z0-9.-]*) ([^ ]*) \"([^\"]*)\" \"([^\"]*)\" \"([^\"]*)\" ([-.0-9]*) ([^ ]*) \"([^\"]*)\" \"([^\"]*)\" \"([^ ]*)\" \"([^ ]+?)\" \"([^ ]+)\" \"([^ ]*)\" \"([^ ]*)\" ?\"?([^ \"]*)\"?"
+      }
+    }
+
+    dynamic "columns" {
+      for_each = local.alb_log_columns
+      content {
+        name = columns.value.name
+        type = columns.value.type
+      }
+    }
+  }
+}
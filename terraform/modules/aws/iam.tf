@@ -81,3 +81,30 @@ resource "aws_iam_role_policy" "glue_cloudwatch" {
     ]
   })
 }
+
+# SQS access for event-mode crawls
+resource "aws_iam_role_policy" "glue_sqs_access" {
+  count = var.glue_crawler_recrawl_behavior == "CRAWL_EVENT_MODE" ? 1 : 0
+
+  name_prefix = "sqs-events-"
+  role        = aws_iam_role.glue_crawler.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect = "Allow"
+        Action = [
+          "sqs:DeleteMessage",
+          "sqs:GetQueueAttributes",
+          "sqs:GetQueueUrl",
+          "sqs:ListDeadLetterSourceQueues",
+          "sqs:PurgeQueue",
+          "sqs:ReceiveMessage",
+          "sqs:SetQueueAttributes"
+        ]
+        Resource = var.glue_crawler_event_queue_arn
+      }
+    ]
+  })
+}
@@ -14,8 +14,8 @@ output "glue_database_name" {
 }
 
 output "glue_crawler_name" {
-  description = "Name of the Glue crawler"
-  value       = aws_glue_crawler.alb_logs.name
+  description = "Name of the Glue crawler (null when partition projection is enabled)"
+  value       = var.enable_partition_projection ? null : aws_glue_crawler.alb_logs[0].name
 }
 
 output "athena_workgroup_name" {
@@ -24,7 +24,7 @@ output "athena_workgroup_name" {
 }
 
 output "glue_table_name" {
-  description = "Name of the Glue table created by the crawler"
+  description = "Name of the Glue table created by the crawler or partition projection"
   value       = "alb_access_logs"
 }
 
@@ -49,7 +49,7 @@ output "deployment_instructions" {
   description = "Instructions for deploying and using the solution"
   value       = <<-EOT
     1. Upload ALB logs to: s3://${aws_s3_bucket.alb_logs.id}/alb-logs/
-    2. Run the Glue Crawler: aws glue start-crawler --name ${aws_glue_crawler.alb_logs.name}
+    2. ${var.enable_partition_projection ? "No crawler needed: partitions are projected from the S3 path" : "Run the Glue Crawler: aws glue start-crawler --name ${aws_glue_crawler.alb_logs[0].name}"}
     3. Query data in Athena using workgroup: ${aws_athena_workgroup.alb_logs.name}
     4. View table in Glue Console: Database '${aws_glue_catalog_database.alb_logs.name}', Table 'alb_access_logs'
   EOT
@@ -21,3 +21,44 @@ variable "glue_crawler_schedule" {
   type        = string
   default     = "cron(0 2 * * ? *)" # Run daily at 2 AM UTC
 }
+
+variable "glue_crawler_recrawl_behavior" {
+  description = "Crawler recrawl policy: CRAWL_EVERYTHING, CRAWL_NEW_FOLDERS_ONLY or CRAWL_EVENT_MODE"
+  type        = string
+  default     = "CRAWL_EVERYTHING"
+
+  validation {
+    condition     = contains(["CRAWL_EVERYTHING", "CRAWL_NEW_FOLDERS_ONLY", "CRAWL_EVENT_MODE"], var.glue_crawler_recrawl_behavior)
+    error_message = "glue_crawler_recrawl_behavior must be CRAWL_EVERYTHING, CRAWL_NEW_FOLDERS_ONLY or CRAWL_EVENT_MODE."
+  }
+}
+
+variable "glue_crawler_event_queue_arn" {
+  description = "ARN of the SQS queue receiving S3 object-created events (CRAWL_EVENT_MODE only)"
+  type        = string
+  default     = ""
+}
+
+variable "enable_partition_projection" {
+  description = "Create the alb_access_logs table with Athena partition projection instead of running the Glue crawler"
+  type        = bool
+  default     = false
+}
+
+variable "partition_projection_start_year" {
+  description = "First year projected for the year partition"
+  type        = number
+  default     = 2024
+}
+
+variable "partition_projection_end_year" {
+  description = "Last year projected for the year partition"
+  type        = number
+  default     = 2030
+}
+
+variable "alb_log_account_id" {
+  description = "Account ID in the AWSLogs/ path of the ALB logs (empty string for the current account)"
+  type        = string
+  default     = ""
+}
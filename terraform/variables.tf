@@ -21,3 +21,9 @@ variable "glue_crawler_schedule" {
   type        = string
   default     = "cron(0 2 * * ? *)" # Run daily at 2 AM UTC
 }
+
+variable "enable_partition_projection" {
+  description = "Use Athena partition projection for the ALB logs table instead of the Glue crawler"
+  type        = bool
+  default     = false
+}
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Shared fixtures for the Python tests
+"""
+
+import gzip
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+from alb_log_parser import sample_log_path
+from log_layout import object_key
+
+
+def _make_tree(root):
+    """Lay out the sample log as two days of objects, one of them gzip-compressed"""
+    with open(sample_log_path(), "rb") as f:
+        data = f.read()
+    for day, compressed in (("16", False), ("17", True)):
+        key = object_key("123456789012", "us-east-1", "app.my-loadbalancer.50dc6c495c0c9188",
+                         datetime(2024, 12, int(day), 10, 15), "52.78.12.34", "random123",
+                         compressed=compressed)
+        path = os.path.join(root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if compressed:
+            with gzip.open(path, "wb") as out:
+                out.write(data)
+        else:
+            with open(path, "wb") as out:
+                out.write(data)
+
+
+@pytest.fixture(scope="session")
+def make_tree():
+    """make_tree(root) writes the sample log as 2024-12-16 (plain) and 2024-12-17 (gzip) objects under root"""
+    return _make_tree
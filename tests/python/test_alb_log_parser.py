@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the ALB access log parser
+"""
+
+import gzip
+import io
+import os
+import sys
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+from alb_log_parser import (
+    ALBLogParseError,
+    ALBLogRecord,
+    iter_column_batches,
+    iter_records,
+    parse_line,
+    sample_log_path,
+    write_synthetic_log
+)
+
+SAMPLE_LINE = open(sample_log_path(), "rb").readline().rstrip(b"\n")
+
+ESCAPED_LINE = (
+    b'h2 2024-12-16T10:15:30.123456Z app/my-lb/50dc 10.1.2.3:443 - -1 -1 -1 460 - 12 0 '
+    b'"GET https://example.com:443/q?x=\\"y\\" HTTP/2.0" "agent \\"quoted\\"" '
+    b'ECDHE-RSA-AES128-GCM-SHA256 TLSv1.2 - "Root=1-abc" "example.com" "arn:cert" 1 '
+    b'2024-12-16T10:15:30.000000Z "forward" "-" "-" "-" "-" "-" "-" "TID_123"'
+)
+
+# Entry as AWS writes it: conn_trace_id is an unquoted trailing field
+AWS_LINE = (
+    b'https 2024-12-16T22:23:00.186641Z app/my-loadbalancer/50dc6c495c0c9188 192.168.131.39:2817 '
+    b'10.0.0.1:80 0.086 0.048 0.037 200 200 0 57 "GET https://www.example.com:443/ HTTP/1.1" '
+    b'"curl/7.46.0" ECDHE-RSA-AES128-GCM-SHA256 TLSv1.2 '
+    b'arn:aws:elasticloadbalancing:us-east-2:123456789012:targetgroup/my-targets/73e2d6bc24d8a067 '
+    b'"Root=1-58337281-1d84f3d73c47ec4e58577259" "www.example.com" '
+    b'"arn:aws:acm:us-east-2:123456789012:certificate/12345678-1234-1234-1234-123456789012" 1 '
+    b'2024-12-16T22:22:48.364000Z "authenticate,forward" "-" "-" "10.0.0.1:80" "200" "-" "-" '
+    b'TID_1234abcd5678ef90'
+)
+
+
+class TestALBLogRecord:
+    """Test lazy record parsing"""
+
+    def test_sample_fields(self):
+        """Test typed column values from the sample log"""
+        record = ALBLogRecord(SAMPLE_LINE)
+        assert record["type"] == "http"
+        assert record["client_ip"] == "192.168.131.39"
+        assert record["client_port"] == 2817
+        assert record["elb_status_code"] == 200
+        assert record["target_processing_time"] == pytest.approx(0.001)
+        assert record["request_verb"] == "GET"
+        assert record["request_url"] == "http://www.example.com:80/index.html"
+        assert record["user_agent"].startswith("Mozilla/5.0 (Windows NT 10.0")
+        assert record["trace_id"] == "Root=1-58337262-36d228ad5d99923122bbe354"
+        assert record["target_port_list"] == "10.0.0.1:80"
+        assert record["ssl_cipher"] is None
+        assert record["conn_trace_id"] is None
+
+    def test_lazy_tokenizing(self):
+        """Test that head fields do not tokenize the quoted tail"""
+        record = ALBLogRecord(SAMPLE_LINE)
+        assert record["elb_status_code"] == 200
+        assert record._segments is None
+        assert record._fields is None
+
+    def test_escaped_quotes_and_missing_target(self):
+        """Test fallback tokenizing for escaped quotes and '-' targets"""
+        record = ALBLogRecord(ESCAPED_LINE)
+        assert record["request_url"] == 'https://example.com:443/q?x=\\"y\\"'
+        assert record["user_agent"] == 'agent \\"quoted\\"'
+        assert record["target_ip"] is None
+        assert record["target_status_code"] is None
+        assert record["ssl_protocol"] == "TLSv1.2"
+        assert record["conn_trace_id"] == "TID_123"
+
+    def test_fast_path_matches_tokenizer(self):
+        """Test that segment lookups agree with full tokenizing"""
+        for line in (SAMPLE_LINE, AWS_LINE):
+            fast = ALBLogRecord(line).to_dict()
+            slow = ALBLogRecord(line)
+            slow.fields  # force the tokenizer path
+            assert slow.to_dict() == fast
+
+    def test_unquoted_conn_trace_id(self):
+        """Test the trailing unquoted conn_trace_id AWS writes is read by every path"""
+        record = ALBLogRecord(AWS_LINE)
+        assert record["conn_trace_id"] == "TID_1234abcd5678ef90"
+        assert record["classification_reason"] is None
+        batch = next(iter_column_batches(io.BytesIO(AWS_LINE + b"\n" + SAMPLE_LINE + b"\n"),
+                                         ["conn_trace_id", "elb_status_code"]))
+        assert batch["conn_trace_id"] == ["TID_1234abcd5678ef90", None]
+
+    def test_malformed_line(self):
+        """Test error handling for truncated lines"""
+        with pytest.raises(ALBLogParseError):
+            parse_line(b"http 2024-12-16T10:15:30Z app/lb")
+
+
+class TestStreaming:
+    """Test streaming readers"""
+
+    def test_iter_records_plain_and_gzip(self, tmp_path):
+        """Test that plain, mmapped and gzip files yield the same records"""
+        plain = sample_log_path()
+        compressed = tmp_path / "sample.log.gz"
+        with open(plain, "rb") as src, gzip.open(compressed, "wb") as dst:
+            dst.write(src.read())
+
+        expected = [r["trace_id"] for r in iter_records(plain)]
+        assert len(expected) == 10
+        assert [r["trace_id"] for r in iter_records(plain, use_mmap=False)] == expected
+        assert [r["trace_id"] for r in iter_records(str(compressed))] == expected
+
+    def test_small_chunks_split_lines(self):
+        """Test that lines spanning block boundaries are reassembled"""
+        with open(sample_log_path(), "rb") as f:
+            data = f.read()
+        records = list(iter_records(io.BytesIO(data), chunk_size=7))
+        assert [r["client_port"] for r in records] == list(range(2817, 2827))
+
+    def test_column_batches(self, tmp_path):
+        """Test that columnar batches match per-record values"""
+        path = tmp_path / "mixed.log"
+        with open(sample_log_path(), "rb") as f:
+            path.write_bytes(f.read() + ESCAPED_LINE + b"\r\n")
+
+        columns = ["elb_status_code", "request_url", "target_group_arn", "request_creation_time"]
+        batched = {c: [] for c in columns}
+        for batch in iter_column_batches(str(path), columns, chunk_size=512):
+            for column in columns:
+                batched[column].extend(batch[column])
+
+        expected = [r.to_dict(columns) for r in iter_records(str(path))]
+        assert len(expected) == 11
+        for column in columns:
+            assert batched[column] == [row[column] for row in expected]
+
+    def test_synthetic_log(self, tmp_path):
+        """Test synthetic benchmark file generation"""
+        path = tmp_path / "synthetic.log"
+        written = write_synthetic_log(str(path), 100_000)
+        assert os.path.getsize(path) == written >= 100_000
+        statuses = [r["elb_status_code"] for r in iter_records(str(path))]
+        assert len(statuses) == path.read_bytes().count(b"\n")
+        assert set(statuses) == {200, 403, 404, 500}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the async Athena runner against the local Athena/S3 stand-ins
+"""
+
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+from athena_runner import AthenaRunner, PollSchedule, RunnerOptions
+from local_aws import ClientError, LocalAthena, LocalS3
+from query_engine import LocalTable, QueryEngine
+
+COUNT_SQL = ("SELECT target_status_code, COUNT(*) AS requests FROM alb_access_logs "
+             "WHERE year = '2024' AND month = '12' AND day = '16' GROUP BY target_status_code")
+ROWS_SQL = ("SELECT client_ip, request_url FROM alb_access_logs "
+            "WHERE year = '2024' AND month = '12' AND day = '16'")
+
+
+@pytest.fixture(scope="module")
+def logs(tmp_path_factory):
+    """One day of logs at a low request rate"""
+    pytest.importorskip("numpy")
+    from log_generator import GeneratorConfig, generate
+    root = tmp_path_factory.mktemp("athena") / "logs"
+    generate(GeneratorConfig(str(root), datetime(2024, 12, 16), days=1, requests_per_second=0.05), workers=1)
+    return str(root)
+
+
+def make_runner(logs, tmp_path, options=None, **athena_kwargs):
+    athena = LocalAthena(logs, LocalS3(str(tmp_path / "s3")), **athena_kwargs)
+    return AthenaRunner("primary", "alb_logs", options or RunnerOptions(poll_initial=0.01, poll_max=0.05),
+                        athena), athena
+
+
+class TestAthenaRunner:
+    """Test concurrency, polling, paging and stats"""
+
+    def test_concurrency_cap_and_stats(self, logs, tmp_path):
+        """Test that no more than max_concurrency queries are active and stats are recorded"""
+        options = RunnerOptions(max_concurrency=2, poll_initial=0.01, poll_max=0.05)
+        runner, athena = make_runner(logs, tmp_path, options, queue_seconds=0.05, run_seconds=0.05)
+        results = runner.run([(f"q{i}", COUNT_SQL) for i in range(6)])
+        runner.close()
+
+        assert [s.name for s in results] == [f"q{i}" for i in range(6)]
+        assert all(s.state == "SUCCEEDED" for s in results)
+        assert athena.peak_active == 2
+        assert all(s.queue_seconds >= 0.04 and s.bytes_scanned > 0 and s.rows > 0 for s in results)
+        assert all(s.output_location.startswith("s3://athena-results/query-results/") for s in results)
+
+    def test_quota_throttling_is_retried(self, logs, tmp_path):
+        """Test that TooManyRequestsException from a lower account quota is retried, not fatal"""
+        options = RunnerOptions(max_concurrency=4, poll_initial=0.01, poll_max=0.05, start_retries=20)
+        runner, athena = make_runner(logs, tmp_path, options, run_seconds=0.05, max_active=1)
+        results = runner.run([(f"q{i}", COUNT_SQL) for i in range(3)])
+        runner.close()
+        assert all(s.state == "SUCCEEDED" for s in results)
+        assert sum(s.throttled for s in results) > 0 and athena.peak_active == 1
+
+    def test_repeated_runs(self, logs, tmp_path):
+        """Test that each run() gets a semaphore of its own loop, so a runner can be reused"""
+        options = RunnerOptions(max_concurrency=1, poll_initial=0.01, poll_max=0.05)
+        runner, athena = make_runner(logs, tmp_path, options, run_seconds=0.05)
+        first = runner.run([(f"q{i}", COUNT_SQL) for i in range(3)])
+        second = runner.run([(f"q{i}", COUNT_SQL) for i in range(3)])
+        runner.close()
+        assert all(s.state == "SUCCEEDED" for s in first + second), [s.reason for s in first + second]
+        assert athena.peak_active == 1
+
+    def test_pages_stream_in_order(self, logs, tmp_path):
+        """Test that small pages reach the consumer one by one and add up to the full result"""
+        runner, athena = make_runner(logs, tmp_path, RunnerOptions(poll_initial=0.01, page_size=100))
+        pages = []
+        stats = runner.run([("rows", ROWS_SQL)], pages.append)[0]
+        runner.close()
+
+        expected = QueryEngine(LocalTable(logs)).execute(ROWS_SQL).rows
+        assert stats.pages == len(pages) == -(-len(expected) // 100) + (len(expected) % 100 == 0)
+        assert [p.index for p in pages] == list(range(len(pages)))
+        assert pages[0].columns == ["client_ip", "request_url"] and pages[0].types == ["varchar", "varchar"]
+        assert [r for p in pages for r in p.rows] == [tuple(r) for r in expected]
+        assert all(len(p.rows) <= 100 for p in pages) and stats.rows == len(expected)
+
+    def test_adaptive_polling(self, logs, tmp_path):
+        """Test the backoff schedule and that a repeated statement needs fewer polls"""
+        options = RunnerOptions(poll_initial=0.01, poll_max=0.5, poll_backoff=2.0)
+        schedule = PollSchedule(options)
+        delays = [schedule.next("QUEUED", "QUEUED") for _ in range(4)]
+        assert delays == [0.01, 0.02, 0.04, 0.08]
+        assert schedule.next("RUNNING", "QUEUED") == 0.01
+        assert PollSchedule(options, expected=10.0).next() == 0.5
+
+        runner, _ = make_runner(logs, tmp_path, options, run_seconds=0.3)
+        first = runner.run([("count", COUNT_SQL)])[0]
+        second = runner.run([("count", COUNT_SQL)])[0]
+        runner.close()
+        assert second.polls < first.polls
+
+    def test_failures_and_timeouts(self, logs, tmp_path):
+        """Test that failed and timed-out queries are reported without stopping the others"""
+        options = RunnerOptions(poll_initial=0.01, poll_max=0.02, timeout_seconds=0.3)
+        runner, athena = make_runner(logs, tmp_path, options)
+        athena.run_seconds = 2.0
+        results = runner.run([("bad", "SELECT no_such_column FROM alb_access_logs WHERE year = '1999'"), ("slow", COUNT_SQL)])
+        runner.close()
+        assert results[0].state == "FAILED" and results[0].reason
+        assert results[1].state == "CANCELLED" and "timed out" in results[1].reason
+
+    def test_timeout_starts_at_submission(self, logs, tmp_path):
+        """Test time spent waiting for a concurrency slot does not count against the timeout"""
+        options = RunnerOptions(max_concurrency=1, poll_initial=0.01, poll_max=0.02, timeout_seconds=0.5)
+        runner, _ = make_runner(logs, tmp_path, options, run_seconds=0.2)
+        results = runner.run([(f"q{i}", COUNT_SQL) for i in range(4)])
+        runner.close()
+        assert [s.state for s in results] == ["SUCCEEDED"] * 4
+
+    def test_throttled_and_failed_polls_stop_the_query(self, logs, tmp_path):
+        """Test throttled polls still time out and a failing poll stops the execution"""
+        options = RunnerOptions(max_concurrency=1, poll_initial=0.01, poll_max=0.02, timeout_seconds=0.2)
+        runner, athena = make_runner(logs, tmp_path, options, run_seconds=5.0)
+        ids = []
+        start = athena.start_query_execution
+
+        def start_query_execution(**kwargs):
+            response = start(**kwargs)
+            ids.append(response["QueryExecutionId"])
+            return response
+
+        def get_query_execution(QueryExecutionId):
+            # The first query is throttled on every poll, the second fails outright
+            code = "TooManyRequestsException" if QueryExecutionId == ids[0] else "InternalServerException"
+            raise ClientError(code, "poll failed", "GetQueryExecution")
+
+        athena.start_query_execution, athena.get_query_execution = start_query_execution, get_query_execution
+        results = runner.run([("throttled", COUNT_SQL), ("broken", COUNT_SQL)])
+        runner.close()
+        assert results[0].state == "CANCELLED" and results[0].throttled > 0
+        assert results[1].state == "ERROR" and "poll failed" in results[1].reason
+        assert athena.requests["StopQueryExecution"] == 2
+        assert all(athena._executions[i].state == "CANCELLED" for i in ids)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the log compaction job
+"""
+
+import gzip
+import os
+import shutil
+import sys
+from datetime import datetime
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+from compaction import SUPERSEDED_DIR, CompactionOptions, compact_tree, superseded_directory
+from log_layout import MANIFEST_FILE, iter_log_objects, read_manifest
+from query_engine import LocalTable, QueryEngine
+
+STATUS_SQL = ("SELECT elb_status_code, COUNT(*) FROM alb_access_logs "
+              "GROUP BY elb_status_code ORDER BY elb_status_code")
+
+
+def make_small_files(root, days=1):
+    """Generate a tree with one small object per node per 5-minute interval"""
+    pytest.importorskip("numpy")
+    from log_generator import GeneratorConfig, generate
+    generate(GeneratorConfig(str(root), datetime(2024, 12, 16), days=days, requests_per_second=0.5), workers=1)
+
+
+def live_lines(root):
+    paths = [obj.key for obj in iter_log_objects(str(root))]
+    lines = []
+    for path in paths:
+        with gzip.open(path, "rb") as f:
+            lines.extend(line for line in f if line.strip())
+    return paths, lines
+
+
+def small_options(**overrides):
+    options = dict(target_bytes=64 * 1024, min_bytes=32 * 1024)
+    options.update(overrides)
+    return CompactionOptions(**options)
+
+
+class TestCompaction:
+    """Test merging, ordering and the manifest commit protocol"""
+
+    def test_merges_into_time_sorted_files(self, tmp_path):
+        """Test that compaction keeps every line, sorted by time, in far fewer files"""
+        make_small_files(tmp_path)
+        before, before_lines = live_lines(tmp_path)
+
+        results = compact_tree(str(tmp_path), small_options(), workers=1)
+        after, after_lines = live_lines(tmp_path)
+
+        # The last interval of a day is delivered into the next day's directory
+        assert [r.partition for r in results] == ["2024/12/16", "2024/12/17"]
+        assert sum(r.input_files for r in results) == len(before)
+        assert sum(r.rows for r in results) == len(before_lines)
+        assert len(after) == sum(len(r.output_files) for r in results) < len(before) // 10
+        assert sorted(after_lines) == sorted(before_lines)
+        times = [line.split(b" ", 2)[1] for line in after_lines]
+        assert times == sorted(times)
+        assert all(os.path.getsize(p) < 2 * 64 * 1024 for p in after)
+
+        # Readers that ignore the manifest (Athena, the crawler, S3 sync) see only the compacted objects
+        on_disk = [os.path.join(d, f) for d, _, files in os.walk(tmp_path) for f in files if f.endswith(".log.gz")]
+        moved = [p for p in on_disk if os.sep + SUPERSEDED_DIR + os.sep in p]
+        assert sorted(set(on_disk) - set(moved)) == sorted(after)
+        assert sorted(moved) == sorted(os.path.join(superseded_directory(os.path.dirname(p)), os.path.basename(p))
+                                       for p in before)
+
+    def test_queries_unchanged(self, tmp_path):
+        """Test that queries see the same data before and after, with partitions in parallel"""
+        make_small_files(tmp_path, days=2)
+        expected = QueryEngine(LocalTable(str(tmp_path))).execute(STATUS_SQL).rows
+
+        results = compact_tree(str(tmp_path), small_options(delete_superseded=True), workers=2)
+
+        assert [r.partition for r in results] == ["2024/12/16", "2024/12/17", "2024/12/18"]
+        assert QueryEngine(LocalTable(str(tmp_path))).execute(STATUS_SQL).rows == expected
+        directory = os.path.dirname(results[0].output_files[0])
+        superseded = read_manifest(directory)["superseded"]
+        assert superseded and not any(os.path.exists(os.path.join(directory, name)) for name in superseded)
+
+    def test_uncommitted_outputs_are_invisible(self, tmp_path):
+        """Test that readers ignore compacted files the manifest does not list, and reruns remove them"""
+        make_small_files(tmp_path)
+        results = compact_tree(str(tmp_path), small_options(), workers=1)
+        committed, lines = live_lines(tmp_path)
+
+        # A crash between writing an output and committing the manifest leaves it behind
+        stray = committed[0].replace("compacted1n0000", "compacted2n0000")
+        shutil.copy(committed[0], stray)
+        assert live_lines(tmp_path)[0] == committed
+
+        assert compact_tree(str(tmp_path), small_options(), workers=1) == []
+        assert not os.path.exists(stray)
+        assert read_manifest(os.path.dirname(stray))["generation"] == results[0].generation
+
+    def test_new_deliveries_compacted_next_generation(self, tmp_path):
+        """Test that objects delivered after a compaction stay visible and join the next generation"""
+        make_small_files(tmp_path)
+        sources, _ = live_lines(tmp_path)
+        compact_tree(str(tmp_path), small_options(), workers=1)
+        directory = os.path.dirname(sources[0])
+        first = read_manifest(directory)
+
+        late = [path[:-len(".log.gz")] + "late.log.gz" for path in sources[:2]]
+        for source, path in zip(sources, late):
+            shutil.copy(os.path.join(superseded_directory(directory), os.path.basename(source)), path)
+        visible, lines = live_lines(tmp_path)
+        assert set(late) <= set(visible)
+
+        results = compact_tree(str(tmp_path), small_options(), workers=1)
+        manifest = read_manifest(directory)
+        assert manifest["generation"] == 2
+        partial = [name for name in first["files"] if os.path.getsize(os.path.join(directory, name)) < 32 * 1024]
+        assert results[0].input_files == 2 + len(partial)
+        assert set(partial) <= set(manifest["superseded"])
+        assert set(os.path.basename(p) for p in late) <= set(manifest["superseded"])
+        assert sorted(live_lines(tmp_path)[1]) == sorted(lines)
+        assert MANIFEST_FILE in os.listdir(directory)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the vectorized cost model
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("yaml")
+
+from cost_estimator import generate_cost_report
+from cost_model import UsageSeries, load_catalog, parameter_grid, simulate
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    return load_catalog()
+
+
+class TestSimulation:
+    """Test cost projections"""
+
+    def test_first_month_matches_list_prices(self, catalog):
+        """100GB ingested and 300GB scanned in month one cost what cost_estimator charges"""
+        usage = UsageSeries.constant(100 / 30, 10, 1.0)
+        result = simulate(catalog, usage, months=1)
+        assert result.components[("aws", "s3_standard")][0, 0] == pytest.approx(2.3, rel=0.01)
+        assert result.components[("aws", "queries")][0, 0] == pytest.approx(300 / 1024 * 5, rel=0.01)
+        assert result.components[("aws", "crawler")][0, 0] == pytest.approx(1.32)
+
+    def test_tiering_and_retention(self, catalog):
+        """Lifecycle tiering lowers storage cost, retention caps it"""
+        usage = UsageSeries.constant(10, 10, 1.0)
+        grid = parameter_grid(tiering=[0, 1], retention_days=[90, 365])
+        result = simulate(catalog, usage, grid, months=24)
+        storage = sum(cost for (cloud, name), cost in result.components.items()
+                      if cloud == "aws" and name.startswith("s3_"))
+        flat_90, tiered_90, flat_365, tiered_365 = storage[:, -1]
+        assert tiered_365 < flat_365
+        assert flat_90 < flat_365
+        # With 90-day retention, steady state is three months of data
+        assert flat_90 == pytest.approx(3 * 300 * 0.023, rel=0.01)
+
+    def test_columnar_cuts_scan_cost(self, catalog):
+        """Parquet scans a fraction of the bytes text logs do"""
+        usage = UsageSeries.constant(10, 100, 5.0)
+        result = simulate(catalog, usage, parameter_grid(columnar_fraction=[0, 1]), months=3)
+        text, parquet = result.components[("aws", "queries")][:, 0]
+        assert parquet == pytest.approx(text * catalog["columnar"]["scan_ratio"])
+        assert result.cloud_total("azure")[1, 0] < result.cloud_total("azure")[0, 0]
+
+    def test_ten_thousand_scenarios_under_a_second(self, catalog):
+        """A 10,000-point grid over 36 months is evaluated in one vectorized pass"""
+        steps = np.linspace(0, 1, 10)
+        grid = parameter_grid(monthly_growth=steps / 5, columnar_fraction=steps,
+                              retention_days=np.linspace(30, 1095, 10), tiering=[0, 1],
+                              query_multiplier=[1, 2, 3, 4, 5])
+        start = time.perf_counter()
+        result = simulate(catalog, UsageSeries.constant(3.33, 10, 1.0), grid, months=36)
+        assert time.perf_counter() - start < 1.0
+        assert result.scenarios == 10_000
+        assert result.cloud_total("gcp").shape == (10_000, 36)
+
+    def test_catalog_scenario_report(self):
+        """generate_cost_report() delegates catalog scenarios to the model"""
+        report = generate_cost_report("parquet")
+        assert report["scenario"] == "parquet"
+        assert report["aws"]["total"] > 0
+        assert report["grand_total"] == pytest.approx(
+            report["aws"]["total"] + report["gcp"]["total"] + report["azure"]["total"], abs=0.02)
+
+    def test_scenario_scanned_tb(self):
+        """A measured scan volume replaces the catalog scenario's own"""
+        def queries(report):
+            return next(c["monthly_cost"] for c in report["aws"]["costs"] if c["resource"] == "queries")
+
+        growth = generate_cost_report("growth")
+        measured = generate_cost_report("growth", scanned_tb=5.0)
+        assert measured["aws"]["total"] > growth["aws"]["total"]
+        # 300 GB is the catalog's own month-one volume (10 queries/day of 1 GB)
+        assert queries(generate_cost_report("growth", scanned_tb=300 / 1024)) == pytest.approx(queries(growth))
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the incremental crawl planner
+"""
+
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+from crawl_planner import BATCH_SIZE, CrawlPlanner, PartitionIndex, iter_event_keys
+from log_layout import object_key
+from partition_projection import ProjectionConfig
+
+BUCKET = "athena-alb-logs-alb-logs-abc123"
+ACCOUNT = "123456789012"
+
+
+def s3_event(key, bucket=BUCKET, name="ObjectCreated:Put"):
+    """An S3 event notification line with one record"""
+    return json.dumps({"Records": [{
+        "eventName": name,
+        "s3": {"bucket": {"name": bucket}, "object": {"key": key, "size": 1024}},
+    }]})
+
+
+def day_keys(day, count=3, account=ACCOUNT):
+    """Object keys for several 5-minute intervals of one day"""
+    return [object_key(account, "us-east-1", "app.my-loadbalancer.50dc6c495c0c9188",
+                       day + timedelta(minutes=5 * i), "52.78.12.34", f"r{i}")
+            for i in range(count)]
+
+
+@pytest.fixture
+def planner(tmp_path):
+    table = ProjectionConfig(bucket=BUCKET, account_id=ACCOUNT, region="us-east-1")
+    return CrawlPlanner(table, "athena_alb_logs_database", PartitionIndex(str(tmp_path / "index")))
+
+
+class TestEventKeys:
+    """Test event parsing"""
+
+    def test_formats(self):
+        """Test S3 notifications, EventBridge events and plain lines"""
+        lines = [
+            s3_event("alb-logs/a%3Db.log"),
+            json.dumps({"detail-type": "Object Created",
+                        "detail": {"bucket": {"name": BUCKET}, "object": {"key": "alb-logs/c.log"}}}),
+            json.dumps({"bucket": BUCKET, "key": "alb-logs/d.log"}),
+            s3_event("alb-logs/e.log", name="ObjectRemoved:Delete"),
+            s3_event("alb-logs/f.log", bucket="another-bucket"),
+        ]
+        assert list(iter_event_keys(lines, BUCKET)) == ["alb-logs/a=b.log", "alb-logs/c.log", "alb-logs/d.log"]
+
+    def test_only_creations_count(self):
+        """Test that tagging, restore and lifecycle events are skipped and keys decode alike on both paths"""
+        mixed = json.loads(s3_event("alb-logs/a%3Db.log"))
+        mixed["Records"].append(json.loads(s3_event("alb-logs/g.log", name="ObjectTagging:Put"))["Records"][0])
+        lines = [
+            s3_event("alb-logs/g.log", name="ObjectTagging:Put"),
+            s3_event("alb-logs/h.log", name="ObjectRestore:Completed"),
+            s3_event("alb-logs/i.log", name="LifecycleTransition"),
+            json.dumps({"detail-type": "Object Tags Added",
+                        "detail": {"bucket": {"name": BUCKET}, "object": {"key": "alb-logs/j.log"}}}),
+            json.dumps(mixed),
+            json.dumps({"detail-type": "Object Created",
+                        "detail": {"bucket": {"name": BUCKET}, "object": {"key": "alb-logs/c%3Dd.log"}}}),
+        ]
+        assert list(iter_event_keys(lines, BUCKET)) == ["alb-logs/a=b.log", "alb-logs/c=d.log"]
+
+
+class TestCrawlPlanner:
+    """Test partition planning"""
+
+    def test_minimal_partitions(self, planner):
+        """Test that many objects per day collapse to one partition each"""
+        lines = [s3_event(k) for k in day_keys(datetime(2024, 12, 16)) + day_keys(datetime(2024, 12, 17))]
+        lines.append(s3_event(day_keys(datetime(2024, 12, 18), 1, account="210987654321")[0]))
+
+        plan = planner.plan(lines)
+        assert plan.new_partitions == [("2024", "12", "16"), ("2024", "12", "17")]
+        assert plan.events == 7
+        assert plan.objects == 7
+        assert plan.skipped_objects == 1
+
+    def test_index_skips_known_partitions(self, planner, tmp_path):
+        """Test that re-planning after saving the index yields nothing new"""
+        lines = [s3_event(k) for k in day_keys(datetime(2024, 12, 16))]
+        planner.index.add(planner.plan(lines).new_partitions)
+        planner.index.save()
+
+        reloaded = PartitionIndex(str(tmp_path / "index"))
+        assert reloaded.partitions() == [("2024", "12", "16")]
+        planner.index = reloaded
+        assert planner.plan(lines).new_partitions == []
+
+    def test_batches_of_100(self, planner):
+        """Test BatchCreatePartition payload batching and locations"""
+        start = datetime(2024, 1, 1)
+        lines = [s3_event(k) for d in range(250) for k in day_keys(start + timedelta(days=d), 1)]
+        plan = planner.plan(lines)
+        requests = planner.batch_requests(plan.new_partitions)
+
+        assert [len(r["PartitionInputList"]) for r in requests] == [BATCH_SIZE, BATCH_SIZE, 50]
+        first = requests[0]["PartitionInputList"][0]
+        assert first["Values"] == ["2024", "01", "01"]
+        assert first["StorageDescriptor"]["Location"] == (
+            f"s3://{BUCKET}/alb-logs/AWSLogs/{ACCOUNT}/elasticloadbalancing/us-east-1/2024/01/01/")
+        assert requests[0]["TableName"] == "alb_access_logs"
+
+    def test_replan_day_is_fast(self, planner):
+        """Test that a day of 5-minute objects from 20 nodes plans quickly"""
+        lines = [s3_event(k) for node in range(20) for k in day_keys(datetime(2024, 12, 16), 288)]
+        plan = planner.plan(lines)
+        assert plan.objects == 5760
+        assert plan.seconds < 1.0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Unit tests for diagram selection, fingerprinting and lazy provider imports
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+# Add parent directory to path
+SCRIPTS = os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python')
+sys.path.insert(0, SCRIPTS)
+
+from generate_diagrams import (DIAGRAMS, MODULES_DIR, diagram_fingerprint, generate, save_state,
+                               stale_diagrams)
+
+
+@pytest.fixture
+def modules(tmp_path):
+    target = tmp_path / "modules"
+    shutil.copytree(MODULES_DIR, target)
+    return str(target)
+
+
+def mark_rendered(output_dir, modules_dir, names):
+    """Record diagrams as rendered from the current inputs, as a successful run would"""
+    os.makedirs(output_dir, exist_ok=True)
+    for name in names:
+        with open(DIAGRAMS[name].output_path(output_dir), "wb") as f:
+            f.write(b"png")
+    save_state(output_dir, {name: diagram_fingerprint(DIAGRAMS[name], modules_dir) for name in names})
+
+
+class TestGenerateDiagrams:
+    """Test what gets rendered and what is skipped"""
+
+    def test_import_does_not_load_diagrams(self):
+        """Test that importing the generator leaves the diagrams package unimported"""
+        code = "import sys, generate_diagrams; print(any(m.split('.')[0] == 'diagrams' for m in sys.modules))"
+        result = subprocess.run([sys.executable, "-c", code], cwd=SCRIPTS, capture_output=True, text=True)
+        assert result.stdout.strip() == "False"
+
+    def test_unchanged_inputs_skip_rendering(self, tmp_path, modules):
+        """Test that a no-op run renders nothing and never needs the diagrams package"""
+        output = str(tmp_path / "out")
+        mark_rendered(output, modules, list(DIAGRAMS))
+        assert generate(output_dir=output, modules_dir=modules) == {name: "unchanged" for name in DIAGRAMS}
+
+    def test_module_change_invalidates_its_diagrams(self, tmp_path, modules):
+        """Test that editing one module only marks the diagrams depicting it"""
+        output = str(tmp_path / "out")
+        mark_rendered(output, modules, list(DIAGRAMS))
+        with open(os.path.join(modules, "gcp", "bigquery.tf"), "a") as f:
+            f.write("\n# changed\n")
+        assert set(stale_diagrams(list(DIAGRAMS), output, modules)) == {"gcp", "gcp-resources", "multi-cloud"}
+        assert set(stale_diagrams(["aws"], output, modules, force=True)) == {"aws"}
+
+        os.remove(DIAGRAMS["azure"].output_path(output))
+        assert set(stale_diagrams(["aws", "azure"], output, modules)) == {"azure"}
+
+    def test_selection(self, tmp_path, modules):
+        """Test that unknown diagram names are rejected"""
+        with pytest.raises(ValueError, match="Unknown diagrams"):
+            generate(["aws", "oracle"], str(tmp_path / "out"), modules)
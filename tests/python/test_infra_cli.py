@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the infrastructure CLI using a fake terraform binary
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+from infra_cli import InfrastructureCLI
+
+FAKE_TERRAFORM = """#!{python}
+import os, sys, time
+module = os.path.basename(os.getcwd())
+stage = sys.argv[1]
+time.sleep(float(os.environ.get("FAKE_TF_SLEEP", "0.3")))
+print(f"fake terraform {{' '.join(sys.argv[1:])}}")
+print("second line")
+with open(os.path.join(os.environ["FAKE_TF_LOG"], f"{{module}}-{{stage}}"), "w") as f:
+    f.write(str(time.time()))
+sys.exit(3 if f"{{module}}:{{stage}}" in os.environ.get("FAKE_TF_FAIL", "").split(",") else 0)
+"""
+
+
+@pytest.fixture
+def cli(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    terraform = bin_dir / "terraform"
+    terraform.write_text(FAKE_TERRAFORM.format(python=sys.executable))
+    terraform.chmod(0o755)
+    log_dir = tmp_path / "log"
+    log_dir.mkdir()
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_TF_LOG", str(log_dir))
+
+    instance = InfrastructureCLI()
+    instance.modules_dir = str(tmp_path / "modules")
+    for cloud in ("aws", "gcp", "azure"):
+        os.makedirs(os.path.join(instance.modules_dir, cloud))
+    return instance
+
+
+class TestDeployAll:
+    """Test concurrent deploy-all"""
+
+    def test_runs_clouds_in_parallel(self, cli, capsys):
+        """Test that three clouds take about as long as one"""
+        start = time.perf_counter()
+        assert cli.deploy_all() == 0
+        elapsed = time.perf_counter() - start
+
+        out = capsys.readouterr().out
+        assert "[gcp:plan] fake terraform plan" in out
+        assert "[azure:validate] second line" in out
+        # 3 stages x 0.3s per cloud; serial execution would need ~2.7s
+        assert elapsed < 2.0
+        assert "Deployment Summary" in out
+
+    def test_max_parallel_and_failures(self, cli, capsys, monkeypatch):
+        """Test that a failing stage stops only its own cloud and fails the run"""
+        monkeypatch.setenv("FAKE_TF_SLEEP", "0")
+        monkeypatch.setenv("FAKE_TF_FAIL", "gcp:validate")
+        assert cli.deploy_all(auto_approve=True, max_parallel=1) == 1
+
+        ran = set(os.listdir(os.environ["FAKE_TF_LOG"]))
+        assert {"aws-apply", "azure-apply", "gcp-validate"} <= ran
+        assert "gcp-plan" not in ran
+        out = capsys.readouterr().out
+        assert "1 at a time" in out
+        assert "✗3" in out
+
+    def test_apply_flags_split(self, cli, capsys):
+        """Test that apply passes -auto-approve as its own argument"""
+        assert cli.run_terraform("apply -auto-approve", "aws", prefix="aws") == 0
+        assert "[aws] fake terraform apply -auto-approve" in capsys.readouterr().out
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the shared timing/profiling instrumentation
+"""
+
+import json
+import os
+import sys
+import time
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+import cost_estimator
+import instrumentation
+from instrumentation import session, span, summarize
+
+
+class TestInstrumentation:
+    """Test spans, sinks, summaries and profiling"""
+
+    def test_disabled_is_a_no_op(self, monkeypatch):
+        """Test that spans cost almost nothing without a trace sink or profiler"""
+        monkeypatch.delenv(instrumentation.ENV_TRACE, raising=False)
+        monkeypatch.delenv(instrumentation.ENV_PROFILE, raising=False)
+        with session("tool") as recorder:
+            assert recorder is None and not instrumentation.enabled()
+            start = time.perf_counter()
+            for _ in range(100_000):
+                with span("hot", "parse") as timing:
+                    timing["rows"] = 1
+            assert time.perf_counter() - start < 0.5
+
+    def test_spans_written_as_json_lines(self, tmp_path, capsys):
+        """Test nesting, attributes, subprocess spans and the summary"""
+        trace = tmp_path / "trace.jsonl"
+        with session("tool", trace=str(trace)) as recorder:
+            with span("outer", "parse", file="a.log") as timing:
+                timing["rows"] = 3
+                with span("inner", "render"):
+                    time.sleep(0.01)
+            instrumentation.run([sys.executable, "-c", "pass"], name="python")
+        assert not instrumentation.enabled()
+
+        records = [json.loads(line) for line in trace.read_text().splitlines()]
+        by_name = {r["name"]: r for r in records}
+        assert set(by_name) == {"outer", "inner", "python", "tool"}
+        assert by_name["inner"]["parent"] == by_name["outer"]["id"]
+        assert by_name["outer"]["parent"] == by_name["tool"]["id"]
+        assert by_name["outer"]["rows"] == 3 and by_name["outer"]["file"] == "a.log"
+        assert by_name["python"]["category"] == "subprocess" and by_name["python"]["returncode"] == 0
+        assert len({r["run"] for r in records}) == 1
+
+        rows = {r["name"]: r for r in summarize(recorder.spans, recorder.wall_seconds)}
+        assert rows["outer"]["self"] < rows["outer"]["total"]
+        assert rows["inner"]["self"] >= 0.01
+        assert "Timing Summary - tool" in capsys.readouterr().err
+
+    def test_cprofile_from_environment(self, tmp_path, monkeypatch, capsys):
+        """Test the env-var enabled cProfile capture"""
+        output = tmp_path / "run.prof"
+        monkeypatch.setenv(instrumentation.ENV_PROFILE, "cprofile")
+        monkeypatch.setenv(instrumentation.ENV_PROFILE_OUTPUT, str(output))
+        with session("tool"):
+            sum(range(10_000))
+        assert output.exists()
+        err = capsys.readouterr().err
+        assert "Profile written to" in err and "Timing Summary" in err
+
+    def test_profile_flag_values(self, tmp_path, monkeypatch, capsys):
+        """Test INFRA_PROFILE=1/true select cProfile, 0 disables it and other values are a one-line error"""
+        monkeypatch.setenv(instrumentation.ENV_PROFILE_OUTPUT, str(tmp_path / "run.prof"))
+        monkeypatch.delenv(instrumentation.ENV_TRACE, raising=False)
+        for value in ("1", "TRUE"):
+            monkeypatch.setenv(instrumentation.ENV_PROFILE, value)
+            with session("tool") as recorder:
+                assert recorder is not None
+            assert (tmp_path / "run.prof").exists()
+            (tmp_path / "run.prof").unlink()
+        monkeypatch.setenv(instrumentation.ENV_PROFILE, "0")
+        with session("tool") as recorder:
+            assert recorder is None
+        monkeypatch.setenv(instrumentation.ENV_PROFILE, "perf")
+        with pytest.raises(SystemExit) as exited:
+            with session("tool"):
+                pass
+        assert "INFRA_PROFILE='perf'" in str(exited.value.code) and "\n" not in str(exited.value.code)
+
+    def test_cost_estimator_trace(self, tmp_path, monkeypatch):
+        """Test an instrumented CLI run end to end"""
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(sys, "argv", ["cost_estimator.py", "--trace", str(tmp_path / "trace.jsonl")])
+        cost_estimator.main()
+        records = [json.loads(line) for line in (tmp_path / "trace.jsonl").read_text().splitlines()]
+        assert {"generate report", "print report", "write json", "cost_estimator"} <= {r["name"] for r in records}
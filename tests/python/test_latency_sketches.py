@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Unit tests for per-target-group latency sketches
+"""
+
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+from latency_sketches import LatencyIndex, decode_sketches, encode_sketches, run_benchmark, target_group_name
+from query_engine import LocalTable
+from sketches import DDSketch
+
+
+class TestLatencySketches:
+    """Test building, storing and merging sketches"""
+
+    def test_add_many_matches_add(self):
+        """Test that the vectorized path fills the same buckets as per-value adds"""
+        values = [0.001 * i for i in range(1, 500)] + [0.0, -1.0 + 1.0]
+        one, bulk = DDSketch(), DDSketch()
+        one.update(values)
+        bulk.add_many(values + [None])
+        assert bulk.bins == one.bins and bulk.zero_count == one.zero_count and bulk.count == one.count
+
+    def test_encode_round_trip(self):
+        """Test the compact file format"""
+        sketch = DDSketch()
+        sketch.update([0.002, 0.004, 0.5])
+        data = encode_sketches({("2024-12-16T10", "web-targets", "target_processing_time"): sketch})
+        decoded = decode_sketches(data)
+        assert decoded[("2024-12-16T10", "web-targets", "target_processing_time")].bins == sketch.bins
+
+    def test_build_and_query(self, make_tree, tmp_path):
+        """Test per-group sketches from a tree and merging over a time range"""
+        make_tree(str(tmp_path / "raw"))
+        index = LatencyIndex(str(tmp_path / "sketches"))
+        results = index.build(LocalTable(str(tmp_path / "raw")))
+        assert [r.rows for r in results] == [10, 10]
+        assert all(r.skipped for r in LatencyIndex(str(tmp_path / "sketches")).build(LocalTable(str(tmp_path / "raw"))))
+
+        # Both objects hold the sample log, whose records are all from 2024-12-16 10:xx
+        day = index.query(datetime(2024, 12, 16), datetime(2024, 12, 17))
+        assert day.count > 0
+        assert index.query(datetime(2024, 12, 16, 10), datetime(2024, 12, 16, 11)).count == day.count
+        assert index.query(datetime(2024, 12, 17), datetime(2024, 12, 18)).count == 0
+        assert sum(index.query(datetime(2024, 12, 16), datetime(2024, 12, 17), target_group=g).count
+                   for g in index.target_groups()) == day.count
+        assert target_group_name("arn:aws:elasticloadbalancing:us-east-1:1:targetgroup/web/abc") == "web"
+
+    def test_recorded_accuracy(self, make_tree, tmp_path):
+        """Test queries use the accuracy of the build and a new accuracy rebuilds every partition"""
+        make_tree(str(tmp_path / "raw"))
+        table = LocalTable(str(tmp_path / "raw"))
+        LatencyIndex(str(tmp_path / "sketches")).build(table, relative_accuracy=0.02)
+        index = LatencyIndex(str(tmp_path / "sketches"))
+        day = index.query(datetime(2024, 12, 16), datetime(2024, 12, 17))
+        assert index.relative_accuracy == 0.02 and day.relative_accuracy == 0.02 and day.count > 0
+
+        assert not any(r.skipped for r in index.build(table, relative_accuracy=0.01))
+        again = LatencyIndex(str(tmp_path / "sketches"))
+        assert again.query(datetime(2024, 12, 16), datetime(2024, 12, 17)).relative_accuracy == 0.01
+        assert all(r.skipped for r in again.build(table, relative_accuracy=0.01))
+
+    def test_benchmark_accuracy(self):
+        """Test sketch percentiles against exact ones on generated logs"""
+        pytest.importorskip("numpy")
+        result = run_benchmark(rate=0.5, days=1)
+        assert result["rows"] > 30000
+        assert result["max_relative_error"] <= 0.0101
+        assert result["sketch_bytes"] < result["raw_bytes"] / 100
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the partitioning and clustering advisor
+"""
+
+import json
+import os
+import re
+import shutil
+import sys
+from datetime import datetime
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+from layout_advisor import (ATHENA_TF, BIGQUERY_TF, Layout, Simulator, advise, athena_target, bigquery_target,
+                            current_layout, group_by_columns, load_sample, load_workload, terraform_change,
+                            terraform_result, where_columns)
+
+WORKLOAD = [
+    {"name": "errors", "runs": 2000,
+     "sql": "SELECT lb_status_code, COUNT(*) FROM lb_access_logs WHERE lb_status_code >= 500 "
+            "AND timestamp >= '2024-12-16' AND timestamp < '2024-12-17' GROUP BY lb_status_code"},
+    {"name": "daily", "runs": 30, "sql": "SELECT COUNT(*) FROM lb_access_logs WHERE timestamp >= '2024-12-16'"},
+]
+
+
+@pytest.fixture(scope="module")
+def logs(tmp_path_factory):
+    """Two days of generated ALB logs"""
+    pytest.importorskip("numpy")
+    from log_generator import GeneratorConfig, generate
+    root = tmp_path_factory.mktemp("layout")
+    generate(GeneratorConfig(str(root / "logs"), datetime(2024, 12, 16), days=2, requests_per_second=0.1),
+             workers=1)
+    workload = root / "workload.jsonl"
+    workload.write_text("".join(json.dumps(entry) + "\n" for entry in WORKLOAD))
+    return str(root / "logs"), str(workload)
+
+
+class TestWorkload:
+    """Test workload parsing"""
+
+    def test_group_by_and_constraints(self, logs):
+        """Test filter and GROUP BY columns are kept only when they are table columns"""
+        assert group_by_columns("SELECT a, COUNT(*) FROM t GROUP BY a, b ORDER BY a") == ["a", "b"]
+        queries = load_workload(logs[1], target=bigquery_target())
+        errors = queries[0]
+        assert errors.runs == 2000
+        assert set(errors.constraints) == {"lb_status_code", "timestamp"}
+        assert errors.group_by == ["lb_status_code"]
+
+    def test_typed_literals_and_date_calls(self, tmp_path):
+        """Test TIMESTAMP/DATE literals, DATE(col) and qualified columns become constraints"""
+        workload = tmp_path / "workload.jsonl"
+        workload.write_text("".join(json.dumps({"name": name, "sql": sql}) + "\n" for name, sql in [
+            ("typed", "SELECT COUNT(*) FROM lb_access_logs l WHERE l.client_ip = '10.0.0.1' "
+                      "AND l.timestamp >= TIMESTAMP '2024-12-15 10:00:00'"),
+            ("day", "SELECT COUNT(*) FROM lb_access_logs WHERE DATE(timestamp) = DATE '2024-12-16'"),
+            ("range", "SELECT COUNT(*) FROM lb_access_logs WHERE DATE(timestamp) BETWEEN '2024-12-15' "
+                      "AND '2024-12-16' AND lb_status_code > 499"),
+            ("opaque", "SELECT COUNT(*) FROM lb_access_logs "
+                       "WHERE TIMESTAMP_TRUNC(timestamp, HOUR) = TIMESTAMP '2024-12-16 10:00:00'"),
+        ]))
+        typed, day, date_range, opaque = load_workload(str(workload), target=bigquery_target())
+        assert set(typed.constraints) == {"client_ip", "timestamp"}
+        assert typed.constraints["timestamp"].low == "2024-12-15T10:00:00"
+        assert (day.constraints["timestamp"].low, day.constraints["timestamp"].high) == ("2024-12-16", "2024-12-17")
+        assert day.constraints["timestamp"].high_inclusive is False
+        assert date_range.constraints["timestamp"].high == "2024-12-17"
+        assert "lb_status_code" in date_range.constraints
+        assert [q.unparsed_time_filters for q in (typed, day, date_range)] == [[], [], []]
+        assert opaque.unparsed_time_filters == ["timestamp"]
+        referenced = where_columns("SELECT a FROM t WHERE b IN (SELECT c FROM u WHERE d = 1) GROUP BY a")
+        assert {"b", "c", "d"} <= set(referenced) and "a" not in referenced
+
+
+class TestAdvisor:
+    """Test the layout simulation and recommendation"""
+
+    def test_clusters_on_the_filtered_column(self, logs):
+        """Test the advisor clusters first on the column the heavy query filters"""
+        target = bigquery_target()
+        queries = load_workload(logs[1], target=target)
+        table = load_sample(logs[0], target)
+        results = advise(Simulator(table, target, queries), target, queries)
+        best, current = results[0], next(r for r in results if r.current)
+        assert current.layout == current_layout(target)
+        assert best.layout.partition_by == ("timestamp",)
+        assert best.layout.cluster_by[0] == "lb_status_code"
+        assert best.monthly_bytes < current.monthly_bytes
+
+    def test_partitioning_prunes_time_filters(self, logs):
+        """Test a day filter reads every retained day without partitioning and one day with it"""
+        target = bigquery_target()
+        queries = load_workload(logs[1], target=target)
+        simulator = Simulator(load_sample(logs[0], target), target, queries, retention_days=30)
+        flat = simulator.simulate(Layout())
+        daily = simulator.simulate(Layout(("timestamp",), "DAY"))
+        monthly = simulator.simulate(Layout(("timestamp",), "MONTH"))
+        assert flat.bytes_per_query["errors"] == pytest.approx(30 * daily.bytes_per_query["errors"], rel=0.2)
+        assert daily.bytes_per_query["errors"] < monthly.bytes_per_query["errors"]
+
+    def test_athena_prefers_parquet_partitions(self, logs):
+        """Test the Athena advisor prefers Parquet and keeps the day key the named queries filter on"""
+        target = athena_target()
+        queries = load_workload(tf_paths=[os.path.join(os.path.dirname(ATHENA_TF), "athena.tf")], target=target)
+        results = advise(Simulator(load_sample(logs[0], target), target, queries), target, queries)
+        assert results[0].layout == Layout(("year", "month", "day"))
+        assert next(r for r in results if r.current).layout.columnar is False
+
+
+class TestTerraform:
+    """Test the Terraform change for a layout"""
+
+    def test_unparsed_time_filter_keeps_partitioning(self, logs, tmp_path):
+        """Test a time filter the advisor cannot parse never leads to dropping time partitioning"""
+        workload = tmp_path / "workload.jsonl"
+        workload.write_text(json.dumps({
+            "name": "opaque", "runs": 1000,
+            "sql": "SELECT COUNT(*) FROM lb_access_logs WHERE client_ip = '10.0.0.1' "
+                   "AND TIMESTAMP_TRUNC(timestamp, DAY) = TIMESTAMP '2024-12-16'"}) + "\n")
+        target = bigquery_target()
+        queries = load_workload(str(workload), target=target)
+        results = advise(Simulator(load_sample(logs[0], target), target, queries), target, queries)
+        assert results[0].layout.partition_by == ()
+        applied = terraform_result(results, target, queries)
+        assert applied.layout.partition_by == ("timestamp",)
+        assert "time_partitioning" in terraform_change(target, applied.layout)[1]
+        queries[0].unparsed_time_filters = []
+        assert terraform_result(results, target, queries) is results[0]
+
+    def test_bigquery_diff(self, tmp_path):
+        """Test the change rewrites partitioning and clustering and round-trips through the parser"""
+        tf = tmp_path / "bigquery.tf"
+        shutil.copy(BIGQUERY_TF, tf)
+        target = bigquery_target(str(tf))
+        layout = Layout(("timestamp",), "HOUR", ("lb_status_code", "client_ip"))
+        original, updated = terraform_change(target, layout)
+        assert terraform_change(target, current_layout(target))[1] == original
+        assert 'type  = "HOUR"' in updated
+        assert 'clustering = ["lb_status_code", "client_ip"]' in updated
+        tf.write_text(updated)
+        assert current_layout(target) == layout
+        tf.write_text(terraform_change(target, Layout())[1])
+        assert current_layout(target) == Layout()
+        assert "time_partitioning" not in tf.read_text()
+
+    def test_athena_diff(self, tmp_path):
+        """Test a text layout changes only the partition keys, projection and template, never the storage"""
+        tf = tmp_path / "glue_projection.tf"
+        shutil.copy(ATHENA_TF, tf)
+        target = athena_target(str(tf))
+        original, updated = terraform_change(target, Layout(("year", "month"), columnar=False))
+        assert '"projection.day.range"' not in updated and 'name = "day"' not in updated
+        assert '"storage.location.template" = "${local.alb_log_location}$${year}/$${month}/"' in updated
+        descriptor = re.compile(r"\n  storage_descriptor \{.*?\n  \}\n", re.S)
+        assert descriptor.search(updated).group(0) == descriptor.search(original).group(0)
+        tf.write_text(updated)
+        assert current_layout(target) == Layout(("year", "month"), columnar=False)
+        _, restored = terraform_change(target, Layout(("year", "month", "day"), columnar=False))
+        assert restored == original
+        with pytest.raises(ValueError):
+            terraform_change(target, Layout(("year", "month", "day", "hour")))
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
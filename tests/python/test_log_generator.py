@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the synthetic ALB log generator
+"""
+
+import gzip
+import io
+import os
+import re
+import sys
+from collections import Counter
+from datetime import datetime
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+np = pytest.importorskip("numpy")
+
+from alb_log_parser import iter_records
+from log_generator import GeneratorConfig, generate, generate_object, render_batch
+from log_layout import iter_log_objects
+from partition_projection import SERDE_REGEX
+
+
+def small_config(root, **overrides):
+    options = dict(output_dir=str(root), start=datetime(2024, 12, 16), requests_per_second=0.2)
+    options.update(overrides)
+    return GeneratorConfig(**options)
+
+
+def tree_contents(root):
+    contents = {}
+    for obj in iter_log_objects(str(root)):
+        with gzip.open(obj.key, "rb") as f:
+            contents[os.path.relpath(obj.key, str(root))] = f.read()
+    return contents
+
+
+class TestRenderBatch:
+    """Test generated line content"""
+
+    def test_lines_parse(self):
+        """Test that every line parses and matches the Glue SerDe regex"""
+        config = small_config("unused")
+        data = render_batch(config, np.random.default_rng(7), 1734307200 * 10 ** 6, 1734307500 * 10 ** 6, 5000)
+        pattern = re.compile(SERDE_REGEX)
+        lines = data.decode().splitlines()
+        assert len(lines) == 5000
+        assert all(pattern.fullmatch(line) for line in lines)
+
+        records = [r.to_dict() for r in iter_records(io.BytesIO(data))]
+        times = [r["time"] for r in records]
+        assert times == sorted(times)
+        assert {r["type"] for r in records} == {"http", "https", "h2", "ws", "wss"}
+        assert all(r["elb_status_code"] == 101 for r in records if r["type"] in ("ws", "wss"))
+
+        statuses = Counter(r["elb_status_code"] for r in records)
+        assert 0.75 < statuses[200] / len(records) < 0.9
+        urls = Counter(r["request_url"] for r in records)
+        # Zipf popularity: the top URL is far more frequent than the median one
+        assert urls.most_common(1)[0][1] > 20 * sorted(urls.values())[len(urls) // 2]
+
+
+class TestGenerate:
+    """Test the AWSLogs tree output"""
+
+    def test_layout_and_gzip(self, tmp_path):
+        """Test that objects land in the day directories as gzip"""
+        key, lines, raw, size = generate_object(small_config(tmp_path), 0, 120, 1)
+        assert key.startswith("alb-logs/AWSLogs/123456789012/elasticloadbalancing/us-east-1/2024/12/16/")
+        assert key.endswith("_20241216T1005Z_52.78.12.35_" + key.rsplit("_", 1)[1])
+        assert key.endswith(".log.gz")
+        with gzip.open(os.path.join(str(tmp_path), key), "rb") as f:
+            assert len(f.read()) == raw
+        assert lines > 0 and size < raw
+
+    def test_reproducible_across_workers(self, tmp_path):
+        """Test that the seed, not the worker count, determines the output"""
+        serial = generate(small_config(tmp_path / "a"), workers=1)
+        parallel = generate(small_config(tmp_path / "b"), workers=2)
+        assert serial.files == parallel.files == 576
+        assert serial.lines == parallel.lines
+        assert tree_contents(tmp_path / "a") == tree_contents(tmp_path / "b")
+
+        generate_object(small_config(tmp_path / "c", seed=7), 0, 100, 0)
+        generate_object(small_config(tmp_path / "d", seed=42), 0, 100, 0)
+        assert list(tree_contents(tmp_path / "c").values()) != list(tree_contents(tmp_path / "d").values())
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
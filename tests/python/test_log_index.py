@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the Bloom filter / min-max lookup index
+"""
+
+import gzip
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+from alb_log_parser import iter_column_batches
+from compaction import CompactionOptions, compact_tree
+from log_index import FileIndex, LogIndex, Lookup, index_file, scan, trace_time
+from parquet_converter import group_by_partition
+from sketches import BloomFilter
+
+
+@pytest.fixture(scope="module")
+def logs(tmp_path_factory):
+    """Three days of small objects, indexed once"""
+    pytest.importorskip("numpy")
+    from log_generator import GeneratorConfig, generate
+    root = tmp_path_factory.mktemp("index")
+    generate(GeneratorConfig(str(root / "logs"), datetime(2024, 12, 16), days=3, requests_per_second=0.1),
+             workers=1)
+    LogIndex(str(root / "idx")).build(str(root / "logs"))
+    return root
+
+
+def all_files(root):
+    return [os.path.abspath(p) for files in group_by_partition(str(root)).values() for p in files]
+
+
+class TestLogIndex:
+    """Test sidecars, pruning and exact lookups"""
+
+    def test_bloom_filter(self):
+        """Test that there are no false negatives and about the requested false positive rate"""
+        bloom = BloomFilter.for_capacity(1000, 0.01)
+        bloom.update(f"10.0.{i // 256}.{i % 256}" for i in range(1000))
+        assert all(f"10.0.{i // 256}.{i % 256}" in bloom for i in range(1000))
+        false_positives = sum(f"192.168.{i // 256}.{i % 256}" in bloom for i in range(10000))
+        assert false_positives < 250
+        assert BloomFilter.from_bytes(bloom.to_bytes()).data == bloom.data
+
+    def test_sidecar_round_trip(self, logs):
+        """Test the sidecar encoding"""
+        path = all_files(logs / "logs")[10]
+        index = index_file(path)
+        decoded = FileIndex.from_bytes(index.to_bytes())
+        assert decoded.rows == index.rows and decoded.ranges == index.ranges
+        assert decoded.blooms["trace_id"].data == index.blooms["trace_id"].data
+        assert decoded.is_current(path)
+
+    def test_trace_lookup_touches_a_handful_of_files(self, logs):
+        """Test that one trace is found across days while reading few sidecars and scanning fewer objects"""
+        files = all_files(logs / "logs")
+        with gzip.open(files[len(files) // 2], "rb") as f:
+            line = f.readline().decode()
+        trace_id = line.split('"Root=', 1)[1].split('"', 1)[0]
+        assert trace_time(trace_id).strftime("%Y-%m-%dT%H:%M:%S") <= line.split(" ")[1]
+
+        index = LogIndex(str(logs / "idx"))
+        result = index.lookup(Lookup(trace_id=trace_id, trust_trace_time=True))
+        assert files[len(files) // 2] in result.files
+        assert len(result.files) <= 5 and result.total_files == len(files)
+        assert result.sidecars_read < result.total_files
+        rows = list(scan(result.files, Lookup(trace_id=trace_id)))
+        assert len(rows) == 1 and rows[0]["trace_id"] == f"Root={trace_id}"
+
+        # A Root= supplied by a client may carry any epoch, so by default only the Bloom filters prune
+        assert Lookup(trace_id=trace_id).time_window() == (None, None)
+        untrusted = index.lookup(Lookup(trace_id=trace_id))
+        assert untrusted.sidecars_read == untrusted.total_files and set(result.files) <= set(untrusted.files)
+
+    def test_no_false_negatives(self, logs):
+        """Test that every object holding a matching row is listed"""
+        files = all_files(logs / "logs")
+        batch = next(iter_column_batches(files[0], ["client_ip"]))
+        lookup = Lookup(client_ip=batch["client_ip"][0], min_latency=0.05)
+
+        expected = {p for p in files if any(scan([p], lookup))}
+        listed = set(LogIndex(str(logs / "idx")).lookup(lookup).files)
+        assert expected and expected <= listed
+        assert len(listed) < len(files)
+
+    def test_incremental_build_and_compaction(self, logs):
+        """Test that unchanged objects are skipped and sidecars of merged objects are dropped"""
+        index = LogIndex(str(logs / "idx"))
+        assert all(r.indexed == 0 for r in index.build(str(logs / "logs")))
+
+        source = str(logs / "logs")
+        compact_tree(source, CompactionOptions(target_bytes=1024 * 1024, min_bytes=512 * 1024), workers=1)
+        rebuilt = index.build(source)
+        assert sum(r.indexed for r in rebuilt) == len(all_files(source)) < 10
+        assert index.lookup(Lookup(start="2024-12-16T00:00:00")).total_files == len(all_files(source))
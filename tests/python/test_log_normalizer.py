@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the cross-cloud log normalizer
+"""
+
+import json
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+from latency_sketches import sketch_batches
+from log_normalizer import (UNIFIED_NAMES, ProviderSummary, _timestamps, alb_view, benchmark, export, normalize,
+                            normalize_sources, write_parquet)
+
+# Columns every provider's native format carries
+SHARED = ["timestamp", "client_ip", "client_port", "backend_ip", "backend_port", "lb_status_code",
+          "backend_status_code", "received_bytes", "sent_bytes", "request_method", "request_url",
+          "request_protocol", "user_agent"]
+
+
+def _rows(batches):
+    columns = {name: [] for name in UNIFIED_NAMES}
+    for batch in batches:
+        for name in UNIFIED_NAMES:
+            columns[name].extend(batch[name])
+    return columns
+
+
+@pytest.fixture(scope="module")
+def sources(tmp_path_factory):
+    """One day of generated ALB logs, rewritten as GCP and Azure logs"""
+    from log_generator import GeneratorConfig, generate
+    root = tmp_path_factory.mktemp("normalizer")
+    logs = str(root / "aws")
+    generate(GeneratorConfig(logs, datetime(2024, 12, 16), days=1, requests_per_second=0.05), workers=1)
+    paths = {"aws": logs}
+    for provider, name in (("gcp", "gcp.json"), ("azure", "azure.json.gz")):
+        paths[provider] = str(root / name)
+        export(normalize("aws", logs), provider, paths[provider])
+    return paths
+
+
+class TestNormalize:
+    """Test each provider maps onto the unified schema"""
+
+    def test_aws(self, sources):
+        """Test ALB records get unified names, NULL for -1 times, target group names and a total time"""
+        rows = _rows(normalize("aws", sources["aws"]))
+        assert rows["provider"][0] == "aws" and rows["timestamp"][0].endswith("Z")
+        assert all(v is None or v >= 0 for v in rows["backend_processing_time"])
+        assert not any(group and group.startswith("arn:") for group in rows["backend_group"])
+        i = next(i for i, total in enumerate(rows["total_time"]) if total is not None)
+        assert rows["total_time"][i] == pytest.approx(rows["request_processing_time"][i]
+                                                      + rows["backend_processing_time"][i]
+                                                      + rows["response_processing_time"][i])
+
+    def test_providers_agree(self, sources):
+        """Test the same requests read back identically from the GCP and Azure formats"""
+        aws = _rows(normalize("aws", sources["aws"]))
+        gcp = _rows(normalize("gcp", sources["gcp"]))
+        azure = _rows(normalize("azure", sources["azure"]))
+        for name in SHARED:
+            assert gcp[name] == aws[name], name
+            assert azure[name] == aws[name], name
+        assert gcp["total_time"] == aws["total_time"]
+        assert azure["backend_group"] == aws["backend_group"]
+        assert azure["request_processing_time"][0] is None
+
+    def test_timestamps_and_documents(self, tmp_path):
+        """Test timestamp spellings and a pretty-printed Azure diagnostics document"""
+        assert _timestamps(["2024-12-16 00:00:08.139083 UTC", "2024-12-16T00:00:08.1390830Z",
+                            "2024-12-16T01:00:08+01:00", 1734307208.5, None]) == [
+            "2024-12-16T00:00:08.139083Z", "2024-12-16T00:00:08.139083Z", "2024-12-16T00:00:08.000000Z",
+            "2024-12-16T00:00:08.500000Z", None]
+        document = tmp_path / "PT1H.json"
+        document.write_text(json.dumps({"records": [{
+            "time": "2024-12-16T00:00:08Z",
+            "properties": {"clientIP": "1.2.3.4", "clientPort": 5, "httpStatus": 502, "serverStatus": "-",
+                           "serverRouted": "", "timeTaken": 0.25, "requestUri": "/x", "host": "h",
+                           "sslEnabled": "off"},
+        }]}, indent=2))
+        batch = next(normalize("azure", str(document)))
+        assert batch["lb_status_code"] == [502] and batch["backend_status_code"] == [None]
+        assert batch["backend_ip"] == [None] and batch["request_url"] == ["http://h/x"]
+        assert batch["total_time"] == [0.25]
+
+
+class TestDownstream:
+    """Test consumers run once over every provider"""
+
+    def test_sketches_and_summary(self, sources):
+        """Test one pass feeds the latency sketches and the per-provider summary"""
+        summary = ProviderSummary()
+        batches = []
+        for batch in normalize_sources([("aws", sources["aws"]), ("azure", sources["azure"])]):
+            summary.add(batch)
+            batches.append(alb_view(batch))
+        sketches, rows = sketch_batches(batches)
+        totals = summary.to_dict()
+        assert rows == totals["aws"]["requests"] * 2
+        assert totals["aws"] == totals["azure"]
+        assert any(name != "-" for _, name, _ in sketches)
+
+    def test_parquet_and_benchmark(self, sources, tmp_path):
+        """Test the unified stream spills to Parquet and every provider is benchmarked"""
+        pa = pytest.importorskip("pyarrow")
+        import pyarrow.parquet as pq
+        path = str(tmp_path / "unified.parquet")
+        rows = write_parquet(normalize_sources([("gcp", sources["gcp"])]), path)
+        table = pq.read_table(path)
+        assert table.num_rows == rows and table.schema.names == UNIFIED_NAMES
+        assert table.schema.field("lb_status_code").type == pa.int32()
+        results = benchmark(rate=0.01, work_dir=str(tmp_path))
+        assert [r.provider for r in results] == ["aws", "gcp", "azure"]
+        assert len({r.rows for r in results}) == 1 and all(r.rows_per_second > 0 for r in results)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
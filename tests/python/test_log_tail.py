@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the log tailer and its sliding window
+"""
+
+import gzip
+import os
+import shutil
+import sys
+from datetime import datetime
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+from alb_log_parser import sample_log_path
+from local_aws import LocalS3
+from log_layout import iter_log_objects
+from log_tail import S3Mirror, SlidingWindow, Tailer, object_end
+
+DAY_DIR = os.path.join("AWSLogs", "123456789012", "elasticloadbalancing", "us-east-1", "2024", "12", "16")
+PLAIN_LOG = "123456789012_elasticloadbalancing_us-east-1_app.lb_20241216T1020Z_10.0.0.1_abcd1234.log"
+
+
+@pytest.fixture(scope="module")
+def logs(tmp_path_factory):
+    """Two hours of generated logs in the AWSLogs layout"""
+    pytest.importorskip("numpy")
+    from log_generator import GeneratorConfig, generate
+    root = str(tmp_path_factory.mktemp("tail") / "logs")
+    generate(GeneratorConfig(root, datetime(2024, 12, 16), days=1, requests_per_second=0.2, prefix=""), workers=1)
+    objects = sorted(iter_log_objects(root), key=object_end)
+    # Keep only the first two hours so the test folds every object
+    for obj in objects[48:]:
+        os.remove(obj.key)
+    return root, objects[:48]
+
+
+def _copy(objects, source, target):
+    for obj in objects:
+        path = os.path.join(target, os.path.relpath(obj.key, source))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copy(obj.key, path)
+
+
+class TestSlidingWindow:
+    """Test bucketing, eviction and late rows"""
+
+    def test_window_and_late_rows(self):
+        """Test only the window's rows are reported and rows older than the lateness are dropped"""
+        window = SlidingWindow(window_seconds=60, bucket_seconds=10, lateness_seconds=60)
+        window.add_batch(["2024-12-16T00:00:05.000000Z"] * 3, [200, 502, 503], [0.1, 0.2, -1], ["a", "b", "b"])
+        window.add_batch(["2024-12-16T00:01:30.000000Z"] * 2, [200, 200], [0.5, 0.5], ["c", "c"])
+        snapshot = window.snapshot()
+        assert snapshot.requests == 2 and snapshot.errors == 0
+        assert snapshot.start == "2024-12-16T00:00:40Z" and snapshot.end == "2024-12-16T00:01:40Z"
+        assert snapshot.top_clients == [("c", 2)]
+
+        added = window.add_batch(["2024-12-16T00:00:45.000000Z", "2024-12-15T23:59:00.000000Z"], [500, 200],
+                                 [0.1, 0.1], ["a", "a"])
+        assert added == 1 and window.late == 1
+        assert window.snapshot().errors == 1
+        window.add_batch(["2024-12-16T01:00:00.000000Z"], [200], [0.1], ["d"])
+        assert len(window.buckets) <= window.kept_buckets
+
+
+class TestTailer:
+    """Test incremental reads, checkpoints and restarts"""
+
+    def test_poll_is_incremental(self, logs, tmp_path):
+        """Test a second poll reads nothing and state stays bounded"""
+        root, objects = logs
+        tailer = Tailer(root, str(tmp_path / "checkpoint.json"), since=0)
+        rows = tailer.poll()
+        assert rows > 0 and tailer.stats.objects == len(objects)
+        assert tailer.poll() == 0
+        assert tailer.window.snapshot().requests > 0
+        assert len(tailer.offsets) < len(objects)  # objects older than the window were pruned
+
+    def test_restart_resumes_from_checkpoint(self, logs, tmp_path):
+        """Test a tailer restarted mid-stream ends with the same window as one uninterrupted run"""
+        root, objects = logs
+        expected = Tailer(root, since=0)
+        expected.poll()
+
+        tree, checkpoint = str(tmp_path / "tree"), str(tmp_path / "checkpoint.json")
+        _copy(objects[:30], root, tree)
+        Tailer(tree, checkpoint, since=0).poll()
+        _copy(objects[30:], root, tree)
+        resumed = Tailer(tree, checkpoint)
+        resumed.poll()
+        assert resumed.window.snapshot() == expected.window.snapshot()
+
+    def test_growing_plain_file(self, tmp_path):
+        """Test appended lines are read once and a partial last line waits for its newline"""
+        with open(sample_log_path(), "rb") as f:
+            lines = [line for line in f.read().splitlines(True) if line.strip()]
+        path = tmp_path / DAY_DIR / PLAIN_LOG
+        path.parent.mkdir(parents=True)
+        path.write_bytes(b"".join(lines[:4]) + lines[4][:30])
+        tailer = Tailer(str(tmp_path), str(tmp_path / "checkpoint.json"), since=0)
+        assert tailer.poll() == 4
+        with open(path, "ab") as f:
+            f.write(lines[4][30:] + b"".join(lines[5:]) + b"not an alb line\n")
+        assert Tailer(str(tmp_path), str(tmp_path / "checkpoint.json")).poll() == len(lines) - 4
+
+    def test_truncated_gzip_is_retried(self, tmp_path):
+        """Test a gzip object still being copied is read up to where it ends and finished on a later poll"""
+        with open(sample_log_path(), "rb") as f:
+            lines = [line for line in f.read().splitlines(True) if line.strip()]
+        data = gzip.compress(b"".join(lines * 50))
+        path = tmp_path / DAY_DIR / (PLAIN_LOG + ".gz")
+        path.parent.mkdir(parents=True)
+        checkpoint = str(tmp_path / "checkpoint.json")
+        path.write_bytes(data[:5])
+        tailer = Tailer(str(tmp_path), checkpoint, since=0)
+        assert tailer.poll() == 0
+        path.write_bytes(data[:len(data) // 2])
+        first = tailer.poll()
+        assert first < len(lines) * 50 and tailer.stats.truncated == 2
+        path.write_bytes(data)
+        assert tailer.poll() == len(lines) * 50 - first
+        assert tailer.poll() == 0
+
+
+class TestS3Mirror:
+    """Test mirroring new objects from S3"""
+
+    def test_sync_copies_new_objects_once(self, logs, tmp_path):
+        """Test only objects not yet mirrored are downloaded, listing from the retained day"""
+        root, objects = logs
+        s3 = LocalS3(str(tmp_path / "s3"))
+        for obj in objects[:10]:
+            with open(obj.key, "rb") as f:
+                s3.put_object(Bucket="logs", Key=os.path.relpath(obj.key, root).replace(os.sep, "/"), Body=f.read())
+        prefix = "AWSLogs/123456789012/elasticloadbalancing/us-east-1/"
+        mirror = S3Mirror(s3, f"s3://logs/{prefix}", str(tmp_path / "mirror"))
+        assert mirror.sync(since=0) == 10
+        assert mirror.sync(since=object_end(objects[5])) == 0
+        tailer = Tailer(str(tmp_path / "mirror"), since=0)
+        assert tailer.poll() > 0 and tailer.stats.objects == 10
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the Parquet converter and log layout helpers
+"""
+
+import os
+import shutil
+import sys
+from datetime import datetime
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+from log_layout import object_key, parse_key
+from parquet_converter import ConversionOptions, convert_tree, group_by_partition, main, split_files
+
+SAMPLE_KEY = ("alb-logs/AWSLogs/123456789012/elasticloadbalancing/us-east-1/2024/12/16/"
+              "123456789012_elasticloadbalancing_us-east-1_app.my-loadbalancer.50dc6c495c0c9188_"
+              "20241216T1015Z_52.78.12.34_random123.log")
+
+
+class TestLogLayout:
+    """Test key parsing"""
+
+    def test_parse_upload_script_key(self):
+        """Test the key layout produced by upload-sample-logs.sh"""
+        obj = parse_key(SAMPLE_KEY)
+        assert obj.partition == ("2024", "12", "16")
+        assert obj.account == "123456789012"
+        assert obj.region == "us-east-1"
+        assert obj.load_balancer == "app.my-loadbalancer.50dc6c495c0c9188"
+        assert obj.hour == "10"
+
+    def test_object_key_round_trip(self):
+        """Test that generated keys match the upload script layout"""
+        key = object_key("123456789012", "us-east-1", "app.my-loadbalancer.50dc6c495c0c9188",
+                         datetime(2024, 12, 16, 10, 15), "52.78.12.34", "random123", compressed=False)
+        assert key == SAMPLE_KEY
+
+    def test_non_log_key(self):
+        """Test that unrelated keys are ignored"""
+        assert parse_key("alb-logs/AWSLogs/123456789012/ELBAccessLogTestFile") is None
+
+
+class TestParquetConverter:
+    """Test Parquet conversion"""
+
+    def test_group_by_partition(self, make_tree, tmp_path):
+        """Test grouping raw files by day"""
+        make_tree(str(tmp_path))
+        partitions = group_by_partition(str(tmp_path))
+        assert list(partitions) == [("2024", "12", "16"), ("2024", "12", "17")]
+
+    def test_convert_tree(self, make_tree, tmp_path):
+        """Test converting a tree to ZSTD Parquet with dictionary-encoded columns"""
+        pq = pytest.importorskip("pyarrow.parquet")
+        make_tree(str(tmp_path / "raw"))
+
+        options = ConversionOptions(compression="zstd", row_group_size=4)
+        results = convert_tree(str(tmp_path / "raw"), str(tmp_path / "out"), options, workers=1)
+
+        assert [r.partition for r in results] == [
+            os.path.join("year=2024", "month=12", "day=16"),
+            os.path.join("year=2024", "month=12", "day=17"),
+        ]
+        assert all(r.rows == 10 for r in results)
+
+        parquet_file = pq.ParquetFile(results[0].output_files[0])
+        assert parquet_file.metadata.num_row_groups == 3
+        assert parquet_file.schema_arrow.field("elb_status_code").type.bit_width == 32
+        column = parquet_file.metadata.row_group(0).column(
+            parquet_file.schema_arrow.get_field_index("target_group_arn"))
+        assert column.compression == "ZSTD"
+        assert "RLE_DICTIONARY" in column.encodings
+
+        table = pq.read_table(str(tmp_path / "out"))
+        assert table.num_rows == 20
+        assert sorted(set(table.column("elb_status_code").to_pylist())) == [200, 403, 404, 500]
+
+    def test_partition_by_hour(self, make_tree, tmp_path):
+        """Test the optional hour= partition level"""
+        pytest.importorskip("pyarrow.parquet")
+        make_tree(str(tmp_path / "raw"))
+
+        options = ConversionOptions(partition_by_hour=True, columns=["elb_status_code", "request_url"])
+        results = convert_tree(str(tmp_path / "raw"), str(tmp_path / "out"), options, workers=1)
+        assert all(os.sep + "hour=10" + os.sep in r.output_files[0] for r in results)
+
+    def test_rerun_replaces_partition(self, make_tree, tmp_path):
+        """Test re-converting a day after a new object arrives replaces its output instead of adding to it"""
+        pq = pytest.importorskip("pyarrow.parquet")
+        make_tree(str(tmp_path / "raw"))
+        options = ConversionOptions(columns=["elb_status_code"])
+        convert_tree(str(tmp_path / "raw"), str(tmp_path / "out"), options, workers=1)
+
+        first = group_by_partition(str(tmp_path / "raw"))[("2024", "12", "16")][0]
+        shutil.copy(first, first.replace("random123", "random456"))
+        results = convert_tree(str(tmp_path / "raw"), str(tmp_path / "out"), options, workers=1)
+        day = os.path.join(str(tmp_path / "out"), "year=2024", "month=12", "day=16")
+        assert results[0].rows == 20 and os.listdir(day) == [os.path.basename(results[0].output_files[0])]
+        assert pq.read_table(str(tmp_path / "out")).num_rows == 30
+        assert sorted(os.listdir(os.path.join(str(tmp_path / "out"), "year=2024", "month=12"))) == [
+            "day=16", "day=17"]
+
+    def test_large_day_uses_every_worker(self, make_tree, tmp_path):
+        """Test one day is split into per-worker chunks that are published together"""
+        pq = pytest.importorskip("pyarrow.parquet")
+        make_tree(str(tmp_path / "raw"))
+        first = group_by_partition(str(tmp_path / "raw"))[("2024", "12", "16")][0]
+        for suffix in ("random200", "random300", "random400", "random500", "random600"):
+            shutil.copy(first, first.replace("random123", suffix))
+        files = group_by_partition(str(tmp_path / "raw"))[("2024", "12", "16")]
+        assert [len(c) for c in split_files(files, 3)] == [2, 2, 2]
+        assert split_files(files, 1) == [files]
+
+        options = ConversionOptions(columns=["elb_status_code"], partition_by_hour=True)
+        results = convert_tree(str(tmp_path / "raw"), str(tmp_path / "out"), options, workers=3)
+        day16 = results[0]
+        assert day16.rows == 60 and day16.input_files == 6 and len(day16.output_files) == 3
+        assert all(os.path.exists(f) for f in day16.output_files)
+        assert pq.read_table(str(tmp_path / "out")).num_rows == 70
+        assert not [d for d in os.listdir(os.path.join(str(tmp_path / "out"), "year=2024", "month=12"))
+                    if d.startswith(".")]
+
+    def test_unknown_column_is_argument_error(self, tmp_path, monkeypatch, capsys):
+        """Test --columns with an unknown name is reported as a usage error"""
+        monkeypatch.setattr(sys, "argv", ["parquet_converter.py", str(tmp_path), str(tmp_path / "out"),
+                                          "--columns", "elb_status_code,status"])
+        with pytest.raises(SystemExit) as exit_info:
+            main()
+        assert exit_info.value.code == 2 and "unknown columns: status" in capsys.readouterr().err
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the partition projection generator
+"""
+
+import os
+import re
+import sys
+from datetime import date
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+from alb_log_parser import COLUMNS, ALBLogRecord, sample_log_path
+from log_layout import parse_key
+from partition_projection import SERDE_REGEX, ProjectionConfig, _hcl_string, to_terraform
+
+REPO_ROOT = os.path.join(os.path.dirname(__file__), '..', '..')
+UPLOAD_SCRIPT = os.path.join(REPO_ROOT, 'examples', 'upload-sample-logs.sh')
+PROJECTION_TF = os.path.join(REPO_ROOT, 'terraform', 'modules', 'aws', 'glue_projection.tf')
+
+
+def upload_script_layout():
+    """Return (BASE_PATH, object file name template) from upload-sample-logs.sh"""
+    with open(UPLOAD_SCRIPT) as f:
+        script = f.read()
+    base_path = re.search(r'^BASE_PATH="([^"]+)"', script, re.M).group(1)
+    filename = re.search(r'\$\{S3_PATH\}([^"]+)"', script).group(1)
+    return base_path, filename
+
+
+def upload_script_key(day: date) -> str:
+    """The object key upload-sample-logs.sh produces when run on the given day"""
+    base_path, filename = upload_script_layout()
+    values = {"YEAR": f"{day:%Y}", "MONTH": f"{day:%m}", "DAY": f"{day:%d}"}
+    directory = f"{base_path}/{day:%Y}/{day:%m}/{day:%d}/"
+    return directory + re.sub(r"\$\{(\w+)\}", lambda m: values[m.group(1)], filename)
+
+
+@pytest.fixture
+def config():
+    base_path, _ = upload_script_layout()
+    match = re.match(r"(?P<prefix>.+)/AWSLogs/(?P<account>\d+)/elasticloadbalancing/(?P<region>.+)$", base_path)
+    return ProjectionConfig(
+        bucket="athena-alb-logs-alb-logs-abc123",
+        account_id=match.group("account"),
+        region=match.group("region"),
+        start_year=2024,
+        end_year=2026,
+        prefix=match.group("prefix"),
+    )
+
+
+class TestProjectionTemplate:
+    """Test that the location template resolves to the sample layout"""
+
+    def test_template_resolves_to_upload_prefixes(self, config):
+        """Test resolved locations against the keys upload-sample-logs.sh writes"""
+        for day in (date(2024, 12, 16), date(2025, 1, 1), date(2026, 2, 28)):
+            key = upload_script_key(day)
+            obj = parse_key(key)
+            location = config.resolve_location(*obj.partition)
+            assert location == f"s3://{config.bucket}/{key.rsplit('/', 1)[0]}/"
+
+    def test_projected_partitions_cover_sample_days(self, config):
+        """Test that projection ranges enumerate exactly the requested days"""
+        days = list(config.projected_partitions(date(2024, 12, 30), date(2025, 1, 2)))
+        assert days == [("2024", "12", "30"), ("2024", "12", "31"), ("2025", "01", "01"), ("2025", "01", "02")]
+        sample = parse_key(upload_script_key(date(2024, 12, 16))).partition
+        assert sample in set(config.projected_partitions())
+
+    def test_table_input(self, config):
+        """Test the Glue TableInput projection properties"""
+        table = config.table_input()
+        params = table["Parameters"]
+        assert params["projection.enabled"] == "true"
+        assert params["projection.year.range"] == "2024,2026"
+        assert params["projection.month.digits"] == "2"
+        assert params["storage.location.template"].endswith("/us-east-1/${year}/${month}/${day}/")
+        assert [k["Name"] for k in table["PartitionKeys"]] == ["year", "month", "day"]
+        assert len(table["StorageDescriptor"]["Columns"]) == len(COLUMNS)
+
+    def test_terraform_escapes_placeholders(self, config):
+        """Test that Terraform output does not interpolate ${year}"""
+        hcl = to_terraform(config)
+        assert "$${year}/$${month}/$${day}/" in hcl
+        assert 'resource "aws_glue_catalog_table" "alb_access_logs"' in hcl
+
+
+class TestSerDe:
+    """Test the RegexSerDe pattern"""
+
+    def test_regex_matches_parser(self):
+        """Test that every capture group agrees with the Python parser"""
+        pattern = re.compile(SERDE_REGEX)
+        assert pattern.groups == len(COLUMNS)
+        with open(sample_log_path(), "rb") as f:
+            for line in f:
+                line = line.rstrip(b"\n")
+                groups = pattern.fullmatch(line.decode()).groups()
+                record = ALBLogRecord(line).to_dict()
+                for (name, _), value in zip(COLUMNS, groups):
+                    expected = record[name]
+                    if expected is None:
+                        assert value in ("", "-"), name
+                    elif isinstance(expected, float):
+                        assert float(value) == expected, name
+                    else:
+                        assert value == str(expected), name
+
+    def test_module_table_in_sync(self):
+        """Test that glue_projection.tf uses the generator's regex and columns"""
+        with open(PROJECTION_TF) as f:
+            hcl = f.read()
+        assert f'"input.regex"          = {_hcl_string(SERDE_REGEX)}' in hcl
+        columns = re.findall(r'\{ name = "(\w+)", type = "(\w+)" \}', hcl)
+        assert columns == COLUMNS
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Unit tests for partition statistics and scan estimates
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+from cost_estimator import generate_cost_report
+from partition_stats import ATHENA_MIN_BYTES, PartitionStats, monthly_scanned_tb
+
+DAY_16 = "SELECT elb_status_code, count(*) FROM alb_access_logs WHERE year = '2024' AND month = '12' AND day = '16' GROUP BY 1"
+
+
+@pytest.fixture
+def stats(make_tree, tmp_path):
+    make_tree(str(tmp_path / "raw"))
+    return PartitionStats.from_tree(str(tmp_path / "raw"))
+
+
+class TestPartitionStats:
+    """Test building the partition index"""
+
+    def test_from_tree(self, stats, tmp_path):
+        """Test hourly bytes and rows from a raw tree"""
+        assert sorted(stats.hours) == [("2024", "12", "16", "10"), ("2024", "12", "17", "10")]
+        assert stats.total_rows == 20
+        assert stats.days()[("2024", "12", "16")].rows == 10
+        assert sum(stats.column_weights.values()) == pytest.approx(1.0)
+
+        stats.save(str(tmp_path / "stats.json"))
+        loaded = PartitionStats.load(str(tmp_path / "stats.json"))
+        assert loaded.hours == stats.hours
+        assert loaded.to_catalog().sizes == stats.to_catalog().sizes
+
+    def test_from_inventory(self, tmp_path):
+        """Test S3 inventory CSV rows (bucket, key, size, ...) with URL-encoded keys"""
+        key = ("alb-logs/AWSLogs/123456789012/elasticloadbalancing/us-east-1/2024/12/16/"
+               "123456789012_elasticloadbalancing_us-east-1_app.my-lb.50dc6c495c0c9188_20241216T1015Z_52.78.12.34_abc.log.gz")
+        path = tmp_path / "inventory.csv"
+        path.write_text(f'"logs-bucket","{key.replace("/", "%2F")}","8000","2024-12-16T10:20:00.000Z"\n'
+                        '"logs-bucket","alb-logs/other.txt","10","2024-12-16T10:20:00.000Z"\n')
+        stats = PartitionStats.from_inventory(str(path), row_bytes=80)
+        assert stats.hours == {("2024", "12", "16", "10"): stats.hours[("2024", "12", "16", "10")]}
+        assert stats.total_bytes == 8000
+        assert stats.total_rows == 100
+
+
+class TestScanEstimate:
+    """Test pruning and projection"""
+
+    def test_partition_pruning(self, stats):
+        """Test that a day filter reads one partition and no filter reads all"""
+        pruned = stats.estimate(DAY_16)
+        full = stats.estimate("SELECT count(*) FROM alb_access_logs")
+        assert pruned.partitions == 1 and pruned.rows == 10
+        assert full.partitions == 2
+        assert pruned.bytes_scanned == stats.days()[("2024", "12", "16")].bytes
+        assert full.bytes_scanned == stats.total_bytes
+        assert pruned.bytes_billed == ATHENA_MIN_BYTES
+        assert stats.estimate("SHOW PARTITIONS alb_access_logs").bytes_billed == 0
+
+    def test_columnar_projection(self, stats):
+        """Test that a columnar estimate reads only the referenced columns"""
+        text = stats.estimate(DAY_16)
+        parquet = stats.estimate(DAY_16, columnar=True)
+        star = stats.estimate("SELECT * FROM alb_access_logs WHERE day = '16'", columnar=True)
+        assert parquet.columns == ["elb_status_code"]
+        assert parquet.bytes_scanned < star.bytes_scanned < text.bytes_scanned
+
+    def test_cost_report(self, stats):
+        """Test feeding scanned bytes into the cost report"""
+        scanned_tb = monthly_scanned_tb(stats, [DAY_16], runs_per_month=300)
+        report = generate_cost_report("standard", scanned_tb)
+        athena = [c for c in report["aws"]["costs"] if c["service"] == "Amazon Athena"][0]
+        assert athena["monthly_cost"] == pytest.approx(scanned_tb * 5, abs=0.01)
+        assert report["aws"]["total"] < generate_cost_report("standard")["aws"]["total"]
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the Terraform plan cache
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+from infra_cli import PLAN_FILE, InfrastructureCLI
+from plan_cache import PlanCache, module_fingerprint
+
+FAKE_TERRAFORM = """#!{python}
+import os, sys
+with open(os.environ["FAKE_TF_CALLS"], "a") as f:
+    f.write(" ".join(sys.argv[1:]) + "\\n")
+if sys.argv[1] == "plan":
+    out = [a.split("=", 1)[1] for a in sys.argv if a.startswith("-out=")][0]
+    with open(out, "w") as f:
+        f.write("binary plan")
+    print("Plan: 3 to add, 0 to change, 0 to destroy.")
+elif sys.argv[1] == "show":
+    print('{{"format_version": "1.2"}}')
+else:
+    print("Success! The configuration is valid.")
+"""
+
+
+@pytest.fixture
+def module(tmp_path):
+    path = tmp_path / "modules" / "aws"
+    path.mkdir(parents=True)
+    (path / "main.tf").write_text('resource "null_resource" "a" {}\n')
+    (path / ".terraform.lock.hcl").write_text('provider "registry.terraform.io/hashicorp/aws" {}\n')
+    return path
+
+
+@pytest.fixture
+def cli(tmp_path, module, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    terraform = bin_dir / "terraform"
+    terraform.write_text(FAKE_TERRAFORM.format(python=sys.executable))
+    terraform.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_TF_CALLS", str(tmp_path / "calls"))
+
+    instance = InfrastructureCLI(cache=PlanCache(str(tmp_path / "cache")))
+    instance.modules_dir = str(module.parent)
+    return instance
+
+
+def calls(tmp_path):
+    with open(tmp_path / "calls") as f:
+        return f.read().splitlines()
+
+
+class TestFingerprint:
+    """Test cache keys"""
+
+    def test_inputs_change_key(self, module, tmp_path, monkeypatch):
+        """Test that .tf, lock file, vars file, TF_VAR_, workspace and local state changes produce new keys"""
+        vars_file = tmp_path / "dev.tfvars"
+        vars_file.write_text('project_name = "a"\n')
+        keys = [module_fingerprint(str(module), "plan", str(vars_file))]
+
+        (module / "main.tf").write_text('resource "null_resource" "b" {}\n')
+        keys.append(module_fingerprint(str(module), "plan", str(vars_file)))
+        (module / ".terraform.lock.hcl").write_text("# upgraded\n")
+        keys.append(module_fingerprint(str(module), "plan", str(vars_file)))
+        vars_file.write_text('project_name = "b"\n')
+        keys.append(module_fingerprint(str(module), "plan", str(vars_file)))
+        monkeypatch.setenv("TF_VAR_environment", "prod")
+        keys.append(module_fingerprint(str(module), "plan", str(vars_file)))
+        keys.append(module_fingerprint(str(module), "validate", str(vars_file)))
+        (module / "terraform.tfstate").write_text('{"lineage": "abc", "serial": 1}')
+        keys.append(module_fingerprint(str(module), "validate", str(vars_file)))
+        (module / "terraform.tfstate").write_text('{"lineage": "abc", "serial": 2}')
+        keys.append(module_fingerprint(str(module), "validate", str(vars_file)))
+
+        # The selected workspace and that workspace's state
+        (module / ".terraform").mkdir()
+        (module / ".terraform" / "environment").write_text("staging")
+        keys.append(module_fingerprint(str(module), "validate", str(vars_file)))
+        (module / "terraform.tfstate.d" / "staging").mkdir(parents=True)
+        (module / "terraform.tfstate.d" / "staging" / "terraform.tfstate").write_text('{"lineage": "s", "serial": 1}')
+        keys.append(module_fingerprint(str(module), "validate", str(vars_file)))
+        monkeypatch.setenv("TF_WORKSPACE", "prod")
+        keys.append(module_fingerprint(str(module), "validate", str(vars_file)))
+        assert len(set(keys)) == len(keys)
+
+        # Provider downloads and saved plans do not affect the key
+        (module / ".terraform" / "provider.tf").write_text("ignored")
+        (module / PLAN_FILE).write_text("ignored")
+        assert module_fingerprint(str(module), "validate", str(vars_file)) == keys[-1]
+
+
+class TestPlanCache:
+    """Test storage and eviction"""
+
+    def test_lru_eviction(self, tmp_path):
+        """Test that the least recently used entry goes first"""
+        cache = PlanCache(str(tmp_path / "cache"), max_bytes=2500)
+        for key in ("aa01", "bb02"):
+            cache.put(key, "plan", "x" * 1000)
+        os.utime(os.path.join(cache._entry_path("aa01"), "meta.json"), (1, 1))
+        os.utime(os.path.join(cache._entry_path("bb02"), "meta.json"), (2, 2))
+        assert cache.get("aa01") is not None  # touch: aa01 becomes most recent
+        cache.put("cc03", "plan", "x" * 1000)
+
+        assert cache.get("bb02") is None
+        assert cache.get("aa01").output == "x" * 1000
+        assert cache.get("cc03") is not None
+
+
+class TestCachedTerraform:
+    """Test run_terraform with the cache enabled"""
+
+    def test_plan_hit_skips_terraform(self, cli, module, tmp_path, capsys):
+        """Test that an unchanged module is planned once and restored from cache"""
+        assert cli.plan("aws") == 0
+        (module / PLAN_FILE).unlink()
+        assert cli.plan("aws") == 0
+        assert calls(tmp_path) == ["plan -out=tfplan", "show -json tfplan"]
+        assert (module / PLAN_FILE).read_text() == "binary plan"
+
+        out = capsys.readouterr().out
+        assert "Plan cache hit" in out
+        assert out.count("Plan: 3 to add") == 2
+
+        entry = cli.cache.entries()[0]
+        assert entry.read_text("plan.json").startswith('{"format_version"')
+
+    def test_change_misses(self, cli, module, tmp_path):
+        """Test that editing a .tf file re-plans and apply is never cached"""
+        cli.validate("aws")
+        cli.validate("aws")
+        (module / "main.tf").write_text('resource "null_resource" "c" {}\n')
+        cli.validate("aws")
+        cli.run_terraform("apply -auto-approve", "aws")
+        assert calls(tmp_path) == ["validate", "validate", "apply -auto-approve"]
+
+    def test_apply_and_destroy_drop_plans(self, cli, module, tmp_path):
+        """Test that plans cached before apply/destroy are not replayed afterwards"""
+        cli.plan("aws")
+        cli.apply("aws", auto_approve=True)
+        assert cli.cache.entries() == []
+        cli.plan("aws")
+        cli.destroy("aws", auto_approve=True)
+        cli.plan("aws")
+        assert [c for c in calls(tmp_path) if not c.startswith("show")] == [
+            "plan -out=tfplan", "apply -auto-approve", "plan -out=tfplan", "destroy -auto-approve",
+            "plan -out=tfplan"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
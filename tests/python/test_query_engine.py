@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the local query engine
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+from query_engine import LocalTable, QueryEngine, date_format
+from query_linter import extract_queries
+
+ATHENA_TF = os.path.join(os.path.dirname(__file__), '..', '..', 'terraform', 'modules', 'aws', 'athena.tf')
+
+
+@pytest.fixture
+def raw_engine(make_tree, tmp_path):
+    make_tree(str(tmp_path / "raw"))
+    return QueryEngine(LocalTable(str(tmp_path / "raw")))
+
+
+def run_named(engine):
+    return {q.name: engine.execute(q.sql, q.name) for q in extract_queries([ATHENA_TF])}
+
+
+class TestFunctions:
+    """Test Presto function stand-ins"""
+
+    def test_date_format(self):
+        """Test MySQL-style specifiers used by traffic_by_hour"""
+        assert date_format("2024-12-16T10:15:30.123456Z", "%Y-%m-%d %H:00:00") == "2024-12-16 10:00:00"
+        assert date_format("2024-12-16T10:15:30Z", "%H:%i:%s") == "10:15:30"
+
+
+class TestQueryEngine:
+    """Test running the named queries locally"""
+
+    def test_partition_pruning(self, raw_engine):
+        """Test that partitioned queries read one day and the full scan reads both"""
+        results = run_named(raw_engine)
+        assert len(results["count_by_status"].scans) == 1
+        assert results["count_by_status"].scans[0].partition == "2024/12/16"
+        assert len(results["full_scan_comparison"].scans) == 2
+        assert results["full_scan_comparison"].bytes_read > results["count_by_status"].bytes_read
+        assert results["show_partitions"].rows == [("year=2024/month=12/day=16",),
+                                                   ("year=2024/month=12/day=17",)]
+
+    def test_named_query_results(self, raw_engine):
+        """Test query results against the sample log"""
+        results = run_named(raw_engine)
+        counts = dict(results["count_by_status"].rows)
+        assert sum(counts.values()) == results["count_by_status"].rows_read == 10
+        assert results["traffic_by_hour"].rows[0][:2] == ("2024-12-16 10:00:00", 10)
+        assert all(400 <= row[0] <= 599 for row in results["error_analysis"].rows)
+        # Both days hold the same sample records, all timestamped on the 16th
+        assert dict(results["full_scan_comparison"].rows) == {k: 2 * v for k, v in counts.items()}
+
+    def test_parquet_matches_raw(self, raw_engine, tmp_path):
+        """Test that Parquet gives the same answers while reading fewer bytes"""
+        pytest.importorskip("pyarrow")
+        from parquet_converter import ConversionOptions, convert_tree
+
+        convert_tree(str(tmp_path / "raw"), str(tmp_path / "parquet"), ConversionOptions(), workers=1)
+        parquet_engine = QueryEngine(LocalTable(str(tmp_path / "parquet")))
+        assert parquet_engine.table.format == "parquet"
+
+        raw, parquet = run_named(raw_engine), run_named(parquet_engine)
+        for name in raw:
+            assert sorted(parquet[name].rows) == sorted(raw[name].rows), name
+        assert parquet["top_urls"].bytes_read < raw["top_urls"].bytes_read
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the Athena query linter
+"""
+
+import os
+import sys
+from datetime import date
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+from query_linter import NamedQuery, PartitionCatalog, analyze, extract_queries, lint_paths, lint_query
+from validate_infrastructure import TerraformValidator
+
+AWS_MODULE = os.path.join(os.path.dirname(__file__), '..', '..', 'terraform', 'modules', 'aws')
+
+
+def rules(sql):
+    return sorted(f.rule for f in analyze(sql).findings if not f.suppressed)
+
+
+class TestAnalyze:
+    """Test SQL analysis"""
+
+    def test_partition_predicates(self):
+        """Test that a full year/month/day filter raises nothing"""
+        sql = "SELECT elb_status_code, COUNT(*) FROM alb_access_logs " \
+              "WHERE year = '2024' AND month = '12' AND day = '16' GROUP BY elb_status_code"
+        assert rules(sql) == []
+        assert analyze(sql).tables == ["alb_access_logs"]
+
+    def test_missing_and_partial_filters(self):
+        """Test missing and partial partition predicates"""
+        assert rules("SELECT client_ip FROM alb_access_logs WHERE time > '2024-12-16'") == [
+            "missing-partition-filter"]
+        assert rules("SELECT client_ip FROM alb_access_logs WHERE year = '2024'") == [
+            "partial-partition-filter"]
+
+    def test_qualified_columns_and_typed_literals(self):
+        """Test alias- and table-qualified partition filters and DATE/TIMESTAMP literals are understood"""
+        assert rules("SELECT a.elb_status_code FROM alb_access_logs a "
+                     "WHERE a.year = '2024' AND a.month = '12' AND a.day = '16'") == []
+        assert rules("SELECT COUNT(*) FROM alb_logs.alb_access_logs l JOIN targets t ON l.target_ip = t.ip "
+                     "WHERE alb_logs.alb_access_logs.year = '2024' AND l.month IN ('11', '12') "
+                     "AND (l.day = '15' OR l.day = '16')") == []
+        analysis = analyze("SELECT 1 FROM t WHERE year = '2024' AND month = '12' AND day = '16' "
+                           "AND time >= TIMESTAMP '2024-12-16 10:00:00' AND t.time < DATE '2024-12-17'")
+        assert analysis.constraints["time"].low == "2024-12-16 10:00:00"
+        assert analysis.constraints["time"].high == "2024-12-17"
+
+    def test_select_star(self):
+        """Test that SELECT * is flagged but COUNT(*) is not"""
+        assert "select-star" in rules("SELECT * FROM t WHERE year='2024' AND month='01' AND day='01'")
+        assert "select-star" in rules("SELECT t.* FROM t WHERE year='2024' AND month='01' AND day='01'")
+        assert rules("SELECT COUNT(*) FROM t WHERE year='2024' AND month='01' AND day='01'") == []
+
+    def test_function_on_partition_column(self):
+        """Test that wrapping a partition column in a function defeats pruning"""
+        sql = "SELECT 1 FROM t WHERE CAST(year AS integer) = 2024 AND month = '12' AND day = '16'"
+        assert rules(sql) == ["function-on-partition-column", "partial-partition-filter"]
+
+    def test_ranges_in_and_or(self):
+        """Test BETWEEN, IN and same-column OR constraints"""
+        analysis = analyze("SELECT 1 FROM t WHERE year = '2024' AND month IN ('11', '12') "
+                           "AND day BETWEEN '10' AND '20' AND (day = '15' OR day = '25')")
+        assert analysis.partition_matches(("2024", "12", "15"))
+        assert not analysis.partition_matches(("2024", "12", "25"))
+        assert not analysis.partition_matches(("2024", "10", "15"))
+
+    def test_ctes_subqueries_and_set_branches(self):
+        """Test filters inside CTEs and derived tables count, and every UNION branch is checked"""
+        pinned = "year = '2024' AND month = '12' AND day = '16'"
+        assert rules(f"WITH e AS (SELECT client_ip FROM alb_access_logs WHERE {pinned}) "
+                     f"SELECT COUNT(*) FROM e") == []
+        assert rules(f"SELECT c FROM (SELECT client_ip c FROM alb_access_logs WHERE {pinned}) t") == []
+        # Outer predicates reach the table through the CTE
+        analysis = analyze("WITH e AS (SELECT client_ip, year, month, day FROM alb_access_logs) "
+                           "SELECT COUNT(*) FROM e WHERE year = '2024' AND month = '12' AND day IN ('16', '17')")
+        assert analysis.findings == [] and analysis.tables == ["alb_access_logs"]
+        assert analysis.partition_matches(("2024", "12", "17"))
+
+        union = analyze(f"SELECT a FROM alb_access_logs WHERE {pinned} UNION ALL SELECT a FROM alb_access_logs")
+        assert [f.rule for f in union.findings] == ["missing-partition-filter"]
+        assert "set branch 2" in union.findings[0].message
+        assert union.partition_matches(("2023", "01", "01"))
+
+        both = analyze(f"SELECT a FROM alb_access_logs WHERE {pinned} "
+                       "UNION SELECT a FROM alb_access_logs WHERE year = '2024' AND month = '12' AND day = '18'")
+        assert both.findings == [] and both.constraints["day"].values == {"16", "18"}
+        assert not both.partition_matches(("2024", "12", "17"))
+
+    def test_suppression(self):
+        """Test the athena-lint ignore comment"""
+        sql = "-- athena-lint: ignore=missing-partition-filter\nSELECT a FROM t"
+        assert rules(sql) == []
+        assert analyze("SHOW PARTITIONS t").findings == []
+
+
+class TestModuleQueries:
+    """Test the named queries shipped in the AWS module"""
+
+    def test_extract_named_queries(self):
+        """Test that every named query heredoc is found"""
+        names = [q.name for q in extract_queries([AWS_MODULE])]
+        for name in ("count_by_status", "top_urls", "error_analysis", "traffic_by_hour",
+                     "full_scan_comparison", "show_partitions"):
+            assert name in names
+
+    def test_module_is_clean_and_full_scan_costs_most(self):
+        """Test that only the suppressed example scans the whole catalog"""
+        catalog = PartitionCatalog.uniform(days=30, bytes_per_day=10 ** 9, end=date(2024, 12, 31))
+        reports = {r.query.name: r for r in lint_paths([AWS_MODULE], catalog)}
+        assert not any(r.errors for r in reports.values())
+        assert reports["count_by_status"].partitions_scanned == 1
+        assert reports["full_scan_comparison"].bytes_scanned == catalog.total_bytes
+        assert reports["show_partitions"].cost is None
+        assert TerraformValidator(AWS_MODULE).lint_queries()[0]
+
+    def test_cost_feeds_estimator(self):
+        """Test that scanned bytes price at $5/TB via AWSCostEstimator"""
+        catalog = PartitionCatalog({("2024", "12", "16"): 1024 ** 4})
+        report = lint_query(NamedQuery("q", "x.tf", 1, "SELECT a FROM t"), catalog, runs_per_month=2)
+        assert report.errors[0].rule == "missing-partition-filter"
+        assert report.cost.monthly_cost == pytest.approx(10.0)
+        assert report.cost.notes == "2.000TB scanned/month"
+
+    def test_default_catalog_holds_pinned_days(self):
+        """Test the default catalog ends on the day the module's queries name, so they are priced"""
+        reports = {r.query.name: r for r in lint_paths([AWS_MODULE])}
+        assert reports["count_by_status"].partitions_scanned == 1
+        assert reports["count_by_status"].cost.monthly_cost > 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the query result cache
+"""
+
+import os
+import shutil
+import sys
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+from local_aws import LocalS3
+from query_linter import analyze
+from result_cache import AthenaBackend, LocalBackend, LocalStore, ResultCache, normalize_sql
+
+DAY_16 = """
+    -- status counts for one closed day
+    SELECT elb_status_code, COUNT(*) AS requests
+    FROM alb_access_logs
+    WHERE year = '2024' AND month = '12' AND day = '16'
+    GROUP BY elb_status_code
+"""
+DAY_17 = DAY_16.replace("'16'", "'17'")
+
+
+@pytest.fixture
+def tree(make_tree, tmp_path):
+    make_tree(str(tmp_path / "raw"))
+    return str(tmp_path / "raw")
+
+
+def make_cache(tree, tmp_path, **kwargs):
+    return ResultCache(LocalBackend(tree), LocalStore(str(tmp_path / "cache")), **kwargs)
+
+
+class TestResultCache:
+    """Test hits, invalidation and eviction"""
+
+    def test_normalize_sql(self):
+        """Test that formatting and comments do not change the key"""
+        reformatted = ("select ELB_STATUS_CODE, count(*) as REQUESTS from ALB_ACCESS_LOGS "
+                       "where YEAR = '2024' and MONTH = '12' and DAY = '16' group by ELB_STATUS_CODE;")
+        assert normalize_sql(DAY_16) == normalize_sql(reformatted)
+        assert normalize_sql("SELECT 'A' FROM t") != normalize_sql("SELECT 'a' FROM t")
+        assert normalize_sql('SELECT "Path" FROM t') != normalize_sql('SELECT "path" FROM t')
+        assert normalize_sql('SELECT "Path" FROM t') != normalize_sql("SELECT Path FROM t")
+
+    def test_repeat_query_hits(self, tree, tmp_path):
+        """Test that a repeat is served from the cache, also by a new process"""
+        first = make_cache(tree, tmp_path).run(DAY_16)
+        cache = make_cache(tree, tmp_path)
+        second = cache.run(DAY_16)
+        assert not first.hit and second.hit
+        assert second.rows == first.rows
+        assert cache.stats.hits == 1 and cache.stats.misses == 1
+        assert cache.stats.hit_rate == 0.5
+
+    def test_new_object_invalidates_only_its_partition(self, tree, tmp_path):
+        """Test that new objects in day 17 leave the day 16 entry valid"""
+        cache = make_cache(tree, tmp_path)
+        cache.run(DAY_16)
+        before = cache.run(DAY_17)
+
+        day_dir = os.path.dirname(next(os.path.join(d, f) for d, _, files in os.walk(tree)
+                                       for f in files if "/17/" in os.path.join(d, f)))
+        source = os.path.join(day_dir, os.listdir(day_dir)[0])
+        shutil.copyfile(source, source.replace("random123", "random456"))
+
+        assert cache.run(DAY_16).hit
+        after = cache.run(DAY_17)
+        assert after.reason == "invalidated"
+        assert sum(r[1] for r in after.rows) == 2 * sum(r[1] for r in before.rows)
+
+    def test_ttl_and_lru(self, tree, tmp_path):
+        """Test expiry and least-recently-used eviction"""
+        cache = make_cache(tree, tmp_path, ttl_seconds=0)
+        cache.run(DAY_16)
+        assert cache.run(DAY_16).reason == "expired"
+
+        cache = make_cache(tree, tmp_path, max_entries=1)
+        cache.clear()
+        cache.run(DAY_16)
+        cache.run(DAY_17)
+        assert len(cache) == 1 and cache.stats.evictions == 1
+        assert cache.run(DAY_17).hit
+        assert not cache.run(DAY_16).hit
+
+    def test_range_filter_lists_only_reached_days(self, make_tree, tmp_path):
+        """Test that an unpinned day range lists the days it reaches, not the whole region"""
+        make_tree(str(tmp_path / "s3" / "logs"))
+        s3 = LocalS3(str(tmp_path / "s3"))
+        listed = []
+        list_objects = s3.list_objects_v2
+
+        def recording_list(**kwargs):
+            if not kwargs.get("Delimiter"):
+                listed.append(kwargs["Prefix"])
+            return list_objects(**kwargs)
+
+        s3.list_objects_v2 = recording_list
+        backend = AthenaBackend("primary", "alb_logs", "logs", "123456789012", athena=object(), s3=s3)
+        sql = "SELECT COUNT(*) FROM alb_access_logs WHERE year = '2024' AND month = '12' AND day >= '17'"
+        versions = backend.partition_versions(analyze(sql))
+
+        assert list(versions) == [("2024", "12", "17")]
+        assert [prefix.split("/elasticloadbalancing/us-east-1/")[1] for prefix in listed] == ["2024/12/17/"]
+        assert len(backend.partition_versions(analyze("SELECT COUNT(*) FROM alb_access_logs"))) == 2
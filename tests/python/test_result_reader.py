@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the streaming Athena result reader
+"""
+
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+from local_aws import LocalAthena, LocalS3
+from result_reader import NULL, ResultReader, benchmark, parse_block, read_paginated, write_parquet
+
+# Athena-style CSV: every value quoted, NULL left empty
+TRICKY_CSV = (
+    '"name","requests","latency","ok"\n'
+    '"plain","10","0.5","true"\n'
+    ',,,\n'
+    '"comma, ""quoted""","7",,"false"\n'
+    '"multi\nline","3","1.25",\n'
+    '"","0","0.0","true"\n'
+)
+TRICKY_TYPES = {"name": "varchar", "requests": "bigint", "latency": "double", "ok": "boolean"}
+
+
+@pytest.fixture(scope="module")
+def athena(tmp_path_factory):
+    """A finished SELECT * over one day of logs in the local stand-ins"""
+    pytest.importorskip("numpy")
+    from log_generator import GeneratorConfig, generate
+    root = tmp_path_factory.mktemp("results")
+    generate(GeneratorConfig(str(root / "logs"), datetime(2024, 12, 16), days=1, requests_per_second=0.05),
+             workers=1)
+    s3 = LocalS3(str(root / "s3"))
+    client = LocalAthena(str(root / "logs"), s3)
+    execution_id = client.start_query_execution(QueryString="SELECT * FROM alb_access_logs")["QueryExecutionId"]
+    client.wait()
+    return client, s3, execution_id
+
+
+def flatten(batches, column):
+    return [value for batch in batches for value in batch.columns[column].tolist()]
+
+
+class TestResultReader:
+    """Test block parsing, ranged reads, type conversion and Parquet spill"""
+
+    def test_parse_block(self):
+        """Test NULL vs empty string, doubled quotes and newlines inside values"""
+        rows = parse_block(TRICKY_CSV)
+        assert rows[2] == [NULL] * 4
+        assert rows[3] == ['comma, "quoted"', "7", NULL, "false"]
+        assert rows[4] == ["multi\nline", "3", "1.25", NULL]
+        assert rows[5][0] == ""
+
+    def test_small_ranges_decode_typed_columns(self, tmp_path):
+        """Test that records split across many tiny ranges decode to typed arrays with null masks"""
+        pytest.importorskip("numpy")
+        s3 = LocalS3(str(tmp_path))
+        s3.put_object(Bucket="results", Key="query-results/q.csv", Body=TRICKY_CSV.encode())
+        reader = ResultReader(s3, chunk_bytes=7, workers=3)
+        batches = list(reader.read("s3://results/query-results/q.csv", TRICKY_TYPES))
+
+        assert flatten(batches, "name") == ["plain", None, 'comma, "quoted"', "multi\nline", ""]
+        assert flatten(batches, "requests") == [10, 0, 7, 3, 0]
+        assert [m for b in batches for m in b.nulls["requests"].tolist()] == [False, True, False, False, False]
+        assert all(b.columns["latency"].dtype == "float64" and b.columns["ok"].dtype == bool for b in batches)
+        assert reader.stats.rows == 5 and reader.stats.bytes == len(TRICKY_CSV.encode())
+        assert reader.stats.requests == -(-len(TRICKY_CSV.encode()) // 7) + 1
+
+    def test_matches_paginated_fetch(self, athena):
+        """Test that ranged reads return exactly what GetQueryResults pages do"""
+        client, s3, execution_id = athena
+        ranged = list(ResultReader(s3, chunk_bytes=64 * 1024, workers=4).read_execution(client, execution_id))
+        paginated = list(read_paginated(client, execution_id, page_size=500))
+        for column in ("client_ip", "target_status_code", "target_processing_time", "ssl_cipher"):
+            assert flatten(ranged, column) == flatten(paginated, column)
+        assert ranged[0].columns["sent_bytes"].dtype == "int64"
+        assert sum(len(b) for b in ranged) == len(client._executions[execution_id].rows)
+
+    def test_parquet_spill(self, athena, tmp_path):
+        """Test streaming batches into Parquet with NULLs intact"""
+        pytest.importorskip("pyarrow")
+        import pyarrow.parquet as pq
+        client, s3, execution_id = athena
+        path = str(tmp_path / "result.parquet")
+        rows = write_parquet(ResultReader(s3, chunk_bytes=64 * 1024).read_execution(client, execution_id), path)
+
+        table = pq.read_table(path)
+        expected = client._executions[execution_id].rows
+        assert rows == table.num_rows == len(expected)
+        index = [name for name, _ in client._executions[execution_id].columns].index("target_status_code")
+        assert table.column("target_status_code").to_pylist() == [row[index] for row in expected]
+        assert pq.ParquetFile(path).metadata.num_row_groups > 1
+
+    def test_ranged_reads_outpace_pagination(self, tmp_path):
+        """Test the MB/s comparison under simulated request latency"""
+        pytest.importorskip("numpy")
+        ranged, paginated = benchmark(rate=0.05, chunk_bytes=256 * 1024, workers=4, get_latency=0.01,
+                                      page_latency=0.02, work_dir=str(tmp_path))
+        assert ranged.rows == paginated.rows > 0 and ranged.bytes == paginated.bytes
+        assert ranged.mb_per_second > paginated.mb_per_second
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Unit tests for dashboard rollups and the query rewriter
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+pytest.importorskip("pyarrow")
+
+from query_engine import LocalTable, QueryEngine
+from query_linter import extract_queries
+from rollups import RollupEngine, RollupStore, rewrite
+from sketches import DDSketch, SpaceSaving
+
+ATHENA_TF = os.path.join(os.path.dirname(__file__), '..', '..', 'terraform', 'modules', 'aws', 'athena.tf')
+
+
+@pytest.fixture
+def tree(make_tree, tmp_path):
+    make_tree(str(tmp_path / "raw"))
+    return str(tmp_path / "raw")
+
+
+def rounded(rows):
+    return sorted(tuple(round(v, 6) if isinstance(v, float) else v for v in row) for row in rows)
+
+
+def named_queries():
+    return {q.name: q.sql for q in extract_queries([ATHENA_TF])}
+
+
+class TestSketches:
+    """Test the mergeable summaries behind the approximate rollups"""
+
+    def test_ddsketch_accuracy_and_merge(self):
+        """Test quantiles within relative accuracy, after merging and a round trip"""
+        rng = random.Random(7)
+        values = [rng.lognormvariate(-3, 1) for _ in range(20000)]
+        left, right = DDSketch(0.01), DDSketch(0.01)
+        left.update(values[:10000])
+        right.update(values[10000:])
+        merged = DDSketch.from_bytes(left.merge(right).to_bytes())
+        ordered = sorted(values)
+        for q in (0.5, 0.95, 0.99):
+            exact = ordered[int(q * (len(ordered) - 1))]
+            assert merged.quantile(q) == pytest.approx(exact, rel=0.011)
+        assert merged.count == 20000
+        assert len(merged.to_bytes()) < 2048
+
+    def test_space_saving_heavy_hitters(self):
+        """Test that frequent keys survive and counts bound the truth"""
+        rng = random.Random(3)
+        stream = [f"/hot/{rng.randint(0, 4)}" if rng.random() < 0.5 else f"/cold/{rng.randint(0, 5000)}"
+                  for _ in range(20000)]
+        left, right = SpaceSaving(50), SpaceSaving(50)
+        for i, key in enumerate(stream):
+            (left if i % 2 else right).add(key)
+        top = dict(left.merge(right).top(5))
+        for key in {f"/hot/{i}" for i in range(5)}:
+            true = stream.count(key)
+            assert key in top
+            assert top[key][0] - top[key][1] <= true <= top[key][0]
+
+
+class TestRollups:
+    """Test building rollups and routing the named queries to them"""
+
+    def test_routing(self):
+        """Test which rollup each named query is sent to"""
+        queries = named_queries()
+        assert rewrite(queries["count_by_status"]).table == "status"
+        assert rewrite(queries["traffic_by_hour"]).table == "status"
+        assert rewrite(queries["error_analysis"]).table == "errors"
+        assert rewrite(queries["top_urls"]).approximate
+        top = ("SELECT request_url, COUNT(*) AS c FROM alb_access_logs WHERE year = '2024' "
+               "GROUP BY request_url ORDER BY {} LIMIT 10")
+        for order in ("c DESC", "COUNT(*) DESC", "2 DESC"):
+            assert rewrite(top.format(order)).table == "top_urls", order
+        # Space-Saving only keeps the most frequent URLs
+        for order in ("c ASC", "c", "request_url", "COUNT(*)", "1 DESC"):
+            assert rewrite(top.format(order)) is None, order
+        assert rewrite(queries["full_scan_comparison"]) is None
+        assert rewrite("SELECT approx_percentile(target_processing_time, 0.99) FROM db.alb_access_logs "
+                       "WHERE year = '2024'").table == "latency"
+
+    def test_exact_rollups_match_raw(self, tree, tmp_path):
+        """Test that exact rollups return the raw results and incremental runs skip unchanged days"""
+        table = LocalTable(tree)
+        store = RollupStore(str(tmp_path / "rollups"))
+        assert not any(r.skipped for r in store.update(table))
+        assert all(r.skipped for r in RollupStore(str(tmp_path / "rollups")).update(table))
+
+        raw = QueryEngine(table)
+        engine = RollupEngine(store, raw)
+        queries = named_queries()
+        for name in ("count_by_status", "error_analysis", "traffic_by_hour"):
+            plan, result = engine.execute(queries[name], name)
+            expected = raw.execute(queries[name], name)
+            assert plan is not None
+            assert rounded(result.rows) == rounded(expected.rows)
+
+        for sql in ("SELECT COUNT(elb_status_code), COUNT(target_status_code) FROM alb_access_logs WHERE year = '2024'",
+                    "SELECT elb_status_code, COUNT(target_status_code), MAX(request_url) FROM alb_access_logs "
+                    "WHERE elb_status_code >= 400 GROUP BY elb_status_code"):
+            plan, result = engine.execute(sql)
+            assert plan is not None and not plan.approximate
+            assert rounded(result.rows) == rounded(raw.execute(sql).rows)
+        for sql in ("SELECT SUM(elb_status_code) FROM alb_access_logs",
+                    "SELECT AVG(target_status_code) FROM alb_access_logs",
+                    "SELECT COUNT(DISTINCT request_url) FROM alb_access_logs"):
+            assert rewrite(sql) is None
+
+        plan, result = engine.execute(queries["top_urls"], "top_urls")
+        assert {r[0] for r in result.rows} == {r[0] for r in raw.execute(queries["top_urls"]).rows}
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the Terraform resource graph
+"""
+
+import json
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+from terraform_graph import ParseCache, graph_from_hcl, graph_from_plan, parse_file
+
+REPO_ROOT = os.path.join(os.path.dirname(__file__), '..', '..')
+TERRAFORM_DIR = os.path.join(REPO_ROOT, 'terraform')
+AWS_MODULE = os.path.join(TERRAFORM_DIR, 'modules', 'aws')
+
+
+class TestTerraformGraph:
+    """Test HCL parsing, reference resolution and graph output"""
+
+    def test_aws_module_edges(self):
+        """Test the references between the AWS module's resources"""
+        edges = set(graph_from_hcl(AWS_MODULE).edges)
+        assert ("aws_glue_crawler.alb_logs", "aws_glue_catalog_database.alb_logs") in edges
+        assert ("aws_glue_crawler.alb_logs", "aws_iam_role.glue_crawler") in edges
+        assert ("aws_glue_crawler.alb_logs", "aws_s3_bucket.alb_logs") in edges
+        assert ("aws_athena_workgroup.alb_logs", "aws_s3_bucket.athena_results") in edges
+        assert ("aws_athena_named_query.top_urls", "aws_athena_workgroup.alb_logs") in edges
+
+    def test_strings_and_comments_are_not_references(self):
+        """Test that SQL heredocs, comments and plain strings do not create edges"""
+        blocks = parse_file('''
+resource "aws_athena_named_query" "q" {
+  # uses aws_s3_bucket.commented
+  workgroup = aws_athena_workgroup.main.id /* aws_iam_role.block */
+  name      = "aws_glue_crawler.literal ${var.prefix}-{x}"
+  query     = <<-EOQ
+    SELECT * FROM aws_glue_catalog_table.sql WHERE a = '}'
+  EOQ
+}
+
+output "bucket" {
+  value = { id = aws_s3_bucket.logs.id }
+}
+''')
+        assert [(b["kind"], b["labels"]) for b in blocks] == [
+            ("resource", ["aws_athena_named_query", "q"]), ("output", ["bucket"])]
+        assert blocks[0]["references"] == ["aws_athena_workgroup.main", "var.prefix"]
+        assert blocks[1]["attributes"]["value"]["references"] == ["aws_s3_bucket.logs"]
+
+    def test_collapse(self):
+        """Test that bucket/role satellites fold into their parent resource"""
+        graph = graph_from_hcl(AWS_MODULE)
+        collapsed = graph.collapse()
+        bucket = collapsed.resources["aws_s3_bucket.alb_logs"]
+        assert "aws_s3_bucket_public_access_block.alb_logs" in bucket.members
+        assert not any(r.type.startswith("aws_s3_bucket_") for r in collapsed.resources.values())
+        assert len(collapsed.resources) < len(graph.resources)
+        assert ("aws_glue_crawler.alb_logs", "aws_s3_bucket.alb_logs") in collapsed.edges
+
+    def test_root_module_composition(self, tmp_path):
+        """Test module addresses from the root configuration and the parse cache"""
+        cache = ParseCache(str(tmp_path / "cache"))
+        graph = graph_from_hcl(TERRAFORM_DIR, cache)
+        assert "module.aws_alb_logs.aws_glue_crawler.alb_logs" in graph.resources
+        assert graph.resources["module.aws_alb_logs.aws_glue_crawler.alb_logs"].module == "aws_alb_logs"
+        assert cache.stats.parsed == cache.stats.files and cache.stats.cached == 0
+
+        again = ParseCache(str(tmp_path / "cache"))
+        assert graph_from_hcl(TERRAFORM_DIR, again).edges == graph.edges
+        assert again.stats.cached == again.stats.files and again.stats.parsed == 0
+
+    def test_plan_json_and_dot(self):
+        """Test `terraform show -json` input through module inputs and outputs, and DOT output"""
+        plan = {"configuration": {"root_module": {
+            "resources": [{"address": "aws_lb.main", "mode": "managed", "type": "aws_lb", "name": "main",
+                           "expressions": {"access_logs": [{"bucket": {
+                               "references": ["module.logs.bucket", "module.logs"]}}]}}],
+            "module_calls": {"logs": {"source": "./modules/aws", "module": {
+                "resources": [
+                    {"address": "aws_s3_bucket.alb_logs", "mode": "managed", "type": "aws_s3_bucket",
+                     "name": "alb_logs", "expressions": {}},
+                    {"address": "aws_glue_crawler.alb_logs", "mode": "managed", "type": "aws_glue_crawler",
+                     "name": "alb_logs", "expressions": {"s3_target": [{"path": {
+                         "references": ["aws_s3_bucket.alb_logs.id", "aws_s3_bucket.alb_logs"]}}]}},
+                ],
+                "outputs": {"bucket": {"expression": {"references": ["aws_s3_bucket.alb_logs.id",
+                                                                     "aws_s3_bucket.alb_logs"]}}},
+            }}},
+        }}}
+        graph = graph_from_plan(json.loads(json.dumps(plan)))
+        assert set(graph.edges) == {
+            ("aws_lb.main", "module.logs.aws_s3_bucket.alb_logs"),
+            ("module.logs.aws_glue_crawler.alb_logs", "module.logs.aws_s3_bucket.alb_logs"),
+        }
+        dot = graph.to_dot("plan")
+        assert 'subgraph "cluster_1"' in dot and 'label="logs";' in dot
+        assert '"aws_lb.main" -> "module.logs.aws_s3_bucket.alb_logs";' in dot
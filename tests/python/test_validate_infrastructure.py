@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the concurrent validation scheduler
+"""
+
+import json
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'python'))
+
+import validate_infrastructure
+from validate_infrastructure import ValidationScheduler, failed_modules, write_json, write_junit
+
+FAKE_TOOL = """#!{python}
+import json, os, sys, time
+time.sleep(0.3)
+if "{name}" == "tfsec":
+    print("[]")
+    sys.exit(0)
+if sys.argv[1] == "validate":
+    broken = os.path.exists("broken.tf")
+    print(json.dumps({{"diagnostics": [{{"summary": "Unsupported block type"}}] if broken else []}}))
+    sys.exit(1 if broken else 0)
+sys.exit(0)
+"""
+
+
+@pytest.fixture
+def modules(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    for name in ("terraform", "tfsec"):
+        tool = bin_dir / name
+        tool.write_text(FAKE_TOOL.format(python=sys.executable, name=name))
+        tool.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    validate_infrastructure.find_tool.cache_clear()
+
+    paths = {}
+    for name in ("aws", "gcp", "azure", "common"):
+        path = tmp_path / "modules" / name
+        path.mkdir(parents=True)
+        (path / "main.tf").write_text("")
+        paths[name] = str(path)
+    return paths
+
+
+class TestValidationScheduler:
+    """Test concurrent module x check execution"""
+
+    def test_concurrent_wall_time(self, modules):
+        """Test that 16 checks take about as long as the longest chain"""
+        start = time.perf_counter()
+        results = ValidationScheduler(modules).run()
+        elapsed = time.perf_counter() - start
+
+        assert [r.status for r in results] == ["passed"] * 16
+        # syntax then security is the longest chain (2 x 0.3s); serial would be ~3.6s
+        assert elapsed < 2.0
+        assert validate_infrastructure.find_tool.cache_info().misses == 1
+
+    def test_dependent_checks_skipped(self, modules):
+        """Test that a syntax failure skips only the security scan for that module"""
+        with open(os.path.join(modules["gcp"], "broken.tf"), "w") as f:
+            f.write("bogus {}")
+        results = {(r.module, r.check): r for r in ValidationScheduler(modules, max_workers=4).run()}
+
+        assert results[("gcp", "syntax")].status == "failed"
+        assert "Unsupported block type" in results[("gcp", "syntax")].message
+        assert results[("gcp", "security")].status == "skipped"
+        assert results[("gcp", "formatting")].status == "passed"
+        assert results[("aws", "security")].status == "passed"
+        assert failed_modules(list(results.values())) == ["gcp"]
+
+    def test_reports(self, modules, tmp_path):
+        """Test the JSON and JUnit outputs"""
+        with open(os.path.join(modules["aws"], "broken.tf"), "w") as f:
+            f.write("bogus {}")
+        results = ValidationScheduler({"aws": modules["aws"]}).run()
+        write_json(results, str(tmp_path / "results.json"))
+        write_junit(results, str(tmp_path / "results.xml"))
+
+        with open(tmp_path / "results.json") as f:
+            data = json.load(f)
+        assert {d["check"]: d["status"] for d in data}["security"] == "skipped"
+        assert all("seconds" in d for d in data)
+
+        suite = ET.parse(str(tmp_path / "results.xml")).getroot().find("testsuite")
+        assert suite.get("name") == "aws"
+        assert (suite.get("tests"), suite.get("failures"), suite.get("skipped")) == ("4", "1", "1")
+        assert suite.find("testcase[@name='syntax']/failure") is not None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])